@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Deposits a second against `sword2.fake_server.FakeSwordServer`, from one thread and from several, on a local
+connection and on a simulated slow one (with latency on each request and a cap on bandwidth), so that changes to
+the request path can be compared without a real SWORD2 server.
+
+Each deposit is a Col-IRI POST of `size` bytes, followed by a GET of its deposit receipt (as `honour_receipts`
+does not need the service document here, it is not fetched). The server keeps only the size and MD5 of what it is
+sent.
+
+Usage:
+
+    python -m benchmarks.deposit_throughput [deposits] [size]
+"""
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sword2 import Connection, HttpLib2Layer
+from sword2.fake_server import FakeSwordServer
+
+NETWORKS = [("local", {}),
+            ("20ms, 10MB/s", {'latency' : 0.02, 'bandwidth' : 10 * 1024 * 1024})]
+
+def deposit(server, payload, n):
+    conn = Connection(server.sd_iri, http_impl=HttpLib2Layer(None))
+    for i in range(n):
+        receipt = conn.create(col_iri=server.col_iris[0], payload=payload, mimetype="application/zip",
+                              filename="example.zip", packaging="http://purl.org/net/sword/package/SimpleZip")
+        conn.get_deposit_receipt(receipt.edit)
+
+def run(server, payload, deposits, threads):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        for f in [pool.submit(deposit, server, payload, deposits // threads) for i in range(threads)]:
+            f.result()
+    return (deposits // threads) * threads / (time.perf_counter() - started)
+
+def main(deposits=200, size=64 * 1024):
+    payload = b"x" * size
+    print("%-16s %8s %14s" % ("network", "threads", "deposits/s"))
+    for name, network in NETWORKS:
+        with FakeSwordServer(keep_content=False, **network) as server:
+            for threads in (1, 4, 16):
+                print("%-16s %8d %14.1f" % (name, threads, run(server, payload, deposits, threads)))
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:3]])
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+How long it takes to import `sword2` and to get a `Connection` going, each in a fresh interpreter (so that nothing
+is already in `sys.modules`), and which of the heavier modules each step loads.
+
+The time shown is the best of `repeat` runs, timed inside the interpreter (so not counting its start-up). For a
+module-by-module breakdown of any of the steps, run it under `python -X importtime -c "..."`.
+
+Usage:
+
+    python -m benchmarks.import_time [repeat]
+"""
+
+import os
+import sys
+import json
+import subprocess
+
+HEAVY = ("httplib2", "lxml.etree", "urllib.request", "html.parser", "logging.config", "concurrent.futures",
+         "zipfile", "ssl", "email.utils")
+
+STEPS = [("import sword2", "import sword2"),
+         ("from sword2 import Connection", "from sword2 import Connection"),
+         ("Connection(...)", "from sword2 import Connection; Connection('http://example.org/sd-iri')"),
+         ("UrlLib2Layer()", "from sword2 import UrlLib2Layer; UrlLib2Layer()"),
+         ("sword2.Harvester", "import sword2; sword2.Harvester")]
+
+PROBE = """
+import sys, time, json
+started = time.perf_counter()
+%s
+took = time.perf_counter() - started
+print(json.dumps([took, [m for m in %r if m in sys.modules]]))
+"""
+
+def run(code):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    out = subprocess.check_output([sys.executable, "-c", PROBE % (code, HEAVY)], env=env,
+                                  cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return json.loads(out.decode("utf-8"))
+
+def main(repeat=10):
+    print("%-32s %9s   %s" % ("", "time", "loads"))
+    for name, code in STEPS:
+        runs = [run(code) for i in range(repeat)]
+        took = min(r[0] for r in runs)
+        print("%-32s %7.1fms   %s" % (name, took * 1e3, ", ".join(runs[0][1]) or "-"))
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:2]])
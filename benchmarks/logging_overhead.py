@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+How much logging costs the parsers and the request path, with logging off (the `sword2` loggers at WARNING) and on
+(DEBUG, to a handler which throws the records away).
+
+With the log messages built lazily, the cost with logging off is that of a call which checks the level and
+returns; the figures for "eager" show what building each message first (the old `"..." % args`) costs on its own.
+
+The last table compares the lines and bytes written for each request with the `sword2` loggers at INFO (formatted
+as text) with those of `sword2.structured_logging.configure`: one JSON event for each operation, and the free-text
+messages at WARNING - then with a tenth of the events sampled, and with the free text at INFO as well but no more than
+10 of each message (and of each operation) a minute.
+
+Usage:
+
+    python -m benchmarks.logging_overhead [repeat]
+"""
+
+import sys
+import timeit
+import logging
+
+from sword2.structured_logging import configure, events_l
+
+from sword2 import Connection, Deposit_Receipt, Ore_Sword_Statement
+from sword2.http_layer import HttpLayer, HttpResponse
+
+RECEIPT = b"""<entry xmlns="http://www.w3.org/2005/Atom" xmlns:sword="http://purl.org/net/sword/terms/">
+    <title>Deposit</title>
+    <id>info:example/1</id>
+    <updated>2011-05-30T01:05:54Z</updated>
+    <link rel="edit" href="http://example.org/edit/1"/>
+    <link rel="edit-media" href="http://example.org/em/1"/>
+    <link rel="http://purl.org/net/sword/terms/add" href="http://example.org/edit/1"/>
+    <content type="application/zip" src="http://example.org/cont/1"/>
+    <sword:packaging>http://purl.org/net/sword/package/SimpleZip</sword:packaging>
+    <sword:treatment>Stored</sword:treatment>
+""" + b"".join(b"    <dcterms:subject xmlns:dcterms=\"http://purl.org/dc/terms/\">subject %d</dcterms:subject>\n" % i
+               for i in range(50)) + b"</entry>"
+
+def ore_statement(resources):
+    descriptions = []
+    for i in range(resources):
+        descriptions.append("""
+    <rdf:Description rdf:about="http://example.org/file/%d">
+        <sword:packaging rdf:resource="http://purl.org/net/sword/package/SimpleZip"/>
+        <sword:depositedOn rdf:datatype="http://www.w3.org/2001/XMLSchema#dateTime">2011-03-02T20:50:06Z</sword:depositedOn>
+        <sword:depositedBy>sword</sword:depositedBy>
+    </rdf:Description>""" % i)
+    return ("""<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns:ore="http://www.openarchives.org/ore/terms/"
+         xmlns:sword="http://purl.org/net/sword/terms/">
+    <rdf:Description rdf:about="http://example.org/rem">
+        <ore:describes rdf:resource="http://example.org/agg"/>
+    </rdf:Description>
+    <rdf:Description rdf:about="http://example.org/agg">
+        <ore:isDescribedBy rdf:resource="http://example.org/rem"/>
+        %s
+        <sword:state rdf:resource="http://purl.org/net/sword/state/archived"/>
+    </rdf:Description>%s
+</rdf:RDF>""" % ("".join('<ore:aggregates rdf:resource="http://example.org/file/%d"/>' % i for i in range(resources)),
+                 "".join(descriptions))).encode("utf-8")
+
+class Response(HttpResponse):
+    def __init__(self, status, headers):
+        self.status = status
+        self.headers = headers
+
+    def __getitem__(self, att):
+        return self.status if att == "status" else self.headers.get(att)
+
+    def get(self, att, default=None):
+        return self.status if att == "status" else self.headers.get(att, default)
+
+    def keys(self):
+        return list(self.headers)
+
+class InMemoryLayer(HttpLayer):
+    """Answers a POST with a deposit receipt, and anything else with a small package"""
+    def request(self, uri, method, headers=None, payload=None):
+        if method == "POST":
+            return Response(201, {'location' : "http://example.org/edit/1", 'content-type' : "application/atom+xml"}), RECEIPT
+        return Response(200, {'content-type' : "application/zip", 'content-length' : "4"}), b"data"
+
+def requests(conn):
+    conn.create(col_iri="http://example.org/col", payload=b"data" * 1000, mimetype="application/zip",
+                filename="example.zip", packaging="http://purl.org/net/sword/package/SimpleZip")
+    conn.get_resource(content_iri="http://example.org/cont/1")
+
+def best(stmt, number, repeat):
+    return min(timeit.repeat(stmt, number=number, repeat=repeat)) / number
+
+def main(repeat=5):
+    logger = logging.getLogger("sword2")
+    logger.propagate = False
+    logger.addHandler(logging.NullHandler())
+    statement = ore_statement(200)
+    conn = Connection("http://example.org/sd-iri", http_impl=InMemoryLayer(), keep_history=False)
+    cases = [("Deposit_Receipt (50 fields)", lambda: Deposit_Receipt(xml_deposit_receipt=RECEIPT), 200),
+             ("Ore_Sword_Statement (200 files)", lambda: Ore_Sword_Statement(statement), 20),
+             ("create + get_resource", lambda: requests(conn), 200)]
+    print("%-34s %12s %12s" % ("", "logging off", "DEBUG"))
+    for name, stmt, number in cases:
+        logger.setLevel(logging.WARNING)
+        off = best(stmt, number, repeat)
+        logger.setLevel(logging.DEBUG)
+        on = best(stmt, number, repeat)
+        print("%-34s %10.1fus %10.1fus" % (name, off * 1e6, on * 1e6))
+
+    logger.setLevel(logging.WARNING)
+    log = logging.getLogger("sword2.connection")
+    headers = {'In-Progress' : "true", 'Content-Type' : "application/zip", 'Content-MD5' : "0" * 32}
+    print("\nOne disabled debug call:")
+    print("  eager  %6.3fus" % (best(lambda: log.debug("Using headers: %s" % str(headers)), 100000, repeat) * 1e6))
+    print("  lazy   %6.3fus" % (best(lambda: log.debug("Using headers: %s", headers), 100000, repeat) * 1e6))
+
+    volume(conn, repeat)
+
+class Counting(object):
+    """Stream which counts what is written to it"""
+    def __init__(self):
+        self.lines = self.size = 0
+
+    def write(self, text):
+        self.lines += text.count("\n")
+        self.size += len(text)
+
+    def flush(self):
+        pass
+
+def volume(conn, repeat, number=200):
+    logger = logging.getLogger("sword2")
+    saved = logger.handlers[:]
+    print("\n%-34s %12s %12s %10s" % ("At INFO, per request", "time", "lines", "bytes"))
+    setups = [("text", None), ("JSON events", {}), ("JSON events, 1 in 10 sampled", {'sample' : 0.1}),
+              ("JSON + text, 10 of each a minute", {'level' : logging.INFO, 'rate' : 10})]
+    for name, options in setups:
+        stream = Counting()
+        logger.handlers = []
+        if options is None:
+            handler = logging.StreamHandler(stream)
+            handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            events_l.setLevel(logging.WARNING)
+        else:
+            configure(stream=stream, **options)
+        took = best(lambda: requests(conn), number, repeat)
+        # each run of requests() is two requests
+        runs = number * repeat
+        print("%-34s %10.1fus %12.2f %10.0f" % (name, took * 1e6 / 2, stream.lines / (2.0 * runs), stream.size / (2.0 * runs)))
+    logger.handlers = saved
+    logger.setLevel(logging.WARNING)
+    events_l.setLevel(logging.WARNING)
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:2]])
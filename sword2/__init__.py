@@ -1,17 +1,76 @@
 """
 SWORD2 Python Client blurb
+
+The classes below, and the submodules themselves, are imported when they are first used (`sword2.Connection`,
+`from sword2 import Entry`, `sword2.connection`...), so that `import sword2` does not load lxml, httplib2, the packaging and
+pipelining modules and so on unless they are needed.
 """
-from .service_document import ServiceDocument
-from .collection import SDCollection, Collection_Feed
-from .statement import Atom_Sword_Statement, Ore_Sword_Statement
-from .error_document import Error_Document
-from .connection import Connection
-from .transaction_history import Transaction_History
+import sys
+import importlib
+
 from .exceptions import *
-from .server_errors import SWORD2ERRORSBYIRI, SWORD2ERRORSBYNAME
-from .utils import Timer, NS, get_md5, create_multipart_related
 from .implementation_info import *
-from .atom_objects import Entry, Category
-from .http_layer import HttpLayer, HttpResponse, HttpLib2Layer, UrlLib2Layer
-from .auto_discovery import AutoDiscovery
-from .deposit_receipt import Deposit_Receipt
+
+# name -> submodule it comes from
+_LAZY = {
+    'ServiceDocument' : "service_document",
+    'SDCollection' : "collection",
+    'Collection_Feed' : "collection",
+    'Atom_Sword_Statement' : "statement",
+    'Ore_Sword_Statement' : "statement",
+    'Error_Document' : "error_document",
+    'Connection' : "connection",
+    'Transaction_History' : "transaction_history",
+    'SWORD2ERRORSBYIRI' : "server_errors",
+    'SWORD2ERRORSBYNAME' : "server_errors",
+    'Timer' : "utils",
+    'NS' : "utils",
+    'get_md5' : "utils",
+    'create_multipart_related' : "utils",
+    'Entry' : "atom_objects",
+    'Category' : "atom_objects",
+    'HttpLayer' : "http_layer",
+    'HttpResponse' : "http_layer",
+    'HttpLib2Layer' : "http_layer",
+    'UrlLib2Layer' : "urllib_layer",
+    'AutoDiscovery' : "auto_discovery",
+    'Deposit_Receipt' : "deposit_receipt",
+    'Minimal_Receipt' : "deposit_receipt",
+    'Harvester' : "harvester",
+    'HarvestResult' : "harvester",
+    'RetryPolicy' : "retry",
+    'SimpleZipPackage' : "package_builder",
+    'BagItPackage' : "package_builder",
+    'PreparedPackage' : "package_builder",
+    'DepositPipeline' : "pipeline",
+}
+
+# the submodules, which are also imported when first used as attributes (`import sword2; sword2.connection`)
+_SUBMODULES = ("atom_objects", "auto_discovery", "circuit_breaker", "collection", "concurrency", "connection",
+               "deposit_receipt", "error_document", "exceptions", "fake_server", "harvester", "http_layer",
+               "implementation_info", "metrics", "package_builder", "pipeline", "progress", "prometheus",
+               "rate_limit", "resource_stream", "retry", "segmented_download", "segmented_upload", "server_errors",
+               "service_document", "statement", "structured_logging", "sword2_logging", "tracing",
+               "transaction_history", "urllib_layer", "utils")
+
+# `from sword2 import *` imports them all
+__all__ = [name for name in globals() if not name.startswith("_") and name not in ("sys", "importlib")] + list(_LAZY)
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        # importing it sets it as an attribute of the package, so this is only called once for it
+        return importlib.import_module("." + name, __name__)
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    value = getattr(importlib.import_module("." + module, __name__), name)
+    globals()[name] = value     # so that this is only called once for each name
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY) | set(_SUBMODULES))
+
+if sys.version_info < (3, 7):
+    # no module __getattr__ (PEP 562), so import them all now
+    for _name in _LAZY:
+        __getattr__(_name)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Per-host circuit breaker, so that requests to a repository which is down fail at once instead of each one waiting
+out a timeout.
+
+Each host has a circuit, which is "closed" (requests go through) to begin with. After `failure_threshold` failures
+in a row - 5xx responses, timeouts, refused connections - it "opens", and for `reset_timeout` seconds every request
+to that host raises `sword2.exceptions.CircuitOpen` without being sent. Then it is "half-open": the next request
+first sends a small probe (a GET of the SD-IRI, or a HEAD of the request's own IRI on other hosts - or, where the
+http layer cannot send a HEAD, the request itself is the probe) while any other request still fails fast. If the probe succeeds the circuit closes and traffic resumes; if not, it opens again.
+
+The circuits are thread-safe, so one `CircuitBreaker` can be shared by every `Connection` in a process.
+
+Usage:
+
+>>> from sword2 import Connection
+>>> from sword2.circuit_breaker import CircuitBreaker
+>>> from sword2.exceptions import CircuitOpen
+>>> breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+>>> conn = Connection("http://localhost:8080/sd-uri", circuit_breaker=breaker)
+>>> try:
+...     conn.create(col_iri=col_iri, payload=f, filename="deposit.zip", mimetype="application/zip")
+... except CircuitOpen as e:
+...     print("%s is down, trying again in %.0fs" % (e.host, e.retry_in))
+>>> breaker.state("localhost:8080")
+'closed'
+"""
+
+import sys
+import time
+import socket
+import threading
+
+from .http_layer import HttpLayer
+from .utils import get_host
+from .exceptions import CircuitOpen
+
+from .sword2_logging import logging
+cb_l = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+FAILURE_EXCEPTIONS = (ConnectionError, socket.timeout, socket.gaierror)
+
+def _server_not_found():
+    """httplib2's exception for a host it cannot find (in DNS), if httplib2 is in use - it is not imported for it"""
+    httplib2 = sys.modules.get("httplib2")
+    return (httplib2.ServerNotFoundError,) if httplib2 is not None else ()
+
+class _Circuit(object):
+    __slots__ = ('state', 'failures', 'opened_at')
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+
+class CircuitBreaker(object):
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, failure_statuses=(500, 502, 503, 504),
+                       failure_exceptions=None, clock=time.monotonic):
+        """
+Parameters:
+
+    failure_threshold  -- number of failures in a row that opens the circuit of a host
+    reset_timeout      -- seconds that a circuit stays open for, before a probe is sent
+    failure_statuses   -- HTTP status codes that count as failures
+    failure_exceptions -- exceptions from the http layer that count as failures - by default `FAILURE_EXCEPTIONS`
+                          (connections refused or reset, timeouts, hosts not found) and
+                          `httplib2.ServerNotFoundError`
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_statuses = tuple(failure_statuses)
+        self.failure_exceptions = tuple(failure_exceptions) if failure_exceptions is not None else None
+        self.clock = clock
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def _circuit(self, host):
+        circuit = self._circuits.get(host)
+        if circuit is None:
+            circuit = self._circuits[host] = _Circuit()
+        return circuit
+
+    def state(self, host):
+        with self._lock:
+            return self._circuit(host).state
+
+    def before(self, host):
+        """Called before a request to `host` is sent. Raises `CircuitOpen` if it must not be; returns True if the
+        caller has to send the probe (and report it with `probed`) first."""
+        with self._lock:
+            circuit = self._circuit(host)
+            if circuit.state == CLOSED:
+                return False
+            retry_in = circuit.opened_at + self.reset_timeout - self.clock()
+            if circuit.state == OPEN and retry_in <= 0:
+                circuit.state = HALF_OPEN
+                return True
+            raise CircuitOpen(host, max(0.0, retry_in))
+
+    def is_failure(self, status=None, error=None):
+        if error is not None:
+            if self.failure_exceptions is None:
+                return isinstance(error, FAILURE_EXCEPTIONS + _server_not_found())
+            return isinstance(error, self.failure_exceptions)
+        return status in self.failure_statuses
+
+    def record(self, host, status=None, error=None):
+        """Counts the outcome of a request to `host` - its response `status`, or the `error` that it raised"""
+        with self._lock:
+            circuit = self._circuit(host)
+            if not self.is_failure(status, error):
+                circuit.failures = 0
+                return
+            circuit.failures += 1
+            if circuit.state == CLOSED and circuit.failures >= self.failure_threshold:
+                self._open(host, circuit)
+
+    def probed(self, host, ok):
+        """Closes the circuit of `host` again if the probe was `ok`, otherwise opens it for another `reset_timeout`"""
+        with self._lock:
+            circuit = self._circuit(host)
+            if ok:
+                cb_l.info("Circuit for %s closed - the probe succeeded", host)
+                circuit.state = CLOSED
+                circuit.failures = 0
+            else:
+                self._open(host, circuit)
+
+    def _open(self, host, circuit):
+        cb_l.warning("Circuit for %s open after %s failures - failing fast for %.1fs", host, circuit.failures,
+                     self.reset_timeout)
+        circuit.state = OPEN
+        circuit.opened_at = self.clock()
+
+class CircuitBreakerLayer(HttpLayer):
+    """Wraps an `HttpLayer`, failing requests to a host fast while `breaker` has its circuit open. `probe_iri` is
+    the IRI to GET as the probe of its own host (the SD-IRI of the `Connection`). Any other attribute is that of
+    the wrapped layer."""
+    def __init__(self, layer, breaker, probe_iri=None):
+        self.layer = layer
+        self.breaker = breaker
+        self.probe_iri = probe_iri
+
+    def __getattr__(self, name):
+        return getattr(self.layer, name)
+
+    def add_credentials(self, username, password, uri=None):
+        self.layer.add_credentials(username, password, uri)
+
+    def _probe(self, host, uri):
+        """Sends the probe of `host`. Returns False if the layer cannot send it (`UrlLib2Layer` has no HEAD), in
+        which case the request about to go out is the probe."""
+        if self.probe_iri and get_host(self.probe_iri) == host:
+            method, uri = "GET", self.probe_iri
+        else:
+            method = "HEAD"
+        try:
+            resp, content = self.layer.request(uri, method, headers={})
+            ok = not self.breaker.is_failure(status=resp['status'])
+        except NotImplementedError:
+            cb_l.info("Cannot probe %s with a %s - sending the request as the probe", host, method)
+            return False
+        except Exception as e:
+            cb_l.info("Probe of %s failed: %s", host, e)
+            ok = False
+        self.breaker.probed(host, ok)
+        if not ok:
+            raise CircuitOpen(host, self.breaker.reset_timeout)
+        return True
+
+    def _call(self, send, uri, method, headers, payload):
+        host = get_host(uri)
+        probing = self.breaker.before(host) and not self._probe(host, uri)
+        try:
+            resp, content = send(uri, method, headers=headers, payload=payload)
+        except Exception as e:
+            if probing:
+                self.breaker.probed(host, not self.breaker.is_failure(error=e))
+            else:
+                self.breaker.record(host, error=e)
+            raise
+        if probing:
+            self.breaker.probed(host, not self.breaker.is_failure(status=resp['status']))
+        else:
+            self.breaker.record(host, status=resp['status'])
+        return resp, content
+
+    def request(self, uri, method, headers=None, payload=None):
+        return self._call(self.layer.request, uri, method, headers, payload)
+
+    def stream_request(self, uri, method, headers=None, payload=None):
+        return self._call(self.layer.stream_request, uri, method, headers, payload)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Adaptive concurrency for bulk operations.
+
+An `AdaptiveLimiter` caps the number of requests that are in flight at once, and moves the cap to follow what the
+server can take, in the way TCP congestion control does (additive increase, multiplicative decrease):
+
+* each successful response widens the window by `increase / limit`, so by about `increase` per window's worth of
+  responses, as long as the latency stays steady;
+* a 5xx response, a timeout or connection failure, or the 95th percentile latency of the last `window` responses
+  rising above `latency_tolerance` times the lowest seen so far, shrinks the window by `decrease` (at most once per
+  round trip, so that a burst of failures from one overloaded moment only counts once);
+* a 503 (or 429) with a Retry-After also holds back every new request until the time it gives has passed.
+
+Give the same limiter to a `Connection` (`concurrency_limiter=...`) and run the bulk operation with as many threads
+as `max_limit` - eg `Harvester(conn, dest, workers=limiter.max_limit)` - and the limiter decides how many of them
+are sending at any moment. Each attempt of each request is timed, from sending it to having the response headers.
+
+Usage:
+
+>>> from sword2 import Connection
+>>> from sword2.concurrency import AdaptiveLimiter
+>>> limiter = AdaptiveLimiter(initial=4, max_limit=32)
+>>> conn = Connection("http://localhost:8080/sd-uri", concurrency_limiter=limiter)
+>>> ...
+>>> limiter.limit, limiter.p95
+(11.4, 0.23)
+"""
+
+import math
+import time
+import socket
+import threading
+from collections import deque
+
+from .retry import parse_retry_after
+
+from .sword2_logging import logging
+cc_l = logging.getLogger(__name__)
+
+def percentile(values, q):
+    """The `q`th percentile (0-100) of `values`, by the nearest-rank method"""
+    values = sorted(values)
+    if not values:
+        return None
+    rank = max(1, int(math.ceil(q / 100.0 * len(values))))
+    return values[rank - 1]
+
+class AdaptiveLimiter(object):
+    def __init__(self, initial=4, min_limit=1, max_limit=64, increase=1.0, decrease=0.5, window=20,
+                       latency_tolerance=2.0, failure_statuses=(500, 502, 503, 504, 429),
+                       failure_exceptions=(ConnectionError, socket.timeout, TimeoutError), clock=time.monotonic):
+        """
+Parameters:
+
+    initial            -- number of requests allowed in flight at the start
+    min_limit          -- the window never shrinks below this
+    max_limit          -- nor grows above this
+    increase           -- how much the window grows per window's worth of successful responses
+    decrease           -- factor that the window is multiplied by when the server is struggling
+    window             -- number of recent responses that the 95th percentile latency is taken over
+    latency_tolerance  -- the window shrinks when the p95 latency rises above this multiple of the lowest seen
+    failure_statuses   -- HTTP status codes that mean the server is overloaded
+    failure_exceptions -- exceptions from the http layer that mean the same
+        """
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.failure_statuses = tuple(failure_statuses)
+        self.failure_exceptions = tuple(failure_exceptions)
+        self.clock = clock
+        self.in_flight = 0
+        self.latencies = deque(maxlen=window)
+        self.p95 = None
+        self.baseline = None
+        self.paused_until = 0.0
+        self._since_window = 0
+        self._hold_until = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Waits until a request may be sent (there is room in the window, and no Retry-After is holding requests
+        back), and counts it as in flight"""
+        with self._cond:
+            while True:
+                wait = self.paused_until - self.clock()
+                if wait <= 0 and self.in_flight < int(self.limit):
+                    break
+                self._cond.wait(wait if wait > 0 else None)
+            self.in_flight += 1
+
+    def release(self, latency=None, status=None, error=None, retry_after=None):
+        """Ends a request that `acquire` allowed, and adjusts the window by its outcome: the `latency` (seconds)
+        and `status` of the response, or the `error` raised instead, and the value of its Retry-After header"""
+        with self._cond:
+            self.in_flight -= 1
+            now = self.clock()
+            if error is not None:
+                failed = isinstance(error, self.failure_exceptions)
+            else:
+                failed = status in self.failure_statuses
+            if failed:
+                self._shrink(now, latency, "%s" % (error if error is not None else status))
+                if retry_after is not None and status in (429, 503):
+                    delay = parse_retry_after(retry_after)
+                    if delay:
+                        self.paused_until = max(self.paused_until, now + delay)
+            elif latency is not None:
+                self.latencies.append(latency)
+                self._since_window += 1
+                if self._since_window >= self.latencies.maxlen:
+                    self._since_window = 0
+                    self.p95 = percentile(self.latencies, 95)
+                    if self.baseline is not None and self.p95 > self.baseline * self.latency_tolerance:
+                        if self.limit <= self.min_limit:
+                            # as slow as it is even at the smallest window - the new normal
+                            self.baseline = self.p95
+                        self._shrink(now, latency, "p95 latency %.3fs" % self.p95)
+                    else:
+                        self.baseline = self.p95 if self.baseline is None else min(self.baseline, self.p95)
+                        self._grow()
+                elif self.p95 is None or self.baseline is None or self.p95 <= self.baseline * self.latency_tolerance:
+                    self._grow()
+            self._cond.notify_all()
+
+    def _grow(self):
+        self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+
+    def _shrink(self, now, latency, reason):
+        if now < self._hold_until:
+            return
+        self.limit = max(self.min_limit, self.limit * self.decrease)
+        # wait for the requests already in flight to come back before shrinking again
+        self._hold_until = now + max(latency or 0.0, self.p95 or 0.0)
+        self.latencies.clear()
+        self._since_window = 0
+        cc_l.info("Concurrency window down to %.1f (%s)", self.limit, reason)
@@ -9,23 +9,70 @@ See http://sword-app.svn.sourceforge.net/viewvc/sword-app/spec/trunk/SWORDProfil
 about the SWORD2 AtomPub profile.
  
 """
-from .sword2_logging import logging
+from .sword2_logging import logging, Snippet
 conn_l = logging.getLogger(__name__)
 
-from .utils import Timer, NS, get_md5, create_multipart_related
+from .utils import Timer, NS, get_md5, get_size, is_stream, create_multipart_related, iter_multipart_related, multipart_boundary
 
 from .transaction_history import Transaction_History
 from .service_document import ServiceDocument
-from .deposit_receipt import Deposit_Receipt
+from .deposit_receipt import Deposit_Receipt, Minimal_Receipt
 from .error_document import Error_Document
 from .statement import Atom_Sword_Statement, Ore_Sword_Statement
+from .resource_stream import ResourceStream, DEFAULT_CHUNK_SIZE
+from .metrics import Metrics
+from .tracing import NO_SPAN, traced
+from .structured_logging import log_operation
+from .progress import ProgressTracker, ProgressReader, TransferStats, callback_listener, UPLOAD, DOWNLOAD
 from .exceptions import *
 
-from lxml import etree
-
 # import httplib2
 from . import http_layer
-import urllib.request, urllib.parse, urllib.error
+import sys
+import time
+import urllib.parse
+
+# sword2.segmented_upload, segmented_download, rate_limit, circuit_breaker and package_builder (and the
+# concurrent.futures, zipfile and zlib which they bring with them) are imported where they are used
+
+def _loaded(module, *names):
+    """The classes `names` from the `sword2` submodule `module` if it has been imported, otherwise an empty tuple -
+    for `isinstance` checks against classes which nothing can be an instance of unless their module is loaded"""
+    module = sys.modules.get(__package__ + "." + module)
+    return tuple(getattr(module, name) for name in names) if module is not None else ()
+
+class ContentWrapper(object):
+    """Response for `Connection.get_resource`"""
+    def __init__(self, resp, content, code=None):
+        self.response_headers = dict(resp)
+        self.content = content
+        self.code = resp.status if code is None else code
+
+class LocalResponse(dict):
+    """Stands in for the server's response when a request is refused by the client itself, before it is sent
+    (see `Connection._preflight`)"""
+    def __init__(self, status, **headers):
+        dict.__init__(self, headers)
+        self.status = status
+
+    def __getitem__(self, att):
+        if att == "status":
+            return self.status
+        return dict.__getitem__(self, att)
+
+class _SegmentLayer(object):
+    """The http layer that `Connection.download_resource` gives a `SegmentedDownloader`: each request is one attempt
+    through the `Connection` (its concurrency limiter, progress tracking and tracing), leaving the retries to the
+    downloader, which resumes a segment from where it stopped"""
+    def __init__(self, conn):
+        self.conn = conn
+
+    def stream_request(self, uri, method, headers=None, payload=None):
+        self.conn.metrics.started()
+        try:
+            return self.conn._attempt(uri, method, headers, payload, True)
+        finally:
+            self.conn.metrics.finished()
 
 class Connection(object):
     """
@@ -84,6 +131,10 @@ Example usage:
 # Useful for bulk-testing where the history might grow exponentially
 >>> conn = Connection(...... , keep_history=False, ....)
 
+# Or keep only the last 1000 records in memory (see `sword2.transaction_history` for spilling them to a file)
+>>> from sword2.transaction_history import Ring_History
+>>> conn = Connection(...... , keep_history=Ring_History(1000), ....)
+
 # Initialise a connection and get the document at the SD IRI:
 # (Uses the Simple Sword Server as an endpoint - sss.py
 
@@ -127,10 +178,20 @@ Please see the testsuite for this class for more examples of the sorts of transa
                        cache_deposit_receipts=True,
                        honour_receipts=True,
                        error_response_raises_exceptions=True,
+                       minimal_response=False,
+                       retry_policy=None,
+                       progress_callback=None,
+                       progress_interval=0.5,
+                       rate_limiter=None,
+                       concurrency_limiter=None,
+                       circuit_breaker=None,
+                       metrics=None,
+                       tracer=None,
                        
                        # http layer implementation if different from default
                        http_impl=None,
-                       ca_certs=None):
+                       ca_certs=None,
+                       expect_continue=None):
         """
 Creates a new Connection object.
 
@@ -158,6 +219,8 @@ Parameters:
                 # Keep a history of all transactions made with the SWORD2 Server
                 # Records details like the response headers, sent headers, times taken and so forth
                 # Kept in a `sword2.transaction_history:Transaction_History` object but can be treated like an ordinary `list`
+                # For long-running or bulk work, pass a bounded backend from `sword2.transaction_history` instead of True:
+                #   `Ring_History(maxlen)` keeps only the latest records, `JSONL_History(path)` spills them to a file
                 keep_history=True,
                 
                 # Keep a cache of all deposit receipt responses from the server and provide an 'index' to these `sword2.Deposit_Receipt` objects
@@ -179,7 +242,74 @@ Parameters:
                 #   OR
                 #   If set to False - A `sword2.error_document:Error_Document` object will be returned.
                 
-                error_response_raises_exceptions=True
+                error_response_raises_exceptions=True,
+                
+                # "Minimal response" mode, for bulk ingest where only the Location (Edit-IRI) of the response matters:
+                #   If set to True - successful responses are returned as a lightweight `sword2.Minimal_Receipt` 
+                #      (code, location and headers only). The response body is discarded, and is neither parsed, 
+                #      validated or cached.
+                #   If set to "raw" - as above, but the raw response body is kept in `Minimal_Receipt.content`
+                #      so that it can be parsed later on with `Minimal_Receipt.to_deposit_receipt()`
+                #   If set to False - full `sword2.Deposit_Receipt` objects are returned
+                # This can also be overridden for each request, with the `minimal_response` parameter of the 
+                # deposit methods (create, update, append and so on)
+                
+                minimal_response=False,
+                
+                # Retrying of transient failures (503, 408, connection resets and so on), as a `sword2.retry.RetryPolicy`.
+                # `None` (the default) or `False` sends each request once, as before. `RetryPolicy()` retries GET, PUT 
+                # and DELETE requests up to 3 times with exponential backoff (or as a Retry-After header asks), but 
+                # not POST requests.
+                
+                retry_policy=None,
+                
+                # Progress of uploads and downloads (see `sword2.progress`):
+                #   progress_callback - called with a `sword2.progress.TransferProgress` (bytes so far, expected total,
+                #      throughput and ETA) when each request or response body starts, every `progress_interval` 
+                #      seconds while it is being sent or received, and when it ends. 
+                # Whether or not a callback is given, the totals are kept in `self.transfer_stats`.
+                
+                progress_callback=None,
+                progress_interval=0.5,
+                
+                # Request rate and bandwidth limits, per host and per On-Behalf-Of user, as a 
+                # `sword2.rate_limit.RateLimiter`. Requests wait until the limiter allows them. Pass the same 
+                # limiter to each `Connection` for the limits to apply to all of them together.
+                
+                rate_limiter=None,
+                
+                # Adaptive limit on the number of requests in flight at once, for bulk operations run from several 
+                # threads, as a `sword2.concurrency.AdaptiveLimiter`. It widens while responses come back quickly 
+                # and successfully, and narrows on 5xx responses, timeouts and rising latency.
+                
+                concurrency_limiter=None,
+                
+                # Per-host circuit breaker, as a `sword2.circuit_breaker.CircuitBreaker`: once requests to a host 
+                # have failed (5xx, timeouts, refused connections) several times in a row, further requests to it
+                # raise `sword2.exceptions.CircuitOpen` straight away, until a GET of the SD-IRI succeeds again.
+                
+                circuit_breaker=None,
+                
+                # Latency histograms (p50/p95/p99) and byte counts for each kind of request, as a 
+                # `sword2.metrics.Metrics`. `None` gives the connection a registry of its own, in `self.metrics`;
+                # pass the same one to several connections to count them all together.
+                
+                metrics=None,
+                
+                # Spans for each request and its phases (hashing, building the body, sending, waiting for the 
+                # response, receiving it and parsing it), as a `sword2.tracing.Tracer` - which calls hooks as spans 
+                # start and end, and exports them as Chrome trace JSON. `None` (default) traces nothing.
+                
+                tracer=None,
+                
+                # Settings for the default http layer (ignored if `http_impl` is given):
+                #   ca_certs - CA certificates file to verify https servers against
+                #   expect_continue - uploads of at least this many bytes are sent with 'Expect: 100-continue', so
+                #      that a server which is going to refuse them (401, 403, 413, 415...) can do so before the
+                #      body is sent. `None` turns this off.
+                
+                ca_certs=None,
+                expect_continue=None
                 )
                 
 If a `Connection` is created with the parameter `download_service_document` set to `False`, then no attempt
@@ -214,13 +344,33 @@ Loading in a locally held Service Document:
         
         self.keep_cache = cache_deposit_receipts
         
+        # When minimal_response is True (or "raw"), successful deposit responses are returned as a
+        # sword2.Minimal_Receipt without parsing or caching the body
+        self.minimal_response = minimal_response
+        
+        # Retry policy for transient failures - see sword2.retry.RetryPolicy
+        self.retry_policy = retry_policy or None
+        
+        # Upload and download progress - see sword2.progress
+        self.transfer_stats = TransferStats()
+        self.progress_interval = progress_interval
+        self._progress_listener = callback_listener(progress_callback)
+        
         # set the http layer
         if http_impl is None:
             conn_l.info("Loading default HTTP layer")
-            self.h = http_layer.HttpLib2Layer(".cache", timeout=30.0, ca_certs=ca_certs)
+            self.h = http_layer.HttpLib2Layer(".cache", timeout=30.0, ca_certs=ca_certs, expect_continue=expect_continue)
         else:
             conn_l.info("Using provided HTTP layer")
             self.h = http_impl
+        if rate_limiter is not None:
+            from .rate_limit import RateLimitedLayer
+            self.h = RateLimitedLayer(self.h, rate_limiter)
+        if circuit_breaker is not None:
+            # outermost, so that requests to a host which is down do not wait for the rate limiter first
+            from .circuit_breaker import CircuitBreakerLayer
+            self.h = CircuitBreakerLayer(self.h, circuit_breaker, probe_iri=service_document_iri)
+        self.concurrency_limiter = concurrency_limiter
         
         self.user_name = user_name
         self.on_behalf_of = on_behalf_of
@@ -231,13 +381,27 @@ Loading in a locally held Service Document:
         self.se_iris = {}            # Key = IRI, Value = ref to latest Deposit Receipt
         self.cached_at = {}          # Key = Edit-IRI, Value = Timestamp for when receipt was cached
         
+        # Collections from the service document, for checking deposits against their accept lists
+        self.col_iris = {}           # Key = Col-IRI, Value = sword2.SDCollection
+        self.maxUploadSize = 0
+        
+        # Request timings and sizes, by operation - see sword2.metrics
+        self.metrics = metrics if metrics is not None else Metrics()
+        
+        # Spans of requests and their phases - see sword2.tracing
+        self.tracer = tracer
+        
         # Transaction history hooks
         self.history = None
         self._t = Timer()
-        self.keep_history = keep_history
-        if keep_history:
-            conn_l.info("keep_history=True--> This instance will keep a JSON-compatible transaction log of all (SWORD/APP) activities in 'self.history'")
+        self.keep_history = keep_history is not None and keep_history is not False
+        if hasattr(keep_history, "log"):
+            # one of the backends from sword2.transaction_history
+            self.history = keep_history
+        elif self.keep_history:
             self.reset_transaction_history()
+        if self.keep_history:
+            conn_l.info("keep_history=True--> This instance will keep a JSON-compatible transaction log of all (SWORD/APP) activities in 'self.history'")
             self.history.log('init',
                              sd_iri = self.sd_iri,
                              user_name = self.user_name,
@@ -245,12 +409,12 @@ Loading in a locally held Service Document:
         # Add credentials to http client
         if user_name:
             conn_l.info("Adding username/password credentials for the client to use.")
-            self.h.add_credentials(user_name, user_pass)
+            self.h.add_credentials(user_name, user_pass, self.sd_iri)
         
         if self.sd_iri and download_service_document:
-            self._t.start("get_service_document")
+            started = time.monotonic()
             self.get_service_document()
-            conn_l.debug("Getting service document and dealing with the response: %s s" % self._t.time_since_start("get_service_document")[1])
+            conn_l.debug("Getting service document and dealing with the response: %s s", time.monotonic() - started)
     
     def _return_error_or_exception(self, cls, resp, content):
         """Internal method for reporting errors, behaving as the `self.raise_except` flag requires.
@@ -261,11 +425,11 @@ Loading in a locally held Service Document:
         else:
             # content type can contain both the mimetype and the charset (e.g. text/xml; charset=utf-8)
             if resp.get('content-type', "").startswith("text/xml") or resp.get('content-type', "").startswith("application/xml"):
-                conn_l.info("Returning an error document, due to HTTP response code %s" % resp.status)
+                conn_l.info("Returning an error document, due to HTTP response code %s", resp.status)
                 e = Error_Document(content, code=resp.status, resp = resp)
                 return e
             else:
-                conn_l.info("Returning due to HTTP response code %s" % resp.status)
+                conn_l.info("Returning due to HTTP response code %s", resp.status)
                 e = Error_Document(code=resp.status, resp = resp)
                 return e
     
@@ -288,13 +452,19 @@ Loading in a locally held Service Document:
         408 - Request Timeout
             Will throw a `sword2.exceptions.RequestTimeOut` exception
         
+        413 - Request Entity Too Large
+            Will throw a `sword2.exceptions.MaxUploadSizeExceeded` exception
+        
+        415 - Unsupported Media Type
+            Will throw a `sword2.exceptions.UnsupportedMediaType` exception
+        
         500-599 errors:
             Will throw a general `sword2.exceptions.ServerError` exception
         
         4XX not listed:
             Will throw a general `sword2.exceptions.HTTPResponseError` exception
         """
-        conn_l.debug("Error body received from server: {x}".format(x=str(content)))
+        conn_l.debug("Error body received from server: %s", Snippet(content))
         
         if resp['status'] == 401:
             conn_l.error("You are unauthorised (401) to access this document on the server. Check your username/password credentials and your 'On Behalf Of'")
@@ -308,11 +478,17 @@ Loading in a locally held Service Document:
         elif resp['status'] == 408:
             conn_l.error("Request Timeout (408) - error uploading.")
             return self._return_error_or_exception(RequestTimeOut, resp, content)
+        elif resp['status'] == 413:
+            conn_l.error("Request Entity Too Large (413) - the upload is larger than the server will accept.")
+            return self._return_error_or_exception(MaxUploadSizeExceeded, resp, content)
+        elif resp['status'] == 415:
+            conn_l.error("Unsupported Media Type (415) - the server does not accept this format or packaging.")
+            return self._return_error_or_exception(UnsupportedMediaType, resp, content)
         elif int(resp['status']) > 499:
-            conn_l.error("Server error occured. Response headers from the server:\n%s" % resp)
+            conn_l.error("Server error occured. Response headers from the server:\n%s", resp)
             return self._return_error_or_exception(ServerError, resp, content)
         else:
-            conn_l.error("Unknown error occured. Response headers from the server:\n%s\n%s" % (resp, content))
+            conn_l.error("Unknown error occured. Response headers from the server:\n%s\n%s", resp, Snippet(content))
             return self._return_error_or_exception(HTTPResponseError, resp, content)
     
     def _cache_deposit_receipt(self, d):
@@ -332,7 +508,7 @@ Loading in a locally held Service Document:
         """
         if self.keep_cache:
             timestamp = self._t.get_timestamp()
-            conn_l.debug("Caching document (Edit-IRI:%s) - at %s" % (d.edit, timestamp))
+            conn_l.debug("Caching document (Edit-IRI:%s) - at %s", d.edit, timestamp)
             self.edit_iris[d.edit] = d
             if d.cont_iri:   # SHOULD exist within receipt
                 self.cont_iris[d.cont_iri] = d
@@ -357,15 +533,18 @@ Loading in a locally held Service Document:
                             ('Workspace atom:title', [<`sword2.Collection` object>, ....]),
             
             `self.maxUploadSize` -- the maximum filesize for a deposit, if given in the service document
+            
+            `self.col_iris` -- a `dict` of the `sword2.Collection` objects, keyed by their Col-IRI
         """
-        self._t.start("SD Parse")
-        self.sd = ServiceDocument(xml_document)
-        _, took_time = self._t.time_since_start("SD Parse")
+        started = time.monotonic()
+        self.sd = self._parse("service_document", ServiceDocument, xml_document)
+        took_time = time.monotonic() - started
         # Set up some convenience references
         self.workspaces = self.sd.workspaces
         self.maxUploadSize = self.sd.maxUploadSize
+        self.col_iris = dict((c.href, c) for _, collections in (self.workspaces or []) for c in collections)
         
-        if self.history:
+        if self.history is not None:
             if self.sd.valid:
                 self.history.log('SD Parse', 
                                  sd_iri = self.sd_iri,
@@ -380,6 +559,7 @@ Loading in a locally held Service Document:
                                  valid = self.sd.valid,
                                  process_duration = took_time)
     
+    @traced("SD_IRI GET")
     def get_service_document(self):
         """Perform an HTTP GET on the Service Document IRI (SD-IRI) and attempt to parse the result as
         a SWORD2 Service Document (using `self.load_service_document`)
@@ -387,27 +567,274 @@ Loading in a locally held Service Document:
         headers = {}
         if self.on_behalf_of:
             headers['on-behalf-of'] = self.on_behalf_of
-        self._t.start("SD_URI request")
-        resp, content = self.h.request(self.sd_iri, "GET", headers=headers)
-        _, took_time = self._t.time_since_start("SD_URI request")
-        if self.history:
+        started = time.monotonic()
+        resp, content, retries = self._send(self.sd_iri, "GET", headers=headers)
+        took_time = time.monotonic() - started
+        self._observe("SD_IRI GET", took_time, content=content, resp=resp, retries=retries, iri=self.sd_iri)
+        if self.history is not None:
             self.history.log('SD_IRI GET', 
                              sd_iri = self.sd_iri,
                              response = resp, 
+                             retries = len(retries),
+                             retry_delays = retries,
                              process_duration = took_time)
         if resp['status'] == 200:
-            conn_l.info("Received a document for %s" % self.sd_iri)
+            conn_l.info("Received a document for %s", self.sd_iri)
             self.load_service_document(content)
         elif resp['status'] == 401:
             conn_l.error("You are unauthorised (401) to access this document on the server. Check your username/password credentials")
         else:
-            conn_l.error("Unexpected response status: " + str(resp['status']))
+            conn_l.error("Unexpected response status: %s", resp['status'])
         
-    def reset_transaction_history(self):
-        """ Clear the transaction history - `self.history`"""
-        del self.history
-        self.history = Transaction_History()
+    def _send(self, iri, method, headers=None, payload=None, stream=False):
+        """Make a request through the http layer, retrying it as `self.retry_policy` allows.
+        
+        Returns a tuple of (response, content, retry delays) - the content is a `sword2.http_layer.StreamingBody`
+        (wrapped in a `sword2.progress.ProgressReader`) if `stream` is True, and the last element is the list of 
+        delays (in seconds) before each retry that was made."""
+        start = None
+        if hasattr(payload, "read"):
+            try:
+                start = payload.tell()
+            except (AttributeError, IOError, OSError):
+                pass
+        self.metrics.started()
+        try:
+            return self._send_with_retries(iri, method, headers, payload, stream, start)
+        finally:
+            self.metrics.finished()
+
+    def _send_with_retries(self, iri, method, headers, payload, stream, start):
+        delays = []
+        while True:
+            resp = content = error = None
+            try:
+                resp, content = self._attempt(iri, method, headers, payload, stream)
+            except Exception as e:
+                if self.retry_policy is None:
+                    raise
+                error = e
+            delay = None
+            if self.retry_policy is not None:
+                delay = self.retry_policy.next_delay(method, len(delays), resp, error)
+            if delay is not None and isinstance(payload, http_layer.ChunkedBody) and payload.started:
+                conn_l.warning("Cannot retry the %s to %s - the chunked payload has already been sent", method, iri)
+                delay = None
+            if delay is not None and hasattr(payload, "read"):
+                if start is None:
+                    conn_l.warning("Cannot retry the %s to %s - the payload cannot be rewound", method, iri)
+                    delay = None
+                else:
+                    payload.seek(start)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return resp, content, delays
+            if stream and content is not None:
+                content.close()
+            conn_l.warning("%s to %s failed (%s) - retrying in %.2fs", method, iri, 
+                           error if error is not None else resp['status'], delay)
+            delays.append(round(delay, 3))
+            with self._span("retry wait", delay=delay):
+                self.retry_policy.sleep(delay)
+    
+    def _observe(self, operation, seconds, headers=None, body=None, content=None, resp=None, retries=None, iri=None):
+        """Counts a request into `self.metrics`: the bytes sent are those of a chunked `body`, or else its 
+        Content-Length, and the bytes received are those of `content` (or the Content-Length of `resp`, if the
+        body is streamed), with the status of `resp` and the number of `retries`. It is also logged as an event
+        on the `sword2.events` logger (see `sword2.structured_logging`), if that is enabled."""
+        if isinstance(body, http_layer.ChunkedBody):
+            sent = body.size
+        else:
+            sent = int((headers or {}).get('Content-Length') or 0)
+        if isinstance(content, (bytes, str)):
+            received = len(content)
+        else:
+            try:
+                received = int(resp.get('content-length')) if resp is not None else 0
+            except (TypeError, ValueError):
+                received = 0
+        status = resp['status'] if resp is not None else None
+        self.metrics.observe(operation, seconds, sent, received, status, len(retries or ()))
+        log_operation(operation, iri, seconds, status, sent, received, len(retries or ()))
+
+    def _parse(self, document, parser, *args, **kw):
+        """`parser(*args, **kw)`, timed into `self.metrics` as the parsing of a `document`"""
+        started = time.monotonic()
+        try:
+            with self._span("parse", document=document):
+                return parser(*args, **kw)
+        finally:
+            self.metrics.observe_parse(document, time.monotonic() - started)
+
+    def _span(self, name, **attributes):
+        """A span of `self.tracer` for a `with` block, or a stand-in that does nothing if there is no tracer"""
+        if self.tracer is None:
+            return NO_SPAN
+        return self.tracer.span(name, **attributes)
+
+    def _tracker(self, direction, method, iri, total=None, listener=None):
+        return ProgressTracker(direction, method, iri, total=total, interval=self.progress_interval,
+                               listeners=(self.transfer_stats, self._progress_listener, listener))
+
+    def _attempt(self, iri, method, headers, payload, stream):
+        """One attempt at a request, within `self.concurrency_limiter` if there is one"""
+        limiter = self.concurrency_limiter
+        if limiter is None:
+            return self._transfer(iri, method, headers, payload, stream)
+        limiter.acquire()
+        started = time.monotonic()
+        try:
+            resp, content = self._transfer(iri, method, headers, payload, stream)
+        except Exception as e:
+            limiter.release(time.monotonic() - started, error=e)
+            raise
+        limiter.release(time.monotonic() - started, status=resp['status'], retry_after=resp.get('retry-after'))
+        return resp, content
+
+    def _transfer(self, iri, method, headers, payload, stream):
+        """One attempt at a request - in an "attempt" span, broken down into its phases, if there is a tracer"""
+        if self.tracer is None:
+            return self._exchange(iri, method, headers, payload, stream)
+        with self.tracer.span("attempt", method=method, iri=iri) as span:
+            try:
+                resp, content = self._exchange(iri, method, headers, payload, stream, span)
+            finally:
+                self._trace_phases(span, stream, payload is None)
+            span.attributes['status'] = resp['status']
+            return resp, content
+
+    def _trace_phases(self, span, stream, empty):
+        """Records the send, ttfb and receive spans of an attempt, from the marks that the http layer (or the
+        progress of the request body) left on it"""
+        now = time.monotonic()
+        returned = span.marks.get("returned", now)
+        sent = span.marks.get("sent")
+        if sent is not None and sent >= returned:
+            # only counted once the layer had returned, so no telling when it went
+            sent = None
+        if sent is None and empty:
+            # a request without a body goes as soon as it is made (any time taken to connect counts as ttfb)
+            sent = span.start
+        headers = span.marks.get("headers", returned if stream else None)
+        send_end = sent or headers or returned
+        self.tracer.record("send", span.start, send_end, parent=span)
+        if headers is None:
+            if returned > send_end:
+                self.tracer.record("response", send_end, returned, parent=span)
+            return
+        if headers > send_end:
+            self.tracer.record("ttfb", send_end, headers, parent=span)
+        if not stream:
+            self.tracer.record("receive", headers, returned, parent=span)
+
+    def _exchange(self, iri, method, headers, payload, stream, span=None):
+        """One attempt at a request, counting the request body and the response body as they go through the http
+        layer (and marking when they have gone and come, on `span`)"""
+        sent = payload
+        upload = None
+        if payload is not None:
+            listener = None
+            if span is not None:
+                def listener(progress, tracker):
+                    if progress.done:
+                        span.mark("sent")
+            upload = self._tracker(UPLOAD, method, iri, total=get_size(payload), listener=listener)
+            if isinstance(payload, http_layer.ChunkedBody):
+                payload.progress = upload
+            elif hasattr(payload, "read"):
+                sent = ProgressReader(payload, upload)
+        try:
+            if stream:
+                resp, content = self.h.stream_request(iri, method, headers=headers, payload=sent)
+            else:
+                resp, content = self.h.request(iri, method, headers=headers, payload=sent)
+            if span is not None:
+                span.mark("returned")
+            if upload is not None and sent is payload and not isinstance(payload, http_layer.ChunkedBody):
+                # a str, bytes or generator payload is handed over in one go
+                upload.update(upload.total or 0)
+        finally:
+            if upload is not None:
+                upload.finish()
+        total = None
+        if method != "HEAD":
+            try:
+                total = int(resp.get('content-length'))
+            except (TypeError, ValueError):
+                pass
+        listener = None
+        if stream and span is not None:
+            # the body is read after the attempt has ended
+            def listener(progress, tracker):
+                if progress.done:
+                    self.tracer.record("receive", tracker.start, tracker.start + progress.elapsed, parent=span)
+        download = self._tracker(DOWNLOAD, method, iri, total=total, listener=listener)
+        if stream:
+            return resp, ProgressReader(content, download)
+        download.update(len(content or b""))
+        download.finish()
+        return resp, content
 
+    def reset_transaction_history(self):
+        """ Clear the transaction history - `self.history`
+        
+        A history backend passed in as `keep_history` is cleared in place (for a `JSONL_History`, only the records
+        kept in memory - the file is not touched)."""
+        if self.history is None or isinstance(self.history, Transaction_History):
+            del self.history
+            self.history = Transaction_History()
+        else:
+            self.history.clear()
+
+    def _accepts(self, accept, mimetype):
+        """Does the `accept` list of a collection include `mimetype`? Handles */* and type/* wildcards"""
+        mimetype = (self._normalise_mime(mimetype) or "").split(";")[0]
+        major = mimetype.split("/")[0]
+        for a in accept:
+            a = (self._normalise_mime(a) or "").split(";")[0]
+            if a in ("*/*", "*", mimetype) or a == major + "/*":
+                return True
+        return False
+    
+    def _preflight(self, target_iri, payload=None, mimetype=None, packaging=None, metadata_entry=None):
+        """Check a deposit against the limits that the service document sets, before anything is sent:
+        
+            maxUploadSize   -- the size of the payload is found with `os.fstat` (or `len`), without reading it
+            accept          -- the mimetype of the payload, if `target_iri` is a Col-IRI in the service document
+                               (`accept alternate="multipart-related"` for multipart deposits)
+            acceptPackaging -- the packaging format, likewise
+        
+        Returns `None` if the deposit may go ahead, otherwise the response from `self._return_error_or_exception`
+        for a `sword2.exceptions.MaxUploadSizeExceeded`, `UnsupportedMediaType` or `PackagingFormatNotAvailable`.
+        Only done if `self.honour_receipts` is set."""
+        if not self.honour_receipts or not payload:
+            return None
+        if self.maxUploadSize:
+            size = get_size(payload)
+            if size is not None and size > self.maxUploadSize * 1024:    # maxUploadSize is in kB
+                conn_l.error("Payload of %s bytes is larger than the server's maxUploadSize of %skB - not sending it. Change the client parameter 'honour_receipts' to False to avoid this check.", size, self.maxUploadSize)
+                return self._return_error_or_exception(MaxUploadSizeExceeded, LocalResponse(413), "")
+        collection = self.col_iris.get(target_iri)
+        if collection is None:
+            return None
+        accept = collection.accept_multipart if metadata_entry else collection.accept
+        if mimetype and accept and not self._accepts(accept, mimetype):
+            conn_l.error("Collection %s does not accept '%s' - not sending it. Change the client parameter 'honour_receipts' to False to avoid this check.", target_iri, mimetype)
+            return self._return_error_or_exception(UnsupportedMediaType, LocalResponse(415), "")
+        if packaging and collection.acceptPackaging and packaging not in collection.acceptPackaging:
+            conn_l.error("Collection %s does not accept the packaging format '%s' - not sending it. Change the client parameter 'honour_receipts' to False to avoid this check.", target_iri, packaging)
+            return self._return_error_or_exception(PackagingFormatNotAvailable, LocalResponse(415), "")
+        return None
+    
+    def _package_defaults(self, payload, mimetype, filename, packaging):
+        """Fills in the mimetype, filename and packaging URI of a package from `sword2.package_builder`, where 
+        they have not been given"""
+        if isinstance(payload, _loaded("package_builder", "SimpleZipPackage", "PreparedPackage")):
+            return (mimetype or payload.mimetype, filename or payload.filename, packaging or payload.packaging)
+        return mimetype, filename, packaging
+    
+    @traced(lambda *args, **kw: kw.get('operation') or kw.get('request_type') or "request")
     def _make_request(self,
                       target_iri, 
                       payload=None,       # These need to be set to upload a file
@@ -429,12 +856,15 @@ Loading in a locally held Service Document:
                       in_progress=True,
                       on_behalf_of=None,
                       metadata_relevant=False,
+                      extra_headers=None,   # any other request headers, eg for a segment of a resumable upload
                       
                       # flags:
                       empty = None,     # If this is True, then the POST/PUT is sent with an empty body
                                         # and the 'Content-Length' header explicitly set to 0
+                      minimal_response = None,  # Overrides `self.minimal_response` for this request if not None
                       method = "POST",
-                      request_type=""       # text label for transaction history reports
+                      request_type="",      # text label for transaction history reports
+                      operation=None        # name to count the request under in `self.metrics` (default: request_type)
                       ):
         """Performs an HTTP request, as defined by the parameters. This is an internally used method and it is best that it
         is not called directly.
@@ -442,15 +872,17 @@ Loading in a locally held Service Document:
         target_iri -- IRI that will be the target of the HTTP call
         
         # File upload parameters:
-        payload   - the payload to send. Can be either a bytestring or a File-like object that supports `payload.read()`
+        payload   - the payload to send. Can be either a bytestring or a File-like object that supports `payload.read()`,
+                    or an iterable of bytestrings (eg a generator, or a `sword2.SimpleZipPackage`/`BagItPackage`). Iterables, and files which cannot seek (eg pipes), 
+                    are sent with 'Transfer-Encoding: chunked' as they are produced; unless `md5sum` is given, their
+                    MD5 is computed as they are sent and follows them in a 'Content-MD5' trailer.
         mimetype  - MIMEType of the payload
         filename  - filename. Most SWORD2 uploads have this as being mandatory.
         packaging - the SWORD2 packaging type of the payload. 
                     eg packaging = 'http://purl.org/net/sword/package/Binary'
         
-        # NB to work around a possible bug in httplib2 0.6.0, the file-like object is read into memory rather than streamed
-        # from disc, so is not as efficient as it should be. That said, it is recommended that file handles are passed to 
-        # the _make_request method, as this is hoped to be a temporary situation.
+        # NB seekable file-like objects are streamed from disc by the default http layer. Only if it has to answer
+        # an authentication challenge (`HttpLib2Layer(preemptive_auth=False)`) is the file read into memory first.
         
         metadata_entry  - a `sword2.Entry` to be uploaded with metadata fields set as desired.
         
@@ -460,12 +892,17 @@ Loading in a locally held Service Document:
         empty   - a flag to specify that an empty request should be made. A blank body and a 'Content-Length:0' header will be explicitly added
                   and any payload or metadata_entry passed in will be ignored.
         
+        minimal_response - `True` or "raw" to return a `sword2.Minimal_Receipt` for a successful response, skipping
+                  the parsing and caching of the response body. `None` (default) uses the connection-wide setting.
+        
         
         # Header flags:
         suggested_identifier    -- set the 'Slug' header
         in_progress             --         'In-Progress'
         on_behalf_of            --         'On-Behalf-Of' 
         metadata_relevant       --         'Metadata-Relevant'
+        extra_headers           -- `dict` of any other headers to send (eg 'Content-Range'). Headers that the type of 
+                                   request sets itself (eg 'Content-MD5' for a file) take precedence over these.
         
         # HTTP settings:
         method          -- "GET", "POST", etc
@@ -483,14 +920,30 @@ Loading in a locally held Service Document:
         If exception-throwing is turned off (`error_response_raises_exceptions = False` or `self.raise_except = False`)
         then the response will be a `sword2.Error_Document`, but will still have the aforementioned attributes set, (code,
         response_headers, etc)
+        
+        In "minimal response" mode, a successful response will be a `sword2.Minimal_Receipt` instead.
         """
-        if payload:
-            md5, f_size = get_md5(payload)
-            # this allows the user to pass in their own md5sum (this doesn't save
-            # any time, though, because of the above operation - useful mainly for
-            # testing at this stage
-            if md5sum is None:
-                md5sum = md5
+        if minimal_response is None:
+            minimal_response = self.minimal_response
+        mimetype, filename, packaging = self._package_defaults(payload, mimetype, filename, packaging)
+        
+        if not empty and method != "DELETE":
+            refused = self._preflight(target_iri, payload, mimetype, packaging, metadata_entry)
+            if refused is not None:
+                return refused
+        
+        # generators and streams that cannot seek are sent chunked, hashing them as they go
+        streaming = payload is not None and is_stream(payload)
+        if md5sum is None and isinstance(payload, _loaded("package_builder", "PreparedPackage")):
+            md5sum = payload.md5
+        if payload and not streaming:
+            # a passed-in md5sum saves reading the payload twice, where its size can be found without reading it
+            f_size = get_size(payload) if md5sum is not None else None
+            if f_size is None:
+                with self._span("hash"):
+                    md5, f_size = get_md5(payload)
+                if md5sum is None:
+                    md5sum = md5
         
         # request-level headers
         headers = {}
@@ -506,76 +959,103 @@ Loading in a locally held Service Document:
         if metadata_relevant:
             headers['Metadata-Relevant'] = str(metadata_relevant).lower()
         
-        self._t.start(request_type)
+        if extra_headers:
+            headers.update(extra_headers)
+        
+        started = time.monotonic()
+        body = None
         if empty:
             # NULL body with explicit zero length.
             headers['Content-Length'] = "0"
-            resp, content = self.h.request(target_iri, method, headers=headers)
-            _, took_time = self._t.time_since_start(request_type)
-            if self.history:
+            resp, content, retries = self._send(target_iri, method, headers=headers)
+            took_time = time.monotonic() - started
+            if self.history is not None:
                 self.history.log(request_type + ": Empty request", 
                                  sd_iri = self.sd_iri,
                                  target_iri = target_iri,
                                  method = method,
                                  response = resp,
                                  headers = headers,
+                                 retries = len(retries),
+                                 retry_delays = retries,
                                  process_duration = took_time)  
         elif method == "DELETE":
-            resp, content = self.h.request(target_iri, method, headers=headers)
-            _, took_time = self._t.time_since_start(request_type)
-            if self.history:
+            resp, content, retries = self._send(target_iri, method, headers=headers)
+            took_time = time.monotonic() - started
+            if self.history is not None:
                 self.history.log(request_type + ": DELETE request", 
                                  sd_iri = self.sd_iri,
                                  target_iri = target_iri,
                                  method = method,
                                  response = resp,
                                  headers = headers,
+                                 retries = len(retries),
+                                 retry_delays = retries,
                                  process_duration = took_time)
             
         elif metadata_entry and not (filename and payload):
             # Metadata-only resource creation
             headers['Content-Type'] = entry_content_type # "application/atom+xml;type=entry"
-            data = str(metadata_entry)
+            with self._span("build body"):
+                # as bytes, so that the Content-Length is right for non-ASCII metadata and urllib can send it
+                data = str(metadata_entry).encode("utf-8")
             headers['Content-Length'] = str(len(data))
             
-            resp, content = self.h.request(target_iri, method, headers=headers, payload=data)
-            _, took_time = self._t.time_since_start(request_type)
-            if self.history:
+            body = data
+            resp, content, retries = self._send(target_iri, method, headers=headers, payload=data)
+            took_time = time.monotonic() - started
+            if self.history is not None:
                 self.history.log(request_type + ": Metadata-only resource request", 
                                  sd_iri = self.sd_iri,
                                  target_iri = target_iri,
                                  method = method,
                                  response = resp,
                                  headers = headers,
+                                 retries = len(retries),
+                                 retry_delays = retries,
                                  process_duration = took_time)
             
         elif metadata_entry and filename and payload:
             # Multipart resource creation
-            my_headers = {"Content-MD5" : str(md5sum)}
+            my_headers = {}
+            if md5sum is not None:
+                my_headers["Content-MD5"] = str(md5sum)
+            else:
+                conn_l.warning("No md5sum given for a streamed payload - the media part will be sent without a Content-MD5")
             if packaging is not None:
                 my_headers['Packaging'] = str(packaging)
-            multicontent_type, payload_data = create_multipart_related([{'key':'atom',
-                                                                    'type':'application/atom+xml; charset="utf-8"',
-                                                                    'data':str(metadata_entry),  # etree default is utf-8
-                                                                    },
-                                                                    {'key':'payload',
-                                                                    'type':str(mimetype),
-                                                                    'filename':filename,
-                                                                    'data':payload,  
-                                                                    'headers':my_headers
-                                                                    }
-                                                                   ])
+            with self._span("build body"):
+                parts = [{'key':'atom',
+                          'type':'application/atom+xml; charset="utf-8"',
+                          'data':str(metadata_entry),  # etree default is utf-8
+                          },
+                         {'key':'payload',
+                          'type':str(mimetype),
+                          'filename':filename,
+                          'data':payload,  
+                          'headers':my_headers
+                          }]
+                if streaming:
+                    boundary = multipart_boundary()
+                    multicontent_type = 'multipart/related; boundary="%s"' % boundary
+                    payload_data = http_layer.ChunkedBody(iter_multipart_related(parts, boundary))
+                    headers['Transfer-Encoding'] = "chunked"
+                else:
+                    multicontent_type, payload_data = create_multipart_related(parts)
+                    headers['Content-Length'] = str(len(payload_data))    # must be str, not int type
                                                                    
             headers['Content-Type'] = multicontent_type + '; type="application/atom+xml"'
-            headers['Content-Length'] = str(len(payload_data))    # must be str, not int type
-            resp, content = self.h.request(target_iri, method, headers=headers, payload=payload_data)
-            _, took_time = self._t.time_since_start(request_type)
-            if self.history:
+            body = payload_data
+            resp, content, retries = self._send(target_iri, method, headers=headers, payload=payload_data)
+            took_time = time.monotonic() - started
+            if self.history is not None:
                 self.history.log(request_type + ": Multipart resource request",
                                  sd_iri = self.sd_iri,
                                  target_iri = target_iri,
                                  response = resp,
                                  headers = headers,
+                                 retries = len(retries),
+                                 retry_delays = retries,
                                  method = method,
                                  multipart = [{'key':'atom',
                                                'type':'application/atom+xml; charset="utf-8"'
@@ -590,36 +1070,58 @@ Loading in a locally held Service Document:
                                  process_duration = took_time)
         elif filename and payload:
             headers['Content-Type'] = str(mimetype)
-            headers['Content-MD5'] = str(md5sum)
-            headers['Content-Length'] = str(f_size)
+            if streaming:
+                headers['Transfer-Encoding'] = "chunked"
+                if md5sum is not None:
+                    headers['Content-MD5'] = str(md5sum)
+                else:
+                    # computed while the payload is sent, and sent after it
+                    headers['Trailer'] = "Content-MD5"
+                payload = http_layer.ChunkedBody(payload, md5_trailer = md5sum is None)
+            else:
+                headers['Content-MD5'] = str(md5sum)
+                headers['Content-Length'] = str(f_size)
             headers['Content-Disposition'] = "attachment; filename=%s" % urllib.parse.quote(filename)
             if packaging is not None:
                 headers['Packaging'] = str(packaging)
             
-            resp, content = self.h.request(target_iri, method, headers=headers, payload=payload)
-            _, took_time = self._t.time_since_start(request_type)
-            if self.history:
+            body = payload
+            resp, content, retries = self._send(target_iri, method, headers=headers, payload=payload)
+            took_time = time.monotonic() - started
+            if self.history is not None:
                 self.history.log(request_type + ": simple resource request",
                                  sd_iri = self.sd_iri,
                                  target_iri = target_iri,
                                  method = method,
                                  response = resp,
                                  headers = headers,
+                                 retries = len(retries),
+                                 retry_delays = retries,
                                  process_duration = took_time)
         else:
             conn_l.error("Parameters were not complete: requires a metadata_entry, or a payload/filename/packaging or both")
             raise Exception("Parameters were not complete: requires a metadata_entry, or a payload/filename/packaging or both")
+        self._observe(operation or request_type, took_time, headers, body, content, resp, retries, target_iri)
         
-        if resp['status'] == 201:
+        if minimal_response and resp['status'] in (200, 201, 204):
+            # Skip the receipt parsing, validation and caching entirely
+            conn_l.info("Received a (%s) response - returning a minimal receipt.", resp['status'])
+            if minimal_response != "raw":
+                content = None
+            return Minimal_Receipt(code = resp.status,
+                                   location = resp.get('location', None),
+                                   response_headers = dict(resp),
+                                   content = content)
+        elif resp['status'] == 201:
             #   Deposit receipt in content
             conn_l.info("Received a Resource Created (201) response.")
             # Check response headers for updated Location IRI
             location = resp.get('location', None)
             if len(content) > 0:
                 # Fighting chance that this is a deposit receipt
-                d = Deposit_Receipt(xml_deposit_receipt = content)
+                d = self._parse("deposit_receipt", Deposit_Receipt, xml_deposit_receipt = content)
                 if d.parsed:
-                    conn_l.info("Server response included a Deposit Receipt. Caching a copy in .resources['%s']" % d.edit)
+                    conn_l.info("Server response included a Deposit Receipt. Caching a copy in .resources['%s']", d.edit)
                 d.response_headers = dict(resp)
                 if location is not None:
                     d.location = location
@@ -635,6 +1137,12 @@ Loading in a locally held Service Document:
                 d.code = 201
                 d.location = location
                 return d
+        elif resp['status'] == 308:
+            # 'Resume Incomplete' - the server has stored a segment of a resumable upload, and wants the rest
+            conn_l.info("Received a Resume Incomplete (308) response - range stored: %s", resp.get('range', None))
+            return Minimal_Receipt(code = 308,
+                                   location = resp.get('location', None),
+                                   response_headers = dict(resp))
         elif resp['status'] == 204:
             #   Deposit receipt in content
             conn_l.info("Received a valid 'No Content' (204) response.")
@@ -648,9 +1156,9 @@ Loading in a locally held Service Document:
             location = resp.get('location', None)
             # content type header may also includ charset
             if self._normalise_mime(content_type).startswith("application/atom+xml;type=entry") and len(content) > 0: 
-                d = Deposit_Receipt(content)
+                d = self._parse("deposit_receipt", Deposit_Receipt, content)
                 if d.parsed:
-                    conn_l.info("Server response included a Deposit Receipt. Caching a copy in .resources['%s']" % d.edit)
+                    conn_l.info("Server response included a Deposit Receipt. Caching a copy in .resources['%s']", d.edit)
                     d.response_headers = dict(resp)
                     d.location = location
                     d.code = 200
@@ -691,6 +1199,7 @@ Loading in a locally held Service Document:
                         suggested_identifier=None,
                         in_progress=False,
                         on_behalf_of=None,
+                        minimal_response=None,     # True or "raw" to get a `sword2.Minimal_Receipt` back
                         ):
         """
 Creating a Resource
@@ -719,6 +1228,9 @@ SWORD2 request parameters:
                                            server to be in progress ('In-Progress') 
     `on_behalf_of`                      -- if this is a mediated deposit ('On-Behalf-Of') 
                                            (the client-wide setting `self.on_behalf_of will be used otherwise)    
+    `minimal_response`                  -- `True` or "raw" to get a lightweight `sword2.Minimal_Receipt` back
+                                           rather than a parsed `sword2.Deposit_Receipt` (see `self.__init__`)
+                                           (the client-wide setting `self.minimal_response` will be used otherwise)
 
         
 1. "Binary File Deposit in a given Collection"
@@ -823,9 +1335,8 @@ The SWORD server is not required to support packaging formats, but this profile
                 if w == workspace:
                     for c in collections:
                         if c.title == collection:
-                            conn_l.debug("Matched: Workspace='%s', Collection='%s' ==> Col-IRI='%s'" % (workspace, 
-                                                                                                        collection, 
-                                                                                                        c.href))
+                            conn_l.debug("Matched: Workspace='%s', Collection='%s' ==> Col-IRI='%s'", workspace, 
+                                         collection, c.href)
                             col_iri = c.href
                             break
 
@@ -845,7 +1356,8 @@ The SWORD server is not required to support packaging formats, but this profile
                                   method="POST",
                                   request_type='Col_IRI POST',
                                   md5sum=md5sum,
-                                  entry_content_type=entry_content_type)
+                                  entry_content_type=entry_content_type,
+                                  minimal_response=minimal_response)
         
     def update(self, metadata_entry = None,    # required for a metadata update
                              payload = None,            # required for a file update      
@@ -862,6 +1374,7 @@ The SWORD server is not required to support packaging formats, but this profile
                              metadata_relevant=False,
                              in_progress=False,
                              on_behalf_of=None,
+                             minimal_response=None,
                       ):
         """
 Replacing the Metadata and/or Files of a Resource
@@ -927,6 +1440,7 @@ If exception-throwing is turned off (`error_response_raises_exceptions = False`
 then the response will be a `sword2.Error_Document`, but will still have the aforementioned attributes set, (code,
 response_headers, etc)
         """
+        mimetype, filename, packaging = self._package_defaults(payload, mimetype, filename, packaging)
         target_iri = None
         request_type = "Update PUT"
         if metadata_entry != None:
@@ -938,10 +1452,10 @@ response_headers, etc)
             else:
                 request_type = "Update Metadata PUT"
             if dr != None and dr.edit != None:
-                conn_l.info("Using the deposit receipt to get the Edit-IRI: %s" % dr.edit)
+                conn_l.info("Using the deposit receipt to get the Edit-IRI: %s", dr.edit)
                 target_iri = dr.edit
             elif edit_iri != None:
-                conn_l.info("Using the %s receipt as the Edit-IRI" % edit_iri)
+                conn_l.info("Using the %s receipt as the Edit-IRI", edit_iri)
                 target_iri = edit_iri
             else:
                 conn_l.error("Metadata or Metadata + file multipart-related update: Cannot find the Edit-IRI from the parameters supplied.")
@@ -950,10 +1464,10 @@ response_headers, etc)
             conn_l.info("Using the Edit-Media-IRI - File update uses a PUT request to the Edit-Media-IRI")
             request_type = "Update File PUT"
             if dr != None and dr.edit_media != None:
-                conn_l.info("Using the deposit receipt to get the Edit-Media-IRI: %s" % dr.edit_media)
+                conn_l.info("Using the deposit receipt to get the Edit-Media-IRI: %s", dr.edit_media)
                 target_iri = dr.edit_media
             elif edit_media_iri != None:
-                conn_l.info("Using the %s receipt as the Edit-Media-IRI" % edit_media_iri)
+                conn_l.info("Using the %s receipt as the Edit-Media-IRI", edit_media_iri)
                 target_iri = edit_media_iri
             else:
                 conn_l.error("File update: Cannot find the Edit-Media-IRI from the parameters supplied.")
@@ -972,7 +1486,8 @@ response_headers, etc)
                                   metadata_relevant=str(metadata_relevant),
                                   method="PUT",
                                   request_type=request_type,
-                                  md5sum=md5sum)
+                                  md5sum=md5sum,
+                                  minimal_response=minimal_response)
 
 
         
@@ -987,7 +1502,8 @@ response_headers, etc)
                         
                         on_behalf_of=None,
                         in_progress=False, 
-                        metadata_relevant=False
+                        metadata_relevant=False,
+                        minimal_response=None
                         ):
         """
 Adding Files to the Media Resource
@@ -1026,7 +1542,7 @@ then the response will be a `sword2.Error_Document`, but will still have the afo
 response_headers, etc)
 
         """
-        conn_l.info("Appending file to a deposit via Edit-Media-IRI %s" % edit_media_iri)
+        conn_l.info("Appending file to a deposit via Edit-Media-IRI %s", edit_media_iri)
         return self._make_request(target_iri = edit_media_iri,
                                   payload=payload,
                                   mimetype=mimetype,
@@ -1037,7 +1553,8 @@ response_headers, etc)
                                   method="POST",
                                   metadata_relevant=metadata_relevant,
                                   request_type='EM_IRI POST (APPEND)',
-                                  md5sum=md5sum)
+                                  md5sum=md5sum,
+                                  minimal_response=minimal_response)
 
     def append(self, 
                         se_iri = None,  
@@ -1053,7 +1570,8 @@ response_headers, etc)
                         metadata_entry = None,
                         metadata_relevant = False,
                         in_progress = False,
-                        dr = None
+                        dr = None,
+                        minimal_response = None
                         ):
         """
 Adding Content to a Resource
@@ -1171,20 +1689,20 @@ response_headers, etc)
                 conn_l.info("Using the deposit receipt to get the SWORD2-Edit-IRI")
                 se_iri = dr.se_iri
                 if se_iri:
-                    conn_l.info("Update Resource via SWORD2-Edit-IRI %s" % se_iri)
+                    conn_l.info("Update Resource via SWORD2-Edit-IRI %s", se_iri)
                 else:
                     # we could try the edit IRI although technically that's not what it's for
                     se_iri = dr.edit
                     if se_iri:
-                        conn_l.info("Complete deposit using the Edit-IRI %s as SWORD2-Edit-IRI not available" % se_iri)
+                        conn_l.info("Complete deposit using the Edit-IRI %s as SWORD2-Edit-IRI not available", se_iri)
                     else:
                         raise Exception("No SWORD2-Edit-IRI was given and no suitable IRI was found in the deposit receipt.")
             else:
                 raise Exception("No SWORD2-Edit-IRI was given")
         else:
-            conn_l.info("Update Resource via SWORD2-Edit-IRI %s" % se_iri)
+            conn_l.info("Update Resource via SWORD2-Edit-IRI %s", se_iri)
 
-        conn_l.info("Adding new file, metadata or both to a SWORD deposit via SWORD-Edit-IRI %s" % se_iri)
+        conn_l.info("Adding new file, metadata or both to a SWORD deposit via SWORD-Edit-IRI %s", se_iri)
         return self._make_request(target_iri = se_iri,
                                   payload=payload,
                                   mimetype=mimetype,
@@ -1196,7 +1714,8 @@ response_headers, etc)
                                   method="POST",
                                   metadata_relevant=metadata_relevant,
                                   request_type='SE_IRI POST (APPEND PKG)',
-                                  md5sum=md5sum)
+                                  md5sum=md5sum,
+                                  minimal_response=minimal_response)
 
 
     def delete(self,
@@ -1209,7 +1728,7 @@ Generic method to send an HTTP DELETE request to a given IRI.
 
 Can be given the optional parameter of `on_behalf_of`.
         """
-        conn_l.info("Deleting resource %s" % resource_iri)
+        conn_l.info("Deleting resource %s", resource_iri)
         return self._make_request(target_iri = resource_iri,
                                   on_behalf_of=on_behalf_of,
                                   method="DELETE",
@@ -1247,13 +1766,13 @@ and the correct IRI will automatically be chosen.
                 conn_l.info("Using the deposit receipt to get the Edit-Media-IRI")
                 edit_media_iri = dr.edit_media
                 if edit_media_iri:
-                    conn_l.info("Deleting Resource via Edit-Media-IRI %s" % edit_media_iri)
+                    conn_l.info("Deleting Resource via Edit-Media-IRI %s", edit_media_iri)
                 else:
                     raise Exception("No Edit-Media-IRI was given and no suitable IRI was found in the deposit receipt.")   
             else:
                 raise Exception("No Edit-Media-IRI was given")
         else:
-            conn_l.info("Deleting Resource via Edit-Media-IRI %s" % edit_media_iri)
+            conn_l.info("Deleting Resource via Edit-Media-IRI %s", edit_media_iri)
 
         return self.delete(edit_media_iri,
                                     on_behalf_of = on_behalf_of)
@@ -1294,13 +1813,13 @@ and the correct IRI will automatically be chosen.
                 conn_l.info("Using the deposit receipt to get the Edit-IRI")
                 edit_iri = dr.edit
                 if edit_iri:
-                    conn_l.info("Deleting Container via Edit-IRI %s" % edit_iri)
+                    conn_l.info("Deleting Container via Edit-IRI %s", edit_iri)
                 else:
                     raise Exception("No Edit-IRI was given and no suitable IRI was found in the deposit receipt.")   
             else:
                 raise Exception("No Edit-IRI was given")
         else:
-            conn_l.info("Deleting Container via Edit-IRI %s" % edit_iri)
+            conn_l.info("Deleting Container via Edit-IRI %s", edit_iri)
 
         return self.delete(edit_iri,
                                     on_behalf_of = on_behalf_of)
@@ -1308,7 +1827,8 @@ and the correct IRI will automatically be chosen.
     def complete_deposit(self,
                         se_iri = None,
                         on_behalf_of=None,
-                        dr = None):
+                        dr = None,
+                        minimal_response = None):
         """
 Completing a Previously Incomplete Deposit
 
@@ -1338,25 +1858,26 @@ and the correct IRI will automatically be chosen.
                 conn_l.info("Using the deposit receipt to get the SWORD2-Edit-IRI")
                 se_iri = dr.se_iri
                 if se_iri:
-                    conn_l.info("Complete deposit using the SWORD2-Edit-IRI %s" % se_iri)
+                    conn_l.info("Complete deposit using the SWORD2-Edit-IRI %s", se_iri)
                 else:
                     # we could try the edit-media IRI although technically that's not what it's for
                     se_iri = dr.edit
                     if se_iri:
-                        conn_l.info("Complete deposit using the Edit-IRI %s as SWORD2-Edit-IRI not available" % se_iri)
+                        conn_l.info("Complete deposit using the Edit-IRI %s as SWORD2-Edit-IRI not available", se_iri)
                     else:
                         raise Exception("No SWORD2-Edit-IRI was given and no suitable IRI was found in the deposit receipt.")
             else:
                 raise Exception("No SWORD2-Edit-IRI was given")
         else:
-            conn_l.info("Complete deposit using the SWORD2-Edit-IRI %s" % se_iri)
+            conn_l.info("Complete deposit using the SWORD2-Edit-IRI %s", se_iri)
         
         return self._make_request(target_iri = se_iri,
                                   on_behalf_of=on_behalf_of,
                                   in_progress='false',
                                   method="POST",
                                   empty=True,
-                                  request_type='SE_IRI Complete Deposit')
+                                  request_type='SE_IRI Complete Deposit',
+                                  minimal_response=minimal_response)
 
     def update_files_for_resource(self, 
                         payload,       # These need to be set to upload a file      
@@ -1372,7 +1893,11 @@ and the correct IRI will automatically be chosen.
                         in_progress=False, 
                         metadata_relevant=False,
                         # Pass back the deposit receipt to automatically get the right IRI to use
-                        dr = None
+                        dr = None,
+                        minimal_response=None,
+                        segment_size=None,         # send a file in resumable segments of this many bytes
+                        segment_mode="auto",
+                        journal_dir=None
                         ):
         """
 Replacing the File Content of a Resource
@@ -1410,6 +1935,16 @@ Set the following parameters in addition to the basic parameters (see `self.crea
     `metadata_relevant` - This should be set to `True` if the server should consider the file a potential source of metadata extraction, 
                           or `False` if the server should not attempt to extract any metadata from the deposi
 
+Resumable uploads:
+------------------
+
+Set `segment_size` to send a large file as a series of segments of that many bytes, each with its own Content-MD5
+and retried on its own (see `sword2.segmented_upload.SegmentedUploader`). The `payload` must then be the path of 
+the file (or a file object opened from one). The segments that the server has stored are recorded in a journal 
+(next to the file, or in `journal_dir`), and an interrupted upload picks up from there when this is called again.
+`segment_mode` is "content-range", "segmented" (a segmented-deposit extension) or "auto" to use Content-Range
+if the server supports it.
+
 Response:
     
 A `sword2.Deposit_Receipt` object containing the deposit receipt data. If the response was blank or 
@@ -1428,13 +1963,21 @@ response_headers, etc)
                 conn_l.info("Using the deposit receipt to get the Edit-Media-IRI")
                 edit_media_iri = dr.edit_media
                 if edit_media_iri:
-                    conn_l.info("Update Resource via Edit-Media-IRI %s" % edit_media_iri)
+                    conn_l.info("Update Resource via Edit-Media-IRI %s", edit_media_iri)
                 else:
                     raise Exception("No Edit-Media-IRI was given and no suitable IRI was found in the deposit receipt.")   
             else:
                 raise Exception("No Edit-Media-IRI was given")
         else:
-            conn_l.info("Update Resource via Edit-Media-IRI %s" % edit_media_iri)
+            conn_l.info("Update Resource via Edit-Media-IRI %s", edit_media_iri)
+        
+        if segment_size:
+            from .segmented_upload import SegmentedUploader
+            path = payload if isinstance(payload, str) else payload.name
+            uploader = SegmentedUploader(self, segment_size=segment_size, mode=segment_mode, journal_dir=journal_dir)
+            return uploader.upload(edit_media_iri, path, filename=filename, mimetype=mimetype, packaging=packaging,
+                                   md5sum=md5sum, on_behalf_of=on_behalf_of, in_progress=in_progress,
+                                   metadata_relevant=metadata_relevant)
             
         return self._make_request(target_iri = edit_media_iri,
                                   payload=payload,
@@ -1446,13 +1989,15 @@ response_headers, etc)
                                   method="PUT",
                                   metadata_relevant=str(metadata_relevant),
                                   request_type='EM_IRI PUT',
-                                  md5sum=md5sum)
+                                  md5sum=md5sum,
+                                  minimal_response=minimal_response)
 
     def update_metadata_for_resource(self, metadata_entry,    # required
                                            edit_iri = None,
                                            in_progress=False,
                                            on_behalf_of=None,
-                                           dr = None
+                                           dr = None,
+                                           minimal_response=None
                                            ):
         """
 Replacing the Metadata of a Resource
@@ -1516,20 +2061,21 @@ response_headers, etc)
                 conn_l.info("Using the deposit receipt to get the Edit-IRI")
                 edit_iri = dr.edit
                 if edit_iri:
-                    conn_l.info("Update Resource via Edit-IRI %s" % edit_iri)
+                    conn_l.info("Update Resource via Edit-IRI %s", edit_iri)
                 else:
                     raise Exception("No Edit-IRI was given and no suitable IRI was found in the deposit receipt.")   
             else:
                 raise Exception("No Edit-IRI was given")
         else:
-            conn_l.info("Update Resource via Edit-IRI %s" % edit_iri)
+            conn_l.info("Update Resource via Edit-IRI %s", edit_iri)
 
         return self._make_request(target_iri = edit_iri,
                                   metadata_entry=metadata_entry,
                                   on_behalf_of=on_behalf_of,
                                   in_progress=in_progress, 
                                   method="PUT",
-                                  request_type='Edit_IRI PUT')
+                                  request_type='Edit_IRI PUT',
+                                  minimal_response=minimal_response)
 
     def update_metadata_and_files_for_resource(self, metadata_entry,    # required
                                                      payload,       # These need to be set to upload a file      
@@ -1544,7 +2090,8 @@ response_headers, etc)
                                                      metadata_relevant=False,
                                                      in_progress=False,
                                                      on_behalf_of=None,
-                                                     dr = None
+                                                     dr = None,
+                                                     minimal_response=None
                                               ):
         """
 Replacing the Metadata and Files of a Resource
@@ -1612,13 +2159,13 @@ response_headers, etc)
                 conn_l.info("Using the deposit receipt to get the Edit-IRI")
                 edit_iri = dr.edit
                 if edit_iri:
-                    conn_l.info("Update Resource via Edit-IRI %s" % edit_iri)
+                    conn_l.info("Update Resource via Edit-IRI %s", edit_iri)
                 else:
                     raise Exception("No Edit-IRI was given and no suitable IRI was found in the deposit receipt.")   
             else:
                 raise Exception("No Edit-IRI was given")
         else:
-            conn_l.info("Update Resource via Edit-IRI %s" % edit_iri)
+            conn_l.info("Update Resource via Edit-IRI %s", edit_iri)
 
         return self._make_request(target_iri = edit_iri,
                                   metadata_entry=metadata_entry, 
@@ -1631,9 +2178,11 @@ response_headers, etc)
                                   metadata_relevant=str(metadata_relevant),
                                   method="PUT",
                                   request_type='Edit_IRI PUT',
-                                  md5sum=md5sum)
+                                  md5sum=md5sum,
+                                  minimal_response=minimal_response)
 
 
+    @traced("Edit_IRI GET")
     def get_deposit_receipt(self, edit_iri):
         """
 Getting a copy of the Entry Document/Deposit Receipt
@@ -1645,13 +2194,13 @@ FIXME: there's also something funny going on with get_resource remembering
 old headers, but not quite sure where that's coming from.  Have to pass in
 packaging and headers explicitly to overcome
         """
-        conn_l.debug("Trying to GET the ATOM Entry Document at %s." % edit_iri)
+        conn_l.debug("Trying to GET the ATOM Entry Document at %s.", edit_iri)
         response = self.get_resource(edit_iri, packaging=None, headers={})
         if response.code == 200:
             conn_l.debug("Attempting to parse the response as a Deposit Receipt")
-            d = Deposit_Receipt(xml_deposit_receipt = response.content)
+            d = self._parse("deposit_receipt", Deposit_Receipt, xml_deposit_receipt = response.content)
             if d.parsed:
-                conn_l.info("Server responsed with a Deposit Receipt. Caching a copy in .resources['%s']" % d.edit)
+                conn_l.info("Server responsed with a Deposit Receipt. Caching a copy in .resources['%s']", d.edit)
             d.response_headers = dict(response.response_headers)
             d.code = 200
             self._cache_deposit_receipt(d)
@@ -1661,47 +2210,52 @@ packaging and headers explicitly to overcome
             d.code = 404
             return d
 
+    @traced("ORE Statement GET")
     def get_ore_sword_statement(self, sword_statement_iri):
         """
 Getting the Sword Statement.
         """
         # get the statement first
-        conn_l.debug("Trying to GET the ORE Sword Statement at %s." % sword_statement_iri)
+        conn_l.debug("Trying to GET the ORE Sword Statement at %s.", sword_statement_iri)
         response = self.get_resource(sword_statement_iri, headers = {'Accept':'application/rdf+xml'})
         if response.code == 200:
             #try:
             if True:
                 conn_l.debug("Attempting to parse the response as a ORE Sword Statement")
-                s = Ore_Sword_Statement(response.content)
+                s = self._parse("statement", Ore_Sword_Statement, response.content)
                 conn_l.debug("Parsed SWORD2 Statement, returning")
                 return s
             #except Exception, e:
             #    # Any error here is to do with the parsing
             #    return response.content
 
+    @traced("Atom Statement GET")
     def get_atom_sword_statement(self, sword_statement_iri):
         """
 Getting the Sword Statement.
         """
         # get the statement first
-        conn_l.debug("Trying to GET the ATOM Sword Statement at %s." % sword_statement_iri)
+        conn_l.debug("Trying to GET the ATOM Sword Statement at %s.", sword_statement_iri)
         response = self.get_resource(sword_statement_iri, headers = {'Accept':'application/atom+xml;type=feed'})
         if response.code == 200:
             #try:
             if True:
                 conn_l.debug("Attempting to parse the response as a ATOM Sword Statement")
-                s = Atom_Sword_Statement(response.content)
+                s = self._parse("statement", Atom_Sword_Statement, response.content)
                 conn_l.debug("Parsed SWORD2 Statement, returning")
                 return s
             #except Exception, e:
             #    # Any error here is to do with the parsing
             #    return response.content
 
+    @traced("Cont_IRI GET")
     def get_resource(self, content_iri = None, 
                            packaging=None, 
                            on_behalf_of=None, 
-                           headers = {},
-                           dr = None):
+                           headers = None,
+                           dr = None,
+                           stream = False,
+                           chunk_size = DEFAULT_CHUNK_SIZE):
         """
 Retrieving the content
 
@@ -1734,45 +2288,57 @@ Response:
         `ContentWrapper.content` -- body of response from server (the file or package)
         `ContentWrapper.code`    -- status code ('200' on success.)
 
+Streaming:
+----------
+
+Set `stream` to `True` to avoid holding the whole file or package in memory. The response is then a 
+`sword2.resource_stream.ResourceStream`, which is an iterator over chunks of the body (of up to `chunk_size` bytes)
+and which computes the MD5 of the data as it goes, so that it can be checked against the server's Content-MD5:
+
+    >>> stream = conn.get_resource(content_iri, stream=True)
+    >>> for chunk in stream:
+    ...     out.write(chunk)
+    >>> stream.verify()
+
+See also `self.download_resource`, which writes the resource straight to disk.
         """
+        headers = dict(headers) if headers else {}
         if not content_iri:
             if dr != None:
                 conn_l.info("Using the deposit receipt to get the SWORD2-Edit-IRI")
                 content_iri = dr.cont_iri
                 if content_iri:
-                    conn_l.info("Getting the resource at Content-IRI %s" % content_iri)
+                    conn_l.info("Getting the resource at Content-IRI %s", content_iri)
                 else:
                     raise Exception("No Content-IRI was given and no suitable IRI was found in the deposit receipt.")   
             else:
                 raise Exception("No Content-IRI was given")
         else:
-            conn_l.info("Getting the resource at Content-IRI %s" % content_iri)
+            conn_l.info("Getting the resource at Content-IRI %s", content_iri)
         
         # 406 - PackagingFormatNotAvailable
         if self.honour_receipts and packaging:
             # Make sure that the packaging format is available from the deposit receipt, if loaded
-            conn_l.debug("Checking that the packaging format '%s' is available." % content_iri)
-            conn_l.debug("Cached Cont-IRI Receipts: %s" % list(self.cont_iris.keys()))
-            if content_iri in list(self.cont_iris.keys()):
+            conn_l.debug("Checking that the packaging format '%s' is available.", packaging)
+            conn_l.debug("%s cached Cont-IRI Receipts", len(self.cont_iris))
+            cached = content_iri in self.cont_iris
+            self.metrics.cache_lookup(cached)
+            if cached:
                 if not (packaging in self.cont_iris[content_iri].packaging):
-                    conn_l.error("Desired packaging format '%' not available from the server, according to the deposit receipt. Change the client parameter 'honour_receipts' to False to avoid this check.")
-                    return self._return_error_or_exception(PackagingFormatNotAvailable, {}, "")
-        if on_behalf_of:
-            headers['On-Behalf-Of'] = on_behalf_of
-        elif self.on_behalf_of:
-            headers['On-Behalf-Of'] = self.on_behalf_of
-        if packaging:
-            headers['Accept-Packaging'] = packaging
+                    conn_l.error("Desired packaging format '%s' not available from the server, according to the deposit receipt. Change the client parameter 'honour_receipts' to False to avoid this check.", packaging)
+                    return self._return_error_or_exception(PackagingFormatNotAvailable, LocalResponse(406), "")
+        headers = self._resource_headers(headers, packaging, on_behalf_of)
         
-        self._t.start("IRI GET resource")
+        started = time.monotonic()
         if packaging:
-            conn_l.info("IRI GET resource '%s' with Accept-Packaging:%s" % (content_iri, packaging))
+            conn_l.info("IRI GET resource '%s' with Accept-Packaging:%s", content_iri, packaging)
         else:
-            conn_l.info("IRI GET resource '%s'" % content_iri)
-        conn_l.debug("Using headers: " + str(headers))
-        resp, content = self.h.request(content_iri, "GET", headers=headers)
-        _, took_time = self._t.time_since_start("IRI GET resource")
-        if self.history:
+            conn_l.info("IRI GET resource '%s'", content_iri)
+        conn_l.debug("Using headers: %s", headers)
+        resp, content, retries = self._send(content_iri, "GET", headers=headers, stream=stream)
+        took_time = time.monotonic() - started
+        self._observe("Cont_IRI GET", took_time, content=content, resp=resp, retries=retries, iri=content_iri)
+        if self.history is not None:
             self.history.log('Cont_IRI GET resource', 
                              sd_iri = self.sd_iri,
                              content_iri = content_iri,
@@ -1780,16 +2346,22 @@ Response:
                              on_behalf_of = self.on_behalf_of,
                              response = resp,
                              headers = headers,
+                             stream = stream,
+                             retries = len(retries),
+                             retry_delays = retries,
                              process_duration = took_time)
-        conn_l.info("Server response: %s" % resp['status'])
-        conn_l.debug(dict(resp))
+        conn_l.info("Server response: %s", resp['status'])
+        if conn_l.isEnabledFor(logging.DEBUG):
+            conn_l.debug("Response headers: %s", dict(resp))
+        if stream:
+            if resp['status'] == 200:
+                conn_l.debug("Cont_IRI GET resource successful - streaming the body from %s", content_iri)
+                return ResourceStream(resp, content, chunk_size=chunk_size)
+            # error bodies are small, and are needed for the error document
+            with content:
+                content = content.read()
         if resp['status'] == 200:
-            conn_l.debug("Cont_IRI GET resource successful - got %s bytes from %s" % (len(content), content_iri))
-            class ContentWrapper(object):
-                def __init__(self, resp, content):
-                    self.response_headers = dict(resp)
-                    self.content = content
-                    self.code = resp.status
+            conn_l.debug("Cont_IRI GET resource successful - got %s bytes from %s", len(content), content_iri)
             return ContentWrapper(resp, content)
         # NOTE: let the core error handling deal with this
         #elif resp['status'] == 406:   # Unavailable packaging format 
@@ -1798,6 +2370,156 @@ Response:
         else:
             return self._handle_error_response(resp, content)
     
+    def _resource_headers(self, headers, packaging, on_behalf_of):
+        """The headers of a request for a resource: `headers`, with On-Behalf-Of and Accept-Packaging"""
+        headers = dict(headers) if headers else {}
+        if on_behalf_of:
+            headers['On-Behalf-Of'] = on_behalf_of
+        elif self.on_behalf_of:
+            headers['On-Behalf-Of'] = self.on_behalf_of
+        if packaging:
+            headers['Accept-Packaging'] = packaging
+        return headers
+
+    def head_resource(self, content_iri, packaging=None, on_behalf_of=None, headers=None):
+        """
+Get the headers of a file or package (its Content-Length, Content-MD5, ETag...) with a HEAD request, sent with
+the same headers as `self.get_resource` would send, and retried as `self.retry_policy` allows.
+
+As a HEAD has no body, there is no error document to parse: the response is returned whatever its status.
+
+Response:
+
+    A `ContentWrapper`, with `ContentWrapper.content` `None`
+        """
+        headers = self._resource_headers(headers, packaging, on_behalf_of)
+        conn_l.info("IRI HEAD resource '%s'", content_iri)
+        started = time.monotonic()
+        # streamed, as UrlLib2Layer only sends a HEAD that way
+        resp, content, retries = self._send(content_iri, "HEAD", headers=headers, stream=True)
+        content.close()
+        took_time = time.monotonic() - started
+        self._observe("Cont_IRI HEAD", took_time, resp=resp, retries=retries, iri=content_iri)
+        if self.history is not None:
+            self.history.log('Cont_IRI HEAD resource', 
+                             sd_iri = self.sd_iri,
+                             content_iri = content_iri,
+                             packaging = packaging,
+                             on_behalf_of = self.on_behalf_of,
+                             response = resp,
+                             headers = headers,
+                             retries = len(retries),
+                             retry_delays = retries,
+                             process_duration = took_time)
+        conn_l.info("Server response: %s", resp['status'])
+        return ContentWrapper(resp, None)
+
+    def download_resource(self, dr_or_iri,
+                                dest_path,
+                                packaging=None,
+                                on_behalf_of=None,
+                                headers=None,
+                                buffer_size=DEFAULT_CHUNK_SIZE,
+                                verify_md5=True,
+                                segments=1):
+        """
+Download a resource straight to disk
+
+Streams the file or package at a Content-IRI (or EM-IRI) to `dest_path`, `buffer_size` bytes at a time, so that 
+the whole of it is never held in memory.
+
+`dr_or_iri` is either the IRI to GET, or a `sword2.Deposit_Receipt` whose Content-IRI will be used.
+
+The MD5 of the data is computed while it is written. If `verify_md5` is `True` and the server sent a Content-MD5
+header that doesn't match, a `sword2.exceptions.ChecksumMismatch` is raised (the downloaded file is left in place 
+for inspection.)
+
+Response:
+    
+    A `ContentWrapper` - 
+        `ContentWrapper.response_headers`    -- response headers
+        `ContentWrapper.content` -- `None`; the body is in the file at `ContentWrapper.path`
+        `ContentWrapper.code`    -- status code ('200' on success.)
+        `ContentWrapper.path`    -- where the resource was written
+        `ContentWrapper.size`    -- the number of bytes written
+        `ContentWrapper.md5`     -- the (hex) MD5 of the bytes written
+
+Segmented downloads:
+
+Set `segments` to more than 1 to fetch the resource as that many concurrent byte ranges (see
+`sword2.segmented_download.SegmentedDownloader`), if the server supports Range requests. It falls back to a 
+single stream if it does not. An interrupted segmented download is resumed when this is called again with the 
+same `dest_path`. The response is then a `sword2.segmented_download.SegmentedDownload`, which has the same 
+attributes as above. Each request for a segment goes through the concurrency limiter, progress tracking and tracing
+of this `Connection`, and is retried as `self.retry_policy` allows - an interrupted segment resumes where it
+stopped.
+
+Server errors are handled as they are for `self.get_resource`.
+        """
+        if isinstance(dr_or_iri, str):
+            content_iri, dr = dr_or_iri, None
+        else:
+            content_iri, dr = None, dr_or_iri
+        if segments > 1:
+            return self._download_segmented(content_iri or dr.cont_iri, dest_path, packaging, on_behalf_of, 
+                                            headers, buffer_size, verify_md5, segments)
+        stream = self.get_resource(content_iri = content_iri,
+                                   packaging = packaging,
+                                   on_behalf_of = on_behalf_of,
+                                   headers = headers,
+                                   dr = dr,
+                                   stream = True,
+                                   chunk_size = buffer_size)
+        if not isinstance(stream, ResourceStream):
+            # an Error_Document, with exceptions turned off
+            return stream
+        with stream:
+            with open(dest_path, "wb", buffering=0) as f:
+                for chunk in stream:
+                    f.write(chunk)
+        conn_l.info("Downloaded %s bytes to %s (md5: %s)", stream.size, dest_path, stream.md5)
+        if verify_md5 and stream.md5_matches() is False:
+            conn_l.error("Downloaded file %s does not match the Content-MD5 sent by the server", dest_path)
+            raise ChecksumMismatch(stream.expected_md5, stream.md5, dest_path)
+        
+        c = ContentWrapper(stream.response_headers, None, stream.code)
+        c.path = dest_path
+        c.size = stream.size
+        c.md5 = stream.md5
+        return c
+    
+    def _download_segmented(self, content_iri, dest_path, packaging, on_behalf_of, headers, buffer_size, verify_md5, segments):
+        if not content_iri:
+            raise Exception("No Content-IRI was given and no suitable IRI was found in the deposit receipt.")
+        headers = self._resource_headers(headers, packaging, on_behalf_of)
+        from .segmented_download import SegmentedDownloader, SegmentedDownloadError
+        downloader = SegmentedDownloader(_SegmentLayer(self), segments=segments, buffer_size=buffer_size, 
+                                         compute_md5=None if verify_md5 else False, retry_policy=self.retry_policy)
+        conn_l.info("IRI GET resource '%s' in up to %s segments", content_iri, segments)
+        started = time.monotonic()
+        try:
+            result = downloader.download(content_iri, dest_path, headers=headers)
+        except SegmentedDownloadError:
+            raise
+        except HTTPResponseError as e:
+            return self._handle_error_response(e.response, e.content)
+        took_time = time.monotonic() - started
+        self.metrics.observe("Cont_IRI GET (segmented)", took_time, received=result.size)
+        log_operation("Cont_IRI GET (segmented)", content_iri, took_time, received=result.size)
+        if self.history is not None:
+            self.history.log('Cont_IRI GET resource (segmented)',
+                             sd_iri = self.sd_iri,
+                             content_iri = content_iri,
+                             packaging = packaging,
+                             on_behalf_of = self.on_behalf_of,
+                             headers = headers,
+                             size = result.size,
+                             ranged = result.ranged,
+                             segments = len(result.segments),
+                             resumed_bytes = result.resumed_bytes,
+                             process_duration = took_time)
+        return result
+    
     def replace_file(self, file_edit_media, payload, mimetype, packaging=None, on_behalf_of=None, metadata_relevant=False):
         """
         API Sugar for replacing any given file (such as that retrieved from a feed of the media resource)
@@ -154,7 +154,7 @@ Availible attributes:
             # user know what to expect (note that Error_Document sub classes Deposit_Receipt
             # and that will almost always fail the validation)
             self.valid = self.validate()
-            d_l.info("Initial SWORD2 validation checks on deposit receipt - Valid document? %s" % self.valid)
+            d_l.info("Initial SWORD2 validation checks on deposit receipt - Valid document? %s", self.valid)
             
             # finally, handle the metadata
             self.handle_metadata()
@@ -183,26 +183,28 @@ Availible attributes:
                 has_se = True
         
         if not has_edit or not has_em or not has_se:
-            d_l.debug("Validation Fail: has_edit: " + str(has_edit) + "; has_em: " + str(has_em) + "; has_se: " + str(has_se))
+            d_l.debug("Validation Fail: has_edit: %s; has_em: %s; has_se: %s", has_edit, has_em, has_se)
             valid = False
         
         # It MUST contain a single sword:treatment element [SWORD003] which contains either a human-readable 
         # statement describing treatment the deposited resource has received or a IRI that dereferences to such a description.
         treatment = self.dom.findall(NS['sword'] % "treatment")
         if treatment == None or len(treatment) == 0:
-            d_l.debug("Validation Fail: no treatment or treatment invalid: " + str(treatment))
+            d_l.debug("Validation Fail: no treatment or treatment invalid: %s", treatment)
             valid = False
         
         return valid
     
     def handle_metadata(self):
         """Method that walks the `etree.SubElement`, assigning the information to the objects attributes."""
+        debug = d_l.isEnabledFor(logging.DEBUG)
         for e in self.dom.getchildren():
             for nmsp, prefix in NS.items():
                 if str(e.tag).startswith(prefix % ""):
                     _, tagname = e.tag.rsplit("}", 1)
                     field = "%s_%s" % (nmsp, tagname)
-                    d_l.debug("Attempting to intepret field: '%s'" % field)
+                    if debug:
+                        d_l.debug("Attempting to intepret field: '%s'", field)
                     if field == "atom_link":
                         self.handle_link(e)
                     elif field == "atom_content":
@@ -311,3 +313,49 @@ Availible attributes:
         for k, v in self.links.items():
             _s.append("Link rel:'%s' -- %s" % (k, v))
         return "\n".join(_s)
+
+
+class Minimal_Receipt(object):
+    """
+`Minimal_Receipt` - the lightweight result returned by `sword2.Connection` when a request is made in "minimal response"
+mode (see the `minimal_response` parameter of `sword2.Connection`).
+
+No attempt is made to parse, validate or cache the response body, so this is suitable for bulk ingest where only the
+Edit-IRI from the 'Location' header is needed.
+
+Available attributes:
+
+    `self.code`             -- HTTP code of the response
+    `self.location`         -- The location, if given (from HTTP Header: "Location: ....")
+    `self.edit`             -- The same as `self.location`, which should always be the Edit-IRI
+    `self.response_headers` -- The HTTP response headers (`dict`)
+    `self.content`          -- The raw response body, if it was kept (`minimal_response="raw"`), otherwise `None`
+
+If the raw body was kept, it can be parsed later on:
+
+>>> dr = minimal_receipt.to_deposit_receipt()
+    """
+    __slots__ = ('code', 'location', 'edit', 'response_headers', 'content')
+
+    def __init__(self, code=0, location=None, response_headers=None, content=None):
+        self.code = code
+        self.location = location
+        self.edit = location
+        self.response_headers = response_headers if response_headers is not None else {}
+        self.content = content
+
+    def to_deposit_receipt(self):
+        """Parse the kept response body (if any) into a full `sword2.Deposit_Receipt`"""
+        if self.content:
+            d = Deposit_Receipt(xml_deposit_receipt = self.content)
+        else:
+            d = Deposit_Receipt()
+        d.response_headers = self.response_headers
+        d.code = self.code
+        if self.location is not None:
+            d.location = self.location
+            d.edit = self.location
+        return d
+
+    def __repr__(self):
+        return "<sword2.Minimal_Receipt - code: %s, location: %s>" % (self.code, self.location)
@@ -31,3 +31,26 @@ class PackagingFormatNotAvailable(HTTPResponseError):
 
 class NotAcceptable(HTTPResponseError):
     pass
+
+class MaxUploadSizeExceeded(HTTPResponseError):
+    """ 413 - the payload is larger than the server's sword:maxUploadSize """
+    pass
+
+class UnsupportedMediaType(HTTPResponseError):
+    """ 415 - the server does not accept content of this type (or in this packaging format) """
+    pass
+
+class ChecksumMismatch(Exception):
+    """ the checksum of the data received does not match the one the server sent (Content-MD5) """
+    def __init__(self, expected=None, actual=None, path=None):
+        Exception.__init__(self, "Expected MD5 %s, received data has MD5 %s" % (expected, actual))
+        self.expected = expected
+        self.actual = actual
+        self.path = path
+
+class CircuitOpen(Exception):
+    """ requests to this host are failing fast, as the last ones failed - see `sword2.circuit_breaker` """
+    def __init__(self, host=None, retry_in=None):
+        Exception.__init__(self, "Circuit open for %s - not sending requests to it for another %.1fs" % (host, retry_in or 0))
+        self.host = host
+        self.retry_in = retry_in
@@ -0,0 +1,836 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+An in-process stand-in for a SWORD2 server, for tests and benchmarks that have no Simple Sword Server or repository
+to talk to.
+
+`FakeSwordServer` runs an `http.server` in background threads of the calling process, on a free localhost port
+(or on `port`), and keeps its deposits in memory. It implements:
+
+    SD-IRI          GET                  service document, with `collections` collections
+    Col-IRI         POST                 create a container from an Atom entry, a file or a multipart/related
+                                         deposit (201, with a deposit receipt)
+    Edit-IRI        GET                  deposit receipt
+                    PUT                  replace the metadata (and the files, if multipart) of the container
+                    POST                 (the SE-IRI) add metadata or files, or complete an in-progress deposit
+                    DELETE               delete the container
+    EM-IRI          GET, HEAD            the content: the file, if there is one (with Range requests), or else a
+                                         zip of the files
+                    PUT                  replace the files, in one request or in Content-Range segments (308s)
+                    POST                 add a file (201, with the File-IRI in Location)
+                    DELETE               delete the files
+    File-IRI        GET, DELETE
+    Statement       GET                  Atom (`<state-iri>.atom`) and ORE (`<state-iri>.rdf`) statements
+
+with HTTP Basic authentication if `user` is given, and the SWORD2 error documents for a Content-MD5 mismatch (in a
+header, a chunked trailer or a multipart part), a packaging format that the collection does not accept, a payload
+larger than `max_upload_size` and an On-Behalf-Of header where `mediation` is off.
+
+To measure throughput and scaling offline, it can slow itself down and fail:
+
+    latency     -- seconds to wait before answering each request (or a callable of the method and path giving it)
+    bandwidth   -- bytes per second at which each request reads its body and writes its response (`None` for as
+                   fast as it can)
+    error_rate  -- fraction of requests (at random) answered with `error_status` (503, with a Retry-After header if
+                   `retry_after` is given) instead
+    `inject(status, count, method, path)` answers the next `count` requests (of that method, to IRIs containing
+    that path) with `status`, for deterministic tests
+
+Every request is counted in `self.counts` (by method and kind of IRI), and the last `history` of them are kept in
+`self.requests` as `(method, path, status, bytes received, bytes sent, seconds)` - recorded as the response is
+sent, so the seconds do not include sending its body. With `keep_content=False` the
+files are not kept, only their sizes and MD5s (and the EM-IRI serves as many zero bytes), so that very large or
+very many deposits can be made without the memory to hold them.
+
+Usage:
+
+>>> from sword2 import Connection
+>>> from sword2.fake_server import FakeSwordServer
+>>> with FakeSwordServer(user="sword", password="sword", latency=0.05, bandwidth=10*1024*1024) as server:
+...     conn = Connection(server.sd_iri, user_name="sword", user_pass="sword")
+...     conn.get_service_document()
+...     with open("deposit.zip", "rb") as f:
+...         receipt = conn.create(col_iri=server.col_iris[0], payload=f, mimetype="application/zip",
+...                               filename="deposit.zip", packaging="http://purl.org/net/sword/package/SimpleZip")
+...     statement = conn.get_ore_sword_statement(server.iri("state", receipt.edit.rsplit("/", 1)[1]) + ".rdf")
+>>> server.counts
+Counter({('GET', 'sd'): 1, ('POST', 'col'): 1, ('GET', 'state'): 1})
+"""
+
+import io
+import re
+import time
+import base64
+import random
+import hashlib
+import itertools
+import threading
+import urllib.parse
+from collections import Counter, OrderedDict, deque
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape, quoteattr
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from lxml import etree
+
+from .utils import NS
+from .server_errors import SWORD2ERRORSBYNAME
+
+from .sword2_logging import logging
+fs_l = logging.getLogger(__name__)
+
+SIMPLE_ZIP = "http://purl.org/net/sword/package/SimpleZip"
+BINARY = "http://purl.org/net/sword/package/Binary"
+ACCEPT_PACKAGING = (SIMPLE_ZIP, BINARY, "http://purl.org/net/sword/package/METSDSpaceSIP")
+
+CHUNK_SIZE = 65536
+
+# which of an entry's elements are kept as the metadata of a container
+METADATA_NAMESPACES = ("http://purl.org/dc/terms/", "http://purl.org/dc/elements/1.1/")
+METADATA_ATOM = (NS['atom'] % "title", NS['atom'] % "summary", NS['atom'] % "author")
+
+ROUTES = [("sd", re.compile(r"^/sd-uri$")),
+          ("col", re.compile(r"^/col-uri/(?P<col>[^/]+)$")),
+          ("edit", re.compile(r"^/edit-uri/(?P<id>[^/]+)$")),
+          ("em", re.compile(r"^/em-uri/(?P<id>[^/]+)$")),
+          ("file", re.compile(r"^/file-uri/(?P<id>[^/]+)/(?P<name>[^/]+)$")),
+          ("state", re.compile(r"^/state-uri/(?P<id>[^/]+)\.(?P<format>atom|rdf)$"))]
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+class _File(object):
+    __slots__ = ('name', 'mimetype', 'packaging', 'size', 'md5', 'content', 'deposited_on', 'deposited_by',
+                 'on_behalf_of')
+
+    def __init__(self, name, mimetype, packaging, size, md5, content, deposited_by, on_behalf_of):
+        self.name = name
+        self.mimetype = mimetype
+        self.packaging = packaging
+        self.size = size
+        self.md5 = md5
+        self.content = content
+        self.deposited_on = _now()
+        self.deposited_by = deposited_by
+        self.on_behalf_of = on_behalf_of
+
+class _Upload(object):
+    """A file being PUT in Content-Range segments"""
+    __slots__ = ('size', 'received', 'content')
+
+    def __init__(self, size, keep_content):
+        self.size = size
+        self.received = 0
+        self.content = bytearray() if keep_content else None
+
+class _Deposit(object):
+    __slots__ = ('id', 'collection', 'metadata', 'files', 'in_progress', 'updated', 'deposited_by', 'on_behalf_of',
+                 'upload')
+
+    def __init__(self, id, collection, deposited_by, on_behalf_of):
+        self.id = id
+        self.collection = collection
+        self.metadata = []          # serialised elements of the Atom entries deposited
+        self.files = OrderedDict()
+        self.in_progress = False
+        self.updated = _now()
+        self.deposited_by = deposited_by
+        self.on_behalf_of = on_behalf_of
+        self.upload = None
+
+class SwordError(Exception):
+    """Answers the request with the SWORD2 error document of `name` (see `sword2.server_errors`)"""
+    def __init__(self, status, name, message=""):
+        Exception.__init__(self, message)
+        self.status = status
+        self.name = name
+        self.message = message
+
+class _Throttle(object):
+    """Holds a transfer to `bandwidth` bytes per second"""
+    def __init__(self, bandwidth):
+        self.bandwidth = bandwidth
+        self.started = time.monotonic()
+        self.done = 0
+
+    def __call__(self, size):
+        if self.bandwidth:
+            self.done += size
+            wait = self.started + self.done / float(self.bandwidth) - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+class FakeSwordServer(object):
+    def __init__(self, collections=2, user=None, password=None, host="127.0.0.1", port=0, latency=0.0,
+                       bandwidth=None, error_rate=0.0, error_status=503, retry_after=None, mediation=True,
+                       accept_packaging=ACCEPT_PACKAGING, max_upload_size=None, keep_content=True, history=10000,
+                       random=random.random):
+        """
+Parameters:
+
+    collections      -- number of collections in the service document
+    user, password   -- the credentials that requests must give (HTTP Basic), or `None` to let anyone in
+    host, port       -- address to listen on; `port` 0 picks a free one
+    latency, bandwidth, error_rate, error_status, retry_after -- see above
+    mediation        -- whether the collections accept On-Behalf-Of deposits
+    accept_packaging -- the packaging formats that the collections accept
+    max_upload_size  -- largest payload accepted, in bytes (`None` for no limit)
+    keep_content     -- whether to keep the files deposited, or only their sizes and MD5s
+    history          -- how many requests to keep in `self.requests`
+        """
+        self.collections = collections
+        self.user = user
+        self.password = password
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.mediation = mediation
+        self.accept_packaging = tuple(accept_packaging)
+        self.max_upload_size = max_upload_size
+        self.keep_content = keep_content
+        self.random = random
+        self.deposits = {}
+        self.requests = deque(maxlen=history)
+        self.counts = Counter()
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self._injected = []
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.fake = self
+        self.url = "http://%s:%s" % (host, self.server.server_port)
+        self.thread = None
+
+    def iri(self, kind, *parts):
+        """The IRI of `kind` ("sd", "col", "edit", "em", "file", "state") for the deposit or collection `parts`"""
+        return "/".join([self.url, kind + "-uri"] + [urllib.parse.quote(str(p), safe="") for p in parts])
+
+    @property
+    def sd_iri(self):
+        return self.iri("sd")
+
+    @property
+    def col_iris(self):
+        return [self.iri("col", n) for n in range(1, self.collections + 1)]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="FakeSwordServer")
+        self.thread.daemon = True
+        self.thread.start()
+        fs_l.info("Fake SWORD2 server listening on %s", self.url)
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def inject(self, status, count=1, method=None, path=None):
+        """Answers the next `count` requests (with `method`, to an IRI whose path contains `path`) with `status`"""
+        with self._lock:
+            self._injected.append([status, count, method, path])
+
+    def reset(self):
+        """Forgets the deposits, counts and requests"""
+        with self._lock:
+            self.deposits.clear()
+            self.requests.clear()
+            self.counts.clear()
+            self.bytes_received = self.bytes_sent = 0
+            self._injected = []
+
+    def _error_for(self, method, path):
+        """The status to fail this request with, if any"""
+        with self._lock:
+            for injected in self._injected:
+                status, count, i_method, i_path = injected
+                if (i_method is None or i_method == method) and (i_path is None or i_path in path):
+                    injected[1] -= 1
+                    if injected[1] <= 0:
+                        self._injected.remove(injected)
+                    return status
+        if self.error_rate and self.random() < self.error_rate:
+            return self.error_status
+        return None
+
+    def _record(self, method, kind, path, status, received, sent, seconds):
+        with self._lock:
+            self.counts[(method, kind)] += 1
+            self.requests.append((method, path, status, received, sent, seconds))
+            self.bytes_received += received
+            self.bytes_sent += sent
+
+    def _new_deposit(self, collection, deposited_by, on_behalf_of):
+        with self._lock:
+            deposit = _Deposit(str(next(self._ids)), collection, deposited_by, on_behalf_of)
+            self.deposits[deposit.id] = deposit
+        return deposit
+
+    # documents
+
+    def service_document(self):
+        collections = []
+        for n, col_iri in enumerate(self.col_iris, 1):
+            collections.append("""
+        <collection href=%s>
+            <atom:title>Collection %s</atom:title>
+            <accept>*/*</accept>
+            <accept alternate="multipart-related">*/*</accept>
+            <sword:collectionPolicy>Anything goes</sword:collectionPolicy>
+            <dcterms:abstract>Collection %s of the fake SWORD2 server</dcterms:abstract>
+            <sword:mediation>%s</sword:mediation>
+            <sword:treatment>Kept in memory</sword:treatment>%s
+        </collection>""" % (quoteattr(col_iri), n, n, "true" if self.mediation else "false",
+                            "".join("\n            <sword:acceptPackaging>%s</sword:acceptPackaging>" % escape(p)
+                                    for p in self.accept_packaging)))
+        return ("""<?xml version="1.0" encoding="utf-8"?>
+<service xmlns:dcterms="http://purl.org/dc/terms/" xmlns:sword="http://purl.org/net/sword/terms/"
+         xmlns:atom="http://www.w3.org/2005/Atom" xmlns="http://www.w3.org/2007/app">
+    <sword:version>2.0</sword:version>%s
+    <workspace>
+        <atom:title>Main Site</atom:title>%s
+    </workspace>
+</service>""" % ("\n    <sword:maxUploadSize>%s</sword:maxUploadSize>" % (self.max_upload_size // 1024)
+                 if self.max_upload_size else "", "".join(collections))).encode("utf-8")
+
+    def _packagings(self, deposit):
+        """The packaging formats that the content of `deposit` can be retrieved in"""
+        formats = [SIMPLE_ZIP]
+        if len(deposit.files) == 1:
+            formats.append(list(deposit.files.values())[0].packaging or BINARY)
+        return formats
+
+    def deposit_receipt(self, deposit):
+        edit, em, state = self.iri("edit", deposit.id), self.iri("em", deposit.id), self.iri("state", deposit.id)
+        titles = [m for m in deposit.metadata if m.startswith("<title") or m.startswith("<atom:title")]
+        files = list(deposit.files.values())
+        mimetype = files[0].mimetype if len(files) == 1 else "application/zip"
+        lines = ['<entry xmlns="http://www.w3.org/2005/Atom" xmlns:sword="http://purl.org/net/sword/terms/">',
+                 "    <id>%s</id>" % escape(edit),
+                 "    <updated>%s</updated>" % deposit.updated]
+        if not titles:
+            lines.append("    <title>Deposit %s</title>" % deposit.id)
+        lines.extend("    " + m for m in deposit.metadata)
+        lines.extend(['    <content type=%s src=%s/>' % (quoteattr(mimetype), quoteattr(em)),
+                      '    <link rel="edit-media" href=%s/>' % quoteattr(em),
+                      '    <link rel="edit" href=%s/>' % quoteattr(edit),
+                      '    <link rel="http://purl.org/net/sword/terms/add" href=%s/>' % quoteattr(edit),
+                      '    <link rel="http://purl.org/net/sword/terms/statement" type="application/atom+xml;type=feed" href=%s/>' % quoteattr(state + ".atom"),
+                      '    <link rel="http://purl.org/net/sword/terms/statement" type="application/rdf+xml" href=%s/>' % quoteattr(state + ".rdf")])
+        lines.extend('    <link rel="http://purl.org/net/sword/terms/originalDeposit" href=%s/>'
+                     % quoteattr(self.iri("file", deposit.id, f.name)) for f in files)
+        lines.extend("    <sword:packaging>%s</sword:packaging>" % escape(p) for p in self._packagings(deposit))
+        lines.extend(["    <sword:treatment>Kept in memory by the fake SWORD2 server</sword:treatment>", "</entry>"])
+        return "\n".join(lines).encode("utf-8")
+
+    def _state(self, deposit):
+        return "inprogress" if deposit.in_progress else "archived"
+
+    def atom_statement(self, deposit):
+        entries = []
+        for f in deposit.files.values():
+            entries.append("""
+    <atom:entry>
+        <atom:category scheme="http://purl.org/net/sword/terms/" term="http://purl.org/net/sword/terms/originalDeposit" label="Original Deposit"/>
+        <atom:content type=%s src=%s/>
+        <sword:packaging>%s</sword:packaging>
+        <sword:depositedOn>%s</sword:depositedOn>
+        <sword:depositedBy>%s</sword:depositedBy>%s
+    </atom:entry>""" % (quoteattr(f.mimetype), quoteattr(self.iri("file", deposit.id, f.name)), escape(f.packaging or BINARY),
+                        f.deposited_on, escape(f.deposited_by),
+                        "\n        <sword:depositedOnBehalfOf>%s</sword:depositedOnBehalfOf>" % escape(f.on_behalf_of)
+                        if f.on_behalf_of else ""))
+        state = self._state(deposit)
+        return ("""<atom:feed xmlns:sword="http://purl.org/net/sword/terms/" xmlns:atom="http://www.w3.org/2005/Atom">
+    <atom:category scheme="http://purl.org/net/sword/terms/state" term="http://purl.org/net/sword/terms/state/%s" label="%s">
+        The deposit is %s
+    </atom:category>%s
+</atom:feed>""" % (state, state, state, "".join(entries))).encode("utf-8")
+
+    def ore_statement(self, deposit):
+        edit, agg = self.iri("edit", deposit.id), self.iri("edit", deposit.id) + "#aggregation"
+        files = [self.iri("file", deposit.id, f.name) for f in deposit.files.values()]
+        descriptions = []
+        for f, iri in zip(deposit.files.values(), files):
+            descriptions.append("""
+    <rdf:Description rdf:about=%s>
+        <sword:packaging rdf:resource=%s/>
+        <sword:depositedOn rdf:datatype="http://www.w3.org/2001/XMLSchema#dateTime">%s</sword:depositedOn>
+        <sword:depositedBy rdf:datatype="http://www.w3.org/2001/XMLSchema#string">%s</sword:depositedBy>%s
+    </rdf:Description>""" % (quoteattr(iri), quoteattr(f.packaging or BINARY), f.deposited_on, escape(f.deposited_by),
+                             "\n        <sword:depositedOnBehalfOf>%s</sword:depositedOnBehalfOf>" % escape(f.on_behalf_of)
+                             if f.on_behalf_of else ""))
+        state = "http://purl.org/net/sword/terms/state/%s" % self._state(deposit)
+        return ("""<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns:ore="http://www.openarchives.org/ore/terms/"
+         xmlns:sword="http://purl.org/net/sword/terms/">
+    <rdf:Description rdf:about=%s>
+        <ore:describes rdf:resource=%s/>
+    </rdf:Description>
+    <rdf:Description rdf:about=%s>
+        <ore:isDescribedBy rdf:resource=%s/>%s%s
+        <sword:state rdf:resource=%s/>
+    </rdf:Description>%s
+    <rdf:Description rdf:about=%s>
+        <sword:stateDescription>The deposit is %s</sword:stateDescription>
+    </rdf:Description>
+</rdf:RDF>""" % (quoteattr(edit), quoteattr(agg), quoteattr(agg), quoteattr(edit),
+                 "".join('\n        <ore:aggregates rdf:resource=%s/>' % quoteattr(i) for i in files),
+                 "".join('\n        <sword:originalDeposit rdf:resource=%s/>' % quoteattr(i) for i in files),
+                 quoteattr(state), "".join(descriptions), quoteattr(state), self._state(deposit))).encode("utf-8")
+
+    def error_document(self, name, message=""):
+        error = SWORD2ERRORSBYNAME[name]
+        return ("""<?xml version="1.0" encoding="utf-8"?>
+<sword:error xmlns="http://www.w3.org/2005/Atom" xmlns:sword="http://purl.org/net/sword/terms/" href=%s>
+    <title>ERROR</title>
+    <updated>%s</updated>
+    <generator uri="https://github.com/swordapp/python-client-sword2" version="1.0">sword2.fake_server</generator>
+    <summary>%s</summary>
+    <sword:treatment>processing failed</sword:treatment>
+    <sword:verboseDescription>%s</sword:verboseDescription>
+</sword:error>""" % (quoteattr(error['IRI']), _now(), escape(error['description']), escape(message))).encode("utf-8")
+
+    def content(self, deposit):
+        """The content of `deposit` as a tuple of (mimetype, bytes, packaging)"""
+        files = list(deposit.files.values())
+        if len(files) == 1:
+            f = files[0]
+            return f.mimetype, f.content if f.content is not None else bytes(f.size), f.packaging or BINARY
+        import zipfile
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as z:
+            for f in files:
+                z.writestr(f.name, f.content if f.content is not None else bytes(f.size))
+        return "application/zip", buf.getvalue(), SIMPLE_ZIP
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeSwordServer/1.0"
+    # the headers and body are written separately, and with Nagle's algorithm a keep-alive client waits for its
+    # delayed ACK (40ms) before it gets the body
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._serve()
+
+    do_HEAD = do_PUT = do_POST = do_DELETE = do_GET
+
+    # requests
+
+    def _serve(self):
+        fake = self.server.fake
+        self.started = time.monotonic()
+        self.received = 0
+        self.status = None
+        self.trailers = {}
+        self.body_read = False
+        path = urllib.parse.urlsplit(self.path).path
+        kind, match = None, None
+        for kind, route in ROUTES:
+            match = route.match(path)
+            if match is not None:
+                break
+        kind = self.kind = kind if match is not None else "other"
+        self.path_only = path
+        latency = fake.latency(self.command, path) if callable(fake.latency) else fake.latency
+        if latency:
+            time.sleep(latency)
+        self.throttle = _Throttle(fake.bandwidth)
+        try:
+            status = fake._error_for(self.command, path)
+            if status is not None:
+                self._drain()
+                headers = {}
+                if status == 503 and fake.retry_after is not None:
+                    headers['Retry-After'] = str(fake.retry_after)
+                self._respond(status, ("%s (injected by the fake SWORD2 server)" % status).encode("ascii"),
+                              "text/plain", headers)
+            elif not self._authorised(fake):
+                self._drain()
+                self._respond(401, b"Authorisation required", "text/plain",
+                              {'WWW-Authenticate' : 'Basic realm="SWORD2"'})
+            elif match is None:
+                self._not_found()
+            else:
+                getattr(self, "_%s_%s" % (kind, self.command if self.command != "HEAD" else "GET"),
+                        self._not_allowed)(fake, **match.groupdict())
+        except SwordError as e:
+            self._drain()
+            self._respond(e.status, fake.error_document(e.name, e.message), "application/xml")
+        except Exception as e:
+            fs_l.exception("Error answering %s %s", self.command, self.path)
+            self.close_connection = True
+            if self.status is None:
+                self._respond(500, str(e).encode("utf-8"), "text/plain")
+
+    def _authorised(self, fake):
+        if fake.user is None:
+            return True
+        auth = self.headers.get("Authorization", "")
+        if not auth.startswith("Basic "):
+            return False
+        try:
+            user, _, password = base64.b64decode(auth[6:]).decode("utf-8").partition(":")
+        except (ValueError, UnicodeDecodeError):
+            return False
+        return user == fake.user and password == fake.password
+
+    def _chunks(self):
+        """The request body, as it is read (at the bandwidth allowed)"""
+        self.body_read = True
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                if size == 0:
+                    break
+                data = self.rfile.read(size)
+                self.rfile.readline()
+                self.received += len(data)
+                self.throttle(len(data))
+                yield data
+            while True:
+                line = self.rfile.readline().strip()
+                if not line:
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                self.trailers[name.strip().lower()] = value.strip()
+        else:
+            remaining = int(self.headers.get("Content-Length") or 0)
+            while remaining > 0:
+                data = self.rfile.read(min(remaining, CHUNK_SIZE))
+                if not data:
+                    break
+                remaining -= len(data)
+                self.received += len(data)
+                self.throttle(len(data))
+                yield data
+
+    def _body(self):
+        return b"".join(self._chunks())
+
+    def _drain(self):
+        if not self.body_read:
+            for data in self._chunks():
+                pass
+
+    def _header(self, name):
+        return self.headers.get(name) or self.trailers.get(name.lower())
+
+    def _respond(self, status, body=b"", content_type=None, headers=None):
+        self.status = status
+        # recorded before the response goes out, so that a client which has it can count on finding its request
+        self.server.fake._record(self.command, self.kind, self.path_only, status, self.received,
+                                 len(body) if self.command != "HEAD" else 0, time.monotonic() - self.started)
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if content_type is not None:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            for i in range(0, len(body), CHUNK_SIZE):
+                chunk = body[i:i + CHUNK_SIZE]
+                self.throttle(len(chunk))
+                self.wfile.write(chunk)
+
+    def _receipt(self, fake, deposit, status, headers=None):
+        headers = dict(headers or {})
+        headers.setdefault('Location', fake.iri("edit", deposit.id))
+        self._respond(status, fake.deposit_receipt(deposit), "application/atom+xml;type=entry", headers)
+
+    def _not_found(self):
+        self._drain()
+        self._respond(404, b"Not found", "text/plain")
+
+    def _not_allowed(self, fake, **kw):
+        raise SwordError(405, "MethodNotAllowed", "%s is not allowed on %s" % (self.command, self.path))
+
+    def _deposit(self, fake, id):
+        deposit = fake.deposits.get(id)
+        if deposit is None:
+            self._not_found()
+        return deposit
+
+    # parts of deposits
+
+    def _check_mediation(self, fake):
+        on_behalf_of = self.headers.get("On-Behalf-Of")
+        if on_behalf_of and not fake.mediation:
+            raise SwordError(412, "MediationNotAllowed", "Mediated deposit is not allowed")
+        return on_behalf_of
+
+    def _check_size(self, fake, size):
+        if fake.max_upload_size and size > fake.max_upload_size:
+            raise SwordError(413, "MaxUploadSizeExceeded", "%s bytes is more than %s" % (size, fake.max_upload_size))
+
+    def _check_packaging(self, fake, packaging):
+        if packaging and packaging not in fake.accept_packaging:
+            raise SwordError(415, "ErrorContent", "Packaging %s is not accepted" % packaging)
+
+    def _entry(self, data):
+        """The metadata elements of an Atom entry, serialised"""
+        try:
+            entry = etree.fromstring(data)
+        except etree.XMLSyntaxError as e:
+            raise SwordError(400, "ErrorBadRequest", "Could not parse the entry: %s" % e)
+        return [etree.tostring(e, encoding="unicode", with_tail=False) for e in entry
+                if isinstance(e.tag, str) and (e.tag in METADATA_ATOM or e.tag.split("}")[0][1:] in METADATA_NAMESPACES)]
+
+    def _filename(self, disposition):
+        match = re.search(r'filename="?([^";]+)"?', disposition or "")
+        return urllib.parse.unquote(match.group(1)) if match else None
+
+    def _file(self, fake, chunks, filename, mimetype, packaging, md5=None, on_behalf_of=None):
+        """Reads a file from `chunks`, checking its size and MD5 (`md5`, or else the Content-MD5 of the request)"""
+        self._check_packaging(fake, packaging)
+        digest = hashlib.md5()
+        content = [] if fake.keep_content else None
+        size = 0
+        for data in chunks:
+            size += len(data)
+            digest.update(data)
+            if content is not None:
+                content.append(data)
+        self._check_size(fake, size)
+        expected = md5 if md5 is not None else self._header("Content-MD5")
+        if expected and expected.strip().lower() != digest.hexdigest():
+            raise SwordError(412, "ErrorChecksumMismatch", "Content-MD5 %s does not match %s" % (expected, digest.hexdigest()))
+        return _File(filename or "deposit", mimetype or "application/octet-stream", packaging, size, digest.hexdigest(),
+                     b"".join(content) if content is not None else None, fake.user or "sword", on_behalf_of)
+
+    def _multipart(self, fake, on_behalf_of):
+        """The metadata and file of a multipart/related deposit"""
+        match = re.search(r'boundary="?([^";]+)"?', self.headers.get("Content-Type", ""))
+        if match is None:
+            raise SwordError(400, "ErrorBadRequest", "No boundary in the Content-Type")
+        body = self._body()
+        metadata, f = [], None
+        for part in body.split(b"--" + match.group(1).encode("latin-1"))[1:]:
+            if part.startswith(b"--"):
+                break
+            head, _, data = part.partition(b"\r\n\r\n")
+            if data.endswith(b"\r\n"):
+                data = data[:-2]
+            headers = {}
+            for line in head.decode("latin-1").strip().split("\r\n"):
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            disposition = headers.get("content-disposition", "")
+            if 'name="atom"' in disposition:
+                metadata = self._entry(data)
+            elif 'name="payload"' in disposition:
+                if headers.get("content-transfer-encoding", "").lower() == "base64":
+                    data = base64.b64decode(data)
+                f = self._file(fake, [data], self._filename(disposition), headers.get("content-type"),
+                               headers.get("packaging"), md5=headers.get("content-md5", ""), on_behalf_of=on_behalf_of)
+        return metadata, f
+
+    def _read_deposit(self, fake, on_behalf_of):
+        """The metadata and file (either of which may be missing) sent in the request"""
+        content_type = self.headers.get("Content-Type", "")
+        length = self.headers.get("Content-Length")
+        if length is not None:
+            self._check_size(fake, int(length))
+        if content_type.startswith("multipart/related"):
+            return self._multipart(fake, on_behalf_of)
+        if content_type.startswith("application/atom+xml"):
+            return self._entry(self._body()), None
+        if length is not None and int(length) == 0 and "chunked" not in self.headers.get("Transfer-Encoding", ""):
+            return [], None
+        return [], self._file(fake, self._chunks(), self._filename(self.headers.get("Content-Disposition")),
+                              content_type.split(";")[0].strip() or None, self.headers.get("Packaging"),
+                              on_behalf_of=on_behalf_of)
+
+    def _in_progress(self, deposit):
+        deposit.in_progress = (self.headers.get("In-Progress") or "false").strip().lower() == "true"
+        deposit.updated = _now()
+
+    # SD-IRI and Col-IRI
+
+    def _sd_GET(self, fake):
+        self._respond(200, fake.service_document(), "application/atomsvc+xml")
+
+    def _col_POST(self, fake, col):
+        if not col.isdigit() or not 1 <= int(col) <= fake.collections:
+            return self._not_found()
+        on_behalf_of = self._check_mediation(fake)
+        metadata, f = self._read_deposit(fake, on_behalf_of)
+        deposit = fake._new_deposit(col, fake.user or "sword", on_behalf_of)
+        deposit.metadata = metadata
+        if f is not None:
+            deposit.files[f.name] = f
+        self._in_progress(deposit)
+        self._receipt(fake, deposit, 201)
+
+    # Edit-IRI (and SE-IRI)
+
+    def _edit_GET(self, fake, id):
+        deposit = self._deposit(fake, id)
+        if deposit is not None:
+            self._receipt(fake, deposit, 200, {'Location' : fake.iri("edit", id)})
+
+    def _edit_PUT(self, fake, id):
+        deposit = self._deposit(fake, id)
+        if deposit is None:
+            return
+        metadata, f = self._read_deposit(fake, self._check_mediation(fake))
+        deposit.metadata = metadata
+        if f is not None:
+            deposit.files = OrderedDict([(f.name, f)])
+        self._in_progress(deposit)
+        self._receipt(fake, deposit, 200)
+
+    def _edit_POST(self, fake, id):
+        deposit = self._deposit(fake, id)
+        if deposit is None:
+            return
+        metadata, f = self._read_deposit(fake, self._check_mediation(fake))
+        deposit.metadata.extend(metadata)
+        if f is not None:
+            deposit.files[f.name] = f
+        self._in_progress(deposit)
+        self._receipt(fake, deposit, 200)
+
+    def _edit_DELETE(self, fake, id):
+        with fake._lock:
+            deposit = fake.deposits.pop(id, None)
+        if deposit is None:
+            return self._not_found()
+        self._drain()
+        self._respond(204)
+
+    # EM-IRI
+
+    def _em_GET(self, fake, id):
+        deposit = self._deposit(fake, id)
+        if deposit is None:
+            return
+        if not deposit.files:
+            return self._not_found()
+        wanted = self.headers.get("Accept-Packaging")
+        if wanted and wanted not in fake._packagings(deposit):
+            raise SwordError(406, "ErrorContent", "The content is not available as %s" % wanted)
+        mimetype, content, packaging = fake.content(deposit)
+        headers = {'Packaging' : packaging, 'Accept-Ranges' : "bytes"}
+        f = list(deposit.files.values())[0]
+        if len(deposit.files) == 1 and f.content is not None:
+            headers['Content-MD5'] = f.md5
+        match = re.match(r"bytes=(\d*)-(\d*)$", self.headers.get("Range", ""))
+        if match is not None and (match.group(1) or match.group(2)):
+            first, last = match.groups()
+            if first:
+                first, last = int(first), min(int(last) if last else len(content) - 1, len(content) - 1)
+            else:
+                first, last = max(len(content) - int(last), 0), len(content) - 1
+            if first >= len(content):
+                return self._respond(416, b"", None, {'Content-Range' : "bytes */%s" % len(content)})
+            headers['Content-Range'] = "bytes %s-%s/%s" % (first, last, len(content))
+            return self._respond(206, content[first:last + 1], mimetype, headers)
+        self._respond(200, content, mimetype, headers)
+
+    def _em_PUT(self, fake, id):
+        deposit = self._deposit(fake, id)
+        if deposit is None:
+            return
+        on_behalf_of = self._check_mediation(fake)
+        content_range = self.headers.get("Content-Range")
+        if content_range:
+            return self._em_PUT_range(fake, deposit, content_range, on_behalf_of)
+        metadata, f = self._read_deposit(fake, on_behalf_of)
+        deposit.files = OrderedDict([(f.name, f)]) if f is not None else OrderedDict()
+        self._in_progress(deposit)
+        self._respond(204)
+
+    def _em_PUT_range(self, fake, deposit, content_range, on_behalf_of):
+        """A segment of a file sent with Content-Range, in order: anything else is answered with what is held"""
+        match = re.match(r"bytes (?:(\d+)-(\d+)|\*)/(\d+)$", content_range.strip())
+        if match is None:
+            raise SwordError(400, "ErrorBadRequest", "Could not understand Content-Range: %s" % content_range)
+        size = int(match.group(3))
+        self._check_size(fake, size)
+        upload = deposit.upload
+        if upload is None or upload.size != size:
+            upload = deposit.upload = _Upload(size, fake.keep_content)
+        if match.group(1) is not None and int(match.group(1)) == upload.received:
+            segment = self._file(fake, self._chunks(), None, None, self.headers.get("Packaging"))
+            if segment.size != int(match.group(2)) - int(match.group(1)) + 1:
+                raise SwordError(400, "ErrorBadRequest", "The segment is not the size its Content-Range says")
+            upload.received += segment.size
+            if upload.content is not None:
+                upload.content.extend(segment.content)
+            if upload.received == size:
+                deposit.upload = None
+                content = bytes(upload.content) if upload.content is not None else None
+                f = _File(self._filename(self.headers.get("Content-Disposition")) or "deposit",
+                          self.headers.get("Content-Type", "application/octet-stream").split(";")[0].strip(),
+                          self.headers.get("Packaging"), size,
+                          hashlib.md5(content).hexdigest() if content is not None else None, content,
+                          fake.user or "sword", on_behalf_of)
+                deposit.files = OrderedDict([(f.name, f)])
+                self._in_progress(deposit)
+                return self._respond(204)
+        else:
+            self._drain()
+        headers = {'Range' : "bytes=0-%s" % (upload.received - 1)} if upload.received else {}
+        self._respond(308, b"", None, headers)
+
+    def _em_POST(self, fake, id):
+        deposit = self._deposit(fake, id)
+        if deposit is None:
+            return
+        metadata, f = self._read_deposit(fake, self._check_mediation(fake))
+        if f is None:
+            raise SwordError(400, "ErrorBadRequest", "No file was sent")
+        deposit.files[f.name] = f
+        self._in_progress(deposit)
+        self._receipt(fake, deposit, 201, {'Location' : fake.iri("file", id, f.name)})
+
+    def _em_DELETE(self, fake, id):
+        deposit = self._deposit(fake, id)
+        if deposit is not None:
+            self._drain()
+            deposit.files = OrderedDict()
+            self._respond(204)
+
+    # File-IRI and statements
+
+    def _file_GET(self, fake, id, name):
+        deposit = self._deposit(fake, id)
+        if deposit is None:
+            return
+        f = deposit.files.get(urllib.parse.unquote(name))
+        if f is None:
+            return self._not_found()
+        self._respond(200, f.content if f.content is not None else bytes(f.size), f.mimetype)
+
+    def _file_DELETE(self, fake, id, name):
+        deposit = self._deposit(fake, id)
+        if deposit is None:
+            return
+        if deposit.files.pop(urllib.parse.unquote(name), None) is None:
+            return self._not_found()
+        self._drain()
+        self._respond(204)
+
+    def _state_GET(self, fake, id, format):
+        deposit = self._deposit(fake, id)
+        if deposit is None:
+            return
+        if format == "atom":
+            self._respond(200, fake.atom_statement(deposit), "application/atom+xml;type=feed")
+        else:
+            self._respond(200, fake.ore_statement(deposit), "application/rdf+xml")
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Bulk harvesting (mirroring) of SWORD2 containers to a local directory.
+
+For each container, the `Harvester` fetches the SWORD2 Statement and then downloads every aggregated resource that
+the Statement lists. Statements and resources are fetched concurrently, and every resource is streamed straight to
+disk. A small manifest is kept in each container's directory, recording the size and MD5 of each file as it was
+downloaded, so that files which are already present and intact are skipped on the next run.
+
+The directory layout mirrors the Edit-IRI of each container:
+
+    <dest_dir>/<host_port>/<path of the Edit-IRI>/<file name of each resource>
+
+Usage:
+
+>>> from sword2 import Connection
+>>> from sword2.harvester import Harvester
+>>> conn = Connection("http://localhost:8080/sd-uri", user_name="sword", user_pass="sword")
+>>> h = Harvester(conn, "/data/mirror", workers=16)
+>>> results = h.harvest(["http://localhost:8080/edit-IRI/43/my_deposit", deposit_receipt, ....])
+>>> for r in results:
+...     print(r.edit_iri, len(r.downloaded), len(r.skipped), r.errors)
+"""
+
+import os
+import re
+import json
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    from hashlib import md5
+except ImportError:
+    import md5
+
+from .deposit_receipt import Deposit_Receipt
+from .resource_stream import DEFAULT_CHUNK_SIZE, normalise_md5
+
+from .sword2_logging import logging
+hv_l = logging.getLogger(__name__)
+
+MANIFEST_NAME = ".sword2-harvest.json"
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9._-]+")
+
+def _safe_name(name):
+    name = _UNSAFE.sub("_", name).strip(".")
+    return name or "_"
+
+def container_directory(dest_dir, edit_iri):
+    """The directory that the resources of the container at `edit_iri` are harvested into"""
+    parts = urllib.parse.urlsplit(edit_iri)
+    segments = [_safe_name(urllib.parse.unquote(p)) for p in parts.path.split("/") if p]
+    if parts.query:
+        segments.append(_safe_name(parts.query))
+    return os.path.join(dest_dir, _safe_name(parts.netloc), *segments)
+
+class HarvestResult(object):
+    """The outcome of harvesting a single container
+
+    `self.edit_iri`         -- Edit-IRI of the container
+    `self.statement_iri`    -- the Statement IRI that was used (`None` if it could not be found)
+    `self.directory`        -- where the container's resources were written
+    `self.downloaded`       -- `list` of the paths of the files downloaded in this run
+    `self.skipped`          -- `list` of the paths of the files which were already present and intact
+    `self.errors`           -- `list` of (IRI, exception) tuples for anything that failed
+    """
+    def __init__(self, edit_iri, directory):
+        self.edit_iri = edit_iri
+        self.directory = directory
+        self.statement_iri = None
+        self.downloaded = []
+        self.skipped = []
+        self.errors = []
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def __repr__(self):
+        return "<sword2.HarvestResult - %s: %s downloaded, %s skipped, %s errors>" % (self.edit_iri,
+                                len(self.downloaded), len(self.skipped), len(self.errors))
+
+class Harvester(object):
+    def __init__(self, conn, dest_dir, workers=8, statement_format="atom", verify_local=True, verify_remote=False,
+                       buffer_size=DEFAULT_CHUNK_SIZE):
+        """
+Parameters:
+
+    conn              -- the `sword2.Connection` to harvest with. Its methods are called from several threads at
+                         once, and the `Connection` is not thread-safe in itself (its receipt caches and
+                         history are shared), so the harvester must own it: do not use it elsewhere during a harvest
+    dest_dir          -- the root directory of the mirror
+    workers           -- number of Statements and resources that are fetched at the same time
+    statement_format  -- "atom" or "ore"; the Statement format to use when a receipt offers both
+    verify_local      -- re-hash files which are already present, and only skip those whose size and MD5 match
+                         the manifest (the default). Set to False to skip them on their size alone
+    verify_remote     -- send a HEAD request for files which are already present, and download them again if the
+                         server's Content-Length or Content-MD5 no longer match
+    buffer_size       -- read/write buffer size for the downloads
+        """
+        self.conn = conn
+        self.dest_dir = dest_dir
+        self.workers = workers
+        self.statement_format = statement_format
+        self.verify_local = verify_local
+        self.verify_remote = verify_remote
+        self.buffer_size = buffer_size
+        self._manifest_lock = threading.Lock()
+
+    def harvest(self, items):
+        """Harvest each of `items` (Edit-IRIs or `sword2.Deposit_Receipt`s), returning a `list` of `HarvestResult`s
+        in the same order."""
+        items = list(items)
+        results = [None] * len(items)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            statements = dict((pool.submit(self._statement_for, item), i) for i, item in enumerate(items))
+            downloads = []
+            for f in as_completed(statements):
+                i = statements[f]
+                result, resources = f.result()
+                results[i] = result
+                if resources:
+                    os.makedirs(result.directory, exist_ok=True)
+                    manifest = self._load_manifest(result.directory)
+                    for uri, filename in resources:
+                        downloads.append(pool.submit(self._harvest_resource, result, manifest, uri, filename))
+            for f in downloads:
+                f.result()
+        for result in results:
+            hv_l.info("Harvested %s - %s downloaded, %s skipped, %s errors", result.edit_iri, len(result.downloaded),
+                      len(result.skipped), len(result.errors))
+        return results
+
+    def _statement_for(self, item):
+        """Get the Statement for a container, and work out the file name that each of its resources will have"""
+        if isinstance(item, Deposit_Receipt):
+            dr, edit_iri = item, item.edit
+        else:
+            edit_iri = item
+            dr = self.conn.edit_iris.get(edit_iri)
+        result = HarvestResult(edit_iri, container_directory(self.dest_dir, edit_iri))
+        try:
+            if dr is None or not (dr.atom_statement_iri or dr.ore_statement_iri):
+                dr = self.conn.get_deposit_receipt(edit_iri)
+                if dr is None or dr.code != 200:
+                    raise Exception("Could not retrieve the deposit receipt at %s" % edit_iri)
+            atom_iri, ore_iri = dr.atom_statement_iri, dr.ore_statement_iri
+            if ore_iri and (self.statement_format == "ore" or not atom_iri):
+                result.statement_iri = ore_iri
+                statement = self.conn.get_ore_sword_statement(ore_iri)
+            elif atom_iri:
+                result.statement_iri = atom_iri
+                statement = self.conn.get_atom_sword_statement(atom_iri)
+            else:
+                raise Exception("No Statement IRI was found in the deposit receipt for %s" % edit_iri)
+            if statement is None:
+                raise Exception("Could not retrieve the Statement at %s" % result.statement_iri)
+        except Exception as e:
+            hv_l.error("Could not get the Statement for %s - %s", edit_iri, e)
+            result.errors.append((edit_iri, e))
+            return result, []
+
+        resources = []
+        names = set()
+        for resource in statement.resources:
+            if not resource.uri:
+                continue
+            name = _safe_name(urllib.parse.unquote(urllib.parse.urlsplit(resource.uri).path.rstrip("/").rsplit("/", 1)[-1]))
+            candidate, n = name, 1
+            while candidate in names or candidate == MANIFEST_NAME:
+                candidate = "%s.%s" % (name, n)
+                n += 1
+            names.add(candidate)
+            resources.append((resource.uri, candidate))
+        return result, resources
+
+    def _load_manifest(self, directory):
+        try:
+            with open(os.path.join(directory, MANIFEST_NAME)) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, directory, manifest):
+        path = os.path.join(directory, MANIFEST_NAME)
+        with self._manifest_lock:
+            with open(path + ".tmp", "w") as f:
+                json.dump(manifest, f, indent=1, sort_keys=True)
+            os.replace(path + ".tmp", path)
+
+    def _file_md5(self, path):
+        m = md5()
+        with open(path, "rb") as f:
+            chunk = f.read(self.buffer_size)
+            while chunk:
+                m.update(chunk)
+                chunk = f.read(self.buffer_size)
+        return m.hexdigest()
+
+    def _is_present(self, path, entry, uri):
+        if entry is None or not os.path.isfile(path):
+            return False
+        if os.path.getsize(path) != entry.get("size"):
+            return False
+        if self.verify_local and self._file_md5(path) != entry.get("md5"):
+            hv_l.info("%s does not match the checksum in the manifest, downloading it again", path)
+            return False
+        if self.verify_remote:
+            head = self.conn.head_resource(uri)
+            if head.code != 200:
+                return False
+            resp = head.response_headers
+            length = resp.get('content-length', None)
+            if length is not None and int(length) != entry.get("size"):
+                return False
+            remote_md5 = normalise_md5(resp.get('content-md5', None))
+            if remote_md5 is not None and remote_md5 != entry.get("md5"):
+                return False
+        return True
+
+    def _harvest_resource(self, result, manifest, uri, filename):
+        path = os.path.join(result.directory, filename)
+        try:
+            if self._is_present(path, manifest.get(filename), uri):
+                hv_l.debug("Skipping %s - already present at %s", uri, path)
+                result.skipped.append(path)
+                return
+            partial = path + ".part"
+            downloaded = self.conn.download_resource(uri, partial, buffer_size=self.buffer_size)
+            if getattr(downloaded, "code", None) != 200:
+                # an Error_Document, as exceptions are turned off
+                raise Exception("Server responded with %s" % getattr(downloaded, "code", None))
+            os.replace(partial, path)
+            with self._manifest_lock:
+                manifest[filename] = {"uri" : uri, "size" : downloaded.size, "md5" : downloaded.md5}
+            self._save_manifest(result.directory, manifest)
+            result.downloaded.append(path)
+        except Exception as e:
+            hv_l.error("Could not harvest %s - %s", uri, e)
+            result.errors.append((uri, e))
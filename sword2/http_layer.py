@@ -1,4 +1,11 @@
+import io
+import sys
 import json
+import threading
+import weakref
+from hashlib import md5
+from .utils import iter_chunks
+from . import tracing
 from .sword2_logging import logging
 http_l = logging.getLogger(__name__)
 
@@ -28,16 +35,97 @@ class HttpResponse(object):
 
 class HttpLayer(object):
     def __init__(self, *args, **kwargs): pass
-    def add_credentials(self, username, password): pass
+    def add_credentials(self, username, password, uri=None):
+        # `uri` is the IRI the credentials are for (the SD-IRI of a `Connection`): they should only be sent
+        # unasked to its origin (scheme, host and port)
+        pass
     def request(self, uri, method, headers=None, payload=None):
         # should return a tuple of an HttpResponse object and the content
         pass
 
+    def stream_request(self, uri, method, headers=None, payload=None):
+        # should return a tuple of an HttpResponse object and a file-like object from which
+        # the body can be read() incrementally, and which must be close()d when done with.
+        # Implementations that cannot stream fall back to reading the whole body into memory.
+        resp, content = self.request(uri, method, headers=headers, payload=payload)
+        return resp, StreamingBody(io.BytesIO(content or b""))
+
+class StreamingBody(object):
+    """File-like view onto a response body which is being streamed from the server.
+    
+    Closing it (or leaving a `with` block) also closes the connection it is being read from."""
+    def __init__(self, fp, connection=None):
+        self.fp = fp
+        self.connection = connection
+
+    def read(self, amt=None):
+        return self.fp.read(amt)
+
+    def close(self):
+        try:
+            self.fp.close()
+        finally:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
 ################################################################################
 # Default httplib2 implementation
 ################################################################################
 
-import httplib2
+# httplib2 is imported when the first request is made (see HttpLib2Layer.h), not with this module
+
+class ChunkedBody(object):
+    """A request body of unknown length (a generator, or a stream that cannot seek), to be sent with 
+    'Transfer-Encoding: chunked'. The MD5 and size of the data are worked out as it is sent.
+    
+    If `md5_trailer` is True, the MD5 is sent as a 'Content-MD5' trailer after the last chunk, by the layers that
+    are able to (`HttpLib2Layer`); the request headers should then include 'Trailer: Content-MD5'.
+    
+    It can only be sent once. If `self.progress` is set to a `sword2.progress.ProgressTracker`, each chunk is counted
+    into it as it is sent. If `self.throttle` is set, it is called with the size of each chunk before it is sent
+    (see `sword2.rate_limit`)."""
+    def __init__(self, source, chunk_size=65536, md5_trailer=False):
+        self.source = source
+        self.chunk_size = chunk_size
+        self.md5_trailer = md5_trailer
+        self.progress = None
+        self.throttle = None
+        self.size = 0
+        self.started = False
+        self.finished = False
+        self._md5 = md5()
+
+    @property
+    def md5(self):
+        return self._md5.hexdigest()
+
+    def __iter__(self):
+        if self.started:
+            raise IOError("A chunked request body can only be sent once")
+        self.started = True
+        for chunk in iter_chunks(self.source, self.chunk_size):
+            self._md5.update(chunk)
+            self.size += len(chunk)
+            if self.throttle is not None:
+                self.throttle(len(chunk))
+            if self.progress is not None:
+                self.progress.update(len(chunk))
+            yield chunk
+        self.finished = True
+        if self.progress is not None:
+            self.progress.finish()
+
+    def trailers(self):
+        if self.md5_trailer and self.finished:
+            return {'Content-MD5' : self.md5}
+        return {}
 
 class HttpLib2Response(HttpResponse):
     def __init__(self, response):
@@ -57,133 +145,405 @@ class HttpLib2Response(HttpResponse):
     def keys(self):
         return list(self.resp.keys())
 
-class HttpLib2Layer(HttpLayer):
-    def __init__(self, cache_dir=".cache", timeout=30.0, ca_certs=None):
-        self.h = httplib2.Http(cache_dir, timeout=timeout, ca_certs=ca_certs)
+class RewindingBody(object):
+    """File payload for httplib2, which sends the same body object again if it retries a request on a dropped
+    connection. Seeks back to where the payload started once it has been read to the end, so that a second
+    send is complete rather than empty."""
+    def __init__(self, f):
+        self.f = f
+        self.start = f.tell()
+
+    def read(self, amt=-1):
+        data = self.f.read(amt)
+        if not data:
+            self.f.seek(self.start)
+        return data
 
-    def add_credentials(self, username, password):
-        self.h.add_credentials(username, password)
+class HttpLib2Layer(HttpLayer):
+    def __init__(self, cache_dir=".cache", timeout=30.0, ca_certs=None, preemptive_auth=True, 
+                       expect_continue=None, continue_timeout=3.0):
+        """
+        preemptive_auth -- send the credentials as HTTP Basic auth with every request to the origin they were
+                           added for (the default), rather than waiting for a 401 challenge from the server. Answering a challenge means sending the 
+                           request twice, body and all, and so file payloads have to be held in memory to be able 
+                           to do so. Set to False for servers that use another scheme (eg Digest.) Chunked 
+                           payloads (generators and pipes) cannot be sent twice, and are still sent with Basic 
+                           credentials.
+        expect_continue -- send POST and PUT requests with a body of at least this many bytes with an 
+                           'Expect: 100-continue' header, so that the server can refuse them (too large, not 
+                           authorised, unsupported packaging and so on) before the body is uploaded. `None` (the 
+                           default) never does so.
+        continue_timeout -- how long to wait for the server to answer the headers before sending the body anyway
+        """
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.ca_certs = ca_certs
+        self.preemptive_auth = preemptive_auth
+        self.expect_continue = expect_continue
+        self.continue_timeout = continue_timeout
+        self.credentials = None
+        self.scope = None
+        # httplib2.Http objects must not be shared between threads, so each thread gets its own
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all = weakref.WeakSet()
+
+    @property
+    def h(self):
+        h = getattr(self._local, "h", None)
+        if h is None:
+            import httplib2
+            h = httplib2.Http(self.cache_dir, timeout=self.timeout, ca_certs=self.ca_certs)
+            with self._lock:
+                if self.credentials is not None and not self.preemptive_auth:
+                    h.add_credentials(*self.credentials)
+                self._all.add(h)
+            self._local.h = h
+        return h
+
+    def add_credentials(self, username, password, uri=None):
+        with self._lock:
+            if self.credentials != (username, password):
+                self.scope = OriginScope()
+            self.scope.add(uri)
+            self.credentials = (username, password)
+            if not self.preemptive_auth:
+                for h in self._all:
+                    h.add_credentials(username, password)
+
+    def _authorization(self, uri):
+        """The Authorization header to send unasked to `uri`, if it is in the scope of the credentials"""
+        credentials, scope = self.credentials, self.scope
+        if credentials is not None and scope.includes(uri):
+            return basic_auth_header(*credentials)
+        return None
 
     def request(self, uri, method, headers=None, payload=None):
+        if self.preemptive_auth:
+            authorization = self._authorization(uri)
+            if authorization is not None:
+                headers = dict(headers or {})
+                headers['Authorization'] = authorization
+        if self._expects_continue(method, headers, payload):
+            start = payload.tell() if hasattr(payload, 'read') and hasattr(payload, 'tell') else None
+            resp, content, sent = send_expecting_continue(uri, method, headers=headers, payload=payload, 
+                                                          timeout=self.timeout, ca_certs=self.ca_certs,
+                                                          continue_timeout=self.continue_timeout)
+            if resp.status != 417:
+                return resp, content
+            if sent:
+                # the body went after `continue_timeout`, so it has to be sent again from the start
+                if isinstance(payload, ChunkedBody):
+                    http_l.warning("Server does not accept 'Expect: 100-continue' (417), and the chunked body has already been sent")
+                    return resp, content
+                if start is not None:
+                    payload.seek(start)
+            http_l.info("Server does not accept 'Expect: 100-continue' (417) - sending the request again without it")
+        ranged = 'content-range' in [k.lower() for k in (headers or {})]
+        if isinstance(payload, ChunkedBody) or ranged:
+            # httplib2 cannot send a body of unknown length, and takes a 308 for a redirect (RFC 7538) - but in
+            # answer to a segment of a resumable upload (with a Content-Range) it means Resume Incomplete
+            authorization = self._authorization(uri)
+            if authorization is not None and not self.preemptive_auth:
+                # nor can these be sent a second time in answer to a 401 challenge, so they always go with 
+                # Basic credentials
+                headers = dict(headers or {})
+                headers['Authorization'] = authorization
+            return send_chunked(uri, method, headers=headers, payload=payload, timeout=self.timeout, ca_certs=self.ca_certs)
         if hasattr(payload, 'read'):
-            # Need to work out why a 401 challenge will stop httplib2 from sending the file...
-            # likely need to make it re-seek to 0...
-            # FIXME: In the meantime, read the file into memory... *sigh*
-            payload = payload.read()
-        resp, content = self.h.request(uri, method, headers=headers, body=payload)
-        return (HttpLib2Response(resp), content)
-
-################################################################################    
-# Guest urllib2 implementation
-################################################################################
-
-import urllib.request, urllib.error, urllib.parse, base64
-
-class PreemptiveBasicAuthHandler(urllib.request.HTTPBasicAuthHandler):
-    def __init__(self, username, password):
-        self.username = username
-        self.password = password
-
-    def http_request(self, request):
-        request.add_header(self.auth_header, 'Basic %s' % base64.b64encode(self.username + ':' + self.password))
-        return request
+            seekable = hasattr(payload, 'seek') and hasattr(payload, 'tell')
+            if self.preemptive_auth and seekable:
+                # no 401 challenge to answer, so the file can be streamed from disc
+                payload = RewindingBody(payload)
+            else:
+                # httplib2 has to be able to send the body again, in answer to a 401 challenge (or on a dropped
+                # connection), and can only do that from memory
+                payload = payload.read()
+        if not any(k.lower() == 'authorization' for k in headers or {}):
+            resp, content = self.h.request(uri, method, headers=headers, body=payload)
+            return (HttpLib2Response(resp), content)
+        return self._follow(uri, method, headers, payload)
+
+    def _follow(self, uri, method, headers, payload, max_redirects=5):
+        """Make a request that carries credentials, following its redirects here rather than in httplib2 (some 
+        versions of which would send the Authorization header on to wherever they lead): it goes to a redirect 
+        target only if the credentials are for its origin."""
+        h = self.h
+        h.follow_redirects = False
+        try:
+            for _ in range(max_redirects + 1):
+                resp, content = h.request(uri, method, headers=headers, body=payload)
+                location = resp.get('location')
+                if not (resp.status in REDIRECT_CODES and location and 
+                        (method in ("GET", "HEAD") or resp.status == 303)):
+                    return (HttpLib2Response(resp), content)
+                target = urllib.parse.urljoin(uri, location)
+                http_l.debug("Following a (%s) redirect from %s to %s", resp.status, uri, target)
+                if resp.status == 303:
+                    method, payload = ("HEAD" if method == "HEAD" else "GET"), None
+                headers = dict((k, v) for k, v in headers.items() if k.lower() != 'authorization')
+                authorization = self._authorization(target)
+                if authorization is not None:
+                    headers['Authorization'] = authorization
+                uri = target
+        finally:
+            h.follow_redirects = True
+        raise http.client.HTTPException("Too many redirects, last IRI was %s" % uri)
+
+    def _expects_continue(self, method, headers, payload):
+        if self.expect_continue is None or payload is None or method not in ("POST", "PUT"):
+            return False
+        if self.credentials is not None and not self.preemptive_auth:
+            # a 401 challenge has to be answered by httplib2
+            return False
+        if isinstance(payload, ChunkedBody):
+            # no telling how large it will be
+            return True
+        length = dict((k.lower(), v) for k, v in (headers or {}).items()).get('content-length')
+        return length is not None and int(length) >= self.expect_continue
+
+    def stream_request(self, uri, method, headers=None, payload=None):
+        # httplib2 always reads the whole body into memory, so go to http.client directly
+        headers = dict(headers or {})
+        authorization = self._authorization(uri)
+        if authorization is not None and self.preemptive_auth:
+            headers['Authorization'] = authorization
+        resp, body = open_stream(uri, method, headers=headers, payload=payload,
+                                 timeout=self.timeout, ca_certs=self.ca_certs)
+        if (resp.status == 401 and self.credentials is not None and not self.preemptive_auth 
+                and not hasattr(payload, 'read') and 'basic' in (resp['www-authenticate'] or '').lower()):
+            # answer the challenge - http.client knows of no other scheme than Basic
+            body.close()
+            headers['Authorization'] = basic_auth_header(*self.credentials)
+            resp, body = open_stream(uri, method, headers=headers, payload=payload,
+                                     timeout=self.timeout, ca_certs=self.ca_certs)
+        return resp, body
 
-    https_request = http_request
+################################################################################
+# Streaming support, directly on top of http.client
+################################################################################
 
-class UrlLib2Response(HttpResponse):
+import http.client
+import base64
+import select
+import urllib.parse
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+def basic_auth_header(username, password):
+    """Value for an 'Authorization' header carrying HTTP Basic credentials"""
+    token = base64.b64encode(("%s:%s" % (username, password)).encode("utf-8"))
+    return "Basic %s" % token.decode("ascii")
+
+class OriginScope(object):
+    """The origins (scheme, host and port) a set of credentials is for, as `urllib.request.HTTPPasswordMgr` keeps
+    them by IRI, so that they are not sent unasked to other hosts - content served from elsewhere, or the target of a
+    redirect. Credentials added without an IRI are for the origin of the first request made with them."""
+    def __init__(self):
+        self.origins = set()
+        self.first = True
+        self._lock = threading.Lock()
+
+    def add(self, uri=None):
+        if uri is not None:
+            with self._lock:
+                self.origins.add(_origin(uri))
+                self.first = False
+
+    def includes(self, uri):
+        origin = _origin(uri)
+        with self._lock:
+            if self.first:
+                self.origins.add(origin)
+                self.first = False
+            return origin in self.origins
+
+def connection_for(uri, timeout=None, ca_certs=None):
+    """Returns a tuple of a new `http.client` connection suitable for the given IRI, and the
+    path (with query) to request from it."""
+    parts = urllib.parse.urlsplit(uri)
+    if parts.scheme == "https":
+        import ssl
+        context = ssl.create_default_context(cafile=ca_certs)
+        conn = http.client.HTTPSConnection(parts.hostname, parts.port, timeout=timeout, context=context)
+    else:
+        conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=timeout)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    return conn, path
+
+class HttpClientResponse(HttpResponse):
     def __init__(self, response):
-        self.response = response
-        self.headers = dict(response.info())
-        self.status = int(self.response.code)
+        self.resp = response
+        self.status = int(response.status)
+        self.headers = {}
+        for k, v in response.getheaders():
+            k = k.lower()
+            if k in self.headers:
+                self.headers[k] += ", " + v
+            else:
+                self.headers[k] = v
 
     def __getitem__(self, att):
-        # needs to behave like a dictionary
-        # we need to be able to look up at least:
-
-        # content-type
-        # status
-        # location
         if att == "status":
             return self.status
-        return self.headers[att]
+        return self.headers.get(att.lower())
 
     def get(self, att, default=None):
-        # same as __getattr__ but with default return
         if att == "status":
             return self.status
-        return self.headers.get(att, default)
+        return self.headers.get(att.lower(), default)
 
     def keys(self):
-        return list(self.headers.keys()) + ["status"]
-
-# http://stackoverflow.com/questions/2502596/python-http-post-a-large-file-with-streaming
-"""
-import urllib2
-import mmap
-
-# Open the file as a memory mapped string. Looks like a string, but 
-# actually accesses the file behind the scenes. 
-f = open('somelargefile.zip','rb')
-mmapped_file_as_string = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
-
-# Do the request
-request = urllib2.Request(url, mmapped_file_as_string)
-request.add_header("Content-Type", "application/zip")
-response = urllib2.urlopen(request)
-
-#close everything
-mmapped_file_as_string.close()
-f.close()
-"""
-
-class UrlLib2Layer(HttpLayer):
-    def __init__(self, opener=None):
-        self.opener = opener
-        if self.opener is None:
-            self.opener = urllib.request.build_opener()
-
-    def add_credentials(self, username, password):
-        auth_handler = PreemptiveBasicAuthHandler(username, password)
-        current_handlers = self.opener.handlers
-        new_handlers = current_handlers + [auth_handler]
-        self.opener = urllib.request.build_opener(*new_handlers)
-
-    def request(self, uri, method, headers=None, payload=None):
-        # NOTE: payload can be a file or a string
+        return list(self.headers.keys())
 
-        if headers is None:
-            headers = {}
-        # should return a tuple of an HttpResponse object and the content
+    def __repr__(self):
+        return json.dumps({"status" : self.status, "headers" : self.headers}, indent=True)
+
+def _origin(uri):
+    parts = urllib.parse.urlsplit(uri)
+    scheme = parts.scheme.lower()
+    return scheme, (parts.hostname or "").lower(), parts.port or {"http" : 80, "https" : 443}.get(scheme)
+
+def open_stream(uri, method, headers=None, payload=None, timeout=None, ca_certs=None, max_redirects=5):
+    """Make a request with `http.client` and return as soon as the response headers have arrived, as a tuple
+    of a `HttpClientResponse` and a `StreamingBody` for the response body.
+    
+    Redirects are followed for GET and HEAD requests. The Authorization header is dropped if a redirect leads to 
+    another scheme, host or port."""
+    headers = dict(headers or {})
+    for _ in range(max_redirects + 1):
+        conn, path = connection_for(uri, timeout=timeout, ca_certs=ca_certs)
         try:
-            if method == "GET":
-                req = urllib.request.Request(uri, None, headers)
-                response = self.opener.open(req)
-                return UrlLib2Response(response), response.read()
-            elif method == "POST":
-                req = urllib.request.Request(uri, payload, headers)
-                response = self.opener.open(req)
-                return UrlLib2Response(response), response.read()
-            elif method == "PUT":
-                req = urllib.request.Request(uri, payload, headers)
-                # monkey-patch the request method (which seems to be the fastest
-                # way to do this)
-                req.get_method = lambda: 'PUT'
-                response = self.opener.open(req)
-                return UrlLib2Response(response), response.read()
-            elif method == "DELETE":
-                req = urllib.request.Request(uri, None, headers)
-                # monkey-patch the request method (which seems to be the fastest
-                # way to do this)
-                req.get_method = lambda: 'DELETE'
-                response = self.opener.open(req)
-                return UrlLib2Response(response), response.read()
+            conn.request(method, path, body=payload, headers=headers)
+            tracing.mark("sent")
+            response = conn.getresponse()
+            tracing.mark("headers")
+        except Exception:
+            conn.close()
+            raise
+        location = response.getheader("location")
+        if response.status in REDIRECT_CODES and location and method in ("GET", "HEAD"):
+            http_l.debug("Following a (%s) redirect from %s to %s", response.status, uri, location)
+            response.close()
+            conn.close()
+            target = urllib.parse.urljoin(uri, location)
+            if _origin(target) != _origin(uri):
+                for k in [k for k in headers if k.lower() == "authorization"]:
+                    del headers[k]
+            uri = target
+            continue
+        return HttpClientResponse(response), StreamingBody(response, conn)
+    raise http.client.HTTPException("Too many redirects, last IRI was %s" % uri)
+
+class _PrefixedReader(io.RawIOBase):
+    """Returns `prefix`, then the rest of `fp` - used to hand a status line that has already been read back to
+    `http.client.HTTPResponse`"""
+    def __init__(self, prefix, fp):
+        self.prefix = prefix
+        self.fp = fp
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self.prefix:
+            n = min(len(b), len(self.prefix))
+            b[:n] = self.prefix[:n]
+            self.prefix = self.prefix[n:]
+            return n
+        return self.fp.readinto(b)
+
+class _ReaderSocket(object):
+    def __init__(self, fp):
+        self.fp = fp
+
+    def makefile(self, mode, *args, **kwargs):
+        return self.fp
+
+def send_expecting_continue(uri, method, headers=None, payload=None, timeout=None, ca_certs=None, continue_timeout=3.0):
+    """Make a request with an 'Expect: 100-continue' header, sending only the headers at first. The body follows
+    once the server answers with a 100 (Continue), or after `continue_timeout` seconds without an answer, as not
+    every server supports it. If the server answers with a final status instead (eg 401, 413 or 415), the request 
+    ends there and the body is never sent.
+    
+    Returns a tuple of (`HttpClientResponse`, response body, whether the request body was sent)"""
+    conn, path = connection_for(uri, timeout=timeout, ca_certs=ca_certs)
+    try:
+        conn.putrequest(method, path, skip_accept_encoding=True)
+        for k, v in (headers or {}).items():
+            conn.putheader(k, v)
+        conn.putheader("Expect", "100-continue")
+        conn.endheaders()
+        ready, _, _ = select.select([conn.sock], [], [], continue_timeout)
+        if ready:
+            fp = conn.sock.makefile("rb")
+            line = fp.readline(65537)
+            status = line.split(None, 2)[1:2]
+            if status == [b"100"]:
+                http.client.parse_headers(fp)   # interim response headers are of no interest
             else:
-                raise NotImplementedError()
-        except urllib.error.HTTPError as e:
-            try:
-                # treat it like a normal response
-                return UrlLib2Response(e), e.read()
-            except Exception as e:
-                # unable to read()
-                return UrlLib2Response(e), None
+                response = http.client.HTTPResponse(_ReaderSocket(io.BufferedReader(_PrefixedReader(line, fp))),
+                                                    method=method)
+                response.begin()
+                tracing.mark("headers")
+                http_l.info("Server answered with a (%s) before the body of the %s to %s was sent", response.status, method, uri)
+                return HttpClientResponse(response), response.read(), False
+        else:
+            http_l.debug("No interim response from %s after %ss - sending the body anyway", uri, continue_timeout)
+        send_body(conn, payload)
+        tracing.mark("sent")
+        response = conn.getresponse()
+        tracing.mark("headers")
+        return HttpClientResponse(response), response.read(), True
+    finally:
+        conn.close()
+
+def send_body(conn, payload):
+    """Send a request body on a `http.client` connection whose headers have been sent - framing it in chunks, 
+    followed by any trailers, if it is a `ChunkedBody`"""
+    if isinstance(payload, ChunkedBody):
+        for chunk in payload:
+            conn.send(b"%X\r\n" % len(chunk) + chunk + b"\r\n")
+        trailers = "".join("%s: %s\r\n" % (k, v) for k, v in payload.trailers().items())
+        conn.send(b"0\r\n" + trailers.encode("latin-1") + b"\r\n")
+    elif payload is not None:
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        conn.send(payload)
+
+def send_chunked(uri, method, headers=None, payload=None, timeout=None, ca_certs=None):
+    """Send a request with a `ChunkedBody` using `http.client`, which (unlike httplib2) can send a body of unknown 
+    length. Other payloads (`bytes` or files) are sent as they are. Returns a tuple of (`HttpClientResponse`, 
+    response body)"""
+    conn, path = connection_for(uri, timeout=timeout, ca_certs=ca_certs)
+    try:
+        conn.putrequest(method, path, skip_accept_encoding=True)
+        for k, v in (headers or {}).items():
+            conn.putheader(k, v)
+        conn.endheaders()
+        send_body(conn, payload)
+        tracing.mark("sent")
+        response = conn.getresponse()
+        tracing.mark("headers")
+        return HttpClientResponse(response), response.read()
+    finally:
+        conn.close()
+
+################################################################################
+# Guest urllib2 implementation: in sword2.urllib_layer, which is only imported
+# (along with urllib.request) when it is asked for
+################################################################################
+
+_URLLIB_NAMES = ('UrlLib2Layer', 'UrlLib2Response', 'PreemptiveBasicAuthHandler')
+
+def __getattr__(name):
+    if name in _URLLIB_NAMES:
+        from . import urllib_layer
+        return getattr(urllib_layer, name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
+if sys.version_info < (3, 7):
+    # no module __getattr__ (PEP 562)
+    from .urllib_layer import UrlLib2Layer, UrlLib2Response, PreemptiveBasicAuthHandler
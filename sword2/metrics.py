@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Latency histograms and byte counts for each kind of request that a `sword2.Connection` makes.
+
+Every request is counted into the `Metrics` of its `Connection` under the name of its operation ("Col_IRI POST",
+"EM_IRI PUT", "Cont_IRI GET" and so on): how long it took, how many bytes were sent and received, its HTTP status
+and how many times it was retried. The time taken to parse service documents, deposit receipts and statements,
+the requests in flight and the hits and misses of the deposit receipt cache are counted too.
+Durations go into a `Histogram` of logarithmic buckets, each 5% wider than the last, so that its memory is fixed
+(a few hundred counters, from a microsecond to an hour) however many requests are counted, and percentiles are
+accurate to within 5%. Everything is thread-safe, and one `Metrics` can be shared by several connections.
+
+See `sword2.prometheus` to export them in the Prometheus text format.
+
+Usage:
+
+>>> from sword2 import Connection
+>>> conn = Connection("http://localhost:8080/sd-uri")
+>>> ...
+>>> conn.metrics.operation("Col_IRI POST").summary()
+{'count': 120000, 'mean': 0.212, 'p50': 0.187, 'p95': 0.402, 'p99': 0.871, 'max': 2.2, 'bytes_sent': 6291456000,
+ 'bytes_received': 148800000}
+>>> print(conn.metrics)
+operation                         count      p50      p95      p99      max     sent MB     recv MB
+Col_IRI POST                     120000    0.187    0.402    0.871    2.200    6291.456     148.800
+...
+"""
+
+import math
+import threading
+
+class Histogram(object):
+    """Counts of values in logarithmic buckets: bucket `i` (from 1) holds the values from `lowest * factor**(i-1)`
+    up to `lowest * factor**i`, bucket 0 those below `lowest`, and the last one those above `highest`."""
+    def __init__(self, lowest=1e-6, highest=3600.0, precision=0.05):
+        self.lowest = lowest
+        self.highest = highest
+        self.factor = 1.0 + precision
+        self._log_factor = math.log(self.factor)
+        self.buckets = [0] * (int(math.ceil(math.log(highest / lowest) / self._log_factor)) + 2)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        if value < self.lowest:
+            return 0
+        return min(len(self.buckets) - 1, int(math.log(value / self.lowest) / self._log_factor) + 1)
+
+    def record(self, value):
+        i = self._index(value)
+        with self._lock:
+            self.buckets[i] += 1
+            self.count += 1
+            self.sum += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def percentile(self, q):
+        """The `q`th percentile (0-100) of the values, as the middle of the bucket it falls in (and so to within
+        the precision of the buckets; below `lowest` the smallest value, above `highest` the largest), or `None` if there are no values"""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = max(1, int(math.ceil(q / 100.0 * self.count)))
+            seen = 0
+            for i, n in enumerate(self.buckets):
+                seen += n
+                if seen >= rank:
+                    break
+            if i == 0:
+                value = self.min
+            elif i == len(self.buckets) - 1:
+                value = self.max
+            else:
+                value = self.lowest * self.factor ** (i - 1) * math.sqrt(self.factor)
+            return min(max(value, self.min), self.max)
+
+    def cumulative(self, bounds):
+        """`(count, sum, [number of values up to each of bounds])`, as of now - a value counts as up to a bound if
+        the whole of its bucket is"""
+        with self._lock:
+            buckets, count, total = list(self.buckets), self.count, self.sum
+        counts = []
+        seen, i = 0, 0
+        for bound in sorted(bounds):
+            # bucket i ends at lowest * factor**i
+            while i < len(buckets) - 1 and self.lowest * self.factor ** i <= bound * (1 + 1e-9):
+                seen += buckets[i]
+                i += 1
+            counts.append(seen)
+        return count, total, counts
+
+    def reset(self):
+        with self._lock:
+            self.buckets = [0] * len(self.buckets)
+            self.count = 0
+            self.sum = 0.0
+            self.min = self.max = None
+
+class OperationMetrics(object):
+    """The latency `Histogram` (in seconds), byte counts, responses by status and retries of one kind of request"""
+    def __init__(self, name):
+        self.name = name
+        self.latency = Histogram()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.statuses = {}          # HTTP status -> number of responses
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    @property
+    def count(self):
+        return self.latency.count
+
+    def observe(self, seconds, sent=0, received=0, status=None, retries=0):
+        self.latency.record(seconds)
+        with self._lock:
+            self.bytes_sent += sent or 0
+            self.bytes_received += received or 0
+            self.retries += retries or 0
+            if status is not None:
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def summary(self):
+        h = self.latency
+        return {'count':h.count, 'mean':h.mean, 'p50':h.percentile(50), 'p95':h.percentile(95),
+                'p99':h.percentile(99), 'max':h.max, 'bytes_sent':self.bytes_sent,
+                'bytes_received':self.bytes_received, 'retries':self.retries, 'statuses':dict(self.statuses)}
+
+class Metrics(object):
+    """A registry of `OperationMetrics`, by the name of the operation"""
+    def __init__(self):
+        self._operations = {}
+        self._parsing = {}          # kind of document -> Histogram of parse times
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def operation(self, name):
+        op = self._operations.get(name)
+        if op is None:
+            with self._lock:
+                op = self._operations.setdefault(name, OperationMetrics(name))
+        return op
+
+    def observe(self, name, seconds, sent=0, received=0, status=None, retries=0):
+        """Counts a request of the operation `name`, which took `seconds`, sent and received so many bytes, and
+        got a response with `status` after so many `retries`"""
+        self.operation(name).observe(seconds, sent, received, status, retries)
+
+    def parsing(self, document):
+        h = self._parsing.get(document)
+        if h is None:
+            with self._lock:
+                h = self._parsing.setdefault(document, Histogram())
+        return h
+
+    def observe_parse(self, document, seconds):
+        """Counts the parsing of a `document` ("service_document", "deposit_receipt", "statement"...)"""
+        self.parsing(document).record(seconds)
+
+    @property
+    def documents(self):
+        with self._lock:
+            return sorted(self._parsing)
+
+    def started(self):
+        """A request has been sent, and is in flight until `finished` is called"""
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def cache_lookup(self, hit):
+        """Counts a lookup in the deposit receipt cache"""
+        with self._lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    @property
+    def operations(self):
+        with self._lock:
+            return sorted(self._operations)
+
+    def summary(self):
+        return dict((name, self.operation(name).summary()) for name in self.operations)
+
+    def reset(self):
+        """Forgets everything but the requests in flight"""
+        with self._lock:
+            self._operations = {}
+            self._parsing = {}
+            self.cache_hits = self.cache_misses = 0
+
+    def __str__(self):
+        lines = ["%-30s %8s %8s %8s %8s %8s %11s %11s" % ("operation", "count", "p50", "p95", "p99", "max",
+                                                         "sent MB", "recv MB")]
+        fmt = lambda v: "%8.3f" % v if v is not None else "%8s" % "-"
+        for name, s in sorted(self.summary().items()):
+            lines.append("%-30s %8d %s %s %s %s %11.3f %11.3f" % (name[:30], s['count'], fmt(s['p50']), fmt(s['p95']),
+                                                                 fmt(s['p99']), fmt(s['max']), s['bytes_sent'] / 1e6,
+                                                                 s['bytes_received'] / 1e6))
+        return "\n".join(lines)
@@ -0,0 +1,503 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Builds SimpleZip and BagIt packages on the fly, as the body of an upload.
+
+A package is an iterable of `bytes` chunks, so it can be passed straight to `Connection.create` (or `update`,
+`append`...) as the `payload`. The zip is written as it is sent, one source file at a time, and is never held in
+memory or spooled to disc. The packaging URI, mimetype and filename are filled in from the package if they are
+not given, and the checksums of each file are computed in the same pass that reads it.
+
+As the size of the package is not known up front, it is sent with `Transfer-Encoding: chunked` (see
+`sword2.http_layer.ChunkedBody`).
+
+Usage:
+
+>>> from sword2 import Connection, SimpleZipPackage, BagItPackage
+>>> conn = Connection("http://localhost:8080/sd-uri", user_name="sword", user_pass="sword")
+>>> package = SimpleZipPackage(["thesis.pdf", "data/"], filename="thesis.zip")
+>>> receipt = conn.create(col_iri="http://localhost:8080/col-uri/43", payload=package)
+>>> package.checksums
+{'thesis.pdf': '9e107d9d372bb6826bd81d3542a419d6', 'data/results.csv': ...}
+
+>>> bag = BagItPackage(["thesis.pdf"], bag_info={"Source-Organization": "Example University"})
+>>> receipt = conn.create(col_iri="http://localhost:8080/col-uri/43", payload=bag)
+
+Preparing packages in parallel:
+
+Compressing and hashing the members of a package is CPU-bound. `package.prepare(executor)` does it for each member 
+in parallel, in a `concurrent.futures.ProcessPoolExecutor`, and returns a `PreparedPackage` - a seekable file-like
+view of the finished zip, whose size and MD5 are known before it is sent (so it is sent with a Content-Length and
+Content-MD5, rather than chunked). The price is scratch disc space: the compressed members are spooled to temporary
+files until the package has been sent. See `sword2.pipeline.DepositPipeline` to prepare one deposit while the one 
+before it is uploading.
+"""
+
+import io
+import os
+import zlib
+import queue
+import bisect
+import shutil
+import struct
+import hashlib
+import zipfile
+import tempfile
+import threading
+from datetime import date
+
+from .resource_stream import DEFAULT_CHUNK_SIZE
+
+from .sword2_logging import logging
+pb_l = logging.getLogger(__name__)
+
+class _Sink(io.RawIOBase):
+    """Write-only, non-seekable file that `zipfile` writes into, and which the package drains after each write"""
+    def __init__(self):
+        self.data = bytearray()
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.data += b
+        self.position += len(b)
+        return len(b)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = bytes(self.data)
+        del self.data[:]
+        return data
+
+def _prepare_member(path, compression, algorithms, chunk_size, tmp_dir):
+    """Compress (if deflating) and hash a file, in a worker process. Returns a tuple of (CRC32, size, compressed 
+    size, {algorithm: hex digest}, path of the compressed data)."""
+    crc = 0
+    size = 0
+    hashes = [hashlib.new(a) for a in algorithms]
+    out = None
+    if compression == zipfile.ZIP_DEFLATED:
+        fd, data_path = tempfile.mkstemp(suffix=".deflate", dir=tmp_dir)
+        out = os.fdopen(fd, "wb")
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    else:
+        data_path = path
+    with open(path, "rb") as src:
+        data = src.read(chunk_size)
+        while data:
+            crc = zlib.crc32(data, crc)
+            size += len(data)
+            for h in hashes:
+                h.update(data)
+            if out is not None:
+                out.write(compressor.compress(data))
+            data = src.read(chunk_size)
+    if out is not None:
+        out.write(compressor.flush())
+        out.close()
+        compress_size = os.path.getsize(data_path)
+    else:
+        compress_size = size
+    return crc, size, compress_size, dict((a, h.hexdigest()) for a, h in zip(algorithms, hashes)), data_path
+
+# the zip records that `prepare` writes itself, around members compressed elsewhere (APPNOTE.TXT, 4.3)
+LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+END_OF_CENTRAL_DIR = struct.Struct("<IHHHHIIH")
+ZIP64_END_OF_CENTRAL_DIR = struct.Struct("<IQHHIIQQQQ")
+ZIP64_LOCATOR = struct.Struct("<IIQI")
+ZIP64_EXTRA = 0x0001
+UTF8_NAMES = 0x800
+MAX_32 = 0xFFFFFFFF
+MAX_16 = 0xFFFF
+
+def _dos_time(date_time):
+    year, month, day, hour, minute, second = date_time[:6]
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+def _encoded_name(zinfo):
+    try:
+        return zinfo.filename.encode("ascii"), 0
+    except UnicodeEncodeError:
+        return zinfo.filename.encode("utf-8"), UTF8_NAMES
+
+def _versions(zinfo, zip64):
+    """(version made by, version needed to extract) for a member"""
+    needed = 45 if zip64 else (20 if zinfo.compress_type == zipfile.ZIP_DEFLATED else 10)
+    return (zinfo.create_system << 8) | max(needed, 20), needed
+
+def _local_header(zinfo):
+    """The local file header of a member whose CRC and sizes are known, from the public fields of its `ZipInfo`"""
+    name, flags = _encoded_name(zinfo)
+    zip64 = zinfo.file_size >= MAX_32 or zinfo.compress_size >= MAX_32
+    extra = struct.pack("<HHQQ", ZIP64_EXTRA, 16, zinfo.file_size, zinfo.compress_size) if zip64 else b""
+    dostime, dosdate = _dos_time(zinfo.date_time)
+    return LOCAL_HEADER.pack(0x04034b50, _versions(zinfo, zip64)[1], flags, zinfo.compress_type, dostime, dosdate,
+                             zinfo.CRC, MAX_32 if zip64 else zinfo.compress_size,
+                             MAX_32 if zip64 else zinfo.file_size, len(name), len(extra)) + name + extra
+
+def _central_directory(members, offset):
+    """The central directory and end records for `members`, a list of (`ZipInfo`, offset of its local header), 
+    starting at `offset`"""
+    records = []
+    for zinfo, header_offset in members:
+        name, flags = _encoded_name(zinfo)
+        large = [n for n in (zinfo.file_size, zinfo.compress_size, header_offset) if n >= MAX_32]
+        extra = struct.pack("<HH%dQ" % len(large), ZIP64_EXTRA, 8 * len(large), *large) if large else b""
+        made_by, needed = _versions(zinfo, bool(large))
+        dostime, dosdate = _dos_time(zinfo.date_time)
+        records.append(CENTRAL_HEADER.pack(0x02014b50, made_by, needed, flags, zinfo.compress_type, dostime, dosdate,
+                                           zinfo.CRC, min(zinfo.compress_size, MAX_32), min(zinfo.file_size, MAX_32),
+                                           len(name), len(extra), 0, 0, zinfo.internal_attr, zinfo.external_attr,
+                                           min(header_offset, MAX_32)) + name + extra)
+    directory = b"".join(records)
+    count, size = len(members), len(directory)
+    end = b""
+    if count >= MAX_16 or size >= MAX_32 or offset >= MAX_32:
+        end = ZIP64_END_OF_CENTRAL_DIR.pack(0x06064b50, ZIP64_END_OF_CENTRAL_DIR.size - 12, 45, 45, 0, 0, count, 
+                                            count, size, offset)
+        end += ZIP64_LOCATOR.pack(0x07064b50, 0, offset + size, 1)
+    end += END_OF_CENTRAL_DIR.pack(0x06054b50, 0, 0, min(count, MAX_16), min(count, MAX_16), min(size, MAX_32),
+                                   min(offset, MAX_32), 0)
+    return directory + end
+
+class _Hasher(threading.Thread):
+    """Works out the MD5 of a prepared package from its parts (`bytes`, or (path, length) tuples), in order, as
+    they are laid out - so that it goes along with the compression of the members after them"""
+    def __init__(self, chunk_size):
+        threading.Thread.__init__(self, name="sword2-package-md5", daemon=True)
+        self.chunk_size = chunk_size
+        self.md5 = hashlib.md5()
+        self.parts = queue.Queue()
+        self.error = None
+        self.start()
+
+    def run(self):
+        part = self.parts.get()
+        while part is not None:
+            try:
+                if self.error is not None:
+                    pass
+                elif isinstance(part, bytes):
+                    self.md5.update(part)
+                else:
+                    with open(part[0], "rb") as f:
+                        chunk = f.read(self.chunk_size)
+                        while chunk:
+                            self.md5.update(chunk)
+                            chunk = f.read(self.chunk_size)
+            except Exception as e:
+                self.error = e
+            part = self.parts.get()
+
+    def stop(self):
+        self.parts.put(None)
+        self.join()
+
+    def hexdigest(self):
+        self.stop()
+        if self.error is not None:
+            raise self.error
+        return self.md5.hexdigest()
+
+def _compress_bytes(data, compression):
+    if compression == zipfile.ZIP_DEFLATED:
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        return compressor.compress(data) + compressor.flush()
+    return data
+
+class PreparedPackage(io.RawIOBase):
+    """A zip package whose members have been compressed and hashed ahead of time (see `SimpleZipPackage.prepare`).
+    
+    Reads as the finished zip, from the zip headers (held in memory) and the compressed data of each member (held 
+    in temporary files, or read from the source file for stored members). It is seekable, so can be resent.
+
+    `self.size`       -- size of the package in bytes
+    `self.md5`        -- hex MD5 of the whole package (`None` if it was not computed)
+    `self.checksums`  -- as for `SimpleZipPackage.checksums`
+    
+    `close()` removes the temporary files."""
+    def __init__(self, package, segments, tmp_dir, md5=None):
+        io.RawIOBase.__init__(self)
+        self.packaging = package.packaging
+        self.mimetype = package.mimetype
+        self.filename = package.filename
+        self.digests = package.digests
+        self.checksums = package.checksums
+        self.md5 = md5
+        self._segments = segments   # `bytes`, or (path, length) tuples
+        self._starts = []
+        offset = 0
+        for seg in segments:
+            self._starts.append(offset)
+            offset += len(seg) if isinstance(seg, bytes) else seg[1]
+        self.size = offset
+        self._tmp_dir = tmp_dir
+        self._pos = 0
+        self._fh = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def readinto(self, b):
+        if self._pos >= self.size:
+            return 0
+        i = bisect.bisect_right(self._starts, self._pos) - 1
+        seg = self._segments[i]
+        offset = self._pos - self._starts[i]
+        if isinstance(seg, bytes):
+            data = seg[offset:offset + len(b)]
+        else:
+            path, length = seg
+            if self._fh is None or self._fh.name != path:
+                if self._fh is not None:
+                    self._fh.close()
+                self._fh = open(path, "rb")
+            self._fh.seek(offset)
+            data = self._fh.read(min(len(b), length - offset))
+            if not data:
+                raise IOError("%s is shorter than when it was prepared" % path)
+        n = len(data)
+        b[:n] = data
+        self._pos += n
+        return n
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        if self._tmp_dir is not None:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+            self._tmp_dir = None
+        io.RawIOBase.close(self)
+
+class SimpleZipPackage(object):
+    packaging = "http://purl.org/net/sword/package/SimpleZip"
+    mimetype = "application/zip"
+
+    def __init__(self, files, filename="package.zip", compression=zipfile.ZIP_DEFLATED, algorithms=("md5",),
+                       chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+Parameters:
+
+    files        -- `list` of the files to put into the package: paths, or (path, name in the package) tuples.
+                    Directories are added with all of the files beneath them.
+    filename     -- file name of the package, for the Content-Disposition of the upload
+    compression  -- `zipfile.ZIP_DEFLATED` (default) or `zipfile.ZIP_STORED`; storing is faster for content that
+                    is already compressed
+    algorithms   -- the `hashlib` algorithms to compute the checksum of each file with
+    chunk_size   -- size of the reads from each file
+
+After the package has been sent, `self.checksums` is a `dict` of the name of each file in the package to its
+checksum (the first of `algorithms`), `self.digests` holds all of them, and `self.size` is the size of the package.
+        """
+        self.files = files
+        self.filename = filename
+        self.compression = compression
+        self.algorithms = tuple(algorithms)
+        self.chunk_size = chunk_size
+        self.digests = {}
+        self.size = 0
+
+    @property
+    def checksums(self):
+        return dict((name, digests[self.algorithms[0]]) for name, digests in self.digests.items())
+
+    def entries(self):
+        """Returns a `list` of (path, name in the package) tuples, one for each file to be packaged.
+        
+        Raises `ValueError` if two files would have the same name in the package."""
+        entries = list(self._walk())
+        seen = set()
+        for path, name in entries:
+            if name in seen:
+                raise ValueError("More than one file would be packaged as %s - give them (path, name) tuples" % name)
+            seen.add(name)
+        return entries
+
+    def _walk(self):
+        for f in self.files:
+            path, name = f if isinstance(f, tuple) else (f, None)
+            path = os.path.normpath(path)
+            if name is None:
+                name = os.path.basename(path)
+            if os.path.isdir(path):
+                for root, dirs, filenames in os.walk(path):
+                    dirs.sort()
+                    for filename in sorted(filenames):
+                        full = os.path.join(root, filename)
+                        yield full, "/".join([name] + os.path.relpath(full, path).split(os.sep))
+            else:
+                yield path, name
+
+    def member_name(self, name):
+        """Where a file is put in the zip"""
+        return name
+
+    def tag_files(self):
+        """Any extra files to add to the end of the zip, as (name, `bytes`) tuples"""
+        return []
+
+    def __iter__(self):
+        sink = _Sink()
+        self.digests = {}
+        self.size = 0
+        entries = self.entries()    # before anything is sent
+        with zipfile.ZipFile(sink, "w", compression=self.compression) as zf:
+            for path, name in entries:
+                for chunk in self._add_file(zf, sink, path, name):
+                    yield chunk
+            for name, data in self.tag_files():
+                zf.writestr(self.member_name(name), data)
+                chunk = sink.take()
+                self.size += len(chunk)
+                yield chunk
+        chunk = sink.take()   # the central directory
+        self.size += len(chunk)
+        pb_l.info("Packaged %s files into %s bytes", len(self.digests), self.size)
+        yield chunk
+
+    def prepare(self, executor, tmp_dir=None, compute_md5=True):
+        """Compress and hash the files of the package in parallel, as jobs for `executor` (eg a
+        `concurrent.futures.ProcessPoolExecutor`), and lay out the zip around them.
+        
+        Returns a `PreparedPackage`. The compressed data of each member is spooled to a temporary directory (in 
+        `tmp_dir`, if given) until the `PreparedPackage` is closed, so unlike iterating over the package this 
+        needs scratch space for up to the size of the package, and writes the compressed data once more.
+
+        The MD5 of the whole package (`compute_md5`) cannot be split up between processes: it is worked out in
+        a thread of its own, member by member as each one comes back from `executor`, so that it overlaps with the 
+        compression of the members after it.
+        
+        The zip headers and central directory are written here, from the `ZipInfo` of each member."""
+        work_dir = tempfile.mkdtemp(prefix="sword2-package-", dir=tmp_dir)
+        hasher = _Hasher(self.chunk_size) if compute_md5 else None
+        segments = []
+        members = []
+        position = [0]
+
+        def add(zinfo, crc, size, compress_size, data):
+            zinfo.compress_type = self.compression
+            zinfo.CRC = crc
+            zinfo.file_size = size
+            zinfo.compress_size = compress_size
+            members.append((zinfo, position[0]))
+            header = _local_header(zinfo)
+            parts = [header, data if isinstance(data, bytes) else (data, compress_size)]
+            segments.extend(parts)
+            position[0] += len(header) + compress_size
+            if hasher is not None:
+                for part in parts:
+                    hasher.parts.put(part)
+
+        try:
+            self.digests = {}
+            entries = self.entries()
+            futures = [executor.submit(_prepare_member, path, self.compression, self.algorithms, self.chunk_size, work_dir)
+                       for path, name in entries]
+            for (path, name), f in zip(entries, futures):
+                crc, size, compress_size, digests, data_path = f.result()
+                self.digests[name] = digests
+                add(zipfile.ZipInfo.from_file(path, self.member_name(name)), crc, size, compress_size, data_path)
+            for name, data in self.tag_files():
+                compressed = _compress_bytes(data, self.compression)
+                add(zipfile.ZipInfo(self.member_name(name), date_time=date.today().timetuple()[:6]),
+                    zlib.crc32(data), len(data), len(compressed), compressed)
+            segments.append(_central_directory(members, position[0]))
+            if hasher is not None:
+                hasher.parts.put(segments[-1])
+                package_md5 = hasher.hexdigest()
+        except BaseException:
+            if hasher is not None:
+                hasher.stop()
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+        prepared = PreparedPackage(self, segments, work_dir, md5=package_md5 if compute_md5 else None)
+        self.size = prepared.size
+        pb_l.info("Prepared %s files into %s bytes", len(entries), prepared.size)
+        return prepared
+
+    def _add_file(self, zf, sink, path, name):
+        zinfo = zipfile.ZipInfo.from_file(path, self.member_name(name))
+        zinfo.compress_type = self.compression
+        hashes = [hashlib.new(a) for a in self.algorithms]
+        with open(path, "rb") as src, zf.open(zinfo, "w") as dest:
+            data = src.read(self.chunk_size)
+            while data:
+                dest.write(data)
+                for h in hashes:
+                    h.update(data)
+                chunk = sink.take()
+                if chunk:
+                    self.size += len(chunk)
+                    yield chunk
+                data = src.read(self.chunk_size)
+        chunk = sink.take()
+        if chunk:
+            self.size += len(chunk)
+            yield chunk
+        self.digests[name] = dict((a, h.hexdigest()) for a, h in zip(self.algorithms, hashes))
+
+class BagItPackage(SimpleZipPackage):
+    packaging = "http://purl.org/net/sword/package/BagIt"
+
+    def __init__(self, files, filename="bag.zip", bag_name="bag", bag_info=None, compression=zipfile.ZIP_DEFLATED,
+                       algorithms=("sha256",), chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+A BagIt bag (RFC 8493), serialised as a zip with a single top-level directory, `bag_name`. The files are put in
+its `data/` directory, and the payload manifests (one for each of `algorithms`) are written at the end of the zip
+from the checksums computed as the files were read, along with `bagit.txt`, `bag-info.txt` (`bag_info`, plus the
+Bagging-Date and Payload-Oxum) and the tag manifests.
+
+Other parameters are as for `SimpleZipPackage`.
+        """
+        SimpleZipPackage.__init__(self, files, filename=filename, compression=compression, algorithms=algorithms,
+                                  chunk_size=chunk_size)
+        self.bag_name = bag_name
+        self.bag_info = bag_info or {}
+        self._sizes = {}
+
+    def member_name(self, name):
+        return "%s/%s" % (self.bag_name, name)
+
+    def entries(self):
+        entries = SimpleZipPackage.entries(self)
+        self._sizes = dict((name, os.path.getsize(path)) for path, name in entries)
+        return [(path, "data/" + name) for path, name in entries]
+
+    def _encode_path(self, name):
+        return name.replace("%", "%25").replace("\r", "%0D").replace("\n", "%0A")
+
+    def tag_files(self):
+        info = {"Bagging-Date" : date.today().isoformat(),
+                "Payload-Oxum" : "%s.%s" % (sum(self._sizes.values()), len(self._sizes))}
+        info.update(self.bag_info)
+        tags = [("bagit.txt", b"BagIt-Version: 1.0\nTag-File-Character-Encoding: UTF-8\n"),
+                ("bag-info.txt", "".join("%s: %s\n" % (k, v) for k, v in info.items()).encode("utf-8"))]
+        for a in self.algorithms:
+            manifest = "".join("%s  %s\n" % (digests[a], self._encode_path(name)) for name, digests in self.digests.items())
+            tags.append(("manifest-%s.txt" % a, manifest.encode("utf-8")))
+        for a in self.algorithms:
+            manifest = "".join("%s  %s\n" % (hashlib.new(a, data).hexdigest(), name) for name, data in tags
+                               if not name.startswith("tagmanifest-"))
+            tags.append(("tagmanifest-%s.txt" % a, manifest.encode("utf-8")))
+        return tags
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Pipelined deposit of many packages, preparing the next deposit while the current one is uploading.
+
+Compressing and hashing a package is CPU-bound, and uploading it is bound by the network, so doing one after the
+other leaves one of them idle. The `DepositPipeline` compresses and hashes the files of each package in a pool of
+worker processes (see `SimpleZipPackage.prepare`), and does so for the next `prefetch` deposits while the
+`Connection` is sending the current one. Plain files are hashed in the pool in the same way, so that the
+`Connection` does not have to read them twice.
+
+Each job is a `dict` of the keyword arguments for `Connection.create` (or for `update` or `append`, if the job has
+a "method" key naming it). Its `payload` may be a `SimpleZipPackage` (or `BagItPackage`), or the path of a file.
+
+Usage:
+
+>>> from sword2 import Connection, SimpleZipPackage
+>>> from sword2.pipeline import DepositPipeline
+>>> conn = Connection("http://localhost:8080/sd-uri", user_name="sword", user_pass="sword")
+>>> jobs = [{"col_iri" : col_iri, "payload" : SimpleZipPackage([d])} for d in directories]
+>>> with DepositPipeline(conn, processes=4) as pipeline:
+...     for job, receipt in pipeline.deposit(jobs):
+...         print(receipt.edit)
+"""
+
+import os
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .package_builder import SimpleZipPackage
+from .resource_stream import DEFAULT_CHUNK_SIZE
+
+from .sword2_logging import logging
+pl_l = logging.getLogger(__name__)
+
+def _file_md5(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """MD5 of a file, in a worker process"""
+    m = hashlib.md5()
+    with open(path, "rb") as f:
+        data = f.read(chunk_size)
+        while data:
+            m.update(data)
+            data = f.read(chunk_size)
+    return m.hexdigest()
+
+class DepositPipeline(object):
+    def __init__(self, conn, processes=None, prefetch=1, tmp_dir=None, executor=None):
+        """
+Parameters:
+
+    conn       -- the `sword2.Connection` to deposit through
+    processes  -- number of worker processes to compress and hash with (default: the number of CPUs)
+    prefetch   -- how many deposits to prepare ahead of the one being uploaded
+    tmp_dir    -- where to keep the compressed data of packages until they have been sent (default: the system's
+                  temporary directory)
+    executor   -- a `concurrent.futures` executor to use instead of starting a `ProcessPoolExecutor` of its own
+        """
+        self.conn = conn
+        self.prefetch = max(1, prefetch)
+        self.tmp_dir = tmp_dir
+        self._own_executor = executor is None
+        self.executor = executor or ProcessPoolExecutor(processes)
+        self._preparers = ThreadPoolExecutor(self.prefetch)
+
+    def close(self):
+        self._preparers.shutdown()
+        if self._own_executor:
+            self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _prepare(self, job):
+        """Returns the keyword arguments for the deposit, with the payload ready to send"""
+        kw = dict(job)
+        kw.pop("method", None)
+        payload = kw.get("payload")
+        if isinstance(payload, SimpleZipPackage):
+            kw["payload"] = payload.prepare(self.executor, tmp_dir=self.tmp_dir)
+        elif isinstance(payload, str):
+            if kw.get("md5sum") is None:
+                kw["md5sum"] = self.executor.submit(_file_md5, payload).result()
+            kw.setdefault("filename", os.path.basename(payload))
+            kw["payload"] = open(payload, "rb")
+        return kw
+
+    def _close(self, kw):
+        payload = kw.get("payload")
+        if hasattr(payload, "close"):
+            payload.close()
+
+    def deposit(self, jobs):
+        """Deposits each of `jobs` in turn, yielding a (job, `Deposit_Receipt`) tuple for each, in order.
+
+        Up to `prefetch` jobs are prepared while each one is being sent."""
+        jobs = iter(jobs)
+        pending = deque()
+        def fill():
+            while len(pending) < self.prefetch:
+                try:
+                    job = next(jobs)
+                except StopIteration:
+                    return
+                pending.append((job, self._preparers.submit(self._prepare, job)))
+        try:
+            fill()
+            while pending:
+                job, future = pending.popleft()
+                kw = future.result()
+                fill()      # the next deposit is prepared while this one is sent
+                try:
+                    pl_l.info("Depositing %s", getattr(kw.get("payload"), "filename", kw.get("filename")))
+                    receipt = getattr(self.conn, job.get("method", "create"))(**kw)
+                finally:
+                    self._close(kw)
+                yield job, receipt
+        finally:
+            for job, future in pending:
+                if not future.cancel():
+                    try:
+                        self._close(future.result())
+                    except Exception:
+                        pass
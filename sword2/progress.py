@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Progress reporting for uploads and downloads.
+
+Each request body that is sent, and each response body that is received, is counted by a `ProgressTracker` as it
+passes through the http layer. Every `interval` seconds (and once more when the transfer ends) the tracker reports
+a `TransferProgress` - bytes so far, the expected total, the throughput over the last interval and since the start,
+and an ETA - to a callback, and to the `TransferStats` of the `Connection`. Between reports a tracker does no more
+than add up the bytes and read the clock, so even a short `interval` costs next to nothing.
+
+Usage:
+
+>>> from sword2 import Connection
+>>> def show(p):
+...     print("%s %s: %s/%s bytes, %.1f MB/s, ETA %s" % (p.direction, p.uri, p.transferred, p.total,
+...                                                       p.rate / 1e6, p.eta))
+>>> conn = Connection("http://localhost:8080/sd-uri", progress_callback=show, progress_interval=1.0)
+>>> receipt = conn.update_files_for_resource(open("huge.zip", "rb"), "huge.zip", edit_media_iri=em_iri)
+upload http://localhost:8080/em-iri/43: 104857600/5368709120 bytes, 98.4 MB/s, ETA 53.5
+...
+>>> conn.transfer_stats.bytes_sent, conn.transfer_stats.average_rate
+(5368709120, 97312467.3)
+>>> [p.uri for p in conn.transfer_stats.active()]     # transfers that are still going, slowest first
+[]
+"""
+
+import time
+import threading
+import itertools
+
+UPLOAD = "upload"
+DOWNLOAD = "download"
+
+class TransferProgress(object):
+    """A snapshot of a transfer
+
+    `self.direction`    -- "upload" or "download"
+    `self.method`       -- HTTP method of the request
+    `self.uri`          -- IRI of the request
+    `self.transferred`  -- bytes sent (or received) so far
+    `self.total`        -- the number of bytes expected, if known, otherwise `None`
+    `self.elapsed`      -- seconds since the transfer started
+    `self.rate`         -- throughput in bytes/second since the last report
+    `self.average`      -- throughput in bytes/second since the start
+    `self.eta`          -- estimated seconds to go, at the average throughput (`None` if the total is not known)
+    `self.done`         -- whether the transfer has ended
+    """
+    __slots__ = ('direction', 'method', 'uri', 'transferred', 'total', 'elapsed', 'rate', 'average', 'eta', 'done')
+
+    def __init__(self, direction, method, uri, transferred, total, elapsed, rate, average, done):
+        self.direction = direction
+        self.method = method
+        self.uri = uri
+        self.transferred = transferred
+        self.total = total
+        self.elapsed = elapsed
+        self.rate = rate
+        self.average = average
+        self.done = done
+        self.eta = None
+        if total is not None:
+            remaining = max(0, total - transferred)
+            self.eta = 0.0 if not remaining else (remaining / average if average else None)
+
+    def __repr__(self):
+        return "<sword2.TransferProgress - %s %s: %s/%s bytes, %.0f B/s>" % (self.direction, self.uri,
+                                                                              self.transferred, self.total, self.rate)
+
+class ProgressTracker(object):
+    """Counts the bytes of one transfer, and reports a `TransferProgress` to each of `listeners` when it starts,
+    at most every `interval` seconds while it goes on, and when `finish()` is called."""
+    _ids = itertools.count()
+
+    def __init__(self, direction, method, uri, total=None, listeners=(), interval=0.5, clock=time.monotonic):
+        self.id = next(self._ids)
+        self.direction = direction
+        self.method = method
+        self.uri = uri
+        self.total = total
+        self.listeners = [l for l in listeners if l is not None]
+        self.interval = interval
+        self.clock = clock
+        self.transferred = 0
+        self.finished = False
+        self.start = self._last_time = clock()
+        self._next = self.start + interval
+        self._last_bytes = 0
+        if self.listeners:
+            self._report(self.start, False)
+
+    def update(self, n):
+        self.transferred += n
+        if self.listeners:
+            now = self.clock()
+            if now >= self._next:
+                self._report(now, False)
+
+    def finish(self):
+        if not self.finished:
+            self.finished = True
+            if self.listeners:
+                self._report(self.clock(), True)
+
+    def snapshot(self, now=None):
+        """The `TransferProgress` as of now, with the throughput since the last report"""
+        now = self.clock() if now is None else now
+        elapsed = now - self.start
+        since = now - self._last_time
+        rate = (self.transferred - self._last_bytes) / since if since > 0 else 0.0
+        average = self.transferred / elapsed if elapsed > 0 else 0.0
+        return TransferProgress(self.direction, self.method, self.uri, self.transferred, self.total, elapsed,
+                                rate, average, self.finished)
+
+    def _report(self, now, done):
+        progress = self.snapshot(now)
+        self._last_time, self._last_bytes = now, self.transferred
+        self._next = now + self.interval
+        for listener in self.listeners:
+            listener(progress, self)
+
+class TransferStats(object):
+    """Transfer statistics for a `Connection`, fed by the `ProgressTracker` of each of its transfers. Safe to use
+    from several threads.
+
+    `self.uploads`, `self.downloads`      -- number of transfers that have ended
+    `self.bytes_sent`, `self.bytes_received`
+    `self.seconds`                        -- total time spent transferring (summed over concurrent transfers)
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = {}
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.uploads = 0
+            self.downloads = 0
+            self.bytes_sent = 0
+            self.bytes_received = 0
+            self.seconds = 0.0
+            self._active.clear()
+
+    def __call__(self, progress, tracker):
+        with self._lock:
+            if not progress.done:
+                self._active[tracker.id] = tracker
+                return
+            self._active.pop(tracker.id, None)
+            if progress.direction == UPLOAD:
+                self.uploads += 1
+                self.bytes_sent += progress.transferred
+            else:
+                self.downloads += 1
+                self.bytes_received += progress.transferred
+            self.seconds += progress.elapsed
+
+    @property
+    def average_rate(self):
+        """Bytes per second, over all the transfers that have ended"""
+        with self._lock:
+            return (self.bytes_sent + self.bytes_received) / self.seconds if self.seconds else 0.0
+
+    def active(self):
+        """A `TransferProgress` for each transfer that is still going, slowest first. Its `rate` is the throughput
+        since the transfer last reported, so a transfer that has stalled drops towards 0."""
+        with self._lock:
+            trackers = list(self._active.values())
+        return sorted((t.snapshot() for t in trackers), key=lambda p: p.rate)
+
+class ProgressReader(object):
+    """Wraps a file-like object (a request payload, or a streamed response body), counting what is read from it
+    into `tracker`. The transfer is finished when the end is reached, or when it is closed."""
+    def __init__(self, f, tracker):
+        self.f = f
+        self.tracker = tracker
+
+    def read(self, amt=-1):
+        data = self.f.read(amt) if amt is not None else self.f.read()
+        if data:
+            self.tracker.update(len(data))
+        elif amt != 0:
+            self.tracker.finish()
+        return data
+
+    def close(self):
+        self.tracker.finish()
+        self.f.close()
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def callback_listener(callback):
+    """Adapts a callback that takes a `TransferProgress` into a `ProgressTracker` listener"""
+    if callback is None:
+        return None
+    return lambda progress, tracker: callback(progress)
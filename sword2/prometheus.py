@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Export of `sword2.metrics.Metrics` in the Prometheus text format (version 0.0.4).
+
+Nothing here listens on the network: `exposition(metrics)` returns the text, for a pull-style handler in whatever
+web framework the application already has, and `write_textfile(metrics, path)` writes it to a file for the
+node_exporter textfile collector (atomically, so the collector never reads half a file).
+
+    sword2_requests_total{operation,status}              -- counter of responses
+    sword2_request_duration_seconds{operation}           -- histogram of the time taken by requests
+    sword2_bytes_sent_total{operation}, sword2_bytes_received_total{operation}
+    sword2_retries_total{operation}                      -- counter of retries
+    sword2_requests_in_flight                            -- gauge
+    sword2_receipt_cache_hits_total, sword2_receipt_cache_misses_total
+    sword2_parse_duration_seconds{document}              -- histogram of the time taken to parse documents
+
+Usage:
+
+>>> from sword2 import Connection
+>>> from sword2 import prometheus
+>>> conn = Connection("http://localhost:8080/sd-uri")
+>>> ...
+>>> handler = prometheus.collector(conn.metrics)       # eg served at /metrics by the application
+>>> print(handler())
+# HELP sword2_requests_total Responses received, by operation and HTTP status
+# TYPE sword2_requests_total counter
+sword2_requests_total{operation="Col_IRI POST",status="201"} 120000
+...
+>>> prometheus.write_textfile(conn.metrics, "/var/lib/node_exporter/sword2.prom")
+"""
+
+import os
+import tempfile
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+PARSE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(**labels):
+    if not labels:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (k, _escape(v)) for k, v in sorted(labels.items()))
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+def _header(lines, name, kind, help):
+    lines.append("# HELP %s %s" % (name, help))
+    lines.append("# TYPE %s %s" % (name, kind))
+
+def _histogram(lines, name, histogram, bounds, **labels):
+    count, total, counts = histogram.cumulative(bounds)
+    for bound, n in zip(sorted(bounds), counts):
+        lines.append("%s_bucket%s %s" % (name, _labels(le=_number(float(bound)), **labels), n))
+    lines.append("%s_bucket%s %s" % (name, _labels(le="+Inf", **labels), count))
+    lines.append("%s_sum%s %s" % (name, _labels(**labels), _number(float(total))))
+    lines.append("%s_count%s %s" % (name, _labels(**labels), count))
+
+def exposition(metrics, prefix="sword2", request_buckets=REQUEST_BUCKETS, parse_buckets=PARSE_BUCKETS):
+    """The metrics, in the Prometheus text format"""
+    lines = []
+    operations = [metrics.operation(name) for name in metrics.operations]
+
+    name = prefix + "_requests_total"
+    _header(lines, name, "counter", "Responses received, by operation and HTTP status")
+    for op in operations:
+        for status, n in sorted(dict(op.statuses).items()):
+            lines.append("%s%s %s" % (name, _labels(operation=op.name, status=status), n))
+
+    name = prefix + "_request_duration_seconds"
+    _header(lines, name, "histogram", "Time taken by requests, including any retries")
+    for op in operations:
+        _histogram(lines, name, op.latency, request_buckets, operation=op.name)
+
+    for attr, help in (("bytes_sent", "Request body bytes sent"), ("bytes_received", "Response body bytes received"),
+                       ("retries", "Requests retried after a transient failure")):
+        name = "%s_%s_total" % (prefix, attr)
+        _header(lines, name, "counter", help)
+        for op in operations:
+            lines.append("%s%s %s" % (name, _labels(operation=op.name), getattr(op, attr)))
+
+    name = prefix + "_requests_in_flight"
+    _header(lines, name, "gauge", "Requests sent and not yet answered")
+    lines.append("%s %s" % (name, metrics.in_flight))
+
+    for attr, help in (("cache_hits", "Lookups that found a cached deposit receipt"),
+                       ("cache_misses", "Lookups that did not find a cached deposit receipt")):
+        name = "%s_receipt_%s_total" % (prefix, attr)
+        _header(lines, name, "counter", help)
+        lines.append("%s %s" % (name, getattr(metrics, attr)))
+
+    name = prefix + "_parse_duration_seconds"
+    _header(lines, name, "histogram", "Time taken to parse service documents, deposit receipts and statements")
+    for document in metrics.documents:
+        _histogram(lines, name, metrics.parsing(document), parse_buckets, document=document)
+
+    return "\n".join(lines) + "\n"
+
+def collector(metrics, **kw):
+    """A callable with no arguments which returns `exposition(metrics)`, for a pull-style handler"""
+    return lambda: exposition(metrics, **kw)
+
+def write_textfile(metrics, path, **kw):
+    """Writes `exposition(metrics)` to the file at `path`, replacing it atomically"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".sword2-metrics-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(exposition(metrics, **kw))
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Request rate and bandwidth limits, per host and per On-Behalf-Of user.
+
+A `RateLimiter` holds a token bucket for each host (and for each On-Behalf-Of user at a host) that a limit has been
+set for: one bucket of requests per second, and one of bytes per second. `RateLimitedLayer` wraps any `HttpLayer`
+so that each request takes a token from the request buckets before it is sent, and each byte of the request and
+response bodies takes one from the byte buckets as it is sent or read. When a bucket is empty the caller waits
+(rather than getting an error) until it has refilled, so that requests go out at exactly the allowed rate.
+
+The buckets are thread-safe, so one `RateLimiter` can be shared by every `Connection` (and thread) in a process -
+the limits then apply to all of them together.
+
+Usage:
+
+>>> from sword2 import Connection
+>>> from sword2.rate_limit import RateLimiter, Limit
+>>> limiter = RateLimiter(default=Limit(requests_per_second=10, bytes_per_second=5e6),
+...                       hosts={"slow.example.org" : Limit(requests_per_second=2)},
+...                       users={"alice" : Limit(requests_per_second=1)})
+>>> conns = [Connection("http://localhost:8080/sd-uri", rate_limiter=limiter) for i in range(8)]
+
+Code that should not block (eg in an event loop) can ask how long to wait instead, and wait for it itself:
+
+>>> await asyncio.sleep(limiter.reserve("http://localhost:8080/col-iri", on_behalf_of="alice"))
+"""
+
+import time
+import threading
+
+from .http_layer import HttpLayer, ChunkedBody
+from .utils import get_host
+
+from .sword2_logging import logging
+rl_l = logging.getLogger(__name__)
+
+class TokenBucket(object):
+    """Holds up to `capacity` tokens, refilled at `rate` tokens per second.
+
+    Tokens are reserved rather than waited for: a reservation that is larger than what is left puts the bucket
+    into debt, and the reservation after it waits until the debt has been paid off. So a burst of callers is
+    spread out at exactly `rate`, in the order they came, and a request for more than `capacity` tokens at once
+    (eg a large write) is allowed, taking as long as it has to."""
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, self.rate))
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, n=1):
+        """Takes `n` tokens, and returns how many seconds to wait before using them"""
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= n
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+class Limit(object):
+    """A limit on the rate of requests and/or of bytes (sent and received together). `burst` is the number of
+    seconds' worth of tokens that can be used at once after a quiet spell."""
+    def __init__(self, requests_per_second=None, bytes_per_second=None, burst=1.0):
+        self.requests_per_second = requests_per_second
+        self.bytes_per_second = bytes_per_second
+        self.burst = burst
+
+    def buckets(self, clock):
+        requests = bytes_ = None
+        if self.requests_per_second:
+            requests = TokenBucket(self.requests_per_second, max(1.0, self.requests_per_second * self.burst), clock)
+        if self.bytes_per_second:
+            bytes_ = TokenBucket(self.bytes_per_second, max(1.0, self.bytes_per_second * self.burst), clock)
+        return requests, bytes_
+
+class RateLimiter(object):
+    def __init__(self, default=None, hosts=None, user_default=None, users=None, clock=time.monotonic,
+                       sleep=time.sleep):
+        """
+Parameters:
+
+    default       -- `Limit` for each host that is not in `hosts` (`None` for no limit)
+    hosts         -- `dict` of host name (as in the IRI, with ":port" if it has one) -> `Limit`
+    user_default  -- `Limit` for each On-Behalf-Of user at a host, for users that are not in `users`
+    users         -- `dict` of On-Behalf-Of user name -> `Limit`, which applies at each host separately
+
+A request has to satisfy both the limit of its host and the limit of its On-Behalf-Of user (if it has one).
+        """
+        self.default = default
+        self.hosts = dict(hosts or {})
+        self.user_default = user_default
+        self.users = dict(users or {})
+        self.clock = clock
+        self.sleep = sleep
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key, limit):
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = limit.buckets(self.clock) if limit is not None else (None, None)
+            return self._buckets[key]
+
+    def buckets(self, uri, on_behalf_of=None):
+        """The (requests, bytes) buckets that apply to a request to `uri`, as a list of pairs"""
+        host = get_host(uri)
+        found = [self._get(host, self.hosts.get(host, self.default))]
+        if on_behalf_of:
+            found.append(self._get((host, on_behalf_of), self.users.get(on_behalf_of, self.user_default)))
+        return found
+
+    def reserve(self, uri, on_behalf_of=None, requests=1, nbytes=0):
+        """Takes `requests` requests and `nbytes` bytes from the buckets for `uri`, and returns how many seconds
+        to wait before going ahead"""
+        wait = 0.0
+        for request_bucket, byte_bucket in self.buckets(uri, on_behalf_of):
+            if requests and request_bucket is not None:
+                wait = max(wait, request_bucket.reserve(requests))
+            if nbytes and byte_bucket is not None:
+                wait = max(wait, byte_bucket.reserve(nbytes))
+        return wait
+
+    def acquire(self, uri, on_behalf_of=None, requests=1, nbytes=0):
+        """As `reserve`, but waits for as long as it takes"""
+        wait = self.reserve(uri, on_behalf_of, requests, nbytes)
+        if wait > 0:
+            rl_l.debug("Rate limit for %s - waiting %.3fs", uri, wait)
+            self.sleep(wait)
+        return wait
+
+class ThrottledReader(object):
+    """Wraps a file-like object (a request payload, or a streamed response body), waiting on `throttle(n)` for
+    each `n` bytes read from it"""
+    def __init__(self, f, throttle):
+        self.f = f
+        self.throttle = throttle
+
+    def read(self, amt=-1):
+        data = self.f.read(amt) if amt is not None else self.f.read()
+        if data:
+            self.throttle(len(data))
+        return data
+
+    def close(self):
+        self.f.close()
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class RateLimitedLayer(HttpLayer):
+    """Wraps an `HttpLayer`, holding each request back until `limiter` allows it. Any other attribute is that of
+    the wrapped layer."""
+    def __init__(self, layer, limiter):
+        self.layer = layer
+        self.limiter = limiter
+
+    def __getattr__(self, name):
+        return getattr(self.layer, name)
+
+    def add_credentials(self, username, password, uri=None):
+        self.layer.add_credentials(username, password, uri)
+
+    def _throttle(self, uri, headers):
+        on_behalf_of = (headers or {}).get('On-Behalf-Of')
+        return lambda n: self.limiter.acquire(uri, on_behalf_of, requests=0, nbytes=n)
+
+    def _payload(self, payload, throttle):
+        if isinstance(payload, ChunkedBody):
+            payload.throttle = throttle
+        elif hasattr(payload, "read"):
+            return ThrottledReader(payload, throttle)
+        elif payload is not None:
+            try:
+                throttle(len(payload))
+            except TypeError:
+                pass        # an iterator, which the wrapped layer sends as it comes
+        return payload
+
+    def request(self, uri, method, headers=None, payload=None):
+        throttle = self._throttle(uri, headers)
+        self.limiter.acquire(uri, (headers or {}).get('On-Behalf-Of'))
+        resp, content = self.layer.request(uri, method, headers=headers, payload=self._payload(payload, throttle))
+        if content:
+            throttle(len(content))
+        return resp, content
+
+    def stream_request(self, uri, method, headers=None, payload=None):
+        throttle = self._throttle(uri, headers)
+        self.limiter.acquire(uri, (headers or {}).get('On-Behalf-Of'))
+        resp, body = self.layer.stream_request(uri, method, headers=headers, payload=self._payload(payload, throttle))
+        return resp, ThrottledReader(body, throttle)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Provides `ResourceStream`, an iterator over the body of a resource retrieved from a SWORD2 server which keeps a
+running MD5 of the data that has passed through it, so that large packages never need to be held in memory.
+
+Usage:
+
+>>> stream = conn.get_resource(content_iri, stream=True)
+>>> with open("package.zip", "wb") as f:
+...     for chunk in stream:
+...         f.write(chunk)
+>>> stream.verify()     # raises `sword2.exceptions.ChecksumMismatch` if the server's Content-MD5 doesn't match
+"""
+
+import binascii
+import base64
+
+try:
+    from hashlib import md5
+except ImportError:
+    import md5
+
+from .exceptions import ChecksumMismatch
+
+from .sword2_logging import logging
+rs_l = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1024*1024    # 1Mb
+
+def normalise_md5(value):
+    """Content-MD5 headers are meant to be the base64 of the binary digest (RFC 1864), but hex digests
+    are common in the wild (and are what this client sends). Returns the lowercase hex form either way, or
+    `None` if the value is not recognisable as an MD5."""
+    if not value:
+        return None
+    value = value.strip()
+    if len(value) == 32:
+        try:
+            int(value, 16)
+            return value.lower()
+        except ValueError:
+            pass
+    try:
+        raw = base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    if len(raw) != 16:
+        return None
+    return binascii.hexlify(raw).decode("ascii")
+
+class ResourceStream(object):
+    """
+`ResourceStream` - iterate over the body of a streamed response, chunk by chunk.
+
+Attributes:
+
+    `self.response_headers`  -- response headers
+    `self.code`              -- status code ('200' on success.)
+    `self.size`              -- number of bytes read so far
+    `self.md5`               -- hex MD5 of the bytes read so far
+    `self.expected_md5`      -- hex MD5 advertised by the server in a Content-MD5 header, or `None`
+
+The stream can only be iterated over once, and closes the connection when it is exhausted (or when `close()` is
+called, for example by leaving a `with` block).
+    """
+    def __init__(self, resp, body, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.response_headers = dict(resp)
+        self.code = resp.status
+        self.content = None     # for parity with the ContentWrapper - the content is never held
+        self.chunk_size = chunk_size
+        self.size = 0
+        self.expected_md5 = normalise_md5(resp.get('content-md5', None))
+        self._body = body
+        self._md5 = md5()
+
+    @property
+    def md5(self):
+        return self._md5.hexdigest()
+
+    def read(self, amt=None):
+        """Read up to `amt` bytes (or the rest of the body), updating the running digest"""
+        if self._body is None:
+            return b""
+        chunk = self._body.read(amt)
+        if chunk:
+            self.size += len(chunk)
+            self._md5.update(chunk)
+        else:
+            self.close()
+        return chunk
+
+    def __iter__(self):
+        chunk = self.read(self.chunk_size)
+        while chunk:
+            yield chunk
+            chunk = self.read(self.chunk_size)
+
+    def close(self):
+        if self._body is not None:
+            self._body.close()
+            self._body = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def md5_matches(self):
+        """`True` or `False` depending on whether the data read so far matches the server's Content-MD5, or
+        `None` if the server did not send one."""
+        if self.expected_md5 is None:
+            return None
+        return self.md5 == self.expected_md5
+
+    def verify(self):
+        """Raise a `sword2.exceptions.ChecksumMismatch` if the server sent a Content-MD5 which does not match
+        the data that was read."""
+        if self.md5_matches() is False:
+            rs_l.error("Content-MD5 mismatch - server sent %s, received data has %s", self.expected_md5, self.md5)
+            raise ChecksumMismatch(self.expected_md5, self.md5)
+        return True
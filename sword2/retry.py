@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Retry policy for requests made by a `sword2.Connection`.
+
+A `RetryPolicy` decides whether a failed attempt (a transient HTTP status, or a network error such as a connection
+reset) should be tried again, and how long to wait before doing so. The wait is an exponential backoff with "full
+jitter" (a random delay between 0 and `backoff_factor * 2**attempt` seconds, capped at `max_backoff`), unless the
+server sent a Retry-After header, in which case that is honoured instead.
+
+Only idempotent methods are retried by default. A POST to a Collection or SE-IRI creates a new container or adds
+to one, so retrying a POST whose response was lost could deposit the same content twice; set `retry_post=True`
+to retry them anyway.
+
+Usage:
+
+>>> from sword2 import Connection
+>>> from sword2.retry import RetryPolicy
+>>> conn = Connection("http://localhost:8080/sd-uri", retry_policy=RetryPolicy(max_retries=5, retry_post=True))
+
+(`retry_policy=False` turns retrying off.)
+"""
+
+import time
+import random
+import socket
+import urllib.error
+from datetime import datetime, timezone
+
+from .sword2_logging import logging
+rt_l = logging.getLogger(__name__)
+
+RETRY_STATUSES = (408, 429, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+def parse_retry_after(value):
+    """Seconds to wait, from a Retry-After header value (either a number of seconds or an HTTP-date), or `None`
+    if the value is missing or not understood."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    from email.utils import parsedate_to_datetime     # only needed for the (rare) HTTP-date form
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+class RetryPolicy(object):
+    def __init__(self, max_retries=3,
+                       backoff_factor=0.5,
+                       max_backoff=30.0,
+                       retry_statuses=RETRY_STATUSES,
+                       retry_post=False,
+                       respect_retry_after=True,
+                       max_retry_after=120.0,
+                       retry_exceptions=(ConnectionError, socket.timeout)):
+        """
+Parameters:
+
+    max_retries          -- number of retries after the first attempt
+    backoff_factor       -- base of the exponential backoff, in seconds
+    max_backoff          -- upper limit on the backoff between two attempts, in seconds
+    retry_statuses       -- HTTP status codes which are worth trying again
+    retry_post           -- also retry POST requests (which are not idempotent)
+    respect_retry_after  -- wait for as long as a Retry-After header asks for, instead of the backoff
+    max_retry_after      -- give up, rather than wait, if a Retry-After asks for longer than this (in seconds)
+    retry_exceptions     -- exception classes from the HTTP layer which are worth trying again
+        """
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.retry_statuses = tuple(retry_statuses)
+        self.retry_post = retry_post
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+        self.retry_exceptions = tuple(retry_exceptions)
+        self.sleep = time.sleep
+
+    def is_retryable_method(self, method):
+        method = method.upper()
+        return method in IDEMPOTENT_METHODS or (method == "POST" and self.retry_post)
+
+    def is_retryable_exception(self, e):
+        if isinstance(e, urllib.error.HTTPError):
+            return False
+        if isinstance(e, urllib.error.URLError) and isinstance(e.reason, Exception):
+            # urllib wraps socket errors
+            e = e.reason
+        return isinstance(e, self.retry_exceptions)
+
+    def backoff(self, attempt):
+        """Delay before retry number `attempt` (counting from 0), with full jitter"""
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * (2 ** attempt)))
+
+    def next_delay(self, method, attempt, resp=None, error=None):
+        """How many seconds to wait before trying again, after `attempt` (counting from 0) received `resp` or
+        raised `error` - or `None` if the request should not be retried."""
+        if attempt >= self.max_retries or not self.is_retryable_method(method):
+            return None
+        if error is not None:
+            return self.backoff(attempt) if self.is_retryable_exception(error) else None
+        if resp is None or resp.status not in self.retry_statuses:
+            return None
+        if self.respect_retry_after:
+            retry_after = parse_retry_after(resp.get('retry-after', None))
+            if retry_after is not None:
+                if retry_after > self.max_retry_after:
+                    rt_l.warning("Server asked for a retry after %ss, which is longer than max_retry_after - giving up", retry_after)
+                    return None
+                return retry_after
+        return self.backoff(attempt)
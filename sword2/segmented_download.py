@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Parallel, resumable downloads of large resources using HTTP Range requests.
+
+A single TCP stream is often limited well below the available bandwidth on long links, so `SegmentedDownloader`
+splits a resource into byte ranges and fetches them concurrently, each written into its place in a preallocated
+file. Progress is kept in a small journal file next to the download (`<dest_path>.segments`) so that an
+interrupted download picks up where each segment left off when it is run again.
+
+If the server does not support Range requests, or does not say how large the resource is, the resource is
+downloaded as a single stream instead. Error statuses (503, 429...) and connection errors are retried as the
+`retry_policy` allows, and an interrupted segment is restarted from where it stopped after its backoff.
+
+Usage:
+
+>>> from sword2 import HttpLib2Layer
+>>> from sword2.segmented_download import SegmentedDownloader
+>>> d = SegmentedDownloader(HttpLib2Layer(), segments=8)
+>>> result = d.download("http://example.org/cont-iri/43", "package.zip")
+>>> result.size, result.ranged
+(5368709120, True)
+
+(or through `sword2.Connection.download_resource(..., segments=8)`)
+"""
+
+import os
+import re
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from hashlib import md5
+except ImportError:
+    import md5
+
+from .resource_stream import DEFAULT_CHUNK_SIZE, normalise_md5
+from .retry import RetryPolicy
+from .exceptions import ChecksumMismatch, HTTPResponseError
+
+from .sword2_logging import logging
+sd_l = logging.getLogger(__name__)
+
+CONTENT_RANGE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+
+class SegmentedDownloadError(HTTPResponseError):
+    """ a segment could not be fetched as requested (eg. the resource changed between segments) """
+    pass
+
+def _pwrite(fd, data, offset, lock):
+    if hasattr(os, "pwrite"):
+        while data:
+            written = os.pwrite(fd, data, offset)
+            data = data[written:]
+            offset += written
+    else:
+        # no positional writes on this platform, so serialise the seek + write
+        with lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            while data:
+                written = os.write(fd, data)
+                data = data[written:]
+
+class SegmentedDownload(object):
+    """Result of `SegmentedDownloader.download`
+
+    `self.path`              -- where the resource was written
+    `self.size`              -- its size in bytes
+    `self.code`              -- status code of the probe/first response
+    `self.response_headers`  -- headers of the probe/first response
+    `self.ranged`            -- whether the resource was fetched in segments (`False` if it fell back to a single stream)
+    `self.segments`          -- the list of [start, end] byte ranges used
+    `self.resumed_bytes`     -- number of bytes that were already present from a previous, interrupted attempt
+    `self.md5`               -- hex MD5 of the file, if it was computed (see `compute_md5`), otherwise `None`
+    """
+    def __init__(self, path, size, code, response_headers, ranged, segments, resumed_bytes=0, md5=None):
+        self.path = path
+        self.size = size
+        self.code = code
+        self.response_headers = response_headers
+        self.content = None     # for parity with the ContentWrapper
+        self.ranged = ranged
+        self.segments = segments
+        self.resumed_bytes = resumed_bytes
+        self.md5 = md5
+
+class SegmentedDownloader(object):
+    def __init__(self, http_impl, segments=4, min_segment_size=8*1024*1024, buffer_size=DEFAULT_CHUNK_SIZE,
+                       segment_retries=2, compute_md5=None, retry_policy=None):
+        """
+Parameters:
+
+    http_impl           -- the `sword2.http_layer.HttpLayer` to make requests with. It must be safe to call
+                           `stream_request` from several threads at once (as `HttpLib2Layer` and `UrlLib2Layer` are)
+    segments            -- number of byte ranges to fetch concurrently
+    min_segment_size    -- resources are not split into segments smaller than this
+    buffer_size         -- size of the reads from each response and of the writes to the file
+    segment_retries     -- number of times an interrupted segment is restarted (from where it stopped) before
+                           giving up
+    compute_md5         -- compute the MD5 of the downloaded file; `None` (default) does so only if the server sent
+                           a Content-MD5, which is then verified
+    retry_policy        -- a `sword2.retry.RetryPolicy` for the probe and each segment: error statuses and connection
+                           errors are retried as it allows (honouring Retry-After). `None` retries no error status,
+                           and restarts interrupted segments after the backoff of a default `RetryPolicy`
+        """
+        self.h = http_impl
+        self.segments = max(1, segments)
+        self.min_segment_size = min_segment_size
+        self.buffer_size = buffer_size
+        self.segment_retries = segment_retries
+        self.compute_md5 = compute_md5
+        self.retry_policy = retry_policy
+        self._backoff_policy = retry_policy if retry_policy is not None else RetryPolicy()
+
+    def journal_path(self, dest_path):
+        return dest_path + ".segments"
+
+    def probe(self, uri, headers=None):
+        """Find out the size of the resource and whether the server will accept Range requests for it.
+
+        Returns a tuple of (response, size or `None`, ranges supported?)"""
+        headers = dict(headers or {})
+        resp = None
+        try:
+            resp, body = self.h.stream_request(uri, "HEAD", headers=headers)
+            body.close()
+        except Exception as e:
+            sd_l.debug("HEAD request for %s failed (%s) - probing with a Range request instead", uri, e)
+        if resp is not None and resp.status == 200:
+            size = resp.get('content-length', None)
+            size = int(size) if size is not None else None
+            accept_ranges = (resp.get('accept-ranges', None) or "").lower()
+            if accept_ranges == "bytes" or size is None:
+                return resp, size, accept_ranges == "bytes"
+            if accept_ranges == "none":
+                return resp, size, False
+        # HEAD not allowed, or did not say whether ranges are supported - ask for the first byte
+        headers['Range'] = "bytes=0-0"
+        resp, body = self.h.stream_request(uri, "GET", headers=headers)
+        body.close()
+        if resp.status == 206:
+            m = CONTENT_RANGE.match(resp.get('content-range', None) or "")
+            if m and m.group(3) != "*":
+                return resp, int(m.group(3)), True
+        size = resp.get('content-length', None)
+        return resp, (int(size) if size is not None and resp.status == 200 else None), False
+
+    def _probe_with_retries(self, uri, headers):
+        attempt = 0
+        while True:
+            resp = error = None
+            try:
+                result = self.probe(uri, headers)
+                resp = result[0]
+            except Exception as e:
+                error = e
+            delay = None
+            if self.retry_policy is not None and (error is not None or resp.status >= 400):
+                delay = self.retry_policy.next_delay("GET", attempt, resp, error)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return result
+            sd_l.warning("Probe of %s failed (%s) - retrying in %.2fs", uri, 
+                         error if error is not None else resp.status, delay)
+            attempt += 1
+            self.retry_policy.sleep(delay)
+
+    def plan(self, size):
+        """Split `size` bytes into [start, end] ranges (inclusive, as in a Range header)"""
+        count = max(1, min(self.segments, size // max(1, self.min_segment_size)))
+        step = -(-size // count)    # ceiling division
+        return [[start, min(start + step, size) - 1] for start in range(0, size, step)]
+
+    def _load_journal(self, path, uri, size, validator):
+        try:
+            with open(path) as f:
+                journal = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if journal.get("uri") != uri or journal.get("size") != size or journal.get("validator") != validator:
+            sd_l.info("Download journal %s is for a different resource or version, starting again", path)
+            return None
+        return journal
+
+    def _save_journal(self, path, journal, lock):
+        with lock:
+            tmp = path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(journal, f)
+            os.replace(tmp, path)
+
+    def download(self, uri, dest_path, headers=None, resume=True):
+        """Download the resource at `uri` to `dest_path`, returning a `SegmentedDownload`"""
+        headers = dict(headers or {})
+        resp, size, ranged = self._probe_with_retries(uri, headers)
+        if resp.status >= 400:
+            raise HTTPResponseError(resp, None)
+        if not ranged or not size:
+            sd_l.info("Server does not support Range requests for %s (or did not give its size) - downloading as a single stream", uri)
+            return self._download_single(uri, dest_path, headers)
+
+        validator = resp.get('etag', None) or resp.get('last-modified', None)
+        # a Content-MD5 on a 206 covers only the range that was sent, not the resource
+        expected_md5 = normalise_md5(resp.get('content-md5', None)) if resp.status == 200 else None
+        journal_path = self.journal_path(dest_path)
+        journal = self._load_journal(journal_path, uri, size, validator) if resume else None
+        if journal is None:
+            journal = {"uri" : uri, "size" : size, "validator" : validator,
+                       "segments" : [[start, end, 0] for start, end in self.plan(size)]}
+        resumed_bytes = sum(done for _, _, done in journal["segments"])
+        if resumed_bytes:
+            sd_l.info("Resuming download of %s - %s of %s bytes already present", uri, resumed_bytes, size)
+
+        if validator is not None:
+            # if the resource changes underneath us, get a 200 (and fail) rather than a mix of versions
+            headers['If-Range'] = validator
+
+        lock = threading.Lock()
+        flags = os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0)
+        fd = os.open(dest_path, flags, 0o644)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, size)
+            todo = [seg for seg in journal["segments"] if seg[0] + seg[2] <= seg[1]]
+            errors = []
+            with ThreadPoolExecutor(max_workers=len(todo) or 1) as pool:
+                futures = [pool.submit(self._fetch_segment, uri, headers, fd, seg, journal, journal_path, lock)
+                           for seg in todo]
+                for f in futures:
+                    e = f.exception()
+                    if e is not None:
+                        errors.append(e)
+            if errors:
+                self._save_journal(journal_path, journal, lock)
+                sd_l.error("%s segment(s) of %s failed; run the download again to resume it", len(errors), uri)
+                raise errors[0]
+        finally:
+            os.close(fd)
+
+        if os.path.exists(journal_path):
+            os.remove(journal_path)
+        result = SegmentedDownload(dest_path, size, resp.status, dict(resp), True,
+                                   [[start, end] for start, end, _ in journal["segments"]], resumed_bytes)
+        self._check_md5(result, expected_md5)
+        return result
+
+    def _fetch_segment(self, uri, headers, fd, seg, journal, journal_path, lock):
+        start, end = seg[0], seg[1]
+        interruptions = retries = 0
+        while seg[0] + seg[2] <= end:
+            offset = start + seg[2]
+            h = dict(headers)
+            h['Range'] = "bytes=%s-%s" % (offset, end)
+            try:
+                resp, body = self.h.stream_request(uri, "GET", headers=h)
+                with body:
+                    if resp.status in (200, 416):
+                        # the range was ignored or refused - or, with an If-Range, the resource has changed
+                        raise SegmentedDownloadError(resp, None)
+                    if resp.status != 206:
+                        delay = self._status_delay(retries, resp)
+                        if delay is None:
+                            raise HTTPResponseError(resp, body.read())
+                        retries += 1
+                        sd_l.warning("Segment %s-%s of %s failed (%s) - retrying in %.2fs", start, end, uri,
+                                     resp.status, delay)
+                        self._backoff_policy.sleep(delay)
+                        continue
+                    m = CONTENT_RANGE.match(resp.get('content-range', None) or "")
+                    if not m or int(m.group(1)) != offset:
+                        raise SegmentedDownloadError(resp, None)
+                    unsaved = 0
+                    remaining = end - offset + 1
+                    while remaining > 0:
+                        chunk = body.read(min(self.buffer_size, remaining))
+                        if not chunk:
+                            break
+                        _pwrite(fd, chunk, offset, lock)
+                        offset += len(chunk)
+                        remaining -= len(chunk)
+                        with lock:
+                            seg[2] += len(chunk)
+                        unsaved += len(chunk)
+                        if unsaved >= 16 * self.buffer_size:
+                            self._save_journal(journal_path, journal, lock)
+                            unsaved = 0
+                    if remaining > 0:
+                        raise IOError("Connection closed with %s bytes of segment %s-%s outstanding" % (remaining, start, end))
+            except HTTPResponseError:
+                raise
+            except Exception as e:
+                interruptions += 1
+                if interruptions > self.segment_retries:
+                    raise
+                delay = self._backoff_policy.backoff(interruptions - 1)
+                sd_l.warning("Segment %s-%s of %s interrupted at byte %s (%s) - retrying in %.2fs", start, end, uri,
+                             start + seg[2], e, delay)
+                self._backoff_policy.sleep(delay)
+
+    def _status_delay(self, retries, resp):
+        """How long to wait before asking again for a segment that got an error status, or `None` not to"""
+        if self.retry_policy is None:
+            return None
+        return self.retry_policy.next_delay("GET", retries, resp)
+
+    def _download_single(self, uri, dest_path, headers):
+        resp, body = self.h.stream_request(uri, "GET", headers=headers)
+        m = md5()
+        size = 0
+        with body:
+            if resp.status != 200:
+                raise HTTPResponseError(resp, body.read())
+            with open(dest_path, "wb", buffering=0) as f:
+                chunk = body.read(self.buffer_size)
+                while chunk:
+                    f.write(chunk)
+                    m.update(chunk)
+                    size += len(chunk)
+                    chunk = body.read(self.buffer_size)
+        result = SegmentedDownload(dest_path, size, resp.status, dict(resp), False, [[0, size - 1]], md5=m.hexdigest())
+        self._check_md5(result, normalise_md5(resp.get('content-md5', None)))
+        return result
+
+    def _check_md5(self, result, expected_md5):
+        compute = self.compute_md5 if self.compute_md5 is not None else expected_md5 is not None
+        if compute and result.md5 is None:
+            m = md5()
+            with open(result.path, "rb") as f:
+                chunk = f.read(self.buffer_size)
+                while chunk:
+                    m.update(chunk)
+                    chunk = f.read(self.buffer_size)
+            result.md5 = m.hexdigest()
+        if expected_md5 is not None and result.md5 is not None and result.md5 != expected_md5:
+            sd_l.error("Downloaded file %s does not match the Content-MD5 sent by the server", result.path)
+            raise ChecksumMismatch(expected_md5, result.md5, result.path)
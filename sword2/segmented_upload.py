@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Resumable uploads of very large files, sent as a series of fixed-size segments.
+
+A connection dropped near the end of a single, very large PUT means sending the whole file again. The
+`SegmentedUploader` sends the file in segments instead, each a request of its own with its own Content-MD5, which
+is retried on its own if it fails. The segments that have been stored are recorded in a small journal file
+(`<path>.upload-segments`, or in `journal_dir`), so an interrupted upload is resumed from the first segment that was
+not stored when it is run again.
+
+Two ways of sending the segments are supported:
+
+"content-range" -- each segment is a PUT to the Edit-Media-IRI with a `Content-Range: bytes <first>-<last>/<size>`
+                   header. The server answers each one but the last with a 308 (Resume Incomplete), and the last
+                   with the usual response to a PUT. An empty PUT with `Content-Range: bytes */<size>` asks the
+                   server how much of the file it holds; it answers with a 308 and a `Range: bytes=0-<last>` header.
+                   A server that does not support this MUST refuse a PUT with a Content-Range (RFC 7231, 4.3.4),
+                   which is how "auto" tells the two apart.
+
+"segmented"     -- an explicit segmented-deposit extension, for servers that do not accept Content-Range:
+
+                   1. `POST <Edit-Media-IRI>` with an empty body and the header
+                      `Segmented-Upload: init; size=<bytes>; segment_size=<bytes>; segment_count=<n>`
+                      The server answers 201, with the Temporary-IRI of the upload in the Location header.
+                   2. `POST <Temporary-IRI>` for each segment, with a `Segment-Number: <n>` header (from 1) and
+                      the segment's Content-MD5. Sending a segment number again replaces that segment.
+                   3. `PUT <Edit-Media-IRI>` with an empty body, the headers of an ordinary file PUT (Content-Type,
+                      Content-Disposition, Packaging and the Content-MD5 of the whole file), and
+                      `Segmented-Upload: <Temporary-IRI>`. The server assembles the segments and answers as it
+                      would answer the ordinary PUT.
+
+Each segment is sent through `Connection._make_request`, so it gets the same headers (On-Behalf-Of, In-Progress,
+Content-Disposition, Packaging...), MD5 handling and transaction history as any other deposit.
+
+Usage:
+
+>>> from sword2 import Connection
+>>> conn = Connection("http://localhost:8080/sd-uri", user_name="sword", user_pass="sword")
+>>> receipt = conn.update_files_for_resource("/data/huge.zip", "huge.zip", mimetype="application/zip",
+...                                          edit_media_iri=em_iri, segment_size=64*1024*1024)
+
+(or with `sword2.segmented_upload.SegmentedUploader(conn).upload(em_iri, "/data/huge.zip", ...)`)
+"""
+
+import io
+import os
+import json
+import hashlib
+import urllib.parse
+
+from .retry import RetryPolicy
+from .exceptions import HTTPResponseError
+from .resource_stream import DEFAULT_CHUNK_SIZE
+
+from .sword2_logging import logging
+su_l = logging.getLogger(__name__)
+
+MODES = ("auto", "content-range", "segmented")
+
+class SegmentedUploadError(HTTPResponseError):
+    """ the server does not support either way of sending an upload in segments """
+    pass
+
+class FileSegment(io.RawIOBase):
+    """Seekable, read-only view of `length` bytes of the file at `path`, from `offset`"""
+    def __init__(self, path, offset, length):
+        io.RawIOBase.__init__(self)
+        self.f = open(path, "rb")
+        self.offset = offset
+        self.length = length
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.pos
+        elif whence == os.SEEK_END:
+            offset += self.length
+        self.pos = min(max(0, offset), self.length)
+        return self.pos
+
+    def readinto(self, b):
+        n = min(len(b), self.length - self.pos)
+        if n <= 0:
+            return 0
+        self.f.seek(self.offset + self.pos)
+        data = self.f.read(n)
+        b[:len(data)] = data
+        self.pos += len(data)
+        return len(data)
+
+    def close(self):
+        self.f.close()
+        io.RawIOBase.close(self)
+
+def _segment_md5(path, offset, length, whole=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    m = hashlib.md5()
+    with FileSegment(path, offset, length) as f:
+        chunk = f.read(chunk_size)
+        while chunk:
+            m.update(chunk)
+            if whole is not None:
+                whole.update(chunk)
+            chunk = f.read(chunk_size)
+    return m.hexdigest()
+
+class SegmentedUploader(object):
+    def __init__(self, conn, segment_size=64*1024*1024, mode="auto", journal_dir=None, retry_policy=None):
+        """
+Parameters:
+
+    conn          -- the `sword2.Connection` to upload through
+    segment_size  -- size of each segment in bytes (the last may be smaller)
+    mode          -- "content-range", "segmented" (see the module documentation), or "auto" (the default) to use
+                     Content-Range if the server supports it and the segmented-deposit extension if not
+    journal_dir   -- directory to keep the journal in (default: next to the file)
+    retry_policy  -- `sword2.RetryPolicy` for each segment (default: `RetryPolicy(retry_post=True)`, as sending a
+                     segment again replaces it). This is on top of any retrying that `conn` does itself.
+        """
+        if mode not in MODES:
+            raise ValueError("mode must be one of %s" % ", ".join(MODES))
+        self.conn = conn
+        self.segment_size = segment_size
+        self.mode = mode
+        self.journal_dir = journal_dir
+        self.retry_policy = retry_policy or RetryPolicy(retry_post=True)
+
+    def journal_path(self, path):
+        if self.journal_dir is None:
+            return path + ".upload-segments"
+        return os.path.join(self.journal_dir, os.path.basename(path) + ".upload-segments")
+
+    def _load_journal(self, journal_path, iri, path, size, mtime):
+        try:
+            with open(journal_path) as f:
+                journal = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if (journal.get("iri") != iri or journal.get("size") != size or journal.get("mtime") != mtime
+                or journal.get("segment_size") != self.segment_size):
+            su_l.info("Upload journal %s is for a different file, target or segment size, starting again", journal_path)
+            return None
+        return journal
+
+    def _save_journal(self, journal_path, journal):
+        tmp = journal_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(journal, f)
+        os.replace(tmp, journal_path)
+
+    def _request(self, target_iri, method, request_type, minimal_response=True, **kw):
+        """`Connection._make_request`, retried as `self.retry_policy` allows. Returns the receipt, or raises the
+        error (or returns the `sword2.Error_Document`, if the connection does not raise exceptions)"""
+        attempt = 0
+        while True:
+            resp = error = result = None
+            try:
+                result = self.conn._make_request(target_iri, method=method, request_type=request_type,
+                                                 minimal_response=minimal_response, **kw)
+                if result.code >= 400:
+                    resp = result.response_headers
+            except HTTPResponseError as e:
+                resp, error = e.response, e
+            except Exception as e:
+                error = e
+            if resp is None and error is None:
+                return result
+            delay = self.retry_policy.next_delay(method, attempt, resp, None if resp is not None else error)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return result
+            su_l.warning("%s to %s failed (%s) - retrying in %.2fs", request_type, target_iri,
+                         resp.status if resp is not None else error, delay)
+            self.retry_policy.sleep(delay)
+            attempt += 1
+
+    def _probe_content_range(self, iri, size, on_behalf_of):
+        """Ask the server how much of the file it holds. Returns a tuple of (the number of bytes, or `None` if the
+        server does not support Content-Range uploads, and the response)"""
+        try:
+            result = self._request(iri, "PUT", "Segmented upload: status", empty=True, on_behalf_of=on_behalf_of,
+                                   minimal_response=None, extra_headers={'Content-Range' : "bytes */%s" % size})
+        except HTTPResponseError:
+            return None, None
+        if result.code in (200, 201, 204):
+            # an earlier attempt sent it all, but its last response was lost
+            return size, result
+        if result.code != 308:
+            return None, result
+        stored = (result.response_headers.get('range', None) or "").replace("bytes=", "").strip()
+        return (int(stored.split("-")[-1]) + 1 if stored else 0), result
+
+    def upload(self, edit_media_iri, path, filename=None, mimetype=None, packaging=None, md5sum=None,
+                     on_behalf_of=None, in_progress=False, metadata_relevant=False, resume=True):
+        """Replace the file content of the resource at `edit_media_iri` with the file at `path`, in segments.
+
+        Returns the response to the last request, as `Connection.update_files_for_resource` would. `md5sum`, if
+        given, saves hashing the segments that were sent by an earlier, interrupted upload again (only the
+        segmented-deposit extension sends the MD5 of the whole file)."""
+        filename = filename or os.path.basename(path)
+        st = os.stat(path)
+        size = st.st_size
+        common = dict(mimetype=mimetype, filename=filename, packaging=packaging, on_behalf_of=on_behalf_of,
+                      metadata_relevant=metadata_relevant)
+        with open(path, "rb") as f:
+            if size <= self.segment_size:
+                # nothing to gain from segments
+                return self.conn._make_request(edit_media_iri, payload=f, md5sum=md5sum, in_progress=in_progress, 
+                                               method="PUT", request_type="Segmented upload: single request", **common)
+            refused = self.conn._preflight(edit_media_iri, f, mimetype, packaging)
+        if refused is not None:
+            return refused
+        count = max(1, -(-size // self.segment_size))
+        journal_path = self.journal_path(path)
+        journal = self._load_journal(journal_path, edit_media_iri, path, size, st.st_mtime) if resume else None
+        if journal is None:
+            journal = {"iri" : edit_media_iri, "size" : size, "mtime" : st.st_mtime, "segment_size" : self.segment_size,
+                       "mode" : None, "temporary_iri" : None, "segments" : [None] * count}
+        mode = journal["mode"] or self.mode
+        if mode in ("auto", "content-range"):
+            stored, result = self._probe_content_range(edit_media_iri, size, on_behalf_of)
+            if stored is None:
+                if self.mode == "content-range":
+                    raise SegmentedUploadError(result and result.response_headers, 
+                                               "%s does not accept uploads with Content-Range" % edit_media_iri)
+                mode = "segmented"
+            elif stored == size and result.code != 308:
+                if os.path.exists(journal_path):
+                    os.remove(journal_path)
+                return result
+            else:
+                mode = "content-range"
+                # the server knows best how much of the file it holds
+                for i in range(count):
+                    if (i + 1) * self.segment_size > stored:
+                        journal["segments"][i] = None
+        if journal["mode"] != mode:
+            journal["mode"] = mode
+            journal["segments"] = [None] * count
+            journal["temporary_iri"] = None
+        if mode == "content-range" and all(journal["segments"]):
+            # the server's answer to the last segment is the answer to the whole upload
+            journal["segments"][-1] = None
+        if mode == "segmented" and journal["temporary_iri"] is None:
+            result = self._request(edit_media_iri, "POST", "Segmented upload: init", empty=True, on_behalf_of=on_behalf_of,
+                                   extra_headers={'Segmented-Upload' : "init; size=%s; segment_size=%s; segment_count=%s" %
+                                                  (size, self.segment_size, count)})
+            if result.code >= 400 or not result.location:
+                raise SegmentedUploadError(result.response_headers, "%s did not start a segmented upload" % edit_media_iri)
+            journal["temporary_iri"] = result.location
+        self._save_journal(journal_path, journal)
+
+        done = sum(1 for seg in journal["segments"] if seg is not None)
+        if done:
+            su_l.info("Resuming the upload of %s to %s - %s of %s segments already stored", path, edit_media_iri, done, count)
+        whole = hashlib.md5() if mode == "segmented" and md5sum is None else None
+        result = None
+        for i in range(count):
+            offset = i * self.segment_size
+            length = min(self.segment_size, size - offset)
+            if journal["segments"][i] is not None:
+                if whole is not None:
+                    digest = _segment_md5(path, offset, length, whole)
+                    if digest != journal["segments"][i]:
+                        raise SegmentedUploadError(None, "%s has changed since segment %s was sent" % (path, i + 1))
+                continue
+            digest = _segment_md5(path, offset, length, whole)
+            with FileSegment(path, offset, length) as payload:
+                if mode == "content-range":
+                    result = self._request(edit_media_iri, "PUT", "Segmented upload: segment %s/%s" % (i + 1, count),
+                                           operation="Segmented upload: segment", payload=payload, md5sum=digest, in_progress=in_progress,
+                                           minimal_response=None if i == count - 1 else True,
+                                           extra_headers={'Content-Range' : "bytes %s-%s/%s" % (offset, offset + length - 1, size)},
+                                           **common)
+                else:
+                    result = self._request(journal["temporary_iri"], "POST", "Segmented upload: segment %s/%s" % (i + 1, count),
+                                           operation="Segmented upload: segment", payload=payload, md5sum=digest, in_progress=True,
+                                           extra_headers={'Segment-Number' : str(i + 1)}, **common)
+            if result.code >= 400:
+                self._save_journal(journal_path, journal)
+                return result
+            journal["segments"][i] = digest
+            self._save_journal(journal_path, journal)
+
+        if mode == "segmented":
+            complete = {'Segmented-Upload' : journal["temporary_iri"],
+                        'Content-Type' : str(mimetype),
+                        'Content-MD5' : md5sum or whole.hexdigest(),
+                        'Content-Disposition' : "attachment; filename=%s" % urllib.parse.quote(filename)}
+            if packaging is not None:
+                complete['Packaging'] = str(packaging)
+            result = self.conn._make_request(edit_media_iri, empty=True, method="PUT", in_progress=in_progress,
+                                             on_behalf_of=on_behalf_of, metadata_relevant=metadata_relevant,
+                                             extra_headers=complete, request_type="Segmented upload: complete")
+        if getattr(result, "code", 0) < 300:
+            os.remove(journal_path)
+        return result
@@ -73,19 +73,19 @@ class ServiceDocument(object):
     def load_document(self, xml_response):
         try:
             if self.sd_uri:
-                sd_l.debug("Attempting to load service document for %s" % self.sd_uri)
+                sd_l.debug("Attempting to load service document for %s", self.sd_uri)
             else:
                 sd_l.debug("Attempting to load service document")
             self.raw_response = xml_response
             self.service_dom = etree.fromstring(xml_response)
             self.parsed = True
             self.valid = self.validate()
-            sd_l.info("Initial SWORD2 validation checks on service document - Valid document? %s" % self.valid)
+            sd_l.info("Initial SWORD2 validation checks on service document - Valid document? %s", self.valid)
             self._enumerate_workspaces()
         except Exception as e:
             # Due to variability of underlying etree implementations, catching all
             # exceptions...
-            sd_l.error("Could not parse the Service Document response from the server - %s" % e)
+            sd_l.error("Could not parse the Service Document response from the server - %s", e)
             sd_l.debug("Received the following raw response:")
             sd_l.debug(self.raw_response)
 
@@ -101,7 +101,7 @@ class ServiceDocument(object):
             if self.version != "2.0":
                 # Not a SWORD2 server...
                 # Fail here?
-                sd_l.error("The service document states that the server's endpoint is not SWORD 2.0 - stated version:%s" % self.version)
+                sd_l.error("The service document states that the server's endpoint is not SWORD 2.0 - stated version:%s", self.version)
                 valid = False
         else:
             sd_l.error("The service document did not have a sword:version")
@@ -151,7 +151,7 @@ class ServiceDocument(object):
                         if multipart is not None:
                             if multipart != "multipart-related" and multipart != "multipart/related":
                                 multipart_accept_valid = False
-                                sd_l.debug("Multipart accept alternate is incorrect: " + str(multipart))
+                                sd_l.debug("Multipart accept alternate is incorrect: %s", multipart)
                         else:
                             # FIXME: we could test to see if the content is viable, but probably that's pointless
                             pass
@@ -168,13 +168,13 @@ class ServiceDocument(object):
             return
         
         if self.sd_uri:
-            sd_l.info("Enumerating workspaces and collections from the service document for %s" % self.sd_uri)
+            sd_l.info("Enumerating workspaces and collections from the service document for %s", self.sd_uri)
         
         # Reset the internally cached set
         self.workspaces = []
         for workspace in self.service_dom.findall(NS['app'] % "workspace"):
             workspace_title = get_text(workspace, NS['atom'] % 'title')
-            sd_l.debug("Found workspace '%s'" % workspace_title)
+            sd_l.debug("Found workspace '%s'", workspace_title)
             collections = []
             for collection_element in workspace.findall(NS['app'] % 'collection'):
                 # app:collection + sword extensions
@@ -27,8 +27,8 @@ class Sword_Statement(object):
                 self.dom = etree.fromstring(self.xml_document)
                 self.parsed = True
             except Exception as e:
-                s_l.error("Failed to parse document - %s" % e)
-                s_l.error("XML document begins:\n %s" % self.xml_document[:300])
+                s_l.error("Failed to parse document - %s", e)
+                s_l.error("XML document begins:\n %s", self.xml_document[:300])
     
     def _validate(self): pass
 
@@ -67,8 +67,8 @@ class Atom_Statement_Entry(Deposit_Receipt, Statement_Resource):
             try:
                 self.deposited_on = datetime.strptime(do.text.strip(), "%Y-%m-%dT%H:%M:%SZ") # e.g. 2011-03-02T20:50:06Z
             except Exception as e:
-                s_l.error("Failed to parse date - %s" % e)
-                s_l.error("Supplied date as string was: %s" % do.text.strip())
+                s_l.error("Failed to parse date - %s", e)
+                s_l.error("Supplied date as string was: %s", do.text.strip())
 
         db = self.dom.find(NS['sword'] % "depositedBy")
         if db is not None and db.text is not None and db.text.strip() != "":
@@ -200,16 +200,19 @@ class Ore_Sword_Statement(Sword_Statement):
             for state_uri in desc.findall(NS['sword'] % "state"):
                 state_uris.append(state_uri.get(NS['rdf'] % "resource"))
         
-        s_l.debug("First pass on ORE statement yielded the following Aggregated Resources: " + str(aggregated_resource_uris))
-        s_l.debug("First pass on ORE statement yielded the following Original Deposits: " + str(original_deposit_uris))
-        s_l.debug("First pass on ORE statement yielded the following States: " + str(state_uris))
+        s_l.debug("First pass on ORE statement yielded the following Aggregated Resources: %s", aggregated_resource_uris)
+        s_l.debug("First pass on ORE statement yielded the following Original Deposits: %s", original_deposit_uris)
+        s_l.debug("First pass on ORE statement yielded the following States: %s", state_uris)
         
+        debug = s_l.isEnabledFor(logging.DEBUG)    # per element, so skip the calls altogether if not
         # second pass, sort out the different descriptions
         for desc in self.dom.findall(NS['rdf'] % "Description"):
             about = desc.get(NS['rdf'] % "about")
-            s_l.debug("Examining Described Resource: " + str(about))
+            if debug:
+                s_l.debug("Examining Described Resource: %s", about)
             if about in state_uris:
-                s_l.debug(str(about) + " is a State URI")
+                if debug:
+                    s_l.debug("%s is a State URI", about)
                 # read and store the state information
                 description_text = None
                 sdesc = desc.find(NS['sword'] % "stateDescription")
@@ -220,43 +223,50 @@ class Ore_Sword_Statement(Sword_Statement):
                 # deal with any left over later
                 state_uris.remove(about)
             elif about in aggregated_resource_uris:
-                s_l.debug(str(about) + " is an Aggregated Resource")
+                if debug:
+                    s_l.debug("%s is an Aggregated Resource", about)
                 
                 is_original_deposit = about in original_deposit_uris
-                s_l.debug("Is Aggregated Resource an original deposit? " + str(is_original_deposit))
+                if debug:
+                    s_l.debug("Is Aggregated Resource an original deposit? %s", is_original_deposit)
                 
                 packaging_uris = []
                 for pack in desc.findall(NS['sword'] % "packaging"):
                     pack_uri = pack.get(NS['rdf'] % "resource")
                     packaging_uris.append(pack_uri)
-                    s_l.debug("Registering Packaging URI: " + pack_uri)
+                    if debug:
+                        s_l.debug("Registering Packaging URI: %s", pack_uri)
                 
                 deposited_on = None
                 do = desc.find(NS['sword'] % "depositedOn")
                 if do is not None and do.text is not None and do.text.strip() != "":
                     try:
                         deposited_on = datetime.strptime(do.text.strip(), "%Y-%m-%dT%H:%M:%SZ") # e.g. 2011-03-02T20:50:06Z
-                        s_l.debug("Registering Deposited On: " + do.text.strip())
+                        if debug:
+                            s_l.debug("Registering Deposited On: %s", do.text.strip())
                     except Exception as e:
-                        s_l.error("Failed to parse date - %s" % e)
-                        s_l.error("Supplied date as string was: %s" % do.text.strip())
+                        s_l.error("Failed to parse date - %s", e)
+                        s_l.error("Supplied date as string was: %s", do.text.strip())
 
                 deposited_by = None
                 db = desc.find(NS['sword'] % "depositedBy")
                 if db is not None and db.text is not None and db.text.strip() != "":
                     deposited_by = db.text.strip()
-                    s_l.debug("Registering Deposited By: " + deposited_by)
+                    if debug:
+                        s_l.debug("Registering Deposited By: %s", deposited_by)
                 
                 deposited_on_behalf_of = None
                 dobo = desc.find(NS['sword'] % "depositedOnBehalfOf")
                 if dobo is not None and dobo.text is not None and db.text.strip() != "":
                     deposited_on_behalf_of = dobo.text.strip()
-                    s_l.debug("Registering Deposited On Behalf Of: " + deposited_on_behalf_of)
+                    if debug:
+                        s_l.debug("Registering Deposited On Behalf Of: %s", deposited_on_behalf_of)
                     
                 ose = Ore_Statement_Resource(about, is_original_deposit, packaging_uris, 
                                             deposited_on, deposited_by, deposited_on_behalf_of)
                 if is_original_deposit:
-                    s_l.debug("Registering Aggregated Resource as an Original Deposit")
+                    if debug:
+                        s_l.debug("Registering Aggregated Resource as an Original Deposit")
                     self.original_deposits.append(ose)
                 self.resources.append(ose)
                 
@@ -267,11 +277,11 @@ class Ore_Sword_Statement(Sword_Statement):
         # finally, we may have aggregated resources and states which did not
         # have rdf:Description elements associated with them.  We do the minimum
         # possible here to accommodate them
-        s_l.debug("Undescribed State URIs: " + str(state_uris))
+        s_l.debug("Undescribed State URIs: %s", state_uris)
         for state in state_uris:
             self.states.append((state, None))
         
-        s_l.debug("Undescribed Aggregated Resource URIs: " + str(aggregated_resource_uris))
+        s_l.debug("Undescribed Aggregated Resource URIs: %s", aggregated_resource_uris)
         for ar in aggregated_resource_uris:
             ose = Ore_Statement_Resource(ar)
             self.resources.append(ose)
@@ -286,7 +296,7 @@ class Ore_Sword_Statement(Sword_Statement):
         
         # is this rdf xml:
         if self.dom.tag.lower() != NS['rdf'] % "rdf" and self.dom.tag.lower() != "rdf":
-            s_l.info("Validation of Ore Statement failed, as root tag is not RDF: " + self.dom.tag)
+            s_l.info("Validation of Ore Statement failed, as root tag is not RDF: %s", self.dom.tag)
             valid = False
         
         # does it meet the basic requirements of being a resource map, which 
@@ -310,15 +320,15 @@ class Ore_Sword_Statement(Sword_Statement):
         
         # now check that all those uris tie up:
         if describes_uri != aggregation_uri:
-            s_l.info("Validation of Ore Statement failed; ore:describes URI does not match Aggregation URI: " +
-                        describes_uri + " != " + aggregation_uri)
+            s_l.info("Validation of Ore Statement failed; ore:describes URI does not match Aggregation URI: %s != %s",
+                        describes_uri, aggregation_uri)
             valid = False
         if rem_uri not in is_described_by_uris:
-            s_l.info("Validation of Ore Statement failed; Resource Map URI does not match one of ore:isDescribedBy URIs: " + 
-                        rem_uri + " not in " + str(is_described_by_uris))
+            s_l.info("Validation of Ore Statement failed; Resource Map URI does not match one of ore:isDescribedBy URIs: %s not in %s", 
+                        rem_uri, is_described_by_uris)
             valid = False
         
-        s_l.info("Statement validation; was it a success? " + str(valid))
+        s_l.info("Statement validation; was it a success? %s", valid)
         self.valid = valid
 
 
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Structured logging, for deployments that make too many requests to read their logs line by line.
+
+`Connection` reports each operation it completes as one event on the `sword2.events` logger, with fields for its
+operation ("Col_IRI POST", "EM_IRI PUT", "Cont_IRI GET"... as in `sword2.metrics`), IRI, HTTP status, duration,
+bytes sent and received and number of retries. The event logger is quiet (at WARNING) unless its level has been
+set, so there are no events until they are asked for; an operation which gets an error status is logged at WARNING,
+the others at INFO.
+
+`configure` sets up the `sword2` loggers without a `logging.config` file: it writes every record as a line of JSON
+(`JSONFormatter`), turns on the operation events, keeps the free-text messages of the other `sword2` loggers at
+WARNING (by default - several a request at INFO), and passes the records through a `SamplingFilter`, which can
+keep a fraction of them (`sample`) and at most `rate` of each kind (each message, or each operation) every `per`
+seconds. Warnings and errors are always kept. A record which follows some that were held back says how many in its
+`suppressed` field.
+
+Usage:
+
+>>> import sys
+>>> from sword2 import Connection
+>>> from sword2.structured_logging import configure
+>>> configure(stream=sys.stdout, sample=0.1)
+>>> conn = Connection("http://localhost:8080/sd-uri")
+>>> conn.get_resource(content_iri="http://localhost:8080/cont-iri")
+{"time": "2024-05-30T01:06:13.251Z", "level": "INFO", "logger": "sword2.events", "message": "Cont_IRI GET http://localhost:8080/cont-iri: 200 in 12.3ms", "event": "Cont_IRI GET", "iri": "http://localhost:8080/cont-iri", "status": 200, "duration_ms": 12.3, "sent": 0, "received": 5120, "retries": 0, "sample": 0.1}
+
+To send the records to a handler of your own (eg a `logging.handlers.QueueHandler`), pass it as `handler`; to keep
+the free-text messages too, but no more than 10 of each a minute, `configure(level=logging.INFO, rate=10)`.
+"""
+
+import sys
+import json
+import time
+import random
+import threading
+
+from .sword2_logging import logging
+
+EVENTS = "sword2.events"
+events_l = logging.getLogger(EVENTS)
+if events_l.level == logging.NOTSET:
+    # quiet until asked for - see `configure`
+    events_l.setLevel(logging.WARNING)
+
+def log_operation(operation, iri, seconds, status=None, sent=0, received=0, retries=0):
+    """Logs an operation as an event on the `sword2.events` logger, if it is enabled at INFO"""
+    if not events_l.isEnabledFor(logging.INFO):
+        return
+    level = logging.WARNING if status is not None and status >= 400 else logging.INFO
+    duration_ms = round(seconds * 1e3, 3)
+    events_l.log(level, "%s %s: %s in %.1fms", operation, iri, status, duration_ms,
+                 extra={'event' : operation,
+                        'fields' : {'event' : operation, 'iri' : iri, 'status' : status, 'duration_ms' : duration_ms,
+                                    'sent' : sent, 'received' : received, 'retries' : retries}})
+
+class JSONFormatter(logging.Formatter):
+    """Formats a record as one line of JSON: its time (UTC), level, logger and message, and the `fields` given to
+    the logger in `extra` (as `log_operation` does), with the `suppressed` and `sample` noted by a `SamplingFilter`"""
+    def format(self, record):
+        event = {'time' : time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + ".%03dZ" % record.msecs,
+                 'level' : record.levelname,
+                 'logger' : record.name,
+                 'message' : record.getMessage()}
+        fields = getattr(record, 'fields', None)
+        if fields:
+            event.update(fields)
+        for name in ('suppressed', 'sample'):
+            value = getattr(record, name, None)
+            if value is not None:
+                event[name] = value
+        if record.exc_info:
+            event['exception'] = self.formatException(record.exc_info)
+        return json.dumps(event, default=str)
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, sample=1.0, rate=None, per=60.0, level=logging.WARNING, clock=time.monotonic,
+                       random=random.random):
+        """
+Keeps records at `level` and above, and of the others:
+
+    sample -- the fraction to keep, at random (the records kept are marked with it, so that counts can be scaled)
+    rate   -- how many of each kind to keep every `per` seconds (`None` for no limit), where the kind of a record
+              is the operation of an event, or else the logger and the message (before its arguments are filled in)
+        """
+        logging.Filter.__init__(self)
+        self.sample = sample
+        self.rate = rate
+        self.per = per
+        self.level = level
+        self.clock = clock
+        self.random = random
+        self._windows = {}      # kind -> [start of the window, records kept in it, records held back]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= self.level:
+            return True
+        if self.sample < 1.0:
+            if self.random() >= self.sample:
+                return False
+            record.sample = self.sample
+        if self.rate is None:
+            return True
+        kind = (record.name, getattr(record, 'event', None) or record.msg)
+        now = self.clock()
+        with self._lock:
+            window = self._windows.get(kind)
+            if window is None or now - window[0] >= self.per:
+                window = self._windows[kind] = [now, 0, window[2] if window is not None else 0]
+            if window[1] >= self.rate:
+                window[2] += 1
+                return False
+            window[1] += 1
+            if window[2]:
+                record.suppressed = window[2]
+                window[2] = 0
+        return True
+
+def configure(stream=None, handler=None, level=logging.WARNING, events=True, sample=1.0, rate=None, per=60.0,
+              propagate=False):
+    """
+Sets up the `sword2` loggers for structured logging, and returns the handler (to remove, with
+`logging.getLogger("sword2").removeHandler`, when done with):
+
+    stream    -- where to write the JSON lines to, if no `handler` is given (default `sys.stderr`)
+    handler   -- a `logging.Handler` to send the records to instead, which is given a `JSONFormatter`
+    level     -- level of the free-text messages of the `sword2` loggers
+    events    -- whether to log an event for each operation
+    sample, rate, per -- see `SamplingFilter`
+    propagate -- whether the records should also go to the handlers of the root logger
+    """
+    if handler is None:
+        handler = logging.StreamHandler(stream if stream is not None else sys.stderr)
+    handler.setFormatter(JSONFormatter())
+    if sample < 1.0 or rate is not None:
+        handler.addFilter(SamplingFilter(sample=sample, rate=rate, per=per))
+    logger = logging.getLogger("sword2")
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = propagate
+    events_l.setLevel(logging.INFO if events else logging.WARNING)
+    return handler
@@ -3,18 +3,19 @@
 
 """
 `sword2` logging
+
+Nothing is configured when `sword2` is imported: the `sword2.*` loggers use whatever configuration the application
+has set up. To use a `logging.config.fileConfig` file instead, call `load_logging_config`:
+
+>>> from sword2.sword2_logging import load_logging_config
+>>> load_logging_config()       # sword2/data/sword2_logging.conf, if there is one
+>>> load_logging_config("/etc/myapp/sword2_logging.conf")
 """
 
-import imp
 import os
 import logging
-import logging.config
 
-try:
-    _, sword2_path, _ = imp.find_module('sword2')
-except ImportError:
-    sword2_path = ""
-SWORD2_LOGGING_CONFIG = os.path.join(sword2_path, 'data', 'sword2_logging.conf')  # default
+SWORD2_LOGGING_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'sword2_logging.conf')  # default
 
 BASIC_CONFIG = """[loggers]
 keys=root
@@ -59,12 +60,41 @@ def create_logging_config(pathtologgingconf=None):
     fn.write(BASIC_CONFIG)
     fn.close()
 
-#if not os.path.isfile(SWORD2_LOGGING_CONFIG):
-#    create_logging_config(SWORD2_LOGGING_CONFIG)
-#
-#logging.config.fileConfig(SWORD2_LOGGING_CONFIG)
+def load_logging_config(pathtologgingconf=None):
+    """
+    Loads the logging configuration from the file at the path provided, or from SWORD2_LOGGING_CONFIG if
+    no path is provided.  Returns True if the file was there and has been loaded, False if there is no such file.
+    (This used to happen when `sword2` was imported.)
+    """
+    if pathtologgingconf is None:
+        pathtologgingconf = SWORD2_LOGGING_CONFIG
+    if not os.path.isfile(pathtologgingconf):
+        return False
+    import logging.config
+    logging.config.fileConfig(pathtologgingconf, disable_existing_loggers=False)
+    return True
+
+LOG_BODY_LIMIT = 1024     # characters of a request or response body to show in a log message
+
+class Snippet(object):
+    """Stands for a (possibly large) request or response body in the arguments of a log message: it is only turned
+    into text if the message is emitted, and then shows no more than the first `limit` characters of it
+
+    >>> conn_l.debug("Error body received from server: %s", Snippet(content))
+    """
+    __slots__ = ('body', 'limit')
 
-# when we call this module, load the logging configuration if it exists
-if os.path.isfile(SWORD2_LOGGING_CONFIG):
-   logging.config.fileConfig(SWORD2_LOGGING_CONFIG)
+    def __init__(self, body, limit=LOG_BODY_LIMIT):
+        self.body = body
+        self.limit = limit
 
+    def __str__(self):
+        body = self.body
+        if isinstance(body, (bytes, bytearray)):
+            text = bytes(body[:self.limit]).decode("utf-8", "replace")
+        else:
+            body = str(body)
+            text = body[:self.limit]
+        if len(body) > self.limit:
+            text += "... (%s characters in all)" % len(body)
+        return text
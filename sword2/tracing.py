@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tracing of requests, broken down into the phases that they spend their time in.
+
+A `Connection` with a `Tracer` runs each operation in a span (named as in `sword2.metrics`: "Col_IRI POST",
+"EM_IRI PUT", "Cont_IRI GET"...), with a child span for each phase of it:
+
+    hash            -- working out the MD5 of the payload
+    build body      -- serialising the metadata entry, or building the multipart body
+    attempt         -- one try at the request through the http layer (there is one for each retry), made up of
+        send        -- from the start of the request until the last byte of the body has been sent
+        ttfb        -- from then until the response headers arrive (time to first byte)
+        receive     -- reading the response body
+    retry wait      -- the pause before a retry
+    parse           -- parsing the service document, deposit receipt or statement
+
+The http layers built on `http.client` (and the streaming requests of `HttpLib2Layer`) report the moment that
+the body has been sent and the moment that the headers arrive, by calling `mark`. Where a layer does not (the
+plain requests of `HttpLib2Layer`, which httplib2 makes in one go), the end of `send` is known only if there is
+no body, or it is read from a file or sent chunked, and what follows it is a single `response` span.
+
+Spans are passed to the `on_start` and `on_end` callbacks of the tracer as they start and end, and the spans that
+have ended are kept (up to `maxlen`) for `to_chrome_trace`, which writes them in the Trace Event format that
+chrome://tracing and https://ui.perfetto.dev show as a timeline, a row for each thread.
+
+Usage:
+
+>>> from sword2 import Connection
+>>> from sword2.tracing import Tracer
+>>> def slow(span):
+...     if span.name == "ttfb" and span.duration > 5:
+...         print("%s waited %.1fs for the server" % (span.attributes.get('iri'), span.duration))
+>>> tracer = Tracer(on_end=slow)
+>>> conn = Connection("http://localhost:8080/sd-uri", tracer=tracer)
+>>> ...
+>>> with open("deposits.trace.json", "w") as f:
+...     tracer.to_chrome_trace(f)
+"""
+
+import os
+import json
+import time
+import threading
+import functools
+import itertools
+import contextlib
+from collections import deque
+
+_local = threading.local()
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def current():
+    """The innermost span in progress on this thread, or `None`"""
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else None
+
+def mark(name):
+    """Notes the time at which `name` ("sent", "headers") happened, on the span in progress on this thread - for
+    the http layers to call. Does nothing if there is no span."""
+    stack = getattr(_local, "stack", None)
+    if stack:
+        stack[-1].mark(name)
+
+class Span(object):
+    """A timed piece of work
+
+    `self.name`
+    `self.id`, `self.parent_id` -- ids of this span and of the span it is part of (`None` for a top-level span)
+    `self.start`, `self.end`    -- `time.monotonic()` when the span started and ended (`None` until it has)
+    `self.thread`               -- id of the thread it ran in
+    `self.attributes`           -- `dict` of details, eg the IRI and the HTTP status of a request
+    `self.marks`                -- `dict` of the times of things that happened during it (see `mark`)
+    """
+    __slots__ = ('name', 'id', 'parent_id', 'start', 'end', 'thread', 'attributes', 'marks')
+
+    def __init__(self, name, id, parent_id, start, thread, attributes):
+        self.name = name
+        self.id = id
+        self.parent_id = parent_id
+        self.start = start
+        self.end = None
+        self.thread = thread
+        self.attributes = attributes
+        self.marks = {}
+
+    @property
+    def duration(self):
+        return self.end - self.start if self.end is not None else None
+
+    def mark(self, name, at=None):
+        """Notes the time of `name`, unless it has been noted already"""
+        if name not in self.marks:
+            self.marks[name] = time.monotonic() if at is None else at
+
+    def __repr__(self):
+        return "<sword2.Span %s #%s (parent %s): %s>" % (self.name, self.id, self.parent_id, self.duration)
+
+class _NoSpan(object):
+    """Context manager standing in for `Tracer.span` when there is no tracer"""
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *args):
+        return False
+
+NO_SPAN = _NoSpan()
+
+class Tracer(object):
+    """Starts and ends spans, calling the `on_start` and `on_end` hooks of each, and keeps the last `maxlen` spans
+    that have ended (`None` for no limit) in `self.spans`. Safe to share between threads and connections.
+
+    Hooks are called in the thread that the span ran in, and should be quick."""
+    def __init__(self, on_start=None, on_end=None, maxlen=100000):
+        self.hooks = []
+        if on_start is not None or on_end is not None:
+            self.add_hook(on_start, on_end)
+        self.spans = deque(maxlen=maxlen)
+        self._ids = itertools.count(1)
+
+    def add_hook(self, on_start=None, on_end=None):
+        """Adds a pair of callbacks, each taking a `Span`"""
+        self.hooks.append((on_start, on_end))
+
+    def start(self, name, parent=None, at=None, **attributes):
+        """Starts a span, as part of `parent` (by default, the span in progress on this thread). It is not made the
+        current span - see `span`."""
+        if parent is None:
+            parent = current()
+        span = Span(name, next(self._ids), parent.id if parent is not None else None,
+                    time.monotonic() if at is None else at, threading.get_ident(), attributes)
+        for on_start, _ in self.hooks:
+            if on_start is not None:
+                on_start(span)
+        return span
+
+    def end(self, span, at=None, **attributes):
+        span.end = time.monotonic() if at is None else at
+        span.attributes.update(attributes)
+        self.spans.append(span)
+        for _, on_end in self.hooks:
+            if on_end is not None:
+                on_end(span)
+
+    def record(self, name, start, end, parent=None, **attributes):
+        """Adds a span which has already happened, from `start` to `end`"""
+        span = self.start(name, parent=parent, at=start, **attributes)
+        self.end(span, at=end)
+        return span
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        """Runs the `with` block in a span, which is the current span of this thread (and so the parent of the
+        spans started in it) until the block ends. An exception is noted in the 'error' attribute."""
+        span = self.start(name, **attributes)
+        stack = _stack()
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.attributes['error'] = e.__class__.__name__
+            raise
+        finally:
+            stack.pop()
+            self.end(span)
+
+    def clear(self):
+        self.spans.clear()
+
+    def trace_events(self):
+        """The spans that have ended, as a `list` of Trace Event "complete" events"""
+        pid = os.getpid()
+        events = []
+        for span in list(self.spans):
+            args = dict(span.attributes)
+            args['id'] = span.id
+            if span.parent_id is not None:
+                args['parent'] = span.parent_id
+            events.append({'name' : span.name, 'cat' : "sword2", 'ph' : "X", 'pid' : pid, 'tid' : span.thread,
+                           'ts' : round(span.start * 1e6, 3), 'dur' : round((span.end - span.start) * 1e6, 3),
+                           'args' : args})
+        return events
+
+    def to_chrome_trace(self, fp=None):
+        """The spans that have ended as Chrome trace JSON, written to `fp` if given, otherwise returned"""
+        trace = {'traceEvents' : self.trace_events(), 'displayTimeUnit' : "ms"}
+        if fp is None:
+            return json.dumps(trace, default=str)
+        json.dump(trace, fp, default=str)
+
+def traced(name):
+    """Decorates a method of an object with a `tracer` attribute (a `Tracer`, or `None`), so that it runs in a span
+    named `name` - or `name(*args, **kw)`, if it is callable"""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kw):
+            tracer = self.tracer
+            if tracer is None:
+                return method(self, *args, **kw)
+            with tracer.span(name(*args, **kw) if callable(name) else name):
+                return method(self, *args, **kw)
+        return wrapper
+    return decorate
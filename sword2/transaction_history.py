@@ -3,9 +3,35 @@
 
 """
 Provides a class to hold the `sword2.Connection` transaction history and give simple means for export (JSON) and reporting.
+
+`Transaction_History`, the default, keeps every record in memory, and so grows for as long as the `Connection` is
+used. For long-running or bulk work, pass one of the other backends as the `keep_history` parameter of `Connection`:
+
+    `Ring_History(maxlen)`      -- keeps only the last `maxlen` records
+    `JSONL_History(path)`       -- appends each record to a file, one JSON object per line, from a background thread
+                                   (so the request path never waits on the disc), and keeps the last few in memory
+
+All of them can be treated like an ordinary sequence (`len(h)`, `h[-1]`, iteration) of `History_Record`s.
+
+A record keeps what is worth keeping about a request rather than the objects involved: the HTTP status and a few
+of the response headers (`RESPONSE_HEADERS`) instead of the response object, the size of the request and response
+bodies, and a `time.monotonic` timestamp (turned into a date only when the record is exported). So records are
+small, and always JSON-safe. `to_json(fp)` writes them to a file one at a time, however many there are.
+
+>>> from sword2 import Connection
+>>> from sword2.transaction_history import JSONL_History
+>>> conn = Connection("http://localhost:8080/sd-uri", keep_history=JSONL_History("/var/log/sword2-history.jsonl"))
+>>> ...
+>>> conn.history.close()        # writes out whatever is still queued
 """
 
+import io
 import json
+import time
+import queue
+import atexit
+import threading
+from collections import deque
 from datetime import datetime
 
 from .sword2_logging import logging
@@ -13,11 +39,75 @@ from .sword2_logging import logging
 th_l = logging.getLogger(__name__)
 
 
-class Transaction_History(list):
+# Response headers that are kept in a record (the rest are dropped)
+RESPONSE_HEADERS = ('location', 'content-type', 'content-length', 'content-md5', 'etag', 'last-modified',
+                    'retry-after', 'range')
+
+# wall-clock time = monotonic time + _WALL_OFFSET
+_WALL_OFFSET = time.time() - time.monotonic()
+
+def _size(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+class History_Record(object):
+    """One entry in a transaction history
+
+    `self.type`     -- the kind of event (eg "init", "SD Parse", "Col_IRI POST: simple resource request")
+    `self.time`     -- when it was logged, as `time.monotonic()`
+    `self.status`   -- HTTP status of the response, for a request (otherwise `None`)
+    `self.payload`  -- `dict` of the details of the event
+
+    `record['type']`, `record['timestamp']` (an isoformat date) and `record['payload']` work as they did when
+    records were `dict`s."""
+    __slots__ = ('type', 'time', 'status', 'payload')
+
+    def __init__(self, event_type, payload, status=None, t=None):
+        self.type = event_type
+        self.time = time.monotonic() if t is None else t
+        self.status = status
+        self.payload = payload
+
+    @property
+    def timestamp(self):
+        return datetime.fromtimestamp(self.time + _WALL_OFFSET).isoformat()
+
+    def __getitem__(self, key):
+        if key in self.__slots__ or key == 'timestamp':
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def to_dict(self):
+        d = {'type':self.type, 'timestamp':self.timestamp, 'payload':self.payload}
+        if self.status is not None:
+            d['status'] = self.status
+        return d
+
+    def __repr__(self):
+        return "<sword2.History_Record - %s [%s]>" % (self.type, self.status)
+
+    @classmethod
+    def from_event(cls, event_type, kw):
+        """Makes a record of a `log` call: a `response` object is boiled down to its status, selected headers and
+        size, and the size of the request body is taken from its Content-Length"""
+        status = None
+        response = kw.pop('response', None)
+        if response is not None:
+            status = _size(response['status'])
+            kw['response_headers'] = dict((h, response.get(h)) for h in RESPONSE_HEADERS
+                                          if response.get(h) is not None)
+            kw.setdefault('response_size', _size(response.get('content-length')))
+        headers = kw.get('headers')
+        if headers and 'Content-Length' in headers:
+            kw.setdefault('request_size', _size(headers['Content-Length']))
+        return cls(event_type, kw, status)
+
+class _History(object):
+    """The behaviour shared by the history backends, on top of a `list` or a `deque` of `History_Record`s"""
     def log(self, event_type, **kw):
-        self.append({'type':event_type,
-                     'timestamp':datetime.now().isoformat(),
-                     'payload':kw})
+        self.append(History_Record.from_event(event_type, kw))
 
     def __str__(self):
         _s = []
@@ -26,14 +116,99 @@ class Transaction_History(list):
             _s.append("Type: '%s' [%s]\nData:" % (item['type'], item['timestamp']))
             for key, value in item['payload'].items():
                 _s.append("%s:   %s" % (key, value))
-        
+
         return "\n".join(_s)
 
-    def to_json(self):
-        th_l.debug("Attempting to dump %s history items to JSON" % len(self))
-        return json.dumps(self)
+    def to_json(self, fp=None, indent=None):
+        """Writes the history to the file-like `fp` as a JSON list, a record at a time - or returns it as a string,
+        if `fp` is not given"""
+        th_l.debug("Attempting to dump %s history items to JSON", len(self))
+        if fp is None:
+            fp = io.StringIO()
+            self.to_json(fp, indent)
+            return fp.getvalue()
+        fp.write("[")
+        for n, record in enumerate(list(self)):
+            if n:
+                fp.write(",")
+            fp.write("\n" if indent is not None else "")
+            fp.write(json.dumps(record.to_dict(), indent=indent, default=str))
+        fp.write("\n]" if indent is not None and self else "]")
+
+    def to_pretty_json(self, fp=None):
+        th_l.debug("Attempting to dump %s history items to indented, readable JSON", len(self))
+        return self.to_json(fp, indent=True)
+
+class Transaction_History(_History, list):
+    pass
+
+class Ring_History(_History, deque):
+    """Keeps the last `maxlen` records, dropping the oldest"""
+    def __init__(self, maxlen=1000):
+        deque.__init__(self, maxlen=maxlen)
+
+class JSONL_History(Ring_History):
+    """Appends each record to the file at `path` as a line of JSON, and keeps the last `maxlen` in memory.
+
+    The file is written by a background thread, which flushes it every `flush_interval` seconds while there is
+    something to write. `flush()` waits until everything logged so far is on disc; `close()` (also called at exit)
+    does the same and stops the thread."""
+    def __init__(self, path, maxlen=100, flush_interval=1.0):
+        Ring_History.__init__(self, maxlen=maxlen)
+        self.path = path
+        self.flush_interval = flush_interval
+        self._fp = open(path, "a", encoding="utf-8")
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write, name="sword2-history-writer")
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.close)
+
+    def append(self, record):
+        Ring_History.append(self, record)
+        self._queue.put(record)
+
+    def _write(self):
+        flush_at = None         # when there is something written but not yet flushed
+        while True:
+            try:
+                timeout = None if flush_at is None else max(0, flush_at - time.monotonic())
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+            if isinstance(item, History_Record):
+                try:
+                    self._fp.write(json.dumps(item.to_dict(), default=str) + "\n")
+                except Exception as e:
+                    th_l.error("Could not write a history record to %s: %s", self.path, e)
+                if flush_at is None:
+                    flush_at = time.monotonic() + self.flush_interval
+                if time.monotonic() < flush_at:
+                    continue
+            if flush_at is not None:
+                self._fp.flush()
+                flush_at = None
+            if item is None:
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+
+    def flush(self):
+        if self._thread.is_alive():
+            done = threading.Event()
+            self._queue.put(done)
+            done.wait()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if not self._fp.closed:
+            self._fp.close()
+        atexit.unregister(self.close)
 
-    def to_pretty_json(self):
-        th_l.debug("Attempting to dump %s history items to indented, readable JSON" % len(self))
-        return json.dumps(self, indent=True)
+    def __enter__(self):
+        return self
 
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,149 @@
+"""
+The urllib implementation of the http layer (`UrlLib2Layer`), kept apart from `sword2.http_layer` so that
+urllib.request is only imported by those who use it. The names are also available from `sword2.http_layer`
+and `sword2`.
+"""
+
+import urllib.request, urllib.error
+
+from .http_layer import HttpLayer, HttpResponse, StreamingBody, ChunkedBody, OriginScope, basic_auth_header
+from . import tracing
+
+class PreemptiveBasicAuthHandler(urllib.request.HTTPBasicAuthHandler):
+    """Sends Basic credentials with every request to the origin of `uri` (or, without one, of the first request),
+    including those that redirects lead to there, but not to other origins"""
+    def __init__(self, username, password, uri=None):
+        urllib.request.HTTPBasicAuthHandler.__init__(self)
+        self.username = username
+        self.password = password
+        self.scope = OriginScope()
+        self.scope.add(uri)
+
+    def http_request(self, request):
+        if not request.has_header(self.auth_header) and self.scope.includes(request.full_url):
+            request.add_unredirected_header(self.auth_header, basic_auth_header(self.username, self.password))
+        return request
+
+    https_request = http_request
+
+class UrlLib2Response(HttpResponse):
+    def __init__(self, response):
+        self.response = response
+        # header names are case-insensitive, so normalise them as httplib2 does
+        self.headers = dict((k.lower(), v) for k, v in response.info().items())
+        self.status = int(self.response.code)
+
+    def __getitem__(self, att):
+        # needs to behave like a dictionary
+        # we need to be able to look up at least:
+
+        # content-type
+        # status
+        # location
+        if att == "status":
+            return self.status
+        return self.headers[att.lower()]
+
+    def get(self, att, default=None):
+        # same as __getattr__ but with default return
+        if att == "status":
+            return self.status
+        return self.headers.get(att.lower(), default)
+
+    def keys(self):
+        return list(self.headers.keys()) + ["status"]
+
+# http://stackoverflow.com/questions/2502596/python-http-post-a-large-file-with-streaming
+"""
+import urllib2
+import mmap
+
+# Open the file as a memory mapped string. Looks like a string, but 
+# actually accesses the file behind the scenes. 
+f = open('somelargefile.zip','rb')
+mmapped_file_as_string = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+# Do the request
+request = urllib2.Request(url, mmapped_file_as_string)
+request.add_header("Content-Type", "application/zip")
+response = urllib2.urlopen(request)
+
+#close everything
+mmapped_file_as_string.close()
+f.close()
+"""
+
+class UrlLib2Layer(HttpLayer):
+    def __init__(self, opener=None):
+        self.opener = opener
+        if self.opener is None:
+            self.opener = urllib.request.build_opener()
+
+    def add_credentials(self, username, password, uri=None):
+        auth_handler = PreemptiveBasicAuthHandler(username, password, uri)
+        current_handlers = self.opener.handlers
+        new_handlers = current_handlers + [auth_handler]
+        self.opener = urllib.request.build_opener(*new_handlers)
+
+    def request(self, uri, method, headers=None, payload=None):
+        # NOTE: payload can be a file, a string or a ChunkedBody
+
+        if headers is None:
+            headers = {}
+        if isinstance(payload, ChunkedBody):
+            # urllib sends iterables chunked, but has no way to send trailers
+            headers = dict((k, v) for k, v in headers.items() if k.lower() != 'trailer')
+            payload = iter(payload)
+        # should return a tuple of an HttpResponse object and the content
+        try:
+            if method == "GET":
+                req = urllib.request.Request(uri, None, headers)
+                response = self.opener.open(req)
+                tracing.mark("headers")
+                return UrlLib2Response(response), response.read()
+            elif method == "POST":
+                req = urllib.request.Request(uri, payload, headers)
+                response = self.opener.open(req)
+                tracing.mark("headers")
+                return UrlLib2Response(response), response.read()
+            elif method == "PUT":
+                req = urllib.request.Request(uri, payload, headers)
+                # monkey-patch the request method (which seems to be the fastest
+                # way to do this)
+                req.get_method = lambda: 'PUT'
+                response = self.opener.open(req)
+                tracing.mark("headers")
+                return UrlLib2Response(response), response.read()
+            elif method == "DELETE":
+                req = urllib.request.Request(uri, None, headers)
+                # monkey-patch the request method (which seems to be the fastest
+                # way to do this)
+                req.get_method = lambda: 'DELETE'
+                response = self.opener.open(req)
+                tracing.mark("headers")
+                return UrlLib2Response(response), response.read()
+            else:
+                raise NotImplementedError()
+        except urllib.error.HTTPError as e:
+            tracing.mark("headers")
+            try:
+                # treat it like a normal response
+                return UrlLib2Response(e), e.read()
+            except Exception as e:
+                # unable to read()
+                return UrlLib2Response(e), None
+
+    def stream_request(self, uri, method, headers=None, payload=None):
+        if headers is None:
+            headers = {}
+        req = urllib.request.Request(uri, payload, headers)
+        req.get_method = lambda: method
+        try:
+            response = self.opener.open(req)
+        except urllib.error.HTTPError as e:
+            # treat it like a normal response
+            tracing.mark("headers")
+            return UrlLib2Response(e), StreamingBody(e)
+        tracing.mark("headers")
+        return UrlLib2Response(response), StreamingBody(response)
+
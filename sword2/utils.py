@@ -8,6 +8,9 @@ Utility methods used within the module
 from .sword2_logging import logging
 utils_l = logging.getLogger(__name__)
 
+import os
+import stat
+import urllib.parse
 from time import time
 from datetime import datetime
 
@@ -70,6 +73,70 @@ def get_md5(data):
         return m.hexdigest(), f_size
         
 
+def get_size(data):
+    """Returns the size in bytes of a `str` or of the rest of a file-like object, without reading it - using
+    `os.fstat` for real files, and seeking to the end and back for other seekable objects.
+    
+    Returns `None` if the size cannot be found out that way (eg for pipes and sockets)."""
+    if hasattr(data, "read"):
+        try:
+            st = os.fstat(data.fileno())
+            if stat.S_ISREG(st.st_mode):
+                return st.st_size - data.tell()
+            return None
+        except (AttributeError, IOError, OSError, ValueError):
+            pass
+        try:
+            pos = data.tell()
+            end = data.seek(0, os.SEEK_END)
+            data.seek(pos)
+            return end - pos
+        except (AttributeError, IOError, OSError, ValueError):
+            return None
+    try:
+        return len(data)
+    except TypeError:
+        # an iterator or generator
+        return None
+
+def get_host(uri):
+    """The host (with ":port", if the IRI has one) that `uri` is sent to, in lower case and without any
+    credentials"""
+    return urllib.parse.urlsplit(uri).netloc.rpartition("@")[2].lower()
+
+def is_stream(data):
+    """Is `data` a payload whose length is not known up front - an iterable of `bytes` chunks (eg a generator), 
+    or a file-like object that cannot seek (eg a pipe)?"""
+    if isinstance(data, (bytes, bytearray, str)):
+        return False
+    if hasattr(data, "read"):
+        try:
+            return not data.seekable()
+        except AttributeError:
+            return not hasattr(data, "seek")
+        except (IOError, OSError, ValueError):
+            return True
+    return hasattr(data, "__iter__")
+
+def iter_chunks(data, chunk_size=65536):
+    """Yields the contents of `data` - `bytes`, a file-like object or an iterable of chunks - as non-empty `bytes`"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if isinstance(data, (bytes, bytearray)):
+        for i in range(0, len(data), chunk_size):
+            yield bytes(data[i:i+chunk_size])
+    elif hasattr(data, "read"):
+        chunk = data.read(chunk_size)
+        while chunk:
+            yield chunk
+            chunk = data.read(chunk_size)
+    else:
+        for chunk in data:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            if chunk:
+                yield chunk
+
 class Timer(object):
     """Simple timer, providing a 'stopwatch' mechanism.
     
@@ -175,55 +242,69 @@ def get_content_type(filename):
     # Generally better to specify the mimetype upfront.
     return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
 
-def create_multipart_related(payloads):
-    """ Expected: list of dicts with keys 'key', 'type'='content type','filename'=optional,'data'=payload, 'headers'={} 
-    
-    TODO: More mem-efficient to spool this to disc rather than hold in RAM, but until Httplib2 bug gets fixed (issue 151)
-    this might be in vain.
-    
-    Can handle more than just two files. 
-    
-    SWORD2 multipart POST/PUT expects two attachments - key = 'atom' w/ Atom Entry (metadata)
-                                                        key = 'payload' (file)
-    """
+def multipart_boundary():
     # Generate random boundary code
     # TODO check that it does not occur in the payload data
-    bhash = md5(datetime.now().isoformat()).hexdigest()    # eg 'd8bb3ea6f4e0a4b4682be0cfb4e0a24e'
-    BOUNDARY = '===========%s_$' % bhash
+    bhash = md5(datetime.now().isoformat().encode("ascii")).hexdigest()    # eg 'd8bb3ea6f4e0a4b4682be0cfb4e0a24e'
+    return '===========%s_$' % bhash
+
+def iter_multipart_related(payloads, boundary, chunk_size=3*65536):
+    """ Yields the body of a multipart/related request as `bytes` chunks, without holding the whole of it in memory.
+    
+    `payloads` are as for `create_multipart_related`; the 'data' of each can be `bytes`, a file-like object or an 
+    iterable of `bytes` chunks. The 'payload' part is base64 encoded as it is read.
+    """
     CRLF = '\r\n'   # As some servers might barf without this.
-    body = []
     for payload in payloads:   # predicatable ordering...
-        body.append('--' + BOUNDARY)
+        part = ['--' + boundary]
         if payload.get('type', None):
-            body.append('Content-Type: %(type)s' % payload)
+            part.append('Content-Type: %(type)s' % payload)
         else:
-            body.append('Content-Type: %s' % get_content_type(payload.get("filename")))
+            part.append('Content-Type: %s' % get_content_type(payload.get("filename")))
             
         if payload.get('filename', None):
-            body.append('Content-Disposition: attachment; name="%(key)s"; filename="%(filename)s"' % (payload))
+            part.append('Content-Disposition: attachment; name="%(key)s"; filename="%(filename)s"' % (payload))
         else:
-            body.append('Content-Disposition: attachment; name="%(key)s"' % (payload))
+            part.append('Content-Disposition: attachment; name="%(key)s"' % (payload))
         
         if "headers" in payload:
             for f,v in payload['headers'].items():
-                body.append("%s: %s" % (f, v))     # TODO force ASCII?
+                part.append("%s: %s" % (f, v))     # TODO force ASCII?
         
-        body.append('MIME-Version: 1.0')
+        part.append('MIME-Version: 1.0')
         if payload['key'] == 'payload':
-            body.append('Content-Transfer-Encoding: base64')
-            body.append('')
-            if hasattr(payload['data'], 'read'):
-                body.append(b64encode(payload['data'].read()))
-            else:
-                body.append(b64encode(payload['data']))
+            part.append('Content-Transfer-Encoding: base64')
+        part.append('')
+        yield (CRLF.join(part) + CRLF).encode("utf-8")
+        if payload['key'] == 'payload':
+            # base64 in multiples of 3 bytes, so that the encoded chunks join up
+            pending = b""
+            for chunk in iter_chunks(payload['data'], chunk_size):
+                pending += chunk
+                cut = len(pending) - len(pending) % 3
+                if cut:
+                    yield b64encode(pending[:cut])
+                    pending = pending[cut:]
+            if pending:
+                yield b64encode(pending)
         else:
-            body.append('')
-            if hasattr(payload['data'], 'read'):
-                body.append(b64encode(payload['data'].read()))
-            else:
-                body.append(b64encode(payload['data']))
-    body.append('--' + BOUNDARY + '--')
-    body.append('')
-    body_bytes = CRLF.join(body)
-    content_type = 'multipart/related; boundary="%s"' % BOUNDARY
+            for chunk in iter_chunks(payload['data'], chunk_size):
+                yield chunk
+        yield CRLF.encode("ascii")
+    yield ('--' + boundary + '--' + CRLF).encode("ascii")
+
+def create_multipart_related(payloads):
+    """ Expected: list of dicts with keys 'key', 'type'='content type','filename'=optional,'data'=payload, 'headers'={} 
+    
+    Returns a tuple of the Content-Type and the body as `bytes`. (See `iter_multipart_related` for a body which is 
+    built as it is sent.)
+    
+    Can handle more than just two files. 
+    
+    SWORD2 multipart POST/PUT expects two attachments - key = 'atom' w/ Atom Entry (metadata)
+                                                        key = 'payload' (file)
+    """
+    boundary = multipart_boundary()
+    body_bytes = b"".join(iter_multipart_related(payloads, boundary))
+    content_type = 'multipart/related; boundary="%s"' % boundary
     return content_type, body_bytes
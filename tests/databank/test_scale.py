@@ -1,31 +1,51 @@
+import os
+import shutil
+import tempfile
+
 from . import TestController
 
 from sword2 import Connection, Entry, UrlLib2Layer
+from sword2.fake_server import FakeSwordServer
 
-PACKAGE = "/home/richard/Desktop/massive_file.zip"
+# size of the generated package, in MB - set SWORD2_SCALE_MB for a bigger (or smaller) one
+PACKAGE_MB = int(os.environ.get("SWORD2_SCALE_MB", "256"))
 PACKAGE_MIME = "application/zip"
-SSS_URL = "http://localhost:5000/swordv2/service-document"
 SSS_UN = "admin"
 SSS_PW = "admin"
 SSS_OBO = "obo"
 
 class TestScale(TestController):
-    
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.package = os.path.join(self.tmp, "massive_file.zip")
+        block = os.urandom(1024 * 1024)
+        with open(self.package, "wb") as f:
+            for i in range(PACKAGE_MB):
+                f.write(block)
+        # the server keeps only the size and MD5 of what it is sent
+        self.server = FakeSwordServer(user=SSS_UN, password=SSS_PW, keep_content=False).start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmp)
+
     def test_01_massive_file(self):
         http = UrlLib2Layer()
-        conn = Connection(SSS_URL, user_name=SSS_UN, user_pass=SSS_PW, http_impl=http)
+        conn = Connection(self.server.sd_iri, user_name=SSS_UN, user_pass=SSS_PW, http_impl=http)
         conn.get_service_document()
         col = conn.sd.workspaces[0][1][0]
         e = Entry(title="scalability testing", id="asidjasidj", dcterms_abstract="abstract", dcterms_identifier="http://whatever/")
         receipt = conn.create(col_iri = col.href, metadata_entry = e)
         receipt = conn.get_deposit_receipt(receipt.location)
-        
+
         # now do the replace
-        with open(PACKAGE) as pkg:
+        with open(self.package, "rb") as pkg:
             new_receipt = conn.update(dr = receipt,
                             payload=pkg,
                             mimetype=PACKAGE_MIME,
                             filename="massive_file.zip",
                             packaging='http://purl.org/net/sword/package/Binary')
-                            
+
         assert new_receipt.code == 204
+        deposit = list(self.server.deposits.values())[0]
+        assert deposit.files["massive_file.zip"].size == PACKAGE_MB * 1024 * 1024
@@ -2,7 +2,11 @@
 Test framework - basic skeleton to simplify loading testsuite-wide data/config or even
 starting up a local SWORD2 server if later tests require this.
 """
+import threading
 from unittest import TestCase
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from sword2.http_layer import HttpLayer, HttpResponse
 
 class TestController(TestCase):
 
@@ -12,6 +16,68 @@ class TestController(TestCase):
 
     def setUp(self):
         pass
-        
+
     def tearDown(self):
         pass
+
+class MockResponse(HttpResponse):
+    def __init__(self, status, headers=None):
+        self.status = int(status)
+        self.headers = dict((k.lower(), v) for k, v in (headers or {}).items())
+
+    def __getitem__(self, att):
+        if att == "status":
+            return self.status
+        return self.headers.get(att)
+
+    def get(self, att, default=None):
+        if att == "status":
+            return self.status
+        return self.headers.get(att, default)
+
+    def keys(self):
+        return list(self.headers.keys()) + ["status"]
+
+class MockHttpLayer(HttpLayer):
+    """In-memory `HttpLayer` - replays the queued (status, headers, body) responses in order and
+    records each request made as a (uri, method, headers, body) tuple in `self.requests`"""
+    def __init__(self, responses=None):
+        self.responses = list(responses or [])
+        self.requests = []
+        self.credentials = None
+
+    def queue(self, status, headers=None, body=b""):
+        self.responses.append((status, headers, body))
+
+    def add_credentials(self, username, password, uri=None):
+        self.credentials = (username, password)
+
+    def request(self, uri, method, headers=None, payload=None):
+        if hasattr(payload, "read"):
+            payload = payload.read()
+        self.requests.append((uri, method, headers, payload))
+        status, headers, body = self.responses.pop(0)
+        return MockResponse(status, headers), body
+
+class LocalServer(object):
+    """Runs an `http.server` request handler class on a free localhost port, in background threads (so that
+    a client holding a keep-alive connection open does not block the server), for the duration of a `with` 
+    block. `self.url` is the base IRI of the server."""
+    def __init__(self, handler_class):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler_class)
+        self.server.daemon_threads = True
+        self.url = "http://127.0.0.1:%s" % self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+class QuietHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
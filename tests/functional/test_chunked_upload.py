@@ -0,0 +1,104 @@
+import os
+import base64
+import email
+from hashlib import md5
+
+from . import TestController, LocalServer, QuietHandler
+
+from sword2 import Connection, Entry, HttpLib2Layer, UrlLib2Layer
+from sword2.utils import is_stream, create_multipart_related
+
+DATA = os.urandom(100001)
+
+def generate(data, size=7777):
+    for i in range(0, len(data), size):
+        yield data[i:i+size]
+
+class ChunkedHandler(QuietHandler):
+    """Decodes chunked request bodies, keeping each request's (headers, body, trailers)"""
+    protocol_version = "HTTP/1.1"
+    received = []
+
+    def do_POST(self):
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            body = b""
+            size = int(self.rfile.readline().split(b";")[0], 16)
+            while size:
+                body += self.rfile.read(size)
+                self.rfile.readline()
+                size = int(self.rfile.readline().split(b";")[0], 16)
+            trailers = {}
+            line = self.rfile.readline()
+            while line.strip():
+                k, v = line.decode("latin-1").split(":", 1)
+                trailers[k.strip()] = v.strip()
+                line = self.rfile.readline()
+        else:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            trailers = {}
+        ChunkedHandler.received.append((self.headers, body, trailers))
+        self.send_response(201)
+        self.send_header("Location", "http://example.org/edit/1")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_PUT = do_POST
+
+class TestChunkedUpload(TestController):
+    def setUp(self):
+        ChunkedHandler.received = []
+
+    def test_01_is_stream(self):
+        r, w = os.pipe()
+        with os.fdopen(r, "rb") as pipe:
+            assert is_stream(pipe)
+        os.close(w)
+        assert is_stream(generate(DATA))
+        assert not is_stream(DATA)
+        with open(__file__, "rb") as f:
+            assert not is_stream(f)
+
+    def test_02_multipart_related(self):
+        content_type, body = create_multipart_related([{'key':'atom', 'type':'application/atom+xml', 'data':'<entry/>'},
+                                                       {'key':'payload', 'type':'application/zip', 'filename':'a.zip',
+                                                        'data':generate(DATA, 1000)}])
+        msg = email.message_from_bytes(b"Content-Type: " + content_type.encode("ascii") + b"\r\n\r\n" + body)
+        atom, payload = msg.get_payload()
+        assert atom.get_payload() == "<entry/>"
+        assert payload.get_payload(decode=True) == DATA
+
+    def test_03_httplib2_chunked_with_md5_trailer(self):
+        with LocalServer(ChunkedHandler) as server:
+            conn = Connection(server.url + "/sd-iri", http_impl=HttpLib2Layer(None))
+            receipt = conn.create(col_iri=server.url + "/col-iri", payload=generate(DATA), mimetype="application/zip",
+                                  filename="package.zip", packaging="http://purl.org/net/sword/package/SimpleZip")
+            assert receipt.code == 201
+            headers, body, trailers = ChunkedHandler.received[0]
+            assert body == DATA
+            assert headers.get("Content-Length") is None
+            assert headers.get("Trailer") == "Content-MD5"
+            assert trailers == {"Content-MD5" : md5(DATA).hexdigest()}
+
+    def test_04_urllib_chunked_with_md5sum(self):
+        r, w = os.pipe()
+        os.write(w, DATA[:50000])
+        os.close(w)
+        with LocalServer(ChunkedHandler) as server, os.fdopen(r, "rb") as pipe:
+            conn = Connection(server.url + "/sd-iri", http_impl=UrlLib2Layer())
+            receipt = conn.update(edit_media_iri=server.url + "/em-iri", payload=pipe, mimetype="application/zip",
+                                  filename="package.zip", md5sum=md5(DATA[:50000]).hexdigest())
+            assert receipt.code == 201
+            headers, body, trailers = ChunkedHandler.received[0]
+            assert body == DATA[:50000]
+            assert headers.get("Content-MD5") == md5(DATA[:50000]).hexdigest()
+
+    def test_05_streamed_multipart(self):
+        with LocalServer(ChunkedHandler) as server:
+            conn = Connection(server.url + "/sd-iri", http_impl=HttpLib2Layer(None))
+            conn.create(col_iri=server.url + "/col-iri", payload=generate(DATA), mimetype="application/zip",
+                        filename="package.zip", metadata_entry=Entry(title="t"), md5sum=md5(DATA).hexdigest())
+            headers, body, trailers = ChunkedHandler.received[0]
+            msg = email.message_from_bytes(b"Content-Type: " + headers["Content-Type"].encode("ascii") + b"\r\n\r\n" + body)
+            atom, payload = msg.get_payload()
+            assert payload["Content-MD5"] == md5(DATA).hexdigest()
+            assert payload.get_payload(decode=True) == DATA
@@ -0,0 +1,124 @@
+import socket
+
+from . import TestController, MockHttpLayer
+
+from sword2 import Connection
+from sword2.exceptions import CircuitOpen, ServerError
+from sword2.circuit_breaker import CircuitBreaker, CircuitBreakerLayer, CLOSED, OPEN
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class FailingLayer(MockHttpLayer):
+    """Raises the queued exceptions, or replays the queued responses"""
+    def request(self, uri, method, headers=None, payload=None):
+        if self.responses and isinstance(self.responses[0], Exception):
+            self.requests.append((uri, method, headers, payload))
+            raise self.responses.pop(0)
+        return MockHttpLayer.request(self, uri, method, headers, payload)
+
+class TestCircuitBreaker(TestController):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, clock=self.clock)
+        self.h = FailingLayer()
+        self.layer = CircuitBreakerLayer(self.h, self.breaker, probe_iri="http://repo.example.org/sd-iri")
+
+    def test_01_opens_after_failures_in_a_row(self):
+        self.h.queue(503)
+        self.h.queue(200)                    # a success resets the count
+        self.h.queue(500)
+        self.h.responses.append(socket.timeout("timed out"))
+        self.h.queue(502)
+        for i in range(3):
+            self.layer.request("http://repo.example.org/col", "GET")
+        self.assertRaises(socket.timeout, self.layer.request, "http://repo.example.org/col", "GET")
+        assert self.breaker.state("repo.example.org") == CLOSED
+        self.layer.request("http://repo.example.org/col", "GET")
+        assert self.breaker.state("repo.example.org") == OPEN
+        # now fails fast, without being sent
+        self.clock.now = 4.0
+        try:
+            self.layer.request("http://repo.example.org/col", "POST", payload=b"big upload")
+            assert False, "CircuitOpen not raised"
+        except CircuitOpen as e:
+            assert e.host == "repo.example.org" and e.retry_in == 6.0
+        assert len(self.h.requests) == 5
+        # other hosts are not affected
+        self.h.queue(200)
+        self.layer.request("http://other.example.org/col", "GET")
+        assert self.breaker.state("other.example.org") == CLOSED
+
+    def _open(self, host="repo.example.org"):
+        while self.breaker.state(host) != OPEN:
+            self.h.queue(503)
+            self.layer.request("http://%s/col" % host, "GET")
+        self.h.requests = []
+
+    def test_02_probe(self):
+        self._open()
+        self.clock.now = 10.0
+        self.h.queue(500)                    # the probe fails
+        self.assertRaises(CircuitOpen, self.layer.request, "http://repo.example.org/col", "POST", {}, b"data")
+        assert [r[:2] for r in self.h.requests] == [("http://repo.example.org/sd-iri", "GET")]
+        assert self.breaker.state("repo.example.org") == OPEN
+        self.clock.now = 15.0
+        self.assertRaises(CircuitOpen, self.layer.request, "http://repo.example.org/col", "POST", {}, b"data")
+        self.clock.now = 20.0
+        self.h.queue(200)                    # the probe
+        self.h.queue(201)
+        resp, content = self.layer.request("http://repo.example.org/col", "POST", {}, b"data")
+        assert resp.status == 201
+        assert [r[:2] for r in self.h.requests[1:]] == [("http://repo.example.org/sd-iri", "GET"),
+                                                        ("http://repo.example.org/col", "POST")]
+        assert self.breaker.state("repo.example.org") == CLOSED
+
+    def test_03_probe_of_another_host(self):
+        for i in range(3):
+            self.h.queue(503)
+            self.layer.stream_request("http://files.example.org/cont/1", "GET")
+        self.clock.now = 10.0
+        self.h.queue(200)
+        self.h.queue(200, {}, b"data")
+        resp, body = self.layer.stream_request("http://files.example.org/cont/1", "GET")
+        assert body.read() == b"data"
+        assert self.h.requests[-2][:2] == ("http://files.example.org/cont/1", "HEAD")
+
+    def test_04_layer_without_head(self):
+        # as UrlLib2Layer, which cannot send a HEAD: the request itself is the probe
+        self._open("files.example.org")
+        self.clock.now = 10.0
+        self.h.responses.append(NotImplementedError())
+        self.h.queue(200, {}, b"data")
+        resp, content = self.layer.request("http://files.example.org/cont/1", "GET")
+        assert content == b"data" and self.breaker.state("files.example.org") == CLOSED
+        assert [r[1] for r in self.h.requests[-2:]] == ["HEAD", "GET"]
+        # and a failed one opens the circuit again
+        self._open("files.example.org")
+        self.clock.now = 30.0
+        self.h.responses.append(NotImplementedError())
+        self.h.queue(503)
+        self.layer.request("http://files.example.org/cont/1", "GET")
+        assert self.breaker.state("files.example.org") == OPEN
+
+    def test_05_server_not_found(self):
+        import httplib2
+        assert self.breaker.is_failure(error=httplib2.ServerNotFoundError("Unable to find the server"))
+        assert not self.breaker.is_failure(error=httplib2.RedirectLimit("Too many redirects", None, None))
+        assert not CircuitBreaker(failure_exceptions=[socket.timeout]).is_failure(error=ConnectionResetError())
+
+    def test_06_connection(self):
+        self.h.queue(503)
+        conn = Connection("http://repo.example.org/sd-iri", http_impl=self.h, circuit_breaker=self.breaker,
+                          retry_policy=False)
+        self.assertRaises(ServerError, conn.get_resource, content_iri="http://repo.example.org/cont")
+        self._open()
+        self.assertRaises(CircuitOpen, conn.get_resource, content_iri="http://repo.example.org/cont")
+        # not retried - the point is not to wait
+        conn = Connection("http://repo.example.org/sd-iri", http_impl=self.h, circuit_breaker=self.breaker)
+        self.assertRaises(CircuitOpen, conn.get_resource, content_iri="http://repo.example.org/cont")
+        assert self.h.requests == []
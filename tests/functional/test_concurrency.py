@@ -0,0 +1,122 @@
+import time
+import socket
+import threading
+
+from . import TestController, MockResponse
+
+from sword2 import Connection
+from sword2.http_layer import HttpLayer
+from sword2.concurrency import AdaptiveLimiter, percentile
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class CountingLayer(HttpLayer):
+    """Answers every request after a short wait, recording the most requests it had at once"""
+    def __init__(self, capacity=None):
+        self.capacity = capacity
+        self.current = 0
+        self.most = 0
+        self.lock = threading.Lock()
+
+    def request(self, uri, method, headers=None, payload=None):
+        with self.lock:
+            self.current += 1
+            self.most = max(self.most, self.current)
+            busy = self.capacity is not None and self.current > self.capacity
+        time.sleep(0.01)
+        with self.lock:
+            self.current -= 1
+        if busy:
+            return MockResponse(503), b""
+        return MockResponse(200, {"Content-Type" : "application/octet-stream"}), b"data"
+
+class TestConcurrency(TestController):
+    def _run(self, limiter, times=1, **kw):
+        for i in range(times):
+            limiter.acquire()
+            limiter.release(**kw)
+
+    def test_01_percentile(self):
+        assert percentile([], 95) is None
+        assert percentile(range(1, 101), 95) == 95
+        assert percentile([3, 1, 2], 50) == 2
+
+    def test_02_grows_on_success(self):
+        limiter = AdaptiveLimiter(initial=2, max_limit=5, window=10, clock=FakeClock())
+        self._run(limiter, 2, latency=0.1, status=200)
+        assert round(limiter.limit, 6) == 2.9   # +1/2, then +1/2.5
+        self._run(limiter, 100, latency=0.1, status=200)
+        assert limiter.limit == 5            # capped
+        assert limiter.p95 == 0.1 and limiter.baseline == 0.1
+
+    def test_03_shrinks_once_per_round_trip(self):
+        clock = FakeClock()
+        limiter = AdaptiveLimiter(initial=16, clock=clock)
+        self._run(limiter, latency=1.0, status=503)
+        assert limiter.limit == 8
+        self._run(limiter, latency=1.0, status=500)
+        assert limiter.limit == 8            # the requests already in flight are not counted again
+        clock.now = 1.5
+        self._run(limiter, latency=0.5, error=socket.timeout("timed out"))
+        assert limiter.limit == 4
+        clock.now = 3.0
+        self._run(limiter, latency=0.5, error=ValueError("not the server's fault"))
+        self._run(limiter, latency=0.5, status=404)
+        assert limiter.limit > 4
+        for i in range(10):
+            clock.now += 10
+            self._run(limiter, latency=0.1, status=502)
+        assert limiter.limit == 1
+
+    def test_04_retry_after_pauses(self):
+        clock = FakeClock()
+        limiter = AdaptiveLimiter(initial=4, clock=clock)
+        self._run(limiter, latency=0.1, status=503, retry_after="5")
+        assert limiter.paused_until == 5.0
+        started = threading.Event()
+        done = threading.Event()
+        def worker():
+            started.set()
+            limiter.acquire()
+            done.set()
+        t = threading.Thread(target=worker)
+        t.start()
+        started.wait()
+        assert not done.wait(0.1)
+        clock.now = 5.0
+        with limiter._cond:
+            limiter._cond.notify_all()
+        assert done.wait(2)
+        t.join()
+
+    def test_05_rising_latency(self):
+        clock = FakeClock()
+        limiter = AdaptiveLimiter(initial=8, window=10, clock=clock)
+        self._run(limiter, 10, latency=0.1, status=200)
+        limit = limiter.limit
+        self._run(limiter, 10, latency=0.5, status=200)
+        assert limiter.p95 == 0.5
+        assert limiter.limit < limit
+        assert limiter.baseline == 0.1
+
+    def test_06_connection_keeps_to_the_window(self):
+        layer = CountingLayer(capacity=3)
+        limiter = AdaptiveLimiter(initial=8, max_limit=8)
+        conn = Connection("http://example.org/sd-iri", http_impl=layer, concurrency_limiter=limiter,
+                          retry_policy=False, error_response_raises_exceptions=False)
+        def worker():
+            for i in range(10):
+                conn.get_resource(content_iri="http://example.org/cont-iri")
+        threads = [threading.Thread(target=worker) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert limiter.in_flight == 0
+        assert limiter.limit < 8             # 503s when more than 3 were sent at once
+        assert layer.most <= 8
@@ -1,8 +1,12 @@
+import io
 import json
+import tempfile
 
-from . import TestController
+from . import TestController, MockHttpLayer
 
-from sword2 import Connection
+from sword2 import Connection, Entry, Deposit_Receipt, Minimal_Receipt, Error_Document
+from sword2.exceptions import MaxUploadSizeExceeded, UnsupportedMediaType, PackagingFormatNotAvailable
+from .test_deposit_receipt import DR
 
 long_service_doc = '''<?xml version="1.0" ?>
 <service xmlns:dcterms="http://purl.org/dc/terms/"
@@ -86,3 +90,79 @@ class TestConnection(TestController):
         assert len(conn.history) == 2
         assert conn.history[0]['type'] == "init"
         assert conn.history[1]['type'] == "SD Parse"
+
+    def test_04_minimal_response_discards_body(self):
+        http = MockHttpLayer()
+        http.queue(201, {"Location" : "http://example.org/edit/1"}, DR.encode("utf-8"))
+        conn = Connection("http://example.org/service-doc", http_impl=http, minimal_response=True)
+        receipt = conn.create(col_iri="http://example.org/col", metadata_entry=Entry(title="t"))
+        assert isinstance(receipt, Minimal_Receipt)
+        assert receipt.code == 201
+        assert receipt.location == "http://example.org/edit/1"
+        assert receipt.edit == "http://example.org/edit/1"
+        assert receipt.content is None
+        # nothing parsed, so nothing cached
+        assert len(conn.edit_iris) == 0
+
+    def test_05_minimal_response_per_call_raw(self):
+        http = MockHttpLayer()
+        http.queue(201, {"Location" : "http://example.org/edit/1"}, DR.encode("utf-8"))
+        http.queue(201, {"Location" : "http://example.org/edit/2"}, DR.encode("utf-8"))
+        conn = Connection("http://example.org/service-doc", http_impl=http)
+        receipt = conn.create(col_iri="http://example.org/col", metadata_entry=Entry(title="t"),
+                              minimal_response="raw")
+        assert isinstance(receipt, Minimal_Receipt)
+        assert receipt.content is not None
+        dr = receipt.to_deposit_receipt()
+        assert dr.parsed
+        assert dr.code == 201
+        assert dr.edit == "http://example.org/edit/1"
+        # the connection-wide default still returns a full receipt
+        receipt = conn.create(col_iri="http://example.org/col", metadata_entry=Entry(title="t"))
+        assert isinstance(receipt, Deposit_Receipt)
+        assert "http://example.org/edit/2" in conn.edit_iris
+
+    def test_06_preflight_max_upload_size(self):
+        http = MockHttpLayer()
+        conn = Connection("http://example.org/service-doc", http_impl=http)
+        conn.load_service_document(long_service_doc.replace("16777216", "1"))    # 1kB
+        with tempfile.TemporaryFile() as f:
+            f.write(b"x" * 2000)
+            f.seek(0)
+            self.assertRaises(MaxUploadSizeExceeded, conn.create, col_iri="http://swordapp.org/col-iri/43",
+                              payload=f, mimetype="application/zip", filename="big.zip",
+                              packaging="http://purl.org/net/sword/package/SimpleZip")
+            assert f.tell() == 0
+        self.assertRaises(MaxUploadSizeExceeded, conn.update, edit_media_iri="http://example.org/em-iri",
+                          payload=b"x" * 2000, mimetype="application/zip", filename="big.zip")
+        assert http.requests == []
+        # ... unless receipts are not being honoured
+        conn.honour_receipts = False
+        http.queue(204)
+        conn.update(edit_media_iri="http://example.org/em-iri", payload=b"x" * 2000, mimetype="application/zip",
+                    filename="big.zip")
+        assert len(http.requests) == 1
+
+    def test_07_preflight_accept_lists(self):
+        http = MockHttpLayer()
+        conn = Connection("http://example.org/service-doc", http_impl=http)
+        conn.load_service_document(long_service_doc)
+        self.assertRaises(UnsupportedMediaType, conn.create, col_iri="http://swordapp.org/col-iri/46",
+                          payload=b"data", mimetype="text/plain", filename="file.txt")
+        self.assertRaises(UnsupportedMediaType, conn.create, col_iri="http://swordapp.org/col-iri/46",
+                          payload=b"data", mimetype="text/plain", filename="file.txt", metadata_entry=Entry(title="t"))
+        self.assertRaises(PackagingFormatNotAvailable, conn.create, col_iri="http://swordapp.org/col-iri/44",
+                          payload=b"data", mimetype="application/zip", filename="file.zip",
+                          packaging="http://purl.org/net/sword/package/METSDSpaceSIP")
+        assert http.requests == []
+
+        conn.raise_except = False
+        refused = conn.create(col_iri="http://swordapp.org/col-iri/46", payload=io.BytesIO(b"data"),
+                              mimetype="text/plain", filename="file.txt")
+        assert isinstance(refused, Error_Document)
+        assert refused.code == 415
+
+        http.queue(201, {"Location" : "http://example.org/edit/1"}, DR.encode("utf-8"))
+        conn.create(col_iri="http://swordapp.org/col-iri/46", payload=b"data", mimetype="application/zip",
+                    filename="file.zip", packaging="http://purl.org/net/sword/package/SimpleZip")
+        assert len(http.requests) == 1
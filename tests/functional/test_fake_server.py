@@ -0,0 +1,136 @@
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+
+from . import TestController
+
+from sword2 import Connection, Entry, UrlLib2Layer, HttpLib2Layer, RetryPolicy
+from sword2.exceptions import NotAuthorised
+from sword2.fake_server import FakeSwordServer
+
+SIMPLE_ZIP = "http://purl.org/net/sword/package/SimpleZip"
+BINARY = "http://purl.org/net/sword/package/Binary"
+
+class TestFakeServer(TestController):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _connect(self, server, **kw):
+        # no httplib2 cache, which would be written to the working directory
+        kw.setdefault('http_impl', HttpLib2Layer(None))
+        return Connection(server.sd_iri, **kw)
+
+    def _create(self, conn, server, payload=b"data", **kw):
+        return conn.create(col_iri=server.col_iris[0], payload=payload, mimetype="application/zip",
+                           filename="example.zip", packaging=SIMPLE_ZIP, **kw)
+
+    def test_01_deposit_lifecycle(self):
+        with FakeSwordServer(user="sword", password="sword") as server:
+            for layer in (HttpLib2Layer(None), UrlLib2Layer()):
+                conn = self._connect(server, user_name="sword", user_pass="sword", http_impl=layer)
+                conn.get_service_document()
+                assert conn.sd.valid and [c.href for c in conn.workspaces[0][1]] == server.col_iris
+                e = Entry(title="Foo", id="info:example/1", dcterms_abstract="About foo")
+                receipt = self._create(conn, server, metadata_entry=e, in_progress=True)
+                assert receipt.code == 201 and receipt.title == "Foo"
+                assert receipt.metadata['dcterms_abstract'] == ["About foo"]
+                assert conn.get_resource(receipt.cont_iri).content == b"data"
+
+                state = receipt.edit.replace("edit-uri", "state-uri")
+                atom = conn.get_atom_sword_statement(state + ".atom")
+                assert atom.resources[0].deposited_by == "sword"
+                ore = conn.get_ore_sword_statement(state + ".rdf")
+                assert ore.states[0][0].endswith("inprogress")
+                assert ore.original_deposits[0].uri.endswith("/example.zip")
+
+                assert conn.complete_deposit(se_iri=receipt.se_iri).code == 200
+                assert conn.update(dr=receipt, payload=b"new data", mimetype="application/zip",
+                                   filename="new.zip", packaging=SIMPLE_ZIP).code == 204
+                assert conn.get_resource(receipt.cont_iri).content == b"new data"
+                assert conn.append(se_iri=receipt.se_iri, payload=b"more", mimetype="text/plain",
+                                   filename="more.txt", packaging=BINARY).code == 200
+                assert len(conn.get_ore_sword_statement(state + ".rdf").resources) == 2
+                dr = conn.update_metadata_for_resource(edit_iri=receipt.edit, metadata_entry=Entry(title="Bar", id="x"))
+                assert dr.code == 200 and dr.title == "Bar"
+                assert conn.delete(resource_iri=receipt.edit_media).code == 204
+                assert conn.delete(resource_iri=receipt.edit).code == 204
+                assert receipt.edit.rsplit("/", 1)[1] not in server.deposits
+            assert server.counts[('POST', 'col')] >= 2
+
+    def test_02_error_documents(self):
+        with FakeSwordServer(mediation=False, max_upload_size=1024, accept_packaging=[SIMPLE_ZIP]) as server:
+            conn = self._connect(server, error_response_raises_exceptions=False, honour_receipts=False)
+            e = self._create(conn, server, md5sum="0" * 32)
+            assert e.code == 412 and e.error_href == "http://purl.org/net/sword/error/ErrorChecksumMismatch"
+            e = self._create(conn, server, on_behalf_of="jbloggs")
+            assert e.code == 412 and e.error_href == "http://purl.org/net/sword/error/MediationNotAllowed"
+            e = self._create(conn, server, payload=b"x" * 2048)
+            assert e.code == 413
+            e = conn.create(col_iri=server.col_iris[0], payload=b"data", mimetype="text/plain", filename="a.txt",
+                            packaging=BINARY)
+            assert e.code == 415 and e.error_href == "http://purl.org/net/sword/error/ErrorContent"
+            # a chunked upload with an MD5 trailer is checked too
+            receipt = self._create(conn, server, payload=(b"data" for i in range(100)))
+            assert receipt.code == 201
+            deposit = server.deposits[receipt.edit.rsplit("/", 1)[1]]
+            assert deposit.files["example.zip"].md5 == hashlib.md5(b"data" * 100).hexdigest()
+        with FakeSwordServer(user="sword", password="sword") as server:
+            conn = self._connect(server, user_name="sword", user_pass="wrong", http_impl=UrlLib2Layer())
+            self.assertRaises(NotAuthorised, self._create, conn, server)
+
+    def test_03_injected_errors(self):
+        with FakeSwordServer(retry_after=0) as server:
+            server.inject(503, count=2, method="POST")
+            conn = self._connect(server, retry_policy=RetryPolicy(max_retries=3, backoff_factor=0.01, retry_post=True))
+            assert self._create(conn, server).code == 201
+            assert [r[2] for r in server.requests] == [503, 503, 201]
+        with FakeSwordServer(error_rate=0.5, random=iter([0.1, 0.9, 0.2, 0.7]).__next__) as server:
+            conn = self._connect(server, error_response_raises_exceptions=False, retry_policy=False)
+            codes = [conn.get_resource(server.sd_iri).code for i in range(4)]
+            assert codes == [503, 200, 503, 200]
+
+    def test_04_latency_and_bandwidth(self):
+        with FakeSwordServer(latency=0.2) as server:
+            conn = self._connect(server)
+            started = time.monotonic()
+            conn.get_service_document()
+            assert time.monotonic() - started >= 0.2
+        with FakeSwordServer(bandwidth=200000) as server:
+            conn = self._connect(server)
+            started = time.monotonic()
+            receipt = self._create(conn, server, payload=b"x" * 100000)
+            assert time.monotonic() - started >= 0.45
+            assert server.requests[-1][3] == 100000
+
+    def test_05_segmented_transfers(self):
+        data = os.urandom(300000)
+        path = os.path.join(self.tmp, "big.zip")
+        with open(path, "wb") as f:
+            f.write(data)
+        with FakeSwordServer() as server:
+            conn = self._connect(server)
+            receipt = self._create(conn, server)
+            result = conn.update_files_for_resource(path, "big.zip", mimetype="application/zip",
+                                                    edit_media_iri=receipt.edit_media, segment_size=100000)
+            assert result.code == 204
+            f = server.deposits[receipt.edit.rsplit("/", 1)[1]].files["big.zip"]
+            assert f.content == data and f.md5 == hashlib.md5(data).hexdigest()
+            # the probe and three segments
+            assert [r[2] for r in server.requests if r[0] == "PUT"] == [308, 308, 308, 204]
+            out = os.path.join(self.tmp, "out.zip")
+            result = conn.download_resource(receipt, out, segments=3)
+            with open(out, "rb") as f:
+                assert f.read() == data
+
+    def test_06_without_content(self):
+        with FakeSwordServer(keep_content=False) as server:
+            conn = self._connect(server)
+            receipt = self._create(conn, server, payload=b"x" * 5000)
+            f = server.deposits[receipt.edit.rsplit("/", 1)[1]].files["example.zip"]
+            assert f.content is None and f.size == 5000
+            assert conn.get_resource(receipt.cont_iri).content == bytes(5000)
@@ -0,0 +1,128 @@
+import os
+import json
+import shutil
+import tempfile
+from hashlib import md5
+
+from . import TestController, LocalServer, QuietHandler
+
+from sword2 import Connection, HttpLib2Layer, Harvester
+from sword2.harvester import container_directory, MANIFEST_NAME
+
+FILES = {"/part-IRI/43/example.zip" : os.urandom(200000),
+         "/part-IRI/43/other/example.zip" : os.urandom(1000),
+         "/part-IRI/43/readme.txt" : b"hello world"}
+
+RECEIPT = """<entry xmlns="http://www.w3.org/2005/Atom">
+    <id>43</id>
+    <link rel="edit" href="%(url)s/edit-IRI/43"/>
+    <link rel="http://purl.org/net/sword/terms/statement" type="application/atom+xml;type=feed"
+          href="%(url)s/statement/43"/>
+</entry>"""
+
+STATEMENT = """<atom:feed xmlns:sword="http://purl.org/net/sword/terms/" xmlns:atom="http://www.w3.org/2005/Atom">
+%s
+</atom:feed>"""
+
+STATEMENT_ENTRY = """    <atom:entry><atom:content type="application/octet-stream" src="%s"/></atom:entry>"""
+
+class ContainerHandler(QuietHandler):
+    gets = []
+    heads = []
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = "http://%s:%s" % self.server.server_address
+        ContainerHandler.gets.append(self.path)
+        if self.path == "/edit-IRI/43":
+            self._send(200, "application/atom+xml;type=entry", (RECEIPT % {"url" : url}).encode("utf-8"))
+        elif self.path == "/statement/43":
+            entries = [STATEMENT_ENTRY % (url + path) for path in sorted(FILES)]
+            entries.append(STATEMENT_ENTRY % (url + "/part-IRI/43/missing.bin"))
+            self._send(200, "application/atom+xml;type=feed", (STATEMENT % "\n".join(entries)).encode("utf-8"))
+        elif self.path in FILES:
+            self._send(200, "application/octet-stream", FILES[self.path])
+        else:
+            self._send(404, "text/plain", b"not found")
+
+    def do_HEAD(self):
+        ContainerHandler.heads.append((self.path, self.headers.get("On-Behalf-Of")))
+        self.send_response(200 if self.path in FILES else 404)
+        if self.path in FILES:
+            self.send_header("Content-Length", str(len(FILES[self.path])))
+            self.send_header("Content-MD5", md5(FILES[self.path]).hexdigest())
+        self.end_headers()
+
+class TestHarvester(TestController):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        ContainerHandler.gets = []
+        ContainerHandler.heads = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_01_container_directory(self):
+        d = container_directory("/mirror", "http://localhost:8080/edit-IRI/43/my deposit")
+        assert d == os.path.join("/mirror", "localhost_8080", "edit-IRI", "43", "my_deposit")
+
+    def test_02_harvest_and_skip(self):
+        with LocalServer(ContainerHandler) as server:
+            conn = Connection(server.url + "/sd-iri", http_impl=HttpLib2Layer(None), error_response_raises_exceptions=False)
+            edit_iri = server.url + "/edit-IRI/43"
+            result = Harvester(conn, self.tmp, workers=4).harvest([edit_iri])[0]
+
+            assert result.statement_iri == server.url + "/statement/43"
+            assert len(result.downloaded) == 3
+            assert len(result.errors) == 1 and result.errors[0][0].endswith("missing.bin")
+            directory = container_directory(self.tmp, edit_iri)
+            assert sorted(os.listdir(directory)) == [MANIFEST_NAME, "example.zip", "example.zip.1", "readme.txt"]
+            with open(os.path.join(directory, "readme.txt"), "rb") as f:
+                assert f.read() == b"hello world"
+            with open(os.path.join(directory, MANIFEST_NAME)) as f:
+                manifest = json.load(f)
+            assert manifest["readme.txt"]["md5"] == md5(b"hello world").hexdigest()
+
+            # a second run skips everything that is already present
+            ContainerHandler.gets = []
+            result = Harvester(conn, self.tmp, workers=4).harvest([edit_iri])[0]
+            assert len(result.downloaded) == 0
+            assert len(result.skipped) == 3
+            assert not [p for p in ContainerHandler.gets if p in FILES]
+
+            # ... unless it has been changed locally, which is only noticed on the size alone if asked
+            with open(os.path.join(directory, "readme.txt"), "wb") as f:
+                f.write(b"HELLO WORLD")
+            result = Harvester(conn, self.tmp, verify_local=False).harvest([edit_iri])[0]
+            assert len(result.skipped) == 3
+            result = Harvester(conn, self.tmp).harvest([edit_iri])[0]
+            assert result.downloaded == [os.path.join(directory, "readme.txt")]
+            with open(os.path.join(directory, "readme.txt"), "rb") as f:
+                assert f.read() == b"hello world"
+
+    def test_03_missing_container(self):
+        with LocalServer(ContainerHandler) as server:
+            conn = Connection(server.url + "/sd-iri", http_impl=HttpLib2Layer(None), error_response_raises_exceptions=False)
+            result = Harvester(conn, self.tmp).harvest([server.url + "/edit-IRI/44"])[0]
+            assert result.statement_iri is None
+            assert len(result.errors) == 1
+            assert not result.ok
+
+    def test_04_verify_remote(self):
+        with LocalServer(ContainerHandler) as server:
+            conn = Connection(server.url + "/sd-iri", http_impl=HttpLib2Layer(None), on_behalf_of="jbloggs",
+                              error_response_raises_exceptions=False)
+            edit_iri = server.url + "/edit-IRI/43"
+            Harvester(conn, self.tmp).harvest([edit_iri])
+            ContainerHandler.gets = []
+            result = Harvester(conn, self.tmp, verify_remote=True).harvest([edit_iri])[0]
+            assert len(result.skipped) == 3
+            assert not [p for p in ContainerHandler.gets if p in FILES]
+            # the HEADs are sent with the headers of the Connection, as any other request is
+            assert sorted(ContainerHandler.heads) == [(p, "jbloggs") for p in sorted(FILES)]
@@ -0,0 +1,239 @@
+import io
+import time
+import base64
+
+from . import TestController, LocalServer, QuietHandler
+
+from sword2 import Connection, HttpLib2Layer, UrlLib2Layer
+from sword2.exceptions import HTTPResponseError
+from sword2.http_layer import RewindingBody, ChunkedBody
+
+from .test_chunked_upload import ChunkedHandler
+
+AUTH = "Basic " + base64.b64encode(b"sword:s\xc3\xa9cret").decode("ascii")
+
+class AuthHandler(QuietHandler):
+    requests = []
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        AuthHandler.requests.append((self.headers.get("Authorization"), body))
+        if self.headers.get("Authorization") != AUTH:
+            self.send_response(401)
+            self.send_header("WWW-Authenticate", 'Basic realm="sword"')
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_POST = do_PUT
+
+class RedirectHandler(QuietHandler):
+    """Redirects every GET to `target`"""
+    target = None
+
+    def do_GET(self):
+        self.send_response(302)
+        self.send_header("Location", RedirectHandler.target + self.path)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+class GetHandler(AuthHandler):
+    def do_GET(self):
+        AuthHandler.requests.append((self.headers.get("Authorization"), self.path))
+        if self.headers.get("Authorization") != AUTH:
+            self.send_response(401)
+            self.send_header("WWW-Authenticate", 'Basic realm="sword"')
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", "4")
+        self.end_headers()
+        self.wfile.write(b"data")
+
+class ChunkedAuthHandler(ChunkedHandler):
+    def do_PUT(self):
+        if self.headers.get("Authorization") != AUTH:
+            self.send_response(401)
+            self.send_header("WWW-Authenticate", 'Basic realm="sword"')
+            self.send_header("Connection", "close")
+            self.end_headers()
+            return
+        ChunkedHandler.do_PUT(self)
+
+class ContinueHandler(QuietHandler):
+    """Refuses uploads of more than 1000 bytes before reading them"""
+    protocol_version = "HTTP/1.1"
+    received = []
+
+    def handle_expect_100(self):
+        if int(self.headers.get("Content-Length", 0)) > 1000:
+            self.send_response(413)
+            self.send_header("Content-Length", "0")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            return False
+        return QuietHandler.handle_expect_100(self)
+
+    def do_PUT(self):
+        ContinueHandler.received.append(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+class NoContinueHandler(QuietHandler):
+    """HTTP/1.0 - ignores the Expect header altogether"""
+    def do_PUT(self):
+        ContinueHandler.received.append(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        self.send_response(204)
+        self.end_headers()
+
+class ExpectationFailedHandler(QuietHandler):
+    """Does not answer the Expect header until the body has arrived, and then refuses it with a 417"""
+    protocol_version = "HTTP/1.1"
+
+    def handle_expect_100(self):
+        return True
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Expect"):
+            self.send_response(417)
+        else:
+            ContinueHandler.received.append(body)
+            self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+class TestHttpLayer(TestController):
+    def setUp(self):
+        AuthHandler.requests = []
+        ContinueHandler.received = []
+        ChunkedHandler.received = []
+
+    def test_01_rewinding_body(self):
+        f = io.BytesIO(b"xxabcdef")
+        f.seek(2)
+        body = RewindingBody(f)
+        assert body.read(4) == b"abcd"
+        assert body.read(4) == b"ef"
+        assert body.read(4) == b""
+        assert body.read() == b"abcdef"
+
+    def test_02_httplib2_preemptive_auth(self):
+        with LocalServer(AuthHandler) as server:
+            h = HttpLib2Layer(None)
+            h.add_credentials("sword", "sécret")
+            payload = io.BytesIO(b"0123456789" * 1000)
+            resp, content = h.request(server.url + "/em-iri", "PUT", headers={"Content-Length" : "10000"},
+                                      payload=payload)
+            assert resp.status == 204
+            # sent once, with the credentials, and the file in full
+            assert AuthHandler.requests == [(AUTH, b"0123456789" * 1000)]
+
+    def test_03_httplib2_challenge_response(self):
+        with LocalServer(AuthHandler) as server:
+            h = HttpLib2Layer(None, preemptive_auth=False)
+            h.add_credentials("sword", "sécret")
+            resp, content = h.request(server.url + "/em-iri", "PUT", headers={"Content-Length" : "4"},
+                                      payload=io.BytesIO(b"data"))
+            assert resp.status == 204
+            assert [auth for auth, body in AuthHandler.requests] == [None, AUTH]
+            assert AuthHandler.requests[1][1] == b"data"
+
+    def test_04_urllib_preemptive_auth(self):
+        with LocalServer(AuthHandler) as server:
+            h = UrlLib2Layer()
+            h.add_credentials("sword", "sécret")
+            resp, content = h.request(server.url + "/col-iri", "POST", headers={"Content-Length" : "4"},
+                                      payload=b"data")
+            assert resp.status == 204
+            assert AuthHandler.requests == [(AUTH, b"data")]
+
+    def test_05_expect_continue_accepted(self):
+        with LocalServer(ContinueHandler) as server:
+            h = HttpLib2Layer(None, expect_continue=10)
+            resp, content = h.request(server.url + "/em-iri", "PUT", headers={"Content-Length" : "500"},
+                                      payload=io.BytesIO(b"x" * 500))
+            assert resp.status == 204
+            assert ContinueHandler.received == [b"x" * 500]
+
+    def test_06_expect_continue_refused_early(self):
+        with LocalServer(ContinueHandler) as server:
+            conn = Connection(server.url + "/sd-iri", expect_continue=10, retry_policy=False)
+            conn.h.cache_dir = None
+            self.assertRaises(HTTPResponseError, conn.update, edit_media_iri=server.url + "/em-iri",
+                              payload=io.BytesIO(b"x" * 5000), mimetype="application/zip", filename="big.zip")
+            assert conn.history[-1]['status'] == 413
+            assert ContinueHandler.received == []
+
+    def test_07_expect_continue_ignored(self):
+        with LocalServer(NoContinueHandler) as server:
+            h = HttpLib2Layer(None, expect_continue=10, continue_timeout=0.2)
+            start = time.time()
+            resp, content = h.request(server.url + "/em-iri", "PUT", headers={"Content-Length" : "5000"},
+                                      payload=b"y" * 5000)
+            assert resp.status == 204
+            assert time.time() - start >= 0.2
+            assert ContinueHandler.received == [b"y" * 5000]
+
+    def test_08_stream_credentials_not_sent_to_another_host(self):
+        with LocalServer(GetHandler) as other, LocalServer(RedirectHandler) as server:
+            RedirectHandler.target = other.url
+            h = HttpLib2Layer(None)
+            h.add_credentials("sword", "sécret")
+            resp, body = h.stream_request(server.url + "/cont-iri", "GET")
+            body.close()
+            assert resp.status == 401
+            assert AuthHandler.requests == [(None, "/cont-iri")]
+
+    def test_09_stream_challenge_response(self):
+        with LocalServer(GetHandler) as server:
+            h = HttpLib2Layer(None, preemptive_auth=False)
+            h.add_credentials("sword", "sécret")
+            resp, body = h.stream_request(server.url + "/cont-iri", "GET")
+            assert body.read() == b"data"
+            body.close()
+            assert [auth for auth, path in AuthHandler.requests] == [None, AUTH]
+
+    def test_10_chunked_upload_without_preemptive_auth(self):
+        with LocalServer(ChunkedAuthHandler) as server:
+            h = HttpLib2Layer(None, preemptive_auth=False)
+            h.add_credentials("sword", "sécret")
+            resp, content = h.request(server.url + "/em-iri", "PUT", headers={"Transfer-Encoding" : "chunked"},
+                                      payload=ChunkedBody(iter([b"da", b"ta"])))
+            assert resp.status == 201
+            assert ChunkedHandler.received[0][0]["Authorization"] == AUTH
+            assert ChunkedHandler.received[0][1] == b"data"
+
+    def test_11_expectation_failed_after_body_sent(self):
+        with LocalServer(ExpectationFailedHandler) as server:
+            h = HttpLib2Layer(None, expect_continue=10, continue_timeout=0.1)
+            payload = io.BytesIO(b"xxz" * 1000)
+            payload.seek(2)
+            resp, content = h.request(server.url + "/em-iri", "PUT", headers={"Content-Length" : "2998"},
+                                      payload=payload)
+            assert resp.status == 204
+            assert ContinueHandler.received == [(b"xxz" * 1000)[2:]]
+
+    def test_12_credentials_only_for_their_origin(self):
+        with LocalServer(GetHandler) as sd, LocalServer(GetHandler) as other, LocalServer(RedirectHandler) as server:
+            RedirectHandler.target = other.url
+            h = HttpLib2Layer(None)
+            h.add_credentials("sword", "sécret", sd.url + "/sd-iri")
+            assert h.request(sd.url + "/cont-iri", "GET")[0].status == 200
+            assert h.request(other.url + "/other", "GET")[0].status == 401
+            resp, body = h.stream_request(other.url + "/streamed", "GET")
+            body.close()
+            # a redirect from the origin of the credentials to another host
+            h.add_credentials("sword", "sécret", server.url + "/sd-iri")
+            assert h.request(server.url + "/redirected", "GET")[0].status == 401
+            u = UrlLib2Layer()
+            u.add_credentials("sword", "sécret", sd.url + "/sd-iri")
+            assert u.request(sd.url + "/urllib", "GET")[0].status == 200
+            assert u.request(other.url + "/urllib-other", "GET")[0].status == 401
+            assert AuthHandler.requests == [(AUTH, "/cont-iri"), (None, "/other"), (None, "/streamed"),
+                                            (None, "/redirected"), (AUTH, "/urllib"), (None, "/urllib-other")]
@@ -0,0 +1,83 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+
+from . import TestController
+
+import sword2
+from sword2 import http_layer
+from sword2.sword2_logging import load_logging_config, BASIC_CONFIG
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def loaded_after(code, modules):
+    """Which of `modules` are in `sys.modules` after running `code` in a fresh interpreter"""
+    probe = "import sys, json\n%s\nprint(json.dumps([m for m in %r if m in sys.modules]))" % (code, modules)
+    out = subprocess.check_output([sys.executable, "-c", probe], cwd=ROOT)
+    return json.loads(out.decode("utf-8"))
+
+class TestImports(TestController):
+    def test_01_import_loads_nothing_heavy(self):
+        heavy = ["httplib2", "lxml.etree", "urllib.request", "html.parser", "logging.config", "concurrent.futures",
+                 "zipfile", "sword2.connection", "sword2.http_layer"]
+        assert loaded_after("import sword2", heavy) == []
+        # a Connection needs its parsers, but not the http backends until a request is made, nor the packaging
+        # and pipelining modules
+        assert loaded_after("import sword2; sword2.Connection('http://example.org/sd-iri')", heavy) == \
+            ["lxml.etree", "sword2.connection", "sword2.http_layer"]
+        assert loaded_after("from sword2 import UrlLib2Layer", ["urllib.request", "httplib2"]) == ["urllib.request"]
+
+    def test_02_names_resolve(self):
+        for name in sword2._LAZY:
+            assert getattr(sword2, name) is not None
+            assert name in dir(sword2) and name in sword2.__all__
+        from sword2.connection import Connection
+        from sword2.urllib_layer import UrlLib2Layer
+        assert sword2.Connection is Connection
+        assert sword2.UrlLib2Layer is http_layer.UrlLib2Layer is UrlLib2Layer
+        # the exceptions are still imported eagerly
+        assert "PackagingFormatNotAvailable" in vars(sword2)
+        try:
+            sword2.NoSuchThing
+        except AttributeError as e:
+            assert "NoSuchThing" in str(e)
+        else:
+            assert False, "expected an AttributeError"
+        try:
+            http_layer.NoSuchThing
+        except AttributeError:
+            pass
+        else:
+            assert False, "expected an AttributeError"
+
+    def test_03_submodules_resolve(self):
+        # in a fresh interpreter, where `import sword2` alone has loaded none of them
+        code = ("import sword2, sys\n"
+                "assert 'sword2.connection' not in sys.modules\n"
+                "assert 'connection' in dir(sword2) and 'http_layer' in dir(sword2)\n"
+                "assert sword2.connection.Connection is sword2.Connection\n"
+                "assert sword2.http_layer.HttpLib2Layer is sword2.HttpLib2Layer\n"
+                "assert sword2.structured_logging is sys.modules['sword2.structured_logging']")
+        assert loaded_after(code, ["sword2.connection"]) == ["sword2.connection"]
+        assert sorted(sword2._SUBMODULES) == sorted(name[:-3] for name in os.listdir(os.path.dirname(sword2.__file__))
+                                                     if name.endswith(".py") and name != "__init__.py")
+
+    def test_04_load_logging_config(self):
+        assert load_logging_config(os.path.join(ROOT, "no", "such", "file.conf")) is False
+        tmp = tempfile.mkdtemp()
+        path = os.path.join(tmp, "sword2_logging.conf")
+        with open(path, "w") as f:
+            f.write(BASIC_CONFIG.replace("level=INFO", "level=ERROR"))
+        # in a fresh interpreter, so as not to disturb the logging of this one
+        code = ("import logging, sword2\n"
+                "from sword2.sword2_logging import load_logging_config\n"
+                "log = logging.getLogger('sword2.connection')\n"
+                "assert load_logging_config(%r)\n"
+                "assert not log.disabled and logging.getLogger().level == logging.ERROR" % path)
+        try:
+            assert loaded_after(code, ["logging.config"]) == ["logging.config"]
+        finally:
+            shutil.rmtree(tmp)
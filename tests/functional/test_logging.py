@@ -0,0 +1,81 @@
+import logging
+
+from . import TestController, MockHttpLayer
+from .test_statement import ATOM_TEST_STATEMENT, ORE_TEST_STATEMENT
+from .test_deposit_receipt import DR
+
+from sword2 import Connection, Deposit_Receipt, Atom_Sword_Statement, Ore_Sword_Statement
+from sword2.sword2_logging import Snippet
+
+class StrictHandler(logging.Handler):
+    """Keeps the formatted messages, and fails on a message whose arguments do not match its format"""
+    def __init__(self):
+        logging.Handler.__init__(self, logging.DEBUG)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+    def handleError(self, record):
+        raise
+
+class Counted(object):
+    """Counts how many times it is turned into text"""
+    def __init__(self):
+        self.count = 0
+
+    def __str__(self):
+        self.count += 1
+        return "counted"
+
+    __repr__ = __str__
+
+class TestLogging(TestController):
+    def setUp(self):
+        self.handler = StrictHandler()
+        self.logger = logging.getLogger("sword2")
+        self.level = self.logger.level
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        self.logger.setLevel(self.level)
+
+    def test_01_snippet(self):
+        assert str(Snippet(b"abc")) == "abc"
+        big = str(Snippet(b"x" * 5000, limit=100))
+        assert big.startswith("x" * 100 + "...") and "5000" in big
+        assert str(Snippet("y" * 50, limit=10)) == "y" * 10 + "... (50 characters in all)"
+        assert str(Snippet(None)) == "None"
+
+    def test_02_messages_format_at_debug(self):
+        self.logger.setLevel(logging.DEBUG)
+        Deposit_Receipt(xml_deposit_receipt=DR)
+        Atom_Sword_Statement(ATOM_TEST_STATEMENT)
+        Ore_Sword_Statement(ORE_TEST_STATEMENT)
+        http = MockHttpLayer()
+        http.queue(500, {"Content-Type" : "text/plain"}, b"e" * 100000)
+        http.queue(200, {"Content-Type" : "application/zip"}, b"data")
+        conn = Connection("http://example.org/sd-iri", http_impl=http, error_response_raises_exceptions=False)
+        conn.get_resource(content_iri="http://example.org/broken")
+        conn.get_resource(content_iri="http://example.org/cont-iri")
+        assert any(m.startswith("Registering Packaging URI: ") for m in self.handler.messages)
+        assert any(m.startswith("Attempting to intepret field: ") for m in self.handler.messages)
+        error_body = [m for m in self.handler.messages if m.startswith("Error body received from server")][0]
+        assert len(error_body) < 2000 and "100000" in error_body
+        assert "Response headers: {" in "\n".join(self.handler.messages)
+
+    def test_03_nothing_built_when_off(self):
+        self.logger.setLevel(logging.WARNING)
+        Ore_Sword_Statement(ORE_TEST_STATEMENT)
+        assert self.handler.messages == []
+        counted = Counted()
+        http = MockHttpLayer()
+        http.queue(200, {"Content-Type" : "application/zip"}, b"data")
+        conn = Connection("http://example.org/sd-iri", http_impl=http)
+        conn.get_resource(content_iri="http://example.org/cont-iri", headers={"X-Counted" : counted})
+        assert counted.count == 0
+        self.logger.setLevel(logging.DEBUG)
+        http.queue(200, {"Content-Type" : "application/zip"}, b"data")
+        conn.get_resource(content_iri="http://example.org/cont-iri", headers={"X-Counted" : counted})
+        assert counted.count > 0
@@ -0,0 +1,84 @@
+import io
+import time
+import random
+import threading
+
+from . import TestController, MockHttpLayer, MockResponse
+
+from sword2 import Connection
+from sword2.metrics import Histogram, Metrics
+
+class SlowLayer(MockHttpLayer):
+    """Answers every request with a 200, after `delays[uri]` seconds"""
+    def __init__(self, delays):
+        MockHttpLayer.__init__(self)
+        self.delays = delays
+
+    def request(self, uri, method, headers=None, payload=None):
+        time.sleep(self.delays.get(uri, 0))
+        return MockResponse(200, {"Content-Type" : "application/zip"}), b"data"
+
+class TestMetrics(TestController):
+    def test_01_percentiles(self):
+        h = Histogram()
+        values = [random.expovariate(10) for i in range(20000)]
+        for v in values:
+            h.record(v)
+        values.sort()
+        for q in (50, 95, 99):
+            exact = values[int(q / 100.0 * len(values)) - 1]
+            assert abs(h.percentile(q) - exact) / exact < 0.06, (q, h.percentile(q), exact)
+        assert h.count == 20000 and h.max == values[-1] and h.min == values[0]
+        assert abs(h.mean - sum(values) / len(values)) < 1e-9
+
+    def test_02_fixed_memory(self):
+        h = Histogram()
+        size = len(h.buckets)
+        for v in (0, 1e-9, 5e-7, 0.5, 3600, 1e9):
+            h.record(v)
+        assert len(h.buckets) == size and size < 500
+        assert h.percentile(100) == 1e9 and h.percentile(1) == 0
+        assert Histogram().percentile(50) is None
+
+    def test_03_thread_safe(self):
+        m = Metrics()
+        def worker():
+            for i in range(2000):
+                m.observe("EM_IRI PUT", 0.01, sent=10, received=1)
+        threads = [threading.Thread(target=worker) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        s = m.summary()["EM_IRI PUT"]
+        assert s['count'] == 16000 and s['bytes_sent'] == 160000 and s['bytes_received'] == 16000
+        assert "EM_IRI PUT" in str(m)
+
+    def test_04_connection(self):
+        http = MockHttpLayer()
+        http.queue(201, {"Location" : "http://example.org/edit/1"}, b"")
+        http.queue(200, {"Content-Type" : "application/zip"}, b"x" * 300)
+        conn = Connection("http://example.org/sd-iri", http_impl=http)
+        conn.create(col_iri="http://example.org/col-iri", payload=io.BytesIO(b"x" * 1000), mimetype="application/zip",
+                    filename="example.zip", packaging="http://purl.org/net/sword/package/SimpleZip")
+        conn.get_resource(content_iri="http://example.org/cont-iri")
+        assert conn.metrics.operations == ["Col_IRI POST", "Cont_IRI GET"]
+        post = conn.metrics.operation("Col_IRI POST")
+        assert post.count == 1 and post.bytes_sent == 1000
+        assert conn.metrics.operation("Cont_IRI GET").bytes_received == 300
+
+    def test_05_concurrent_requests_timed_separately(self):
+        http = SlowLayer({"http://example.org/slow" : 0.3})
+        conn = Connection("http://example.org/sd-iri", http_impl=http)
+        def get(uri):
+            conn.get_resource(content_iri=uri)
+        slow = threading.Thread(target=get, args=("http://example.org/slow",))
+        slow.start()
+        time.sleep(0.05)
+        for i in range(5):
+            get("http://example.org/fast")       # started while the slow one is in flight
+        slow.join()
+        h = conn.metrics.operation("Cont_IRI GET").latency
+        assert h.count == 6
+        assert h.max >= 0.3
+        assert h.percentile(50) < 0.05
@@ -0,0 +1,149 @@
+import io
+import os
+import shutil
+import hashlib
+import zipfile
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from . import TestController, LocalServer
+from .test_chunked_upload import ChunkedHandler
+
+from sword2 import Connection, HttpLib2Layer, SimpleZipPackage, BagItPackage, DepositPipeline
+from sword2.package_builder import _local_header, _central_directory
+
+class TestPackageBuilder(TestController):
+    def setUp(self):
+        ChunkedHandler.received = []
+        self.tmp = tempfile.mkdtemp()
+        self.big = os.path.join(self.tmp, "big.bin")
+        with open(self.big, "wb") as f:
+            f.write(os.urandom(300000))
+        os.makedirs(os.path.join(self.tmp, "dir", "sub"))
+        with open(os.path.join(self.tmp, "dir", "a.txt"), "wb") as f:
+            f.write(b"a" * 1000)
+        with open(os.path.join(self.tmp, "dir", "sub", "b.txt"), "wb") as f:
+            f.write(b"b")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _read(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    def test_01_simple_zip(self):
+        for compression in (zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED):
+            package = SimpleZipPackage([self.big, os.path.join(self.tmp, "dir"), (self.big, "copy/big.bin")],
+                                       compression=compression, chunk_size=65536)
+            data = b"".join(package)
+            assert package.size == len(data)
+            zf = zipfile.ZipFile(io.BytesIO(data))
+            assert zf.testzip() is None
+            assert zf.namelist() == ["big.bin", "dir/a.txt", "dir/sub/b.txt", "copy/big.bin"]
+            assert zf.read("copy/big.bin") == self._read(self.big)
+            assert package.checksums["dir/a.txt"] == hashlib.md5(b"a" * 1000).hexdigest()
+
+    def test_02_bagit(self):
+        bag = BagItPackage([self.big, os.path.join(self.tmp, "dir")], bag_info={"Source-Organization" : "Test"},
+                           algorithms=("sha256", "md5"))
+        zf = zipfile.ZipFile(io.BytesIO(b"".join(bag)))
+        names = zf.namelist()
+        assert "bag/data/big.bin" in names
+        assert "bag/data/dir/sub/b.txt" in names
+        assert zf.read("bag/bagit.txt").startswith(b"BagIt-Version: 1.0")
+        info = zf.read("bag/bag-info.txt").decode("utf-8")
+        assert "Source-Organization: Test" in info
+        assert "Payload-Oxum: %s.3" % (300000 + 1000 + 1) in info
+        for algorithm in ("sha256", "md5"):
+            for line in zf.read("bag/manifest-%s.txt" % algorithm).decode("utf-8").splitlines():
+                digest, path = line.split("  ", 1)
+                assert hashlib.new(algorithm, zf.read("bag/" + path)).hexdigest() == digest
+            for line in zf.read("bag/tagmanifest-%s.txt" % algorithm).decode("utf-8").splitlines():
+                digest, path = line.split("  ", 1)
+                assert hashlib.new(algorithm, zf.read("bag/" + path)).hexdigest() == digest
+
+    def test_03_create_with_package(self):
+        with LocalServer(ChunkedHandler) as server:
+            conn = Connection(server.url + "/sd-iri", http_impl=HttpLib2Layer(None))
+            receipt = conn.create(col_iri=server.url + "/col-iri", payload=BagItPackage([self.big]))
+            assert receipt.code == 201
+            headers, body, trailers = ChunkedHandler.received[0]
+            assert headers["Packaging"] == "http://purl.org/net/sword/package/BagIt"
+            assert headers["Content-Type"] == "application/zip"
+            assert "filename=bag.zip" in headers["Content-Disposition"]
+            assert trailers["Content-MD5"] == hashlib.md5(body).hexdigest()
+            assert zipfile.ZipFile(io.BytesIO(body)).read("bag/data/big.bin") == self._read(self.big)
+
+    def test_04_prepared_package(self):
+        with ProcessPoolExecutor(2) as executor:
+            for compression in (zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED):
+                bag = BagItPackage([self.big, os.path.join(self.tmp, "dir")], compression=compression)
+                prepared = bag.prepare(executor, tmp_dir=self.tmp)
+                data = prepared.read()
+                assert len(data) == prepared.size
+                assert prepared.md5 == hashlib.md5(data).hexdigest()
+                zf = zipfile.ZipFile(io.BytesIO(data))
+                assert zf.testzip() is None
+                assert zf.read("bag/data/big.bin") == self._read(self.big)
+                assert "Payload-Oxum: %s.3" % (300000 + 1000 + 1) in zf.read("bag/bag-info.txt").decode("utf-8")
+                # the same bytes as the package streamed in one process
+                assert zipfile.ZipFile(io.BytesIO(b"".join(bag))).namelist() == zf.namelist()
+                prepared.seek(300)
+                assert prepared.read(100000) == data[300:100300]
+                prepared.close()
+                assert [f for f in os.listdir(self.tmp) if f.startswith("sword2-package-")] == []
+
+    def test_05_pipeline(self):
+        with LocalServer(ChunkedHandler) as server:
+            conn = Connection(server.url + "/sd-iri", http_impl=HttpLib2Layer(None))
+            jobs = [{"col_iri" : server.url + "/col-iri", "payload" : SimpleZipPackage([self.big], filename="1.zip")},
+                    {"col_iri" : server.url + "/col-iri", "payload" : os.path.join(self.tmp, "dir", "a.txt"),
+                     "mimetype" : "text/plain"},
+                    {"method" : "update", "edit_media_iri" : server.url + "/em-iri",
+                     "payload" : SimpleZipPackage([os.path.join(self.tmp, "dir")], filename="3.zip")}]
+            with DepositPipeline(conn, processes=2, tmp_dir=self.tmp) as pipeline:
+                results = list(pipeline.deposit(jobs))
+            assert [job for job, receipt in results] == jobs
+            assert len(ChunkedHandler.received) == 3
+            for headers, body, trailers in ChunkedHandler.received:
+                assert headers["Content-Length"] == str(len(body))
+                assert headers["Content-MD5"] == hashlib.md5(body).hexdigest()
+            assert ChunkedHandler.received[1][1] == b"a" * 1000
+            assert "filename=a.txt" in ChunkedHandler.received[1][0]["Content-Disposition"]
+            assert zipfile.ZipFile(io.BytesIO(ChunkedHandler.received[2][1])).namelist() == ["dir/a.txt", "dir/sub/b.txt"]
+
+    def test_06_duplicate_names(self):
+        package = BagItPackage([self.big, (os.path.join(self.tmp, "dir", "a.txt"), "big.bin")])
+        self.assertRaises(ValueError, package.entries)
+        self.assertRaises(ValueError, b"".join, package)
+
+    def test_07_prepared_zip_records(self):
+        # the headers are written by the package builder, not by zipfile - read them back with zipfile
+        with ProcessPoolExecutor(1) as executor:
+            package = SimpleZipPackage([(self.big, "dïr/big.bin")])
+            prepared = package.prepare(executor, tmp_dir=self.tmp)
+            zf = zipfile.ZipFile(io.BytesIO(prepared.read()))
+            streamed = zipfile.ZipFile(io.BytesIO(b"".join(package)))
+            for a, b in zip(zf.infolist(), streamed.infolist()):
+                # (the streamed zip has data descriptors, as it cannot go back to fill in the CRC and sizes)
+                assert (a.filename, a.date_time, a.external_attr, a.CRC, a.file_size, a.flag_bits & 0x800) == \
+                       (b.filename, b.date_time, b.external_attr, b.CRC, b.file_size, b.flag_bits & 0x800)
+            assert zf.read("dïr/big.bin") == self._read(self.big)
+            prepared.close()
+        # members and offsets too large for the 32-bit fields
+        zinfo = zipfile.ZipInfo("huge.bin", (2024, 5, 30, 1, 2, 4))
+        zinfo.compress_type = zipfile.ZIP_STORED
+        zinfo.CRC = 1234
+        zinfo.file_size = zinfo.compress_size = 5 * 2 ** 30
+        small = zipfile.ZipInfo("small.txt", (2024, 5, 30, 1, 2, 4))
+        small.compress_type = zipfile.ZIP_STORED
+        small.CRC, small.file_size, small.compress_size = 5, 3, 3
+        header = _local_header(zinfo)
+        end = len(header) + zinfo.compress_size
+        directory = _central_directory([(zinfo, 0), (small, end)], end + 100)
+        infos = zipfile.ZipFile(io.BytesIO(header + directory)).infolist()
+        assert [(i.filename, i.file_size, i.compress_size, i.CRC) for i in infos] == \
+               [("huge.bin", 5 * 2 ** 30, 5 * 2 ** 30, 1234), ("small.txt", 3, 3, 5)]
+        # (zipfile shifts the offsets by where it actually found the central directory)
+        assert infos[1].header_offset - infos[0].header_offset == end
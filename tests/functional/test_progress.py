@@ -0,0 +1,122 @@
+import io
+
+from . import TestController, MockHttpLayer, LocalServer, QuietHandler
+
+from sword2 import Connection, HttpLib2Layer
+from sword2.progress import ProgressTracker, ProgressReader, TransferStats, UPLOAD, DOWNLOAD
+
+DATA = b"x" * 300000
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+class ContentHandler(QuietHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Length", str(len(DATA)))
+        self.end_headers()
+        self.wfile.write(DATA)
+
+    def do_PUT(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+class TestProgress(TestController):
+    def test_01_tracker_reports_every_interval(self):
+        clock = FakeClock()
+        reports = []
+        tracker = ProgressTracker(UPLOAD, "PUT", "http://example.org/em", total=1000, interval=1.0, clock=clock,
+                                  listeners=[lambda p, t: reports.append(p)])
+        assert len(reports) == 1 and reports[0].transferred == 0
+        tracker.update(100)
+        clock.now += 0.5
+        tracker.update(100)
+        assert len(reports) == 1            # within the interval, nothing is reported
+        clock.now += 0.5
+        tracker.update(200)
+        assert len(reports) == 2
+        p = reports[-1]
+        assert p.transferred == 400 and p.elapsed == 1.0
+        assert p.rate == 400.0 and p.average == 400.0
+        assert p.eta == 1.5                 # 600 bytes to go at 400 bytes/second
+        clock.now += 2.0
+        tracker.update(100)
+        assert reports[-1].rate == 50.0     # throughput since the last report
+        tracker.finish()
+        tracker.finish()
+        assert len(reports) == 4 and reports[-1].done
+
+    def test_02_unknown_total(self):
+        tracker = ProgressTracker(DOWNLOAD, "GET", "http://example.org/cont", clock=FakeClock())
+        tracker.update(10)
+        p = tracker.snapshot()
+        assert p.total is None and p.eta is None and p.transferred == 10
+
+    def test_03_stats_and_stalled_transfers(self):
+        clock = FakeClock()
+        stats = TransferStats()
+        slow = ProgressTracker(UPLOAD, "PUT", "slow", total=100, clock=clock, listeners=[stats])
+        fast = ProgressTracker(DOWNLOAD, "GET", "fast", clock=clock, listeners=[stats])
+        clock.now += 1.0
+        slow.update(10)
+        fast.update(1000)
+        assert [p.uri for p in stats.active()] == ["slow", "fast"]
+        fast.finish()
+        assert [p.uri for p in stats.active()] == ["slow"]
+        assert stats.downloads == 1 and stats.bytes_received == 1000 and stats.seconds == 1.0
+        slow.finish()
+        assert stats.uploads == 1 and stats.bytes_sent == 10
+        assert stats.average_rate == 505.0
+        assert stats.active() == []
+
+    def test_04_reader_finishes_at_end(self):
+        done = []
+        tracker = ProgressTracker(UPLOAD, "PUT", "x", total=5,
+                                  listeners=[lambda p, t: p.done and done.append(p.transferred)])
+        reader = ProgressReader(io.BytesIO(b"hello"), tracker)
+        assert reader.read(3) == b"hel"
+        assert reader.tell() == 3
+        assert reader.read() == b"lo"
+        assert reader.read() == b""
+        assert done == [5]
+
+    def test_05_connection_counts_bodies(self):
+        seen = []
+        h = MockHttpLayer()
+        h.queue(204)
+        h.queue(200, {"Content-Length" : "11"}, b"hello world")
+        conn = Connection("http://example.org/sd-iri", http_impl=h, progress_callback=seen.append)
+        conn.update_files_for_resource(io.BytesIO(DATA), "data.zip", mimetype="application/zip",
+                                       edit_media_iri="http://example.org/em-iri")
+        conn.get_resource(content_iri="http://example.org/cont-iri")
+        stats = conn.transfer_stats
+        assert stats.bytes_sent == len(DATA)
+        assert stats.bytes_received == 11
+        finished = [p for p in seen if p.done]
+        assert [(p.direction, p.method, p.transferred) for p in finished] == [
+                (UPLOAD, "PUT", len(DATA)), (DOWNLOAD, "PUT", 0), (DOWNLOAD, "GET", 11)]
+        assert finished[-1].total == 11 and finished[-1].eta == 0.0
+
+    def test_06_streamed_over_the_network(self):
+        seen = []
+        with LocalServer(ContentHandler) as server:
+            conn = Connection(server.url + "/sd-iri", http_impl=HttpLib2Layer(None), progress_callback=seen.append,
+                              progress_interval=0)
+            conn.update_files_for_resource(io.BytesIO(DATA), "data.zip", mimetype="application/zip",
+                                           edit_media_iri=server.url + "/em-iri")
+            with conn.get_resource(content_iri=server.url + "/cont-iri", stream=True) as body:
+                while body.read(65536):
+                    pass
+        stats = conn.transfer_stats
+        assert stats.bytes_sent == len(DATA) and stats.bytes_received == len(DATA)
+        downloads = [p for p in seen if p.direction == DOWNLOAD and p.method == "GET"]
+        assert len(downloads) > 2           # reported as the body came in, not only at the end
+        assert downloads[-1].done and downloads[-1].total == len(DATA)
+        assert stats.active() == []
@@ -0,0 +1,99 @@
+import os
+import re
+import shutil
+import tempfile
+
+from . import TestController, MockHttpLayer
+
+from sword2 import Connection, RetryPolicy
+from sword2 import prometheus
+from sword2.metrics import Metrics
+
+RECEIPT = b"""<entry xmlns="http://www.w3.org/2005/Atom" xmlns:sword="http://purl.org/net/sword/terms/">
+    <title>Deposit</title>
+    <id>info:example/1</id>
+    <updated>2011-05-30T01:05:54Z</updated>
+    <link rel="edit" href="http://example.org/edit/1"/>
+    <content type="application/zip" src="http://example.org/cont/1"/>
+    <sword:packaging>http://purl.org/net/sword/package/SimpleZip</sword:packaging>
+    <sword:treatment>Stored</sword:treatment>
+</entry>"""
+
+LABEL = r'[a-z]+="(?:[^"\\]|\\.)*"'
+SAMPLE = re.compile(r'^[a-z0-9_]+(\{%s(,%s)*\})? [0-9.e+-]+$' % (LABEL, LABEL))
+
+class TestPrometheus(TestController):
+    def _samples(self, text):
+        samples = {}
+        for line in text.splitlines():
+            if line.startswith("#"):
+                continue
+            assert SAMPLE.match(line), line
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+        return samples
+
+    def test_01_format(self):
+        m = Metrics()
+        for i in range(10):
+            m.observe("Col_IRI POST", 0.02 * (i + 1), sent=100, received=10, status=201)
+        m.observe("Col_IRI POST", 0.5, status=503, retries=2)
+        m.observe('Odd "name"\\', 0.1)
+        m.observe_parse("deposit_receipt", 0.002)
+        m.cache_lookup(True)
+        m.cache_lookup(False)
+        m.cache_lookup(False)
+        m.started()
+        text = prometheus.exposition(m)
+        assert "# TYPE sword2_requests_total counter" in text
+        assert "# TYPE sword2_request_duration_seconds histogram" in text
+        samples = self._samples(text)
+        assert samples['sword2_requests_total{operation="Col_IRI POST",status="201"}'] == 10
+        assert samples['sword2_requests_total{operation="Col_IRI POST",status="503"}'] == 1
+        assert samples['sword2_bytes_sent_total{operation="Col_IRI POST"}'] == 1000
+        assert samples['sword2_retries_total{operation="Col_IRI POST"}'] == 2
+        assert samples['sword2_requests_in_flight'] == 1
+        assert samples['sword2_receipt_cache_hits_total'] == 1
+        assert samples['sword2_receipt_cache_misses_total'] == 2
+        assert samples['sword2_parse_duration_seconds_count{document="deposit_receipt"}'] == 1
+        assert samples['sword2_request_duration_seconds_bucket{le="0.1",operation="Col_IRI POST"}'] == 4
+        assert samples['sword2_request_duration_seconds_bucket{le="0.25",operation="Col_IRI POST"}'] == 10
+        assert samples['sword2_request_duration_seconds_bucket{le="+Inf",operation="Col_IRI POST"}'] == 11
+        assert samples['sword2_request_duration_seconds_count{operation="Col_IRI POST"}'] == 11
+        assert 'operation="Odd \\"name\\"\\\\"' in text
+        buckets = [v for k, v in samples.items() if k.startswith("sword2_request_duration_seconds_bucket")
+                   and "Col_IRI" in k]
+        assert buckets == sorted(buckets)
+
+    def test_02_textfile(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            m = Metrics()
+            m.observe("EM_IRI PUT", 1.0, status=204)
+            path = os.path.join(tmp, "sword2.prom")
+            prometheus.write_textfile(m, path)
+            with open(path) as f:
+                assert f.read() == prometheus.collector(m)()
+            assert os.listdir(tmp) == ["sword2.prom"]
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_03_fed_by_connection(self):
+        http = MockHttpLayer()
+        http.queue(503, {"Retry-After" : "0"})
+        http.queue(201, {"Location" : "http://example.org/edit/1"}, RECEIPT)
+        http.queue(200, {"Content-Type" : "application/zip"}, b"data")
+        conn = Connection("http://example.org/sd-iri", http_impl=http,
+                          retry_policy=RetryPolicy(retry_post=True))
+        receipt = conn.create(col_iri="http://example.org/col-iri", metadata_entry=None, payload=b"data",
+                              mimetype="application/zip", filename="example.zip",
+                              packaging="http://purl.org/net/sword/package/SimpleZip")
+        assert receipt.code == 201
+        conn.get_resource(content_iri="http://example.org/cont/1", packaging="http://purl.org/net/sword/package/SimpleZip")
+        samples = self._samples(prometheus.exposition(conn.metrics))
+        assert samples['sword2_requests_total{operation="Col_IRI POST",status="201"}'] == 1
+        assert samples['sword2_retries_total{operation="Col_IRI POST"}'] == 1
+        assert samples['sword2_requests_total{operation="Cont_IRI GET",status="200"}'] == 1
+        assert samples['sword2_parse_duration_seconds_count{document="deposit_receipt"}'] == 1
+        assert samples['sword2_receipt_cache_hits_total'] == 1
+        assert samples['sword2_requests_in_flight'] == 0
@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+from hashlib import md5
+
+from . import TestController, MockHttpLayer, LocalServer, QuietHandler
+
+from sword2 import Connection, HttpLib2Layer, UrlLib2Layer
+from sword2.exceptions import ChecksumMismatch
+from sword2.resource_stream import ResourceStream, normalise_md5
+
+PACKAGE = os.urandom(300000)
+PACKAGE_MD5 = md5(PACKAGE).hexdigest()
+
+class PackageHandler(QuietHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Length", str(len(PACKAGE)))
+        if self.path == "/bad-md5":
+            self.send_header("Content-MD5", md5(b"something else").hexdigest())
+        else:
+            self.send_header("Content-MD5", PACKAGE_MD5)
+        self.end_headers()
+        self.wfile.write(PACKAGE)
+
+class TestResourceStream(TestController):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_01_normalise_md5(self):
+        import base64, binascii
+        b64 = base64.b64encode(binascii.unhexlify(PACKAGE_MD5)).decode("ascii")
+        assert normalise_md5(PACKAGE_MD5.upper()) == PACKAGE_MD5
+        assert normalise_md5(b64) == PACKAGE_MD5
+        assert normalise_md5("not an md5") is None
+        assert normalise_md5(None) is None
+
+    def test_02_stream_fallback_layer(self):
+        http = MockHttpLayer()
+        http.queue(200, {"Content-MD5" : PACKAGE_MD5}, PACKAGE)
+        conn = Connection("http://example.org/service-doc", http_impl=http)
+        stream = conn.get_resource("http://example.org/cont-iri", stream=True, chunk_size=65536)
+        assert isinstance(stream, ResourceStream)
+        chunks = list(stream)
+        assert max(len(c) for c in chunks) <= 65536
+        assert b"".join(chunks) == PACKAGE
+        assert stream.size == len(PACKAGE)
+        assert stream.md5_matches()
+
+    def test_03_download_resource_httplib2(self):
+        with LocalServer(PackageHandler) as server:
+            conn = Connection(server.url + "/sd-iri", http_impl=HttpLib2Layer(None))
+            path = os.path.join(self.tmp, "package.zip")
+            result = conn.download_resource(server.url + "/cont-iri", path, buffer_size=4096)
+            assert result.code == 200
+            assert result.content is None
+            assert result.size == len(PACKAGE)
+            assert result.md5 == PACKAGE_MD5
+            with open(path, "rb") as f:
+                assert f.read() == PACKAGE
+
+    def test_04_download_resource_urllib_checksum_mismatch(self):
+        with LocalServer(PackageHandler) as server:
+            conn = Connection(server.url + "/sd-iri", http_impl=UrlLib2Layer())
+            path = os.path.join(self.tmp, "package.zip")
+            self.assertRaises(ChecksumMismatch, conn.download_resource, server.url + "/bad-md5", path)
+            # skipping the check
+            result = conn.download_resource(server.url + "/bad-md5", path, verify_md5=False)
+            assert result.md5 == PACKAGE_MD5
@@ -0,0 +1,97 @@
+import io
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from . import TestController, MockHttpLayer
+
+from sword2 import Connection, Entry
+from sword2.exceptions import ServerError
+from sword2.retry import RetryPolicy, parse_retry_after
+
+class FlakyHttpLayer(MockHttpLayer):
+    """Raises a connection reset for the first `failures` requests"""
+    def __init__(self, failures, responses=None):
+        MockHttpLayer.__init__(self, responses)
+        self.failures = failures
+
+    def request(self, uri, method, headers=None, payload=None):
+        if self.failures:
+            self.failures -= 1
+            if hasattr(payload, "read"):
+                payload.read()
+            raise ConnectionResetError("connection reset by peer")
+        return MockHttpLayer.request(self, uri, method, headers, payload)
+
+class TestRetry(TestController):
+    def _policy(self, **kw):
+        self.slept = []
+        policy = RetryPolicy(**kw)
+        policy.sleep = self.slept.append
+        return policy
+
+    def test_01_parse_retry_after(self):
+        assert parse_retry_after("120") == 120.0
+        assert parse_retry_after(None) is None
+        assert parse_retry_after("soon") is None
+        when = datetime.now(timezone.utc) + timedelta(seconds=30)
+        assert 20 < parse_retry_after(format_datetime(when, usegmt=True)) <= 30
+
+    def test_02_backoff(self):
+        policy = RetryPolicy(backoff_factor=1.0, max_backoff=5.0)
+        for attempt in range(6):
+            assert 0 <= policy.backoff(attempt) <= min(5.0, 2 ** attempt)
+
+    def test_03_get_retried_with_retry_after(self):
+        http = MockHttpLayer()
+        http.queue(503, {"Retry-After" : "2"}, b"busy")
+        http.queue(200, {"Content-Type" : "application/zip"}, b"data")
+        conn = Connection("http://example.org/sd", http_impl=http, retry_policy=self._policy())
+        resource = conn.get_resource("http://example.org/cont-iri")
+        assert resource.code == 200
+        assert resource.content == b"data"
+        assert self.slept == [2.0]
+        assert conn.history[-1]['payload']['retries'] == 1
+        assert conn.history[-1]['payload']['retry_delays'] == [2.0]
+
+    def test_04_gives_up(self):
+        http = MockHttpLayer([(503, {}, b"busy")] * 3)
+        conn = Connection("http://example.org/sd", http_impl=http, retry_policy=self._policy(max_retries=2))
+        self.assertRaises(ServerError, conn.get_resource, "http://example.org/cont-iri")
+        assert len(http.requests) == 3
+        assert len(self.slept) == 2
+
+    def test_05_post_only_retried_when_enabled(self):
+        http = MockHttpLayer([(503, {}, b"busy"), (201, {"Location" : "http://example.org/edit/1"}, b"")])
+        conn = Connection("http://example.org/sd", http_impl=http, retry_policy=self._policy(),
+                          error_response_raises_exceptions=False)
+        receipt = conn.create(col_iri="http://example.org/col", metadata_entry=Entry(title="t"))
+        assert receipt.code == 503
+        assert len(http.requests) == 1
+
+        http = MockHttpLayer([(503, {}, b"busy"), (201, {"Location" : "http://example.org/edit/1"}, b"")])
+        conn = Connection("http://example.org/sd", http_impl=http, retry_policy=self._policy(retry_post=True))
+        receipt = conn.create(col_iri="http://example.org/col", metadata_entry=Entry(title="t"))
+        assert receipt.code == 201
+        assert len(http.requests) == 2
+
+    def test_06_payload_rewound_after_connection_reset(self):
+        http = FlakyHttpLayer(2, [(204, {}, b"")])
+        conn = Connection("http://example.org/sd", http_impl=http, retry_policy=self._policy())
+        payload = io.BytesIO(b"some file contents")
+        receipt = conn.update(edit_media_iri="http://example.org/em-iri", payload=payload,
+                              mimetype="text/plain", filename="file.txt")
+        assert receipt.code == 204
+        assert http.requests[0][3] == b"some file contents"
+        assert len(self.slept) == 2
+
+    def test_07_retrying_disabled(self):
+        http = FlakyHttpLayer(1, [(200, {}, b"")])
+        conn = Connection("http://example.org/sd", http_impl=http, retry_policy=False)
+        self.assertRaises(ConnectionResetError, conn.get_resource, "http://example.org/cont-iri")
+
+    def test_08_streamed_get_retried_after_connection_reset(self):
+        http = FlakyHttpLayer(1, [(200, {"Content-Type" : "application/zip"}, b"data")])
+        conn = Connection("http://example.org/sd", http_impl=http, retry_policy=self._policy())
+        stream = conn.get_resource("http://example.org/cont-iri", stream=True)
+        assert b"".join(stream) == b"data"
+        assert len(self.slept) == 1
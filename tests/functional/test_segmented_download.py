@@ -0,0 +1,157 @@
+import os
+import re
+import json
+import shutil
+import tempfile
+from hashlib import md5
+
+from . import TestController, LocalServer, QuietHandler
+
+from sword2 import Connection, HttpLib2Layer, UrlLib2Layer, RetryPolicy
+from sword2.segmented_download import SegmentedDownloader
+from sword2.exceptions import HTTPResponseError
+
+PACKAGE = os.urandom(1000003)
+PACKAGE_MD5 = md5(PACKAGE).hexdigest()
+
+class RangeHandler(QuietHandler):
+    ranges = []
+
+    def _headers(self, status, length, content_range=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Length", str(length))
+        self.send_header("Content-MD5", PACKAGE_MD5)
+        self.send_header("ETag", '"v1"')
+        if self.path != "/no-ranges":
+            self.send_header("Accept-Ranges", "bytes")
+        if content_range:
+            self.send_header("Content-Range", content_range)
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._headers(200, len(PACKAGE))
+
+    def do_GET(self):
+        m = re.match(r"bytes=(\d+)-(\d+)", self.headers.get("Range", ""))
+        if m and self.path != "/no-ranges":
+            start, end = int(m.group(1)), int(m.group(2))
+            RangeHandler.ranges.append((start, end))
+            self._headers(206, end - start + 1, "bytes %s-%s/%s" % (start, end, len(PACKAGE)))
+            self.wfile.write(PACKAGE[start:end + 1])
+        else:
+            self._headers(200, len(PACKAGE))
+            self.wfile.write(PACKAGE)
+
+class NoHeadHandler(QuietHandler):
+    """Refuses HEAD, and sends the Content-MD5 of each range that it is asked for"""
+    def do_HEAD(self):
+        self.send_response(405)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        start, end = [int(n) for n in re.match(r"bytes=(\d+)-(\d+)", self.headers["Range"]).groups()]
+        self.send_response(206)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Content-Range", "bytes %s-%s/%s" % (start, end, len(PACKAGE)))
+        self.send_header("Content-MD5", md5(PACKAGE[start:end + 1]).hexdigest())
+        self.end_headers()
+        self.wfile.write(PACKAGE[start:end + 1])
+
+class TestSegmentedDownload(TestController):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "package.zip")
+        RangeHandler.ranges = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def test_01_plan(self):
+        d = SegmentedDownloader(None, segments=4, min_segment_size=10)
+        assert d.plan(100) == [[0, 24], [25, 49], [50, 74], [75, 99]]
+        assert d.plan(15) == [[0, 14]]
+
+    def test_02_segmented(self):
+        with LocalServer(RangeHandler) as server:
+            d = SegmentedDownloader(HttpLib2Layer(None), segments=4, min_segment_size=1024, buffer_size=65536)
+            result = d.download(server.url + "/cont-iri", self.path)
+            assert result.ranged
+            assert len(result.segments) == 4
+            assert result.md5 == PACKAGE_MD5
+            assert self._read() == PACKAGE
+            assert not os.path.exists(self.path + ".segments")
+
+    def test_03_no_ranges_falls_back(self):
+        with LocalServer(RangeHandler) as server:
+            d = SegmentedDownloader(UrlLib2Layer(), segments=4, min_segment_size=1024)
+            result = d.download(server.url + "/no-ranges", self.path)
+            assert not result.ranged
+            assert self._read() == PACKAGE
+
+    def test_04_resume(self):
+        with LocalServer(RangeHandler) as server:
+            uri = server.url + "/cont-iri"
+            # as if an earlier attempt had been interrupted half way through the second segment
+            with open(self.path, "wb") as f:
+                f.write(PACKAGE[:600000])
+            journal = {"uri" : uri, "size" : len(PACKAGE), "validator" : '"v1"',
+                       "segments" : [[0, 499999, 500000], [500000, 1000002, 100000]]}
+            with open(self.path + ".segments", "w") as f:
+                json.dump(journal, f)
+            d = SegmentedDownloader(HttpLib2Layer(None), segments=2, min_segment_size=1024)
+            result = d.download(uri, self.path)
+            assert result.resumed_bytes == 600000
+            assert (600000, 1000002) in RangeHandler.ranges
+            assert (0, 499999) not in RangeHandler.ranges
+            assert self._read() == PACKAGE
+
+    def test_05_connection_download_resource(self):
+        with LocalServer(RangeHandler) as server:
+            conn = Connection(server.url + "/sd-iri", http_impl=HttpLib2Layer(None))
+            result = conn.download_resource(server.url + "/cont-iri", self.path, segments=3)
+            assert result.ranged
+            assert result.size == len(PACKAGE)
+            assert self._read() == PACKAGE
+            assert conn.history[-1]['type'] == 'Cont_IRI GET resource (segmented)'
+
+    def test_06_range_md5_not_taken_for_the_resource(self):
+        with LocalServer(NoHeadHandler) as server:
+            d = SegmentedDownloader(HttpLib2Layer(None), segments=4, min_segment_size=1024)
+            result = d.download(server.url + "/cont-iri", self.path)
+            assert result.ranged
+            assert self._read() == PACKAGE
+
+    def test_07_segment_retried_after_error_status(self):
+        class BusyHandler(RangeHandler):
+            """Answers the first request for each range after the probe with a 503"""
+            busy = set()
+
+            def do_GET(self):
+                if "Range" in self.headers and self.headers["Range"] != "bytes=0-0" and self.headers["Range"] not in BusyHandler.busy:
+                    BusyHandler.busy.add(self.headers["Range"])
+                    self.send_response(503)
+                    self.send_header("Retry-After", "0")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                RangeHandler.do_GET(self)
+
+        with LocalServer(BusyHandler) as server:
+            conn = Connection(server.url + "/sd-iri", http_impl=HttpLib2Layer(None), retry_policy=RetryPolicy())
+            result = conn.download_resource(server.url + "/cont-iri", self.path, segments=3)
+            assert result.ranged and self._read() == PACKAGE
+            # (one segment, as the package is smaller than the default `min_segment_size`)
+            assert BusyHandler.busy == {"bytes=0-1000002"} and RangeHandler.ranges == [(0, 1000002)]
+            # through the connection, so its progress is tracked
+            assert conn.transfer_stats.bytes_received >= len(PACKAGE)
+            # without a retry policy, a 503 is not retried
+            BusyHandler.busy = set()
+            os.remove(self.path)
+            d = SegmentedDownloader(HttpLib2Layer(None), segments=3, min_segment_size=1024)
+            self.assertRaises(HTTPResponseError, d.download, server.url + "/cont-iri", self.path)
@@ -0,0 +1,163 @@
+import os
+import re
+import json
+import shutil
+import tempfile
+from hashlib import md5
+
+from . import TestController, LocalServer, QuietHandler
+
+from sword2 import Connection, HttpLib2Layer, RetryPolicy
+from sword2.exceptions import ServerError
+from sword2.segmented_upload import SegmentedUploader
+
+DATA = os.urandom(350000)
+
+class SegmentedUploadHandler(QuietHandler):
+    """Stand-in for a server that takes uploads in segments - with Content-Range (`content_range = True`) or with
+    the segmented-deposit extension. `fail_at` is a byte offset (or segment number) whose segment gets a 500."""
+    content_range = True
+    fail_at = None
+    stored = b""            # Content-Range upload in progress
+    temporary = {}          # segment number -> data, for the extension
+    files = {}              # path -> content, once complete
+    requests = []
+
+    def _reply(self, status, headers=None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _body(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-MD5") and md5(body).hexdigest() != self.headers["Content-MD5"]:
+            return None
+        return body
+
+    def do_PUT(self):
+        cls = SegmentedUploadHandler
+        content_range = self.headers.get("Content-Range")
+        cls.requests.append(("PUT", self.path, content_range or self.headers.get("Segmented-Upload")))
+        if content_range:
+            if not cls.content_range:
+                return self._reply(400)
+            m = re.match(r"bytes (\*|(\d+)-(\d+))/(\d+)", content_range)
+            body = self._body()
+            if m.group(1) != "*":
+                start, end, size = int(m.group(2)), int(m.group(3)), int(m.group(4))
+                if cls.fail_at == start:
+                    return self._reply(500)
+                if body is None or start > len(cls.stored):
+                    return self._reply(400)
+                cls.stored = cls.stored[:start] + body
+                if end + 1 == size:
+                    cls.files[self.path] = cls.stored
+                    cls.stored = b""
+                    return self._reply(204)
+            if cls.stored:
+                return self._reply(308, {"Range" : "bytes=0-%s" % (len(cls.stored) - 1)})
+            return self._reply(308)
+        if self.headers.get("Segmented-Upload"):
+            data = b"".join(cls.temporary[n] for n in sorted(cls.temporary))
+            if md5(data).hexdigest() != self.headers.get("Content-MD5"):
+                return self._reply(412)
+            cls.files[self.path] = data
+            return self._reply(204)
+        cls.files[self.path] = self._body()
+        self._reply(204)
+
+    def do_POST(self):
+        cls = SegmentedUploadHandler
+        cls.requests.append(("POST", self.path, self.headers.get("Segment-Number") or self.headers.get("Segmented-Upload")))
+        if self.path.startswith("/temporary/"):
+            number = int(self.headers["Segment-Number"])
+            body = self._body()
+            if cls.fail_at == number:
+                return self._reply(500)
+            if body is None:
+                return self._reply(412)
+            cls.temporary[number] = body
+            return self._reply(200)
+        if (self.headers.get("Segmented-Upload") or "").startswith("init"):
+            cls.temporary = {}
+            return self._reply(201, {"Location" : "http://%s:%s/temporary/1" % self.server.server_address})
+        self._reply(400)
+
+class TestSegmentedUpload(TestController):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "big.zip")
+        with open(self.path, "wb") as f:
+            f.write(DATA)
+        SegmentedUploadHandler.content_range = True
+        SegmentedUploadHandler.fail_at = None
+        SegmentedUploadHandler.stored = b""
+        SegmentedUploadHandler.temporary = {}
+        SegmentedUploadHandler.files = {}
+        SegmentedUploadHandler.requests = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _uploader(self, conn, **kw):
+        policy = RetryPolicy(max_retries=0)
+        return SegmentedUploader(conn, segment_size=100000, retry_policy=policy, **kw)
+
+    def test_01_content_range(self):
+        with LocalServer(SegmentedUploadHandler) as server:
+            conn = Connection(server.url + "/sd-iri", http_impl=HttpLib2Layer(None))
+            receipt = conn.update_files_for_resource(self.path, "big.zip", mimetype="application/zip",
+                                                     edit_media_iri=server.url + "/em-iri", segment_size=100000)
+            assert receipt.code == 204
+            assert SegmentedUploadHandler.files["/em-iri"] == DATA
+            assert [r[2] for r in SegmentedUploadHandler.requests] == ["bytes */350000", "bytes 0-99999/350000",
+                        "bytes 100000-199999/350000", "bytes 200000-299999/350000", "bytes 300000-349999/350000"]
+            assert not os.path.exists(self.path + ".upload-segments")
+
+    def test_02_content_range_resumed(self):
+        with LocalServer(SegmentedUploadHandler) as server:
+            conn = Connection(server.url + "/sd-iri", http_impl=HttpLib2Layer(None), retry_policy=False)
+            SegmentedUploadHandler.fail_at = 200000
+            self.assertRaises(ServerError, self._uploader(conn).upload, server.url + "/em-iri", self.path,
+                              mimetype="application/zip")
+            with open(self.path + ".upload-segments") as f:
+                journal = json.load(f)
+            assert journal["mode"] == "content-range"
+            assert journal["segments"] == [md5(DATA[:100000]).hexdigest(), md5(DATA[100000:200000]).hexdigest(), None, None]
+
+            SegmentedUploadHandler.fail_at = None
+            SegmentedUploadHandler.requests = []
+            receipt = self._uploader(conn).upload(server.url + "/em-iri", self.path, mimetype="application/zip")
+            assert receipt.code == 204
+            assert [r[2] for r in SegmentedUploadHandler.requests] == ["bytes */350000",
+                        "bytes 200000-299999/350000", "bytes 300000-349999/350000"]
+            assert SegmentedUploadHandler.files["/em-iri"] == DATA
+
+    def test_03_segmented_extension_resumed(self):
+        SegmentedUploadHandler.content_range = False
+        with LocalServer(SegmentedUploadHandler) as server:
+            conn = Connection(server.url + "/sd-iri", http_impl=HttpLib2Layer(None), retry_policy=False)
+            SegmentedUploadHandler.fail_at = 4
+            self.assertRaises(ServerError, self._uploader(conn, journal_dir=self.tmp).upload, server.url + "/em-iri",
+                              self.path, mimetype="application/zip", packaging="http://purl.org/net/sword/package/SimpleZip")
+            assert sorted(SegmentedUploadHandler.temporary) == [1, 2, 3]
+
+            SegmentedUploadHandler.fail_at = None
+            SegmentedUploadHandler.requests = []
+            receipt = self._uploader(conn, journal_dir=self.tmp).upload(server.url + "/em-iri", self.path,
+                              mimetype="application/zip", packaging="http://purl.org/net/sword/package/SimpleZip")
+            assert receipt.code == 204
+            # no new temporary upload, and only the segment that failed
+            assert SegmentedUploadHandler.requests == [("POST", "/temporary/1", "4"),
+                                                       ("PUT", "/em-iri", server.url + "/temporary/1")]
+            assert SegmentedUploadHandler.files["/em-iri"] == DATA
+
+    def test_04_small_file_single_request(self):
+        with LocalServer(SegmentedUploadHandler) as server:
+            conn = Connection(server.url + "/sd-iri", http_impl=HttpLib2Layer(None))
+            receipt = SegmentedUploader(conn, segment_size=len(DATA)).upload(server.url + "/em-iri", self.path,
+                                                                              mimetype="application/zip")
+            assert receipt.code == 204
+            assert SegmentedUploadHandler.requests == [("PUT", "/em-iri", None)]
@@ -0,0 +1,104 @@
+import io
+import json
+import logging
+
+from . import TestController, MockHttpLayer
+from .test_deposit_receipt import DR
+
+from sword2 import Connection
+from sword2.structured_logging import configure, events_l, JSONFormatter, SamplingFilter
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def record(msg, args=(), level=logging.INFO, name="sword2.service_document"):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+class TestStructuredLogging(TestController):
+    def setUp(self):
+        self.logger = logging.getLogger("sword2")
+        self.saved = (self.logger.level, self.logger.propagate, events_l.level)
+        self.handler = None
+
+    def tearDown(self):
+        if self.handler is not None:
+            self.logger.removeHandler(self.handler)
+        self.logger.level, self.logger.propagate, events_l.level = self.saved
+
+    def _lines(self, stream):
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    def _requests(self, conn, http, n):
+        for i in range(n):
+            http.queue(201, {"Location" : "http://example.org/edit/%d" % i}, DR)
+            conn.create(col_iri="http://example.org/col-iri", payload=b"data", mimetype="application/zip",
+                        filename="example.zip", packaging="http://purl.org/net/sword/package/SimpleZip")
+
+    def test_01_one_event_per_operation(self):
+        stream = io.StringIO()
+        self.handler = configure(stream=stream)
+        http = MockHttpLayer()
+        conn = Connection("http://example.org/sd-iri", http_impl=http, error_response_raises_exceptions=False)
+        self._requests(conn, http, 3)
+        http.queue(404, {"Content-Type" : "text/plain"}, b"gone")
+        conn.get_resource(content_iri="http://example.org/cont-iri")
+        lines = [l for l in self._lines(stream) if l['logger'] == "sword2.events"]
+        assert [l['event'] for l in lines] == ["Col_IRI POST"] * 3 + ["Cont_IRI GET"], lines
+        # the free-text messages are kept at WARNING
+        assert all(l['level'] in ("WARNING", "ERROR") for l in self._lines(stream) if l not in lines)
+        first = lines[0]
+        assert first['level'] == "INFO"
+        assert first['iri'] == "http://example.org/col-iri" and first['status'] == 201
+        assert first['sent'] == 4 and first['received'] == len(DR) and first['retries'] == 0
+        assert first['duration_ms'] >= 0 and first['time'].endswith("Z")
+        assert lines[-1]['level'] == "WARNING" and lines[-1]['status'] == 404
+
+    def test_02_free_text_rate_limited(self):
+        stream = io.StringIO()
+        self.handler = configure(stream=stream, level=logging.INFO, events=False, rate=2)
+        http = MockHttpLayer()
+        conn = Connection("http://example.org/sd-iri", http_impl=http)
+        self._requests(conn, http, 5)
+        lines = self._lines(stream)
+        assert lines and all(l['logger'] != "sword2.events" for l in lines)
+        validation = [l for l in lines if l['message'].startswith("Initial SWORD2 validation checks on deposit receipt")]
+        assert len(validation) == 2
+        counts = {}
+        for l in lines:
+            counts[(l['logger'], l['message'])] = counts.get((l['logger'], l['message']), 0) + 1
+        assert max(counts.values()) <= 2
+
+    def test_03_sampling_filter(self):
+        clock = Clock()
+        f = SamplingFilter(rate=2, per=60, clock=clock)
+        kept = [f.filter(record("Valid document? %s", (i,))) for i in range(5)]
+        assert kept == [True, True, False, False, False]
+        assert f.filter(record("Something else"))
+        assert f.filter(record("Valid document? %s", (0,), level=logging.ERROR))
+        clock.now = 61
+        r = record("Valid document? %s", (True,))
+        assert f.filter(r) and r.suppressed == 3
+        assert "suppressed" not in vars(record("x")) and json.loads(JSONFormatter().format(r))['suppressed'] == 3
+
+        values = iter([0.05, 0.5, 0.09, 0.95])
+        f = SamplingFilter(sample=0.1, random=lambda: next(values))
+        kept = [f.filter(record("Registering %s", (i,))) for i in range(4)]
+        assert kept == [True, False, True, False]
+        r = record("Registering %s", (1,))
+        f.random = lambda: 0.0
+        assert f.filter(r) and json.loads(JSONFormatter().format(r))['sample'] == 0.1
+
+    def test_04_no_events_unless_asked(self):
+        stream = io.StringIO()
+        self.handler = logging.StreamHandler(stream)
+        self.logger.addHandler(self.handler)
+        self.logger.setLevel(logging.INFO)
+        http = MockHttpLayer()
+        conn = Connection("http://example.org/sd-iri", http_impl=http)
+        self._requests(conn, http, 1)
+        assert stream.getvalue() and "sword2.events" not in stream.getvalue()
+        assert events_l.getEffectiveLevel() == logging.WARNING
@@ -0,0 +1,122 @@
+import io
+import json
+import time
+import threading
+
+from . import TestController, MockHttpLayer, LocalServer, QuietHandler
+
+from sword2 import Connection, Entry, HttpLib2Layer, UrlLib2Layer
+from sword2.tracing import Tracer, current
+
+RECEIPT = b"""<entry xmlns="http://www.w3.org/2005/Atom" xmlns:sword="http://purl.org/net/sword/terms/">
+    <title>Deposit</title>
+    <id>info:example/1</id>
+    <updated>2011-05-30T01:05:54Z</updated>
+    <link rel="edit" href="http://example.org/edit/1"/>
+</entry>"""
+
+class SlowHandler(QuietHandler):
+    """Waits 0.2s before answering, then sends the body in two halves 0.1s apart"""
+    def do_GET(self):
+        time.sleep(0.2)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Length", "20000")
+        self.end_headers()
+        self.wfile.write(b"x" * 10000)
+        self.wfile.flush()
+        time.sleep(0.1)
+        self.wfile.write(b"x" * 10000)
+
+class TestTracing(TestController):
+    def _children(self, tracer, span):
+        return dict((s.name, s) for s in tracer.spans if s.parent_id == span.id)
+
+    def test_01_spans_and_hooks(self):
+        started, ended = [], []
+        tracer = Tracer(on_start=lambda s: started.append(s.name), on_end=lambda s: ended.append(s.name))
+        with tracer.span("outer", iri="http://example.org/") as outer:
+            assert current() is outer
+            with tracer.span("inner") as inner:
+                assert inner.parent_id == outer.id
+            try:
+                with tracer.span("failing"):
+                    raise ValueError()
+            except ValueError:
+                pass
+        assert current() is None
+        assert started == ["outer", "inner", "failing"]
+        assert ended == ["inner", "failing", "outer"]
+        assert tracer.spans[1].attributes['error'] == "ValueError"
+        assert outer.duration >= inner.duration >= 0
+
+        trace = json.loads(tracer.to_chrome_trace())
+        events = trace['traceEvents']
+        assert [e['name'] for e in events] == ["inner", "failing", "outer"]
+        assert all(e['ph'] == "X" and e['dur'] >= 0 for e in events)
+        assert events[0]['args']['parent'] == outer.id
+        assert events[2]['args']['iri'] == "http://example.org/"
+        fp = io.StringIO()
+        tracer.to_chrome_trace(fp)
+        assert json.loads(fp.getvalue()) == trace
+
+    def test_02_deposit_phases(self):
+        http = MockHttpLayer()
+        http.queue(201, {"Location" : "http://example.org/edit/1"}, RECEIPT)
+        tracer = Tracer()
+        conn = Connection("http://example.org/sd-iri", http_impl=http, tracer=tracer)
+        e = Entry(title="Deposit", id="info:example/1")
+        conn.create(col_iri="http://example.org/col-iri", metadata_entry=e, payload=b"data",
+                    mimetype="application/zip", filename="example.zip",
+                    packaging="http://purl.org/net/sword/package/SimpleZip")
+        request = tracer.spans[-1]
+        assert request.name == "Col_IRI POST" and request.parent_id is None
+        children = self._children(tracer, request)
+        assert sorted(children) == ["attempt", "build body", "hash", "parse"]
+        assert children['parse'].attributes['document'] == "deposit_receipt"
+        attempt = children['attempt']
+        assert attempt.attributes['status'] == 201 and attempt.attributes['method'] == "POST"
+        assert "send" in self._children(tracer, attempt)
+        assert children['hash'].end <= children['build body'].start <= attempt.start <= children['parse'].start
+
+    def test_03_network_phases(self):
+        with LocalServer(SlowHandler) as server:
+            for layer in (UrlLib2Layer(), HttpLib2Layer(None)):
+                tracer = Tracer()
+                conn = Connection(server.url + "/sd-iri", http_impl=layer, tracer=tracer)
+                stream = conn.get_resource(server.url + "/cont-iri", stream=True)
+                assert len(b"".join(stream)) == 20000
+                attempt = [s for s in tracer.spans if s.name == "attempt"][0]
+                phases = self._children(tracer, attempt)
+                assert sorted(phases) == ["receive", "send", "ttfb"], phases
+                assert phases['ttfb'].duration >= 0.15
+                assert phases['receive'].duration >= 0.05
+                assert phases['send'].end <= phases['ttfb'].start <= phases['receive'].start
+
+    def test_04_concurrent_requests(self):
+        with LocalServer(SlowHandler) as server:
+            tracer = Tracer()
+            conn = Connection(server.url + "/sd-iri", http_impl=UrlLib2Layer(), tracer=tracer)
+            threads = [threading.Thread(target=conn.get_resource, args=(server.url + "/cont-iri",))
+                       for i in range(2)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        requests = [s for s in tracer.spans if s.name == "Cont_IRI GET"]
+        assert len(requests) == 2 and requests[0].thread != requests[1].thread
+        # they overlapped, and each attempt and its phases belong to the request of its own thread
+        assert requests[0].start < requests[1].end and requests[1].start < requests[0].end
+        for request in requests:
+            attempt = self._children(tracer, request)['attempt']
+            assert attempt.thread == request.thread
+            assert sorted(self._children(tracer, attempt)) == ["receive", "send", "ttfb"]
+        events = json.loads(tracer.to_chrome_trace())['traceEvents']
+        assert len(set(e['tid'] for e in events)) == 2
+
+    def test_05_no_tracer(self):
+        http = MockHttpLayer()
+        http.queue(200, {"Content-Type" : "application/zip"}, b"data")
+        conn = Connection("http://example.org/sd-iri", http_impl=http)
+        assert conn.tracer is None
+        assert conn.get_resource(content_iri="http://example.org/cont-iri").content == b"data"
@@ -0,0 +1,102 @@
+import io
+import os
+import json
+import shutil
+import tempfile
+
+from . import TestController, MockHttpLayer, MockResponse
+
+from sword2 import Connection
+from sword2.transaction_history import Transaction_History, Ring_History, JSONL_History, History_Record
+
+class TestTransactionHistory(TestController):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "history.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _lines(self):
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_01_ring(self):
+        h = Ring_History(3)
+        for i in range(5):
+            h.log("event", n=i)
+        assert len(h) == 3
+        assert [r['payload']['n'] for r in h] == [2, 3, 4]
+        assert h[-1]['type'] == "event"
+        assert [r['payload']['n'] for r in json.loads(h.to_json())] == [2, 3, 4]
+
+    def test_02_jsonl(self):
+        h = JSONL_History(self.path, maxlen=2, flush_interval=60)
+        for i in range(5):
+            h.log("event", n=i, unserialisable=object())
+        h.flush()                            # long before the flush interval is up
+        assert [r['payload']['n'] for r in self._lines()] == [0, 1, 2, 3, 4]
+        assert [r['payload']['n'] for r in h] == [3, 4]
+        h.log("event", n=5)
+        h.close()
+        h.close()
+        assert len(self._lines()) == 6
+        # appended to, not overwritten
+        with JSONL_History(self.path) as h:
+            h.log("event", n=6)
+        assert len(self._lines()) == 7
+
+    def test_03_jsonl_flushes_periodically(self):
+        h = JSONL_History(self.path, flush_interval=0.05)
+        h.log("event", n=1)
+        for i in range(100):
+            if self._lines_written():
+                break
+            h._thread.join(0.02)
+        assert self._lines_written() == 1
+        h.close()
+
+    def _lines_written(self):
+        with open(self.path) as f:
+            return len(f.readlines())
+
+    def test_04_connection(self):
+        http = MockHttpLayer()
+        http.queue(200, {"Content-Type" : "application/zip"}, b"data")
+        http.queue(200, {"Content-Type" : "application/zip"}, b"data")
+        history = Ring_History(2)
+        conn = Connection("http://example.org/sd-iri", http_impl=http, keep_history=history)
+        assert conn.history is history and conn.keep_history
+        assert history[0]['type'] == "init"
+        conn.get_resource(content_iri="http://example.org/cont-iri")
+        conn.get_resource(content_iri="http://example.org/cont-iri")
+        assert [r['type'] for r in history] == ["Cont_IRI GET resource"] * 2
+        conn.reset_transaction_history()
+        assert conn.history is history and len(history) == 0
+        assert isinstance(Connection("http://example.org/sd-iri").history, Transaction_History)
+        assert Connection("http://example.org/sd-iri", keep_history=False).history is None
+
+    def test_05_compact_records(self):
+        h = Transaction_History()
+        resp = MockResponse(201, {"Location" : "http://example.org/edit/1", "Content-Length" : "1234",
+                                  "Server" : "Apache", "Set-Cookie" : "a=b"})
+        h.log("Col_IRI POST", response=resp, headers={"Content-Length" : "5000", "Content-MD5" : "abc"},
+              retries=0)
+        record = h[0]
+        assert isinstance(record, History_Record)
+        assert not hasattr(record, "__dict__")
+        assert record.status == 201 and record['type'] == "Col_IRI POST"
+        assert "response" not in record.payload
+        assert record.payload['response_headers'] == {"location" : "http://example.org/edit/1",
+                                                      "content-length" : "1234"}
+        assert record.payload['response_size'] == 1234 and record.payload['request_size'] == 5000
+        assert record['timestamp'].startswith("20")
+
+        fp = io.StringIO()
+        h.log("init", sd_iri="http://example.org/sd-iri")
+        h.to_json(fp)
+        dumped = json.loads(fp.getvalue())
+        assert dumped[0]['status'] == 201 and dumped[1]['type'] == "init"
+        assert json.loads(h.to_json()) == dumped
+        assert json.loads(h.to_pretty_json()) == dumped
+        assert json.loads(Transaction_History().to_pretty_json()) == []
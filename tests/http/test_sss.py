@@ -5,17 +5,14 @@ from . import TestController
 from sword2 import Connection, Entry
 from sword2.exceptions import PackagingFormatNotAvailable
 
-#SSS_PY_URL="http://sword-app.svn.sourceforge.net/viewvc/sword-app/sss/trunk/sss.py?revision=HEAD"
-SSS_PY_URL="https://raw.githubusercontent.com/OA-DeepGreen/Simple-Sword-Server/master/sss/sss-1.0.py"
-PORT_NUMBER="8081"
+from sword2.fake_server import FakeSwordServer
 
-import subprocess, urllib.request, urllib.parse, urllib.error, tempfile
-import os
+# The tests used to download the Simple Sword Server (sss.py) and run it on this port; they now run against the
+# in-process stand-in for it
+PORT_NUMBER="8081"
 
 import atexit
 
-from time import sleep
-
 long_service_doc = '''<?xml version="1.0" ?>
 <service xmlns:dcterms="http://purl.org/dc/terms/"
     xmlns:sword="http://purl.org/net/sword/terms/"
@@ -72,14 +69,9 @@ long_service_doc = '''<?xml version="1.0" ?>
 </service>'''
 
 
-f, sss_path = tempfile.mkstemp(suffix=".py")
-os.close(f)
-
-urllib.request.urlretrieve(SSS_PY_URL, sss_path)
-sss_pid = subprocess.Popen(['python', sss_path, PORT_NUMBER])
-sleep(1)
+sss = FakeSwordServer(user="sword", password="sword", host="localhost", port=int(PORT_NUMBER)).start()
 
-atexit.register(sss_pid.kill)
+atexit.register(sss.stop)
 
 class TestConnection(TestController):
     def test_01_blank_init(self):
@@ -129,7 +121,7 @@ class TestConnection(TestController):
    
     def test_06_Simple_POST_to_sss(self):
         conn = Connection("http://localhost:%s/sd-uri" % PORT_NUMBER, user_name="sword", user_pass="sword", download_service_document=True)
-        resp = conn.create(payload = "Payload is just a load of text", 
+        resp = conn.create(payload = b"Payload is just a load of text", 
                                     mimetype = "text/plain", 
                                     filename = "readme.txt", 
                                     packaging = 'http://purl.org/net/sword/package/Binary', 
@@ -142,7 +134,7 @@ class TestConnection(TestController):
     def test_07_Multipart_POST_to_sss(self):
         conn = Connection("http://localhost:%s/sd-uri" % PORT_NUMBER, user_name="sword", user_pass="sword", download_service_document=True)
         e = Entry(title="Foo", id="asidjasidj", dcterms_appendix="blah blah", dcterms_title="foo bar")
-        resp = conn.create(payload = "Multipart payload here", 
+        resp = conn.create(payload = b"Multipart payload here", 
                                     metadata_entry = e, 
                                     mimetype = "text/plain", 
                                     filename = "readme.txt", 
@@ -156,7 +148,7 @@ class TestConnection(TestController):
     def test_08_Simple_POST_to_sss_w_coliri(self):
         conn = Connection("http://localhost:%s/sd-uri" % PORT_NUMBER, user_name="sword", user_pass="sword", download_service_document=True)
         e = Entry(title="Foo", id="asidjasidj", dcterms_appendix="blah blah", dcterms_title="foo bar")
-        resp = conn.create(payload = "Payload is just a load of text", 
+        resp = conn.create(payload = b"Payload is just a load of text", 
                                     mimetype = "text/plain", 
                                     filename = "readme.txt", 
                                     packaging = 'http://purl.org/net/sword/package/Binary',
@@ -169,7 +161,7 @@ class TestConnection(TestController):
         conn = Connection("http://localhost:%s/sd-uri" % PORT_NUMBER, user_name="sword", user_pass="sword", download_service_document=True)
         e = Entry(title="Foo", id="asidjasidj", dcterms_appendix="blah blah", dcterms_title="foo bar")
         e = Entry(title="Foo", id="asidjasidj", dcterms_appendix="blah blah", dcterms_title="foo bar")
-        resp = conn.create(payload = "Multipart payload here", 
+        resp = conn.create(payload = b"Multipart payload here", 
                                     metadata_entry = e, 
                                     mimetype = "text/plain", 
                                     filename = "readme.txt", 
@@ -182,7 +174,7 @@ class TestConnection(TestController):
     def test_10_Multipart_POST_then_update_on_EM_IRI(self):
         conn = Connection("http://localhost:%s/sd-uri" % PORT_NUMBER, user_name="sword", user_pass="sword", download_service_document=True)
         e = Entry(title="Foo", id="asidjasidj", dcterms_appendix="blah blah", dcterms_title="foo bar")
-        deposit_receipt = conn.create(payload = "Multipart_POST_then_update_on_EM_IRI", 
+        deposit_receipt = conn.create(payload = b"Multipart_POST_then_update_on_EM_IRI", 
                                     metadata_entry = e, 
                                     mimetype = "text/plain", 
                                     filename = "readme.txt", 
@@ -190,7 +182,7 @@ class TestConnection(TestController):
                                     col_iri = conn.workspaces[0][1][0].href, 
                                     in_progress=True)
         assert deposit_receipt.edit_media != None
-        dr = conn.update(payload = "Multipart_POST_then_update_on_EM_IRI  -- updated resource",
+        dr = conn.update(payload = b"Multipart_POST_then_update_on_EM_IRI  -- updated resource",
                                               mimetype = "text/plain",
                                               filename = "readthis.txt",
                                               packaging = "http://purl.org/net/sword/package/Binary",
@@ -200,7 +192,7 @@ class TestConnection(TestController):
     def test_11_Multipart_POST_then_update_metadata_on_Edit_IRI(self):
         conn = Connection("http://localhost:%s/sd-uri" % PORT_NUMBER, user_name="sword", user_pass="sword", download_service_document=True)
         e = Entry(title="Foo", id="asidjasidj", dcterms_appendix="blah blah", dcterms_title="foo bar")
-        deposit_receipt = conn.create(payload = "Multipart_POST_then_update_on_EM_IRI", 
+        deposit_receipt = conn.create(payload = b"Multipart_POST_then_update_on_EM_IRI", 
                                     metadata_entry = e, 
                                     mimetype = "text/plain", 
                                     filename = "readme.txt", 
@@ -238,7 +230,7 @@ class TestConnection(TestController):
     def test_14_Invalid_Packaging_cached_receipt(self):
         conn = Connection("http://localhost:%s/sd-uri" % PORT_NUMBER, user_name="sword", user_pass="sword", download_service_document=True, honour_receipts=True)
         col_iri = conn.sd.workspaces[0][1][0].href  # pick the first collection
-        dr = conn.create(payload = "Payload is just a load of text", 
+        dr = conn.create(payload = b"Payload is just a load of text", 
                                     mimetype = "text/plain", 
                                     filename = "readme.txt", 
                                     packaging = 'http://purl.org/net/sword/package/Binary',
@@ -263,7 +255,7 @@ class TestConnection(TestController):
     def test_16_Invalid_Packaging_cached_receipt(self):
         conn = Connection("http://localhost:%s/sd-uri" % PORT_NUMBER, user_name="sword", user_pass="sword", download_service_document=True, honour_receipts=True)
         col_iri = conn.sd.workspaces[0][1][0].href  # pick the first collection
-        dr = conn.create(payload = "Payload is just a load of text", 
+        dr = conn.create(payload = b"Payload is just a load of text", 
                                     mimetype = "text/plain", 
                                     filename = "readme.txt", 
                                     packaging = 'http://purl.org/net/sword/package/Binary',
@@ -281,7 +273,7 @@ class TestConnection(TestController):
     def test_17_Simple_POST_and_GET(self):
         conn = Connection("http://localhost:%s/sd-uri" % PORT_NUMBER, user_name="sword", user_pass="sword", download_service_document=True)
         col_iri = conn.sd.workspaces[0][1][0].href  # pick the first collection
-        dr = conn.create(payload = "Simple_POST_and_GET", 
+        dr = conn.create(payload = b"Simple_POST_and_GET", 
                                     mimetype = "text/plain", 
                                     filename = "readme.txt", 
                                     packaging = 'http://purl.org/net/sword/package/Binary',
@@ -298,7 +290,7 @@ class TestConnection(TestController):
     def test_18_Metadata_POST_to_se_iri(self):
         conn = Connection("http://localhost:%s/sd-uri" % PORT_NUMBER, user_name="sword", user_pass="sword", download_service_document=True)
         e = Entry(title="Foo", id="asidjasidj", dcterms_appendix="blah blah", dcterms_title="foo bar")
-        deposit_receipt = conn.create(payload = "Multipart_POST_then_update_on_EM_IRI", 
+        deposit_receipt = conn.create(payload = b"Multipart_POST_then_update_on_EM_IRI", 
                                     metadata_entry = e, 
                                     mimetype = "text/plain", 
                                     filename = "readme.txt", 
@@ -316,7 +308,7 @@ class TestConnection(TestController):
     def test_19_File_POST_to_se_iri(self):
         conn = Connection("http://localhost:%s/sd-uri" % PORT_NUMBER, user_name="sword", user_pass="sword", download_service_document=True)
         e = Entry(title="Foo", id="asidjasidj", dcterms_appendix="blah blah", dcterms_title="foo bar")
-        deposit_receipt = conn.create(payload = "Multipart_POST_then_update_on_EM_IRI", 
+        deposit_receipt = conn.create(payload = b"Multipart_POST_then_update_on_EM_IRI", 
                                     metadata_entry = e, 
                                     mimetype = "text/plain", 
                                     filename = "readme.txt", 
@@ -326,7 +318,7 @@ class TestConnection(TestController):
                                     
         assert deposit_receipt.se_iri != None
         dr = conn.append(se_iri = deposit_receipt.se_iri,
-                                              payload = "Multipart_POST_then_appending_file_on_SE_IRI  -- updated resource",
+                                              payload = b"Multipart_POST_then_appending_file_on_SE_IRI  -- updated resource",
                                               mimetype = "text/plain",
                                               filename = "readthisextrafile.txt",
                                               packaging = "http://purl.org/net/sword/package/Binary")
@@ -335,7 +327,7 @@ class TestConnection(TestController):
     def test_20_Multipart_POST_to_se_iri(self):
         conn = Connection("http://localhost:%s/sd-uri" % PORT_NUMBER, user_name="sword", user_pass="sword", download_service_document=True)
         e = Entry(title="Foo", id="asidjasidj", dcterms_appendix="blah blah", dcterms_title="foo bar")
-        deposit_receipt = conn.create(payload = "Multipart_POST_then_update_on_EM_IRI", 
+        deposit_receipt = conn.create(payload = b"Multipart_POST_then_update_on_EM_IRI", 
                                     metadata_entry = e, 
                                     mimetype = "text/plain", 
                                     filename = "readme.txt", 
@@ -346,7 +338,7 @@ class TestConnection(TestController):
         assert deposit_receipt.se_iri != None
         e.add_fields(dcterms_identifier="doi://multipart_update_to_SE_IRI")
         dr = conn.append(se_iri = deposit_receipt.se_iri,
-                                              payload = "Multipart_POST_then_appending_file_on_SE_IRI  -- updated resource",
+                                              payload = b"Multipart_POST_then_appending_file_on_SE_IRI  -- updated resource",
                                               mimetype = "text/plain",
                                               filename = "readthisextrafile.txt",
                                               packaging = "http://purl.org/net/sword/package/Binary",
@@ -358,7 +350,7 @@ class TestConnection(TestController):
     def test_21_Create_deposit_and_delete_content(self):
         conn = Connection("http://localhost:%s/sd-uri" % PORT_NUMBER, user_name="sword", user_pass="sword", download_service_document=True)
         e = Entry(title="Foo", id="asidjasidj", dcterms_appendix="blah blah", dcterms_title="foo bar")
-        deposit_receipt = conn.create(payload = "Multipart_POST_then_update_on_EM_IRI", 
+        deposit_receipt = conn.create(payload = b"Multipart_POST_then_update_on_EM_IRI", 
                                     metadata_entry = e, 
                                     mimetype = "text/plain", 
                                     filename = "readme.txt", 
@@ -373,7 +365,7 @@ class TestConnection(TestController):
     def test_22_Create_deposit_and_delete_deposit(self):
         conn = Connection("http://localhost:%s/sd-uri" % PORT_NUMBER, user_name="sword", user_pass="sword", download_service_document=True)
         e = Entry(title="Foo", id="asidjasidj", dcterms_appendix="blah blah", dcterms_title="foo bar")
-        deposit_receipt = conn.create(payload = "Multipart_POST_then_update_on_EM_IRI", 
+        deposit_receipt = conn.create(payload = b"Multipart_POST_then_update_on_EM_IRI", 
                                     metadata_entry = e, 
                                     mimetype = "text/plain", 
                                     filename = "readme.txt", 
@@ -388,7 +380,7 @@ class TestConnection(TestController):
     def test_23_Finish_in_progress_deposit(self):
         conn = Connection("http://localhost:%s/sd-uri" % PORT_NUMBER, user_name="sword", user_pass="sword", download_service_document=True)
         e = Entry(title="Foo", id="asidjasidj", dcterms_appendix="blah blah", dcterms_title="foo bar")
-        deposit_receipt = conn.create(payload = "Multipart_POST_then_update_on_EM_IRI", 
+        deposit_receipt = conn.create(payload = b"Multipart_POST_then_update_on_EM_IRI", 
                                     metadata_entry = e, 
                                     mimetype = "text/plain", 
                                     filename = "readme.txt", 
@@ -403,7 +395,7 @@ class TestConnection(TestController):
     def test_24_get_sword_statement(self):
         conn = Connection("http://localhost:%s/sd-uri" % PORT_NUMBER, user_name="sword", user_pass="sword", download_service_document=True)
         e = Entry(title="Foo", id="asidjasidj", dcterms_appendix="blah blah", dcterms_title="foo bar")
-        deposit_receipt = conn.create(payload = "Multipart_POST_then_update_on_EM_IRI", 
+        deposit_receipt = conn.create(payload = b"Multipart_POST_then_update_on_EM_IRI", 
                                     metadata_entry = e, 
                                     mimetype = "text/plain", 
                                     filename = "readme.txt", 